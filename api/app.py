@@ -7,8 +7,9 @@ from flask_babel import Babel
 from flask_sqlalchemy_session import flask_scoped_session
 
 from api.config import Configuration
+from core.app_server import replay_current_request
 from core.log import LogConfiguration
-from core.model import SessionManager
+from core.model import CachedFeed, SessionManager
 from core.util import LanguageCodes
 
 from .util.profilers import (
@@ -53,6 +54,15 @@ def initialize_database(autoinitialize=True):
     _db.commit()
     logging.getLogger().info("Application debug mode==%r" % app.debug)
 
+    if not testing:
+        # Keep recently used feeds close at hand, so that most
+        # requests for cached feeds don't have to go to the database.
+        # A stale feed is regenerated by making the same request
+        # again in a background thread.
+        CachedFeed.configure_from_environment(
+            refresh_job_factory=replay_current_request
+        )
+
 
 from . import routes  # noqa
 from .admin import routes  # noqa
@@ -1,13 +1,19 @@
+import copy
 import datetime
+import hashlib
+import hmac
 import importlib
 import json
 import logging
+import os
 import re
 import sys
+import time
 import urllib.error
 import urllib.parse
 import urllib.request
 from abc import ABCMeta
+from threading import Lock
 from typing import Iterable, Optional
 
 import flask
@@ -55,6 +61,7 @@ from core.util.problem_detail import json as pd_json
 
 from .config import CannotLoadConfiguration, Configuration, IntegrationException
 from .problem_details import *
+from .util.library_settings import LazyLibraryMapping
 from .util.patron import PatronUtility
 
 
@@ -538,11 +545,40 @@ class Authenticator:
     log = logging.getLogger("api.authenticator.Authenticator")
 
     def __init__(
-        self, _db, libraries: Iterable[Library], analytics: Optional[Analytics] = None
+        self,
+        _db,
+        libraries: Iterable[Library],
+        analytics: Optional[Analytics] = None,
+        lazy: bool = False,
     ):
+        """Constructor.
+
+        :param lazy: If this is True, a library's LibraryAuthenticator
+            isn't created until it's needed.
+        """
+        self._db = _db
+        self.analytics = analytics
+
         # Create authenticators
-        self.library_authenticators = {}
-        self.populate_authenticators(_db, libraries, analytics)
+        if lazy:
+            self.library_authenticators = LazyLibraryMapping(
+                self.create_authenticator,
+                [library.short_name for library in libraries],
+            )
+        else:
+            self.library_authenticators = LazyLibraryMapping(self.create_authenticator)
+            self.populate_authenticators(_db, libraries, analytics)
+
+    def create_authenticator(self, short_name):
+        """Create the LibraryAuthenticator for the library with the given
+        short name.
+
+        :raise KeyError: If there is no such library.
+        """
+        library = Library.lookup(self._db, short_name)
+        if not library:
+            raise KeyError(short_name)
+        return LibraryAuthenticator.from_config(self._db, library, self.analytics)
 
     @property
     def current_library_short_name(self):
@@ -1719,6 +1755,171 @@ class AuthenticationProvider(OPDSAuthenticationFlow):
         raise NotImplementedError()
 
 
+class CredentialVerificationCache:
+    """Remember, for a short time, what the source of truth said about
+    a set of Basic Auth credentials, so that a patron who makes several
+    requests in a row doesn't cause one ILS request per request.
+
+    Credentials are never stored. Entries are keyed on a salted, slow
+    hash of the username and password; the salt is random and only
+    lives as long as the cache does.
+    """
+
+    # PBKDF2 iterations used when hashing credentials.
+    HASH_ITERATIONS = 10000
+
+    # The cache won't grow beyond this many entries.
+    MAX_ENTRIES = 10000
+
+    # Log the hit rate after this many lookups.
+    REPORT_EVERY = 1000
+
+    log = logging.getLogger("Credential verification cache")
+
+    def __init__(
+        self, ttl, negative_ttl=0, max_entries=MAX_ENTRIES, clock=time.monotonic
+    ):
+        """Constructor.
+
+        :param ttl: Remember successful verifications for this many
+            seconds.
+        :param negative_ttl: Remember that credentials were wrong for
+            this many seconds. If this is zero, failures aren't
+            remembered at all.
+        :param clock: A function returning the current time in seconds.
+            Only intended to be replaced in tests.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._salt = os.urandom(16)
+        self._lock = Lock()
+
+        # Maps a credential hash to a 3-tuple (username hash, PatronData
+        # or None, expiration time).
+        self._entries = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        if not lookups:
+            return 0
+        return (self.hits + self.negative_hits) / lookups
+
+    def credential_key(self, username, password):
+        value = "%s\0%s" % (username or "", password or "")
+        return hashlib.pbkdf2_hmac(
+            "sha256", value.encode("utf8"), self._salt, self.HASH_ITERATIONS
+        )
+
+    def username_key(self, username):
+        return hmac.new(
+            self._salt, (username or "").encode("utf8"), hashlib.sha256
+        ).digest()
+
+    def get(self, username, password):
+        """Look up the last verdict on these credentials.
+
+        :return: A 2-tuple (found, patrondata). If `found` is False,
+            the source of truth must be asked. Otherwise, `patrondata`
+            is a PatronData, or None if the credentials were wrong.
+        """
+        key = self.credential_key(username, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[2] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry:
+                patrondata = entry[1]
+                if patrondata is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+            else:
+                patrondata = None
+                self.misses += 1
+            lookups = self.hits + self.negative_hits + self.misses
+        if not lookups % self.REPORT_EVERY:
+            self.log.info(
+                "%d hits, %d negative hits, %d misses, %d invalidations; hit rate %.1f%%",
+                self.hits,
+                self.negative_hits,
+                self.misses,
+                self.invalidations,
+                self.hit_rate * 100,
+            )
+        return entry is not None, patrondata
+
+    def put(self, username, password, patrondata):
+        """Remember the verdict on these credentials.
+
+        :param patrondata: A PatronData, or None if the credentials
+            were wrong.
+        """
+        if patrondata is None:
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl
+        if not ttl:
+            return
+        key = self.credential_key(username, password)
+        username_key = self.username_key(username)
+        with self._lock:
+            now = self.clock()
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[2] > now}
+            while len(self._entries) >= self.max_entries:
+                # Forget the oldest entry.
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (username_key, patrondata, now + ttl)
+
+    def invalidate(self, username, patrondata=None):
+        """Forget what we know about the credentials for `username`.
+
+        :param patrondata: If this is provided, only forget verdicts
+            whose PatronData no longer agrees with it about the patron's
+            account.
+        """
+        username_key = self.username_key(username)
+        with self._lock:
+            for key, (entry_username_key, cached, expires) in list(
+                self._entries.items()
+            ):
+                if entry_username_key != username_key:
+                    continue
+                if patrondata and self.agrees(cached, patrondata):
+                    continue
+                del self._entries[key]
+                self.invalidations += 1
+
+    @classmethod
+    def agrees(cls, cached, patrondata):
+        """Does a cached PatronData agree with fresh information about
+        the things that decide whether the patron may use the service?
+        """
+        if cached is None:
+            return False
+        for field in (
+            "permanent_id",
+            "authorization_identifier",
+            "authorization_expires",
+            "external_type",
+            "block_reason",
+            "library_identifier",
+        ):
+            value = getattr(patrondata, field)
+            if value is not None and value != getattr(cached, field):
+                return False
+        return True
+
+
 class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
     """Verify a username/password, obtained through HTTP Basic Auth, with
     a remote source of truth.
@@ -1819,6 +2020,12 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
     BARCODE_FORMAT_CODABAR = "Codabar"  # Constant defined in the extension
     BARCODE_FORMAT_NONE = ""
 
+    # A successful check of a patron's credentials with the source of
+    # truth can be reused for this many seconds, and a failed check
+    # for this many seconds.
+    CREDENTIAL_CACHE_SECONDS = "credential_cache_seconds"
+    CREDENTIAL_FAILURE_CACHE_SECONDS = "credential_failure_cache_seconds"
+
     # These identifier and password are supposed to be valid
     # credentials.  If there's a problem using them, there's a problem
     # with the authenticator or with the way we have it configured.
@@ -1933,6 +2140,22 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
             "key": PASSWORD_LABEL,
             "label": _("Label for password entry"),
         },
+        {
+            "key": CREDENTIAL_CACHE_SECONDS,
+            "label": _("Remember verified credentials for (seconds)"),
+            "description": _(
+                "If a patron's credentials were accepted this recently, they won't be checked again. Leave blank to check credentials on every request."
+            ),
+            "type": "number",
+        },
+        {
+            "key": CREDENTIAL_FAILURE_CACHE_SECONDS,
+            "label": _("Remember rejected credentials for (seconds)"),
+            "description": _(
+                "If a patron's credentials were rejected this recently, they will be rejected again without being checked. Leave blank to check rejected credentials every time."
+            ),
+            "type": "number",
+        },
     ] + AuthenticationProvider.SETTINGS
 
     # Used in the constructor to signify that the default argument
@@ -2001,6 +2224,34 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
             or self.DEFAULT_PASSWORD_LABEL
         )
 
+        credential_cache_seconds = integration.setting(
+            self.CREDENTIAL_CACHE_SECONDS
+        ).int_value
+        if credential_cache_seconds:
+            self.credential_cache = CredentialVerificationCache(
+                credential_cache_seconds,
+                integration.setting(self.CREDENTIAL_FAILURE_CACHE_SECONDS).int_value
+                or 0,
+            )
+        else:
+            self.credential_cache = None
+
+    def update_patron_metadata(self, patron):
+        """Refresh our local record of this patron's account information.
+
+        If what we learn contradicts a credential check we remembered,
+        the remembered verdict is forgotten.
+
+        :param patron: A Patron object.
+        """
+        remote_patron_info = self.remote_patron_lookup(patron)
+        if isinstance(remote_patron_info, PatronData):
+            self.apply_patrondata(remote_patron_info, patron)
+            if self.credential_cache:
+                self.credential_cache.invalidate(
+                    patron.authorization_identifier, remote_patron_info
+                )
+
     def remote_patron_lookup(self, patron_or_patrondata):
         """Ask the remote for information about this patron, and then make sure
         the patron belongs to the library associated with thie BasicAuthenticationProvider."""
@@ -2109,7 +2360,7 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
             return server_side_validation_result
 
         # Check these credentials with the source of truth.
-        patrondata = self.remote_authenticate(username, password)
+        patrondata = self.cached_remote_authenticate(_db, username, password)
         if not patrondata or isinstance(patrondata, ProblemDetail):
             # Either an error occured or the credentials did not correspond
             # to any patron.
@@ -2170,6 +2421,11 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
             # use that Patron object.
             return patrondata
 
+        if self.credential_cache:
+            # If what we just learned contradicts a verdict we
+            # remembered, forget the verdict.
+            self.credential_cache.invalidate(username, patrondata)
+
         # At this point we have a _complete_ PatronData object which we
         # know represents an existing patron on the remote side. Try
         # the local lookup again.
@@ -2191,6 +2447,45 @@ class BasicAuthenticationProvider(AuthenticationProvider, HasSelfTests):
         self.apply_patrondata(patrondata, patron)
         return patron
 
+    def cached_remote_authenticate(self, _db, username, password):
+        """Call remote_authenticate(), unless the source of truth
+        recently gave a verdict on these same credentials.
+
+        A remembered PatronData is not used if its block status
+        disagrees with what we have in the database about the patron.
+        """
+        cache = self.credential_cache
+        if not cache:
+            return self.remote_authenticate(username, password)
+
+        found, patrondata = cache.get(username, password)
+        if found:
+            if patrondata is None:
+                return None
+            patron = self.local_patron_lookup(_db, username, patrondata)
+            if not patron or self.block_status_matches(patrondata, patron):
+                return copy.copy(patrondata)
+            cache.invalidate(username)
+
+        patrondata = self.remote_authenticate(username, password)
+        if not patrondata:
+            cache.put(username, password, None)
+        elif isinstance(patrondata, PatronData):
+            cache.put(username, password, copy.copy(patrondata))
+        return patrondata
+
+    @classmethod
+    def block_status_matches(cls, patrondata, patron):
+        """Does a Patron have the block status the PatronData says
+        it should?
+        """
+        if patrondata.block_reason is None:
+            # The PatronData doesn't know.
+            return True
+        if patrondata.block_reason is PatronData.NO_VALUE:
+            return patron.block_reason is None
+        return patrondata.block_reason == patron.block_reason
+
     def apply_patrondata(self, patrondata, patron):
         """Apply a PatronData object to the given patron and make sure
         any fields that need to be updated as a result of new data
@@ -6,6 +6,7 @@ import socket
 import ssl
 import urllib
 from datetime import timedelta
+from threading import Lock
 from typing import Union
 
 import certifi
@@ -182,6 +183,9 @@ class Axis360API(
         )
 
         self.token = None
+        # Coverage providers may make requests from several threads at
+        # once; only one of them should fetch a new token.
+        self._token_lock = Lock()
         self.collection_id = collection.id
         verify_certificate = collection.external_integration.setting(
             self.VERIFY_SSL
@@ -253,6 +257,27 @@ class Axis360API(
         )
         return self.parse_token(response.content)
 
+    def bearer_token(self, expired=None):
+        """Get a bearer token, refreshing it if we don't have one yet.
+
+        :param expired: A token which turned out to have expired. If
+            this is still the current token, a new one is fetched;
+            if another thread already replaced it, its replacement is
+            used.
+        """
+        with self._token_lock:
+            if not self.token or self.token == expired:
+                self.token = None
+                self.token = self.refresh_bearer_token()
+            return self.token
+
+    def with_session(self, _db):
+        api = self._copy_with_session(_db)
+        # Share this object's bearer token, rather than having every
+        # copy fetch its own.
+        api.bearer_token = self.bearer_token
+        return api
+
     def request(
         self,
         url,
@@ -266,10 +291,9 @@ class Axis360API(
         """Make an HTTP request, acquiring/refreshing a bearer token
         if necessary.
         """
-        if not self.token:
-            self.token = self.refresh_bearer_token()
+        token = self.bearer_token()
         headers = dict(extra_headers)
-        headers["Authorization"] = "Bearer " + self.token
+        headers["Authorization"] = "Bearer " + token
         headers["Library"] = self.library_id
         if exception_on_401:
             disallowed_response_codes = ["401"]
@@ -289,7 +313,7 @@ class Axis360API(
             # make _make_request raise a RemoteIntegrationException.
             #
             # The token has expired. Get a new token and try again.
-            self.token = None
+            self.bearer_token(expired=token)
             return self.request(
                 url=url,
                 method=method,
@@ -591,6 +615,7 @@ class Axis360API(
 
     def _make_request(self, url, method, headers, data=None, params=None, **kwargs):
         """Actually make an HTTP request."""
+        kwargs.setdefault("integration", ExternalIntegration.AXIS_360)
         return HTTP.request_with_timeout(
             method, url, headers=headers, data=data, params=params, **kwargs
         )
@@ -740,8 +765,14 @@ class Axis360BibliographicCoverageProvider(BibliographicCoverageProvider):
         self.parser = BibliographicParser()
 
     def process_batch(self, identifiers):
+        return self.process_fetched_batch(identifiers, self.fetch_batch(identifiers))
+
+    def fetch_batch(self, identifiers):
+        identifier_strings = self.api.create_identifier_strings(identifiers)
+        return self.api.availability(title_ids=identifier_strings)
+
+    def process_fetched_batch(self, identifiers, response):
         identifier_strings = self.api.create_identifier_strings(identifiers)
-        response = self.api.availability(title_ids=identifier_strings)
         seen_identifiers = set()
         batch_results = []
         for metadata, availability in self.parser.process_all(response.content):
@@ -17,7 +17,7 @@ from pymarc import parse_xml_to_array
 
 from core.analytics import Analytics
 from core.config import CannotLoadConfiguration
-from core.coverage import BibliographicCoverageProvider
+from core.coverage import BibliographicCoverageProvider, CoverageFailure
 from core.metadata_layer import (
     CirculationData,
     ContributorData,
@@ -41,6 +41,7 @@ from core.model import (
     Hyperlink,
     Identifier,
     LicensePool,
+    LicensePoolAvailabilityBatch,
     Measurement,
     Representation,
     Session,
@@ -56,6 +57,7 @@ from core.testing import DatabaseTest
 from core.util.datetime_helpers import datetime_utc, strptime_utc, to_utc, utc_now
 from core.util.http import HTTP
 from core.util.string_helpers import base64
+from core.util.worker_pools import prefetch
 from core.util.xmlparser import XMLParser
 
 from .circulation import BaseCirculationAPI, FulfillmentInfo, HoldInfo, LoanInfo
@@ -116,6 +118,11 @@ class BibliothecaAPI(BaseCirculationAPI, HasSelfTests):
     ]
 
     MAX_AGE = timedelta(days=730).seconds
+
+    # When catching up on events, fetch this many slices of time ahead
+    # of the slice whose events are being handled.
+    PREFETCH_EVENT_SLICES = 2
+
     CAN_REVOKE_HOLD_WHEN_RESERVED = False
     SET_DELIVERY_MECHANISM_AT = None
 
@@ -311,6 +318,7 @@ class BibliothecaAPI(BaseCirculationAPI, HasSelfTests):
 
     def _request_with_timeout(self, method, url, *args, **kwargs):
         """This will be overridden in MockBibliothecaAPI."""
+        kwargs.setdefault("integration", ExternalIntegration.BIBLIOTHECA)
         return HTTP.request_with_timeout(method, url, *args, **kwargs)
 
     def _simple_http_get(self, url, headers, *args, **kwargs):
@@ -622,6 +630,11 @@ class DummyBibliothecaAPIResponse:
 
 
 class MockBibliothecaAPI(BibliothecaAPI):
+
+    # Mock responses are handed out in the order they were queued, so
+    # don't fetch anything in the background.
+    PREFETCH_EVENT_SLICES = 0
+
     @classmethod
     def mock_collection(self, _db, name="Test Bibliotheca Collection"):
         """Create a mock Bibliotheca collection for use in tests."""
@@ -1259,6 +1272,7 @@ class BibliothecaCirculationSweep(IdentifierSweepMonitor):
         # that Bibliotheca doesn't know about.  This is a pretty reliable
         # indication that we no longer own any licenses to the
         # book.
+        batch = LicensePoolAvailabilityBatch(self._db)
         for identifier in identifiers_not_mentioned_by_bibliotheca:
             pools = [
                 lp
@@ -1272,7 +1286,8 @@ class BibliothecaCirculationSweep(IdentifierSweepMonitor):
                 continue
             if pool.licenses_owned > 0:
                 self.log.warn("Removing %s from circulation.", identifier.identifier)
-            pool.update_availability(0, 0, 0, 0, self.analytics, as_of=now)
+            pool.update_availability(0, 0, 0, 0, self.analytics, as_of=now, batch=batch)
+        batch.finish()
 
     def _process_metadata(
         self,
@@ -1649,11 +1664,16 @@ class BibliothecaEventMonitor(BibliothecaTimelineMonitor):
 
         # Since we'll never get more than about 100 events from a
         # single API call, slice the timespan into relatively small
-        # chunks.
-        for slice_start, slice_cutoff, full_slice in self.slice_timespan(
-            start, cutoff, timedelta(minutes=5)
+        # chunks. The next few slices are fetched in the background
+        # while the events in the current slice are handled.
+        slices = self.slice_timespan(start, cutoff, timedelta(minutes=5))
+        for events in prefetch(
+            (
+                self.api.get_events_between(slice_start, slice_cutoff)
+                for slice_start, slice_cutoff, full_slice in slices
+            ),
+            self.api.PREFETCH_EVENT_SLICES,
         ):
-            events = self.api.get_events_between(slice_start, slice_cutoff)
             for event in events:
                 self.handle_event(*event)
                 events_handled += 1
@@ -1801,6 +1821,23 @@ class BibliothecaBibliographicCoverageProvider(BibliographicCoverageProvider):
 
     def process_item(self, identifier):
         metadata = self.api.bibliographic_lookup(identifier)
+        return self._process_metadata(identifier, metadata)
+
+    def fetch_batch(self, identifiers):
+        # Each title is still looked up on its own, so that one bad
+        # identifier can't spoil the lookup for the rest of the batch.
+        return [self.api.bibliographic_lookup(i) for i in identifiers]
+
+    def process_fetched_batch(self, identifiers, metadatas):
+        results = []
+        for identifier, metadata in zip(identifiers, metadatas):
+            result = self._process_metadata(identifier, metadata)
+            if not isinstance(result, CoverageFailure):
+                self.handle_success(identifier)
+            results.append(result)
+        return results
+
+    def _process_metadata(self, identifier, metadata):
         if not metadata:
             return self.failure(identifier, "Bibliotheca bibliographic lookup failed.")
         [metadata] = metadata
@@ -1,9 +1,10 @@
+import copy
 import datetime
 import logging
-import sys
 import time
 from abc import ABC, abstractmethod
-from threading import Thread
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from threading import BoundedSemaphore, Lock
 from typing import Dict, Optional, Type
 
 import flask
@@ -29,9 +30,11 @@ from core.model import (
     Patron,
     RightsStatus,
     Session,
+    SessionManager,
     get_one,
 )
 from core.util.datetime_helpers import utc_now
+from core.util.histogram import LatencyHistograms
 
 from .circulation_exceptions import *
 from .config import Configuration
@@ -481,6 +484,25 @@ class BaseCirculationAPI:
     # is called "ebook-epub-adobe" in Overdrive.
     delivery_mechanism_to_internal_format = {}
 
+    def with_session(self, _db):
+        """Make a copy of this object which uses a different database
+        session, so it can be used in another thread.
+
+        Most APIs keep model objects or other per-session state around,
+        so this can't be done in general. An API that doesn't implement
+        this is only used in the thread that created it.
+        """
+        raise NotImplementedError()
+
+    def _copy_with_session(self, _db):
+        """A shallow copy of this object that uses a different database
+        session. Subclasses that implement with_session() should start
+        with this, then replace anything that belongs to the old session.
+        """
+        api = copy.copy(self)
+        api._db = _db
+        return api
+
     def internal_format(self, delivery_mechanism):
         """Look up the internal format for this delivery mechanism or
         raise an exception.
@@ -669,6 +691,27 @@ class CirculationAPI:
     'borrow'.
     """
 
+    # The maximum number of vendor API requests for patron activity
+    # this process will make at once.
+    PATRON_ACTIVITY_THREADS = 20
+
+    # The maximum number of requests for patron activity this process
+    # will have in progress at once for any one collection. This keeps
+    # a vendor API that has stopped responding from tying up every
+    # thread in the pool.
+    PATRON_ACTIVITY_THREADS_PER_API = 5
+
+    # When syncing a patron's bookshelf, stop waiting for vendor APIs
+    # after this many seconds.
+    PATRON_ACTIVITY_TIMEOUT = 20
+
+    _patron_activity_executor = None
+    _patron_activity_executor_lock = Lock()
+    _patron_activity_limits = {}
+
+    # How long each vendor API takes to report on patron activity.
+    patron_activity_latency = LatencyHistograms()
+
     def __init__(
         self,
         db: sqlalchemy.orm.session.Session,
@@ -1587,80 +1630,176 @@ class CirculationAPI:
 
         return True
 
+    @classmethod
+    def patron_activity_executor(cls):
+        """Find or create the pool of threads used to ask vendor APIs
+        about patron activity.
+
+        The pool is shared by every CirculationAPI in this process, so
+        no matter how many patrons sync their bookshelves at once, no
+        more than PATRON_ACTIVITY_THREADS vendor requests are made at a
+        time.
+        """
+        with cls._patron_activity_executor_lock:
+            if cls._patron_activity_executor is None:
+                cls._patron_activity_executor = ThreadPoolExecutor(
+                    max_workers=cls.PATRON_ACTIVITY_THREADS,
+                    thread_name_prefix="patron-activity",
+                )
+            return cls._patron_activity_executor
+
+    @classmethod
+    def patron_activity_limit(cls, collection_id):
+        """Find or create the semaphore that limits how many requests
+        for patron activity may be in progress at once for a collection.
+        """
+        with cls._patron_activity_executor_lock:
+            limit = cls._patron_activity_limits.get(collection_id)
+            if limit is None:
+                limit = BoundedSemaphore(cls.PATRON_ACTIVITY_THREADS_PER_API)
+                cls._patron_activity_limits[collection_id] = limit
+            return limit
+
     def patron_activity(self, patron, pin):
         """Return a record of the patron's current activity
         vis-a-vis all relevant external loan sources.
 
-        We check each source in a separate thread for speed.
-
-        :return: A 2-tuple (loans, holds) containing `HoldInfo` and
-            `LoanInfo` objects.
+        We check each source in a separate thread for speed. Any source
+        that doesn't respond within PATRON_ACTIVITY_TIMEOUT seconds, or
+        that already has PATRON_ACTIVITY_THREADS_PER_API requests in
+        progress, is left out.
+
+        The worker threads are only given the patron's ID and PIN, and
+        use their own database sessions, so a request that's still
+        running after we stop waiting for it can't interfere with
+        the caller's session. A source whose API doesn't implement
+        with_session() can't use another session, so it's checked in
+        this thread instead, while the worker threads are running.
+
+        :return: A 3-tuple (loans, holds, complete). `loans` and `holds`
+            contain `LoanInfo` and `HoldInfo` objects. `complete` is
+            False if any of the sources failed or timed out.
         """
-        log = self.log
-
-        class PatronActivityThread(Thread):
-            def __init__(self, api, patron, pin):
-                self.api = api
-                self.patron = patron
-                self.pin = pin
-                self.activity = None
-                self.exception = None
-                self.trace = None
-                super().__init__()
-
-            def run(self):
-                before = time.time()
-                try:
-                    self.activity = self.api.patron_activity(self.patron, self.pin)
-                except Exception as e:
-                    self.exception = e
-                    self.trace = sys.exc_info()
-                after = time.time()
-                log.debug(
-                    "Synced %s in %.2f sec", self.api.__class__.__name__, after - before
-                )
-
-        threads = []
         before = time.time()
-        for api in list(self.api_for_collection.values()):
-            thread = PatronActivityThread(api, patron, pin)
-            threads.append(thread)
-        for thread in threads:
-            thread.start()
-        for thread in threads:
-            thread.join()
+        executor = self.patron_activity_executor()
+        session_factory = SessionManager.sessionmaker(session=self._db)
+        patron_id = patron.id if patron else None
+
         loans = []
         holds = []
         complete = True
-        for thread in threads:
-            if thread.exception:
+        futures = []
+        local_apis = []
+        for collection_id, api in list(self.api_for_collection.items()):
+            if type(api).with_session is BaseCirculationAPI.with_session:
+                local_apis.append(api)
+                continue
+            limit = self.patron_activity_limit(collection_id)
+            if not limit.acquire(blocking=False):
+                complete = False
+                self.log.error(
+                    "%s already has %d requests in progress, skipping",
+                    api.__class__.__name__,
+                    self.PATRON_ACTIVITY_THREADS_PER_API,
+                )
+                continue
+            future = executor.submit(
+                self._patron_activity, api, session_factory, patron_id, pin
+            )
+            # This is called when the request finishes, or when it's
+            # cancelled before it starts.
+            future.add_done_callback(lambda f, limit=limit: limit.release())
+            futures.append((api, future))
+        for api in local_apis:
+            futures.append((api, self._local_patron_activity(api, patron, pin)))
+
+        done, not_done = wait(
+            [future for api, future in futures], timeout=self.PATRON_ACTIVITY_TIMEOUT
+        )
+        for api, future in futures:
+            if future in not_done:
+                # We'll have to do without this source's activity. If
+                # the request hasn't started yet, it never will. If it
+                # has, its result will be ignored.
+                future.cancel()
+                complete = False
+                self.log.error(
+                    "%s timed out after %.2f sec",
+                    api.__class__.__name__,
+                    self.PATRON_ACTIVITY_TIMEOUT,
+                )
+                continue
+            try:
+                activity = future.result()
+            except Exception as e:
                 # Something went wrong, so we don't have a complete
                 # picture of the patron's loans.
                 complete = False
                 self.log.error(
                     "%s errored out: %s",
-                    thread.api.__class__.__name__,
-                    thread.exception,
-                    exc_info=thread.trace,
+                    api.__class__.__name__,
+                    e,
+                    exc_info=e,
                 )
-            if thread.activity:
-                for i in thread.activity:
-                    l = None
-                    if isinstance(i, LoanInfo):
-                        l = loans
-                    elif isinstance(i, HoldInfo):
-                        l = holds
-                    else:
-                        self.log.warn(
-                            "value %r from patron_activity is neither a loan nor a hold.",
-                            i,
-                        )
-                    if l is not None:
-                        l.append(i)
+                continue
+            for i in activity:
+                l = None
+                if isinstance(i, LoanInfo):
+                    l = loans
+                elif isinstance(i, HoldInfo):
+                    l = holds
+                else:
+                    self.log.warn(
+                        "value %r from patron_activity is neither a loan nor a hold.",
+                        i,
+                    )
+                if l is not None:
+                    l.append(i)
         after = time.time()
         self.log.debug("Full sync took %.2f sec", after - before)
         return loans, holds, complete
 
+    def _patron_activity(self, api, session_factory, patron_id, pin):
+        """Ask one vendor API about a patron's activity. This runs in
+        a worker thread.
+
+        :return: A list of LoanInfo and HoldInfo objects.
+        """
+        name = api.__class__.__name__
+        before = time.time()
+        _db = session_factory()
+        try:
+            patron = get_one(_db, Patron, id=patron_id)
+            activity = list(api.with_session(_db).patron_activity(patron, pin) or [])
+            # Keep anything the API stored along the way, such as a
+            # new credential for the patron.
+            _db.commit()
+            return activity
+        finally:
+            _db.close()
+            elapsed = time.time() - before
+            self.patron_activity_latency.observe(name, elapsed)
+            self.log.debug("Synced %s in %.2f sec", name, elapsed)
+
+    def _local_patron_activity(self, api, patron, pin):
+        """Ask one vendor API about a patron's activity, in this thread
+        and with this thread's database session.
+
+        :return: A Future containing a list of LoanInfo and HoldInfo
+            objects, or the exception that was raised.
+        """
+        name = api.__class__.__name__
+        before = time.time()
+        future = Future()
+        try:
+            future.set_result(list(api.patron_activity(patron, pin) or []))
+        except Exception as e:
+            future.set_exception(e)
+        elapsed = time.time() - before
+        self.patron_activity_latency.observe(name, elapsed)
+        self.log.debug("Synced %s in %.2f sec", name, elapsed)
+        return future
+
     def local_loans(self, patron):
         return (
             self._db.query(Loan)
@@ -39,6 +39,11 @@ class Configuration(CoreConfiguration):
     # or off.
     WSGI_DEBUG_KEY = "wsgi_debug"
 
+    # The name of the setting listing the libraries whose lanes,
+    # authenticators and so on are set up as soon as the application
+    # starts, rather than when the first request for them comes in.
+    PRELOAD_LIBRARIES = "preload_libraries"
+
     # A custom link to a Terms of Service document to be understood by
     # users of the administrative interface.
     #
@@ -215,6 +220,17 @@ class Configuration(CoreConfiguration):
             "required": True,
             "type": "number",
             "default": 0,
+            "description": _(
+                "A cached authentication document is also replaced as soon as its library's configuration changes. Set this to 0 to create a new document for every request."
+            ),
+        },
+        {
+            "key": PRELOAD_LIBRARIES,
+            "label": _("Libraries to set up at startup"),
+            "required": False,
+            "description": _(
+                "Normally a library is set up the first time a request for that library comes in. List the short names of libraries that should be set up as soon as the circulation manager starts, separated by pipes (lib1|lib2), or use '*' to set up every library at startup."
+            ),
         },
         {
             "key": CUSTOM_TOS_HREF,
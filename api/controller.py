@@ -1,8 +1,10 @@
 import email
+import hashlib
 import json
 import logging
 import os
 import sys
+import time
 import urllib.parse
 from collections import defaultdict
 from time import mktime
@@ -77,6 +79,7 @@ from core.opensearch import OpenSearchDocument
 from core.user_profile import ProfileController as CoreProfileController
 from core.util.authentication_for_opds import AuthenticationForOPDSDocument
 from core.util.datetime_helpers import utc_now
+from core.util.histogram import LatencyHistograms
 from core.util.http import HTTP, RemoteIntegrationException
 from core.util.log import elapsed_time_logging, log_elapsed_time
 from core.util.opds_writer import OPDSFeed
@@ -126,11 +129,32 @@ from .opds import (
 from .problem_details import *
 from .shared_collection import SharedCollectionAPI
 from .testing import MockCirculationAPI, MockSharedCollectionAPI
+from .util.library_settings import ConfigurationFingerprint, LazyLibraryMapping
+
+
+class AuthenticationDocumentEntry:
+    """An Authentication For OPDS document, as kept in
+    CirculationManager.authentication_documents.
+    """
+
+    def __init__(self, content, key=None):
+        self.content = content
+        self.key = key
+        self.timestamp = utc_now()
+        # The ETag is calculated once, when the document is created,
+        # rather than every time the document is served.
+        self.etag = hashlib.sha256(content.encode("utf8")).hexdigest()
 
 
 class CirculationManager:
     log = logging.getLogger("api.controller.CirculationManager")
 
+    # Authentication For OPDS documents are kept for
+    # AUTHENTICATION_DOCUMENT_CACHE_TIME seconds, or until their
+    # library's configuration changes. At most this many documents
+    # are kept.
+    AUTHENTICATION_DOCUMENT_CACHE_LENGTH = 1000
+
     def __init__(self, _db, testing=False):
         self._db = _db
 
@@ -145,6 +169,17 @@ class CirculationManager:
         self.site_configuration_last_update = (
             Configuration.site_configuration_last_update(self._db, timeout=0)
         )
+
+        # How long it takes to load the site configuration, in this
+        # process. "full" covers reloading everything; "libraries"
+        # covers reloading only the libraries affected by a change.
+        # The time taken to set up each of a library's objects is
+        # recorded separately: "authenticator", "lanes", "circulation"
+        # and "customIndexView". So is the time taken to fingerprint
+        # the configuration: "fingerprint".
+        self.settings_load_latency = LatencyHistograms()
+        self.configuration_fingerprint = None
+
         self.setup_one_time_controllers()
         self.load_settings()
 
@@ -198,15 +233,108 @@ class CirculationManager:
 
     def reload_settings_if_changed(self):
         """If the site configuration has been updated, reload the
-        CirculationManager's configuration from the database.
+        parts of the CirculationManager's configuration that changed.
         """
         last_update = Configuration.site_configuration_last_update(self._db)
         if last_update > self.site_configuration_last_update:
-            self.load_settings()
+            self.reload_settings()
             self.site_configuration_last_update = last_update
 
+    def reload_settings(self):
+        """Find out which libraries are affected by a change to the site
+        configuration, and reload only their configuration.
+
+        If the change affects the whole site, or we don't know what the
+        configuration looked like before, everything is reloaded.
+        """
+        start = time.perf_counter()
+        previous = self.configuration_fingerprint
+        fingerprint = self.fingerprint_configuration()
+        if previous is None or fingerprint.sitewide != previous.sitewide:
+            self.load_settings(fingerprint)
+            return
+
+        library_ids = fingerprint.changed_libraries(previous)
+        self.log.info(
+            "Site configuration changed for %d libraries: %s",
+            len(library_ids),
+            ", ".join(
+                sorted(
+                    str(fingerprint.short_names.get(i) or previous.short_names.get(i))
+                    for i in library_ids
+                )
+            ),
+        )
+        for library_id in library_ids:
+            # The objects for these libraries will be created again
+            # the next time they're needed. If a library was deleted,
+            # its objects are simply forgotten.
+            short_name = fingerprint.short_names.get(library_id)
+            for mapping in (
+                self.top_level_lanes,
+                self.circulation_apis,
+                self.custom_index_views,
+            ):
+                if short_name:
+                    mapping.invalidate(library_id)
+                else:
+                    mapping.discard(library_id)
+            old_short_name = previous.short_names.get(library_id)
+            if old_short_name:
+                self.auth.library_authenticators.discard(old_short_name)
+            if short_name:
+                self.auth.library_authenticators.invalidate(short_name)
+
+        if library_ids:
+            self.load_cross_library_settings(self._db.query(Library).all())
+        self.configuration_fingerprint = fingerprint
+        self.settings_load_latency.observe("libraries", time.perf_counter() - start)
+
+    def fingerprint_configuration(self):
+        """Calculate a ConfigurationFingerprint of the site configuration
+        as it is in the database right now.
+
+        This means reading the whole site configuration, so it's only
+        done when it's needed.
+        """
+        return self.timed("fingerprint", ConfigurationFingerprint.from_database)(
+            self._db
+        )
+
+    def timed(self, name, function):
+        """Wrap `function` so that the time it takes is recorded in
+        settings_load_latency under `name`.
+        """
+
+        def timed_function(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.settings_load_latency.observe(name, time.perf_counter() - start)
+
+        return timed_function
+
+    def library_component(self, name, create):
+        """Turn a function that creates an object for a Library into a
+        function that creates it for a library ID, for use with a
+        LazyLibraryMapping.
+
+        :param name: The time taken to create the object is recorded
+            under this name.
+        """
+        create = self.timed(name, create)
+
+        def factory(library_id):
+            library = Library.by_id(self._db, library_id)
+            if not library:
+                raise KeyError(library_id)
+            return create(library)
+
+        return factory
+
     @log_elapsed_time(log_method=log.debug, message_prefix="load_settings")
-    def load_settings(self):
+    def load_settings(self, fingerprint=None):
         """Load all necessary configuration settings and external
         integrations from the database.
 
@@ -214,7 +342,16 @@ class CirculationManager:
         initialized.  It may also be called later to reload the site
         configuration after changes are made in the administrative
         interface.
+
+        :param fingerprint: A ConfigurationFingerprint of the
+            configuration about to be loaded, if one has already been
+            calculated. If there isn't one, none is calculated unless
+            some libraries are preloaded: until then, every library is
+            set up from the configuration as it is now, and the first
+            reload sets up everything again.
         """
+        start = time.perf_counter()
+        self.configuration_fingerprint = fingerprint
         LogConfiguration.initialize(self._db)
         self.analytics = Analytics(self._db, refresh=True)
 
@@ -234,42 +371,117 @@ class CirculationManager:
             Library.cache_warm(self._db, lambda: libraries)
             ConfigurationSetting.cache_warm(self._db)
 
-        self.auth = Authenticator(self._db, libraries, self.analytics)
+        # Each library's authenticator, lanes, CirculationAPI and
+        # CustomIndexView are created the first time a request for
+        # that library comes in, unless the library is preloaded.
+        self.auth = Authenticator(self._db, libraries, self.analytics, lazy=True)
+        self.auth.library_authenticators.factory = self.timed(
+            "authenticator", self.auth.create_authenticator
+        )
 
         self.setup_external_search()
 
+        library_ids = [library.id for library in libraries]
+
         # Track the Lane configuration for each library by mapping its
         # short name to the top-level lane.
-        new_top_level_lanes = {}
+        self.top_level_lanes = LazyLibraryMapping(
+            self.library_component(
+                "lanes", lambda library: load_lanes(self._db, library)
+            ),
+            library_ids,
+        )
         # Create a CirculationAPI for each library.
-        new_circulation_apis = {}
+        self.circulation_apis = LazyLibraryMapping(
+            self.library_component(
+                "circulation",
+                lambda library: self.setup_circulation(library, self.analytics),
+            ),
+            library_ids,
+        )
         # Potentially load a CustomIndexView for each library
-        new_custom_index_views = {}
+        self.custom_index_views = LazyLibraryMapping(
+            self.library_component("customIndexView", CustomIndexView.for_library),
+            library_ids,
+        )
 
         # Make sure there's a site-wide public/private key pair.
         self.sitewide_key_pair
 
-        with elapsed_time_logging(
-            log_method=self.log.debug,
-            message_prefix="load_settings - per-library lanes, custom indexes, api",
-        ):
-            for library in libraries:
-                new_top_level_lanes[library.id] = load_lanes(self._db, library)
-                new_custom_index_views[library.id] = CustomIndexView.for_library(
-                    library
-                )
-                new_circulation_apis[library.id] = self.setup_circulation(
-                    library, self.analytics
-                )
+        self.load_cross_library_settings(libraries)
+
+        self.setup_configuration_dependent_controllers()
+        max_age = int(
+            ConfigurationSetting.sitewide(
+                self._db, Configuration.AUTHENTICATION_DOCUMENT_CACHE_TIME
+            ).value_or_default(0)
+        )
+        # Every document is created again after the whole configuration
+        # is reloaded. A cache time of zero means documents aren't
+        # cached at all.
+        self.authentication_document_max_age = max_age
+        self.authentication_documents = None
+        if max_age > 0:
+            self.authentication_documents = ExpiringDict(
+                max_len=self.AUTHENTICATION_DOCUMENT_CACHE_LENGTH,
+                max_age_seconds=max_age,
+            )
+        self.wsgi_debug = (
+            ConfigurationSetting.sitewide(
+                self._db, Configuration.WSGI_DEBUG_KEY
+            ).bool_value
+            or False
+        )
+        self.preload_libraries(libraries)
+        self.settings_load_latency.observe("full", time.perf_counter() - start)
+
+    def preload_libraries(self, libraries):
+        """Set up the libraries named in the PRELOAD_LIBRARIES sitewide
+        setting now, rather than when the first request for them comes in.
+        """
+        value = (
+            ConfigurationSetting.sitewide(
+                self._db, Configuration.PRELOAD_LIBRARIES
+            ).value
+            or ""
+        )
+        short_names = {x.strip() for x in value.split("|") if x.strip()}
+        libraries = [
+            library
+            for library in libraries
+            if "*" in short_names or library.short_name in short_names
+        ]
+        if libraries and self.configuration_fingerprint is None:
+            # Once a library has been set up, reloading the site
+            # configuration will need to know whether the library's
+            # configuration has changed since.
+            self.configuration_fingerprint = self.fingerprint_configuration()
+        for library in libraries:
+            with elapsed_time_logging(
+                log_method=self.log.info,
+                skip_start=True,
+                message_prefix=f"Preload {library.short_name}",
+            ):
+                for mapping, key in (
+                    (self.auth.library_authenticators, library.short_name),
+                    (self.top_level_lanes, library.id),
+                    (self.circulation_apis, library.id),
+                    (self.custom_index_views, library.id),
+                ):
+                    mapping.get(key)
 
+    def load_cross_library_settings(self, libraries):
+        """Set up the objects that depend on the configuration of more
+        than one library.
+
+        These are set up again whenever any library's configuration
+        changes.
+        """
         with elapsed_time_logging(
             log_method=self.log.debug, message_prefix="Configure device management"
         ):
             self.adobe_device_management = self._dev_mgmt_from_libraries(libraries)
 
-        self.top_level_lanes = new_top_level_lanes
-        self.circulation_apis = new_circulation_apis
-        self.custom_index_views = new_custom_index_views
         self.shared_collection_api = self.setup_shared_collection()
 
         # Assemble the list of patron web client domains from individual
@@ -306,21 +518,6 @@ class CirculationManager:
                 patron_web_domains.add(get_domain(setting.value))
 
         self.patron_web_domains = patron_web_domains
-        self.setup_configuration_dependent_controllers()
-        authentication_document_cache_time = int(
-            ConfigurationSetting.sitewide(
-                self._db, Configuration.AUTHENTICATION_DOCUMENT_CACHE_TIME
-            ).value_or_default(0)
-        )
-        self.authentication_for_opds_documents = ExpiringDict(
-            max_len=1000, max_age_seconds=authentication_document_cache_time
-        )
-        self.wsgi_debug = (
-            ConfigurationSetting.sitewide(
-                self._db, Configuration.WSGI_DEBUG_KEY
-            ).bool_value
-            or False
-        )
 
     def _dev_mgmt_from_libraries(
         self, libraries: List[Library]
@@ -443,7 +640,7 @@ class CirculationManager:
         self.analytics_controller = AnalyticsController(self)
         self.profiles = ProfileController(self)
         self.patron_devices = DeviceTokensController(self)
-        self.heartbeat = HeartbeatController()
+        self.heartbeat = HeartbeatController(checks=self.heartbeat_checks)
         self.odl_notification_controller = ODLNotificationController(self)
         self.shared_collection_controller = SharedCollectionController(self)
         self.static_files = StaticFileController(self)
@@ -452,6 +649,26 @@ class CirculationManager:
 
         self.lcp_controller = LCPController(self)
 
+    def heartbeat_checks(self):
+        """Report how long each vendor API has been taking to tell us
+        about patron activity, and how long it has taken to load the
+        site configuration, since this process started.
+        """
+        checks = {}
+        for check, latency in (
+            (
+                "patronActivity:responseTime",
+                CirculationAPI.patron_activity_latency.as_dict(),
+            ),
+            ("settings:loadTime", self.settings_load_latency.as_dict()),
+        ):
+            if latency:
+                checks[check] = [
+                    dict(componentId=name, observedValue=histogram, observedUnit="s")
+                    for name, histogram in sorted(latency.items())
+                ]
+        return checks or None
+
     def setup_configuration_dependent_controllers(self):
         """Set up all the controllers that depend on the
         current site configuration.
@@ -585,12 +802,64 @@ class CirculationManager:
             **kwargs,
         )
 
-    @property
-    def authentication_for_opds_document(self):
-        """Make sure the current request's library has an Authentication For
-        OPDS document in the cache, then return the cached version.
+    def authentication_document_key(self, library):
+        """The key under which `library`'s Authentication For OPDS
+        document is cached.
 
-        If the cache is disabled, a fresh document is created every time.
+        The key changes whenever the library's configuration (or the
+        sitewide configuration) changes, so an out-of-date document is
+        never served from the cache.
+        """
+        fingerprint = self.configuration_fingerprint
+        if fingerprint is None:
+            # The configuration hasn't changed since it was loaded.
+            sitewide = library_digest = None
+        else:
+            sitewide = fingerprint.sitewide
+            library_digest = fingerprint.libraries.get(library.id)
+        return json.dumps(
+            [
+                "authentication_document",
+                library.id,
+                sitewide,
+                library_digest,
+                flask.request.url_root,
+                # Announcements come and go by date.
+                utc_now().date().isoformat(),
+            ]
+        )
+
+    def current_authentication_document(self):
+        """Find or create the Authentication For OPDS document for the
+        current request's library.
+
+        :return: An AuthenticationDocumentEntry, or a ProblemDetail if
+            the document couldn't be created.
+        """
+        library = flask.request.library
+        cache = self.authentication_documents
+        key = None
+        entry = None
+        if cache is not None:
+            key = self.authentication_document_key(library)
+            entry = cache.get(key)
+        if entry is None:
+            # The document was not in the cache, either because
+            # something it depends on has changed, because it's
+            # expired, or because the cache itself has been disabled.
+            # Create a new one and stick it in the cache for next
+            # time.
+            value = self.auth.create_authentication_document()
+            if not isinstance(value, str):
+                return value
+            entry = AuthenticationDocumentEntry(value, key)
+            if cache is not None:
+                cache[key] = entry
+        return entry
+
+    def annotate_authentication_document(self, entry):
+        """Add debugging information to a cached Authentication For OPDS
+        document, if it was requested and is allowed.
 
         If the query argument `debug` is provided and the
         WSGI_DEBUG_KEY site-wide setting is set to True, the
@@ -598,29 +867,39 @@ class CirculationManager:
         describing the current WSGI environment. Since this can reveal
         internal details of deployment, it should only be enabled when
         diagnosing deployment problems.
+
+        :return: The document to send, which is `entry.content` itself
+            if no debugging information was added.
         """
-        name = flask.request.library.short_name
-        value = self.authentication_for_opds_documents.get(name, None)
-        if value is None:
-            # The document was not in the cache, either because it's
-            # expired or because the cache itself has been disabled.
-            # Create a new one and stick it in the cache for next
-            # time.
-            value = self.auth.create_authentication_document()
-            self.authentication_for_opds_documents[name] = value
-
-        if self.wsgi_debug and "debug" in flask.request.args:
-            # Annotate with debugging information about the WSGI
-            # environment and the authentication document cache
-            # itself.
-            value = json.loads(value)
-            value["_debug"] = dict(
-                url=self.url_for("authentication_document", library_short_name=name),
-                environ=str(dict(flask.request.environ)),
-                cache=str(self.authentication_for_opds_documents),
-            )
-            value = json.dumps(value)
-        return value
+        if not (self.wsgi_debug and "debug" in flask.request.args):
+            return entry.content
+
+        # Annotate with debugging information about the WSGI
+        # environment and the authentication document cache itself.
+        value = json.loads(entry.content)
+        value["_debug"] = dict(
+            url=self.url_for(
+                "authentication_document",
+                library_short_name=flask.request.library.short_name,
+            ),
+            environ=str(dict(flask.request.environ)),
+            cache=dict(key=entry.key, timestamp=entry.timestamp.isoformat()),
+        )
+        return json.dumps(value)
+
+    @property
+    def authentication_for_opds_document(self):
+        """Make sure the current request's library has an Authentication For
+        OPDS document in the cache, then return the cached version.
+
+        If the cache is disabled, a fresh document is created every time.
+        See annotate_authentication_document for the `debug` query
+        argument.
+        """
+        entry = self.current_authentication_document()
+        if isinstance(entry, ProblemDetail):
+            return entry
+        return self.annotate_authentication_document(entry)
 
     @property
     def sitewide_key_pair(self):
@@ -905,12 +1184,22 @@ class IndexController(CirculationManagerController):
         return self.appropriate_index_for_patron_type()
 
     def authentication_document(self):
-        """Serve this library's Authentication For OPDS document."""
-        return Response(
-            self.manager.authentication_for_opds_document,
-            200,
-            {"Content-Type": AuthenticationForOPDSDocument.MEDIA_TYPE},
-        )
+        """Serve this library's Authentication For OPDS document.
+
+        The document's ETag is a hash of its content, so a client that
+        already has the current document gets a 304 response. A
+        document annotated with debugging information has no ETag.
+        """
+        entry = self.manager.current_authentication_document()
+        if isinstance(entry, ProblemDetail):
+            return entry
+        document = self.manager.annotate_authentication_document(entry)
+        headers = {"Content-Type": AuthenticationForOPDSDocument.MEDIA_TYPE}
+        if document is entry.content:
+            headers["ETag"] = '"%s"' % entry.etag
+            if flask.request.if_none_match.contains_weak(entry.etag):
+                return Response(status=304, headers=headers)
+        return Response(document, 200, headers)
 
     def has_root_lanes(self):
         """Does the active library feature root lanes for patrons of
@@ -1187,6 +1476,8 @@ class OPDSFeedController(CirculationManagerController):
         # so library settings are irrelevant.
         facets = CrawlableFacets.default(None)
 
+        # Crawlable feeds can be very large, so they're sent out as
+        # they're generated.
         return feed_class.page(
             _db=self._db,
             title=title,
@@ -1196,6 +1487,7 @@ class OPDSFeedController(CirculationManagerController):
             facets=facets,
             pagination=pagination,
             search_engine=search_engine,
+            stream=True,
         )
 
     def _load_search_facets(self, lane):
@@ -693,6 +693,7 @@ class NoveListAPI:
         # This might take a very long time -- disable the normal
         # timeout.
         kwargs["timeout"] = None
+        kwargs["integration"] = ExternalIntegration.NOVELIST
         response = HTTP.put_with_timeout(url, data, headers=headers, **kwargs)
         return response
 
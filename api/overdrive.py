@@ -21,10 +21,12 @@ from core.model import (
     ExternalIntegration,
     Identifier,
     LicensePool,
+    LicensePoolAvailabilityBatch,
     MediaTypes,
     Patron,
     Representation,
 )
+from core.model.configuration import ConfigurationStorage
 from core.monitor import CollectionMonitor, IdentifierSweepMonitor, TimelineMonitor
 from core.overdrive import (
     MockOverdriveCoreAPI,
@@ -154,6 +156,17 @@ class OverdriveAPI(
     def external_integration(self, _db):
         return self.collection.external_integration
 
+    def with_session(self, _db):
+        api = self._copy_with_session(_db)
+        # The configuration is read from the ExternalIntegration, so
+        # it has to be looked up again in the new session.
+        api._external_integration = api.collection.external_integration
+        api._configuration_storage = ConfigurationStorage(api)
+        api._configuration = OverdriveConfiguration(
+            configuration_storage=api._configuration_storage, db=_db
+        )
+        return api
+
     def _run_self_tests(self, _db):
         result = self.run_test(
             "Checking global Client Authentication privileges",
@@ -1062,7 +1075,7 @@ class OverdriveAPI(
         replace = ReplacementPolicy.from_license_source(self._db)
         metadata.apply(edition, self.collection, replace=replace)
 
-    def update_licensepool(self, book_id):
+    def update_licensepool(self, book_id, batch=None):
         """Update availability information for a single book.
 
         If the book has never been seen before, a new LicensePool
@@ -1072,6 +1085,10 @@ class OverdriveAPI(
         circulation information. Bibliographic coverage will be
         ensured for the Overdrive Identifier, and a Work will be
         created for the LicensePool and set as presentation-ready.
+
+        :param batch: A LicensePoolAvailabilityBatch. If this is
+            provided, the new circulation information may not be
+            written until the batch is finished.
         """
         # Retrieve current circulation information about this book
         try:
@@ -1113,7 +1130,9 @@ class OverdriveAPI(
                 license_pool.identifier, force=True
             )
 
-        return self.update_licensepool_with_book_info(book, license_pool, is_new)
+        return self.update_licensepool_with_book_info(
+            book, license_pool, is_new, batch=batch
+        )
 
     # Alias for the CirculationAPI interface
     def update_availability(self, licensepool):
@@ -1130,7 +1149,9 @@ class OverdriveAPI(
             licensepool.identifier.identifier,
         )
 
-    def update_licensepool_with_book_info(self, book, license_pool, is_new_pool):
+    def update_licensepool_with_book_info(
+        self, book, license_pool, is_new_pool, batch=None
+    ):
         """Update a book's LicensePool with information from a JSON
         representation of its circulation info.
 
@@ -1138,11 +1159,14 @@ class OverdriveAPI(
         coverage. If the new Edition is the only candidate for the
         pool's presentation_edition, promote it to presentation
         status.
+
+        :param batch: A LicensePoolAvailabilityBatch to pass into
+            CirculationData.apply.
         """
         extractor = OverdriveRepresentationExtractor(self)
         circulation = extractor.book_info_to_circulation(book)
         license_pool, circulation_changed = circulation.apply(
-            self._db, license_pool.collection
+            self._db, license_pool.collection, batch=batch
         )
 
         edition, is_new_edition = self._edition(license_pool)
@@ -1299,6 +1323,7 @@ class OverdriveCirculationMonitor(CollectionMonitor, TimelineMonitor):
     """
 
     MAXIMUM_BOOK_RETRIES = 3
+    BATCH_SIZE = 50
     SERVICE_NAME = "Overdrive Circulation Monitor"
     PROTOCOL = ExternalIntegration.OVERDRIVE
     OVERLAP = datetime.timedelta(minutes=1)
@@ -1317,6 +1342,13 @@ class OverdriveCirculationMonitor(CollectionMonitor, TimelineMonitor):
     def catch_up_from(self, start, cutoff, progress: TimestampData):
         """Find Overdrive books that changed recently.
 
+        Books are committed to the database in batches of
+        BATCH_SIZE. If a batch runs into stale data, its books are
+        processed again one at a time. The rollback throws away the
+        batch's availability information along with everything else
+        that was done for those books, so each one is looked up in
+        Overdrive again.
+
         :progress: A TimestampData representing the time previously
             covered by this Monitor.
         """
@@ -1325,6 +1357,8 @@ class OverdriveCirculationMonitor(CollectionMonitor, TimelineMonitor):
         # Ask for changes between the last time covered by the Monitor
         # and the current time.
         total_books = 0
+        books = []
+        batch = LicensePoolAvailabilityBatch(self._db)
         for book in self.recently_changed_ids(start, cutoff):
             total_books += 1
             if not total_books % 100:
@@ -1332,34 +1366,63 @@ class OverdriveCirculationMonitor(CollectionMonitor, TimelineMonitor):
             if not book:
                 continue
 
-            # Attempt to create/update the book up to MAXIMUM_BOOK_RETRIES times.
-            book_changed = False
-            book_succeeded = False
-            for attempt in range(OverdriveCirculationMonitor.MAXIMUM_BOOK_RETRIES):
-                if book_succeeded:
-                    break
-
-                try:
-                    _, _, is_changed = self.api.update_licensepool(book)
+            books.append(book)
+            try:
+                _, _, book_changed = self.api.update_licensepool(book, batch=batch)
+                if len(books) >= self.BATCH_SIZE:
+                    batch.finish()
                     self._db.commit()
-                    book_succeeded = True
-                    book_changed = is_changed
-                except StaleDataError as e:
-                    self.log.exception("encountered stale data exception: ", exc_info=e)
-                    self._db.rollback()
-                    if attempt + 1 == OverdriveCirculationMonitor.MAXIMUM_BOOK_RETRIES:
-                        progress.exception = e
-                    else:
-                        time.sleep(1)
-                        self.log.warning(
-                            f"retrying book {book} (attempt {attempt} of {OverdriveCirculationMonitor.MAXIMUM_BOOK_RETRIES})"
-                        )
+                    books = []
+            except StaleDataError as e:
+                self._handle_stale_data(book, 0, progress, e)
+                # Everything since the last commit was rolled back.
+                for earlier_book in books[:-1]:
+                    self._update_book(earlier_book, progress)
+                book_changed = self._update_book(book, progress, attempts=1)
+                books = []
+                batch = LicensePoolAvailabilityBatch(self._db)
 
             if self.should_stop(start, book, book_changed):
                 break
 
+        if books:
+            try:
+                batch.finish()
+                self._db.commit()
+            except StaleDataError as e:
+                self._handle_stale_data(books[-1], 0, progress, e)
+                for book in books:
+                    self._update_book(book, progress)
+
         progress.achievements = "Books processed: %d." % total_books
 
+    def _update_book(self, book, progress, attempts=0):
+        """Create or update a single book and commit the change, trying
+        up to MAXIMUM_BOOK_RETRIES times.
+
+        :param attempts: The number of attempts that were already made.
+        :return: Whether the book changed.
+        """
+        for attempt in range(attempts, self.MAXIMUM_BOOK_RETRIES):
+            try:
+                _, _, is_changed = self.api.update_licensepool(book)
+                self._db.commit()
+                return is_changed
+            except StaleDataError as e:
+                self._handle_stale_data(book, attempt, progress, e)
+        return False
+
+    def _handle_stale_data(self, book, attempt, progress, e):
+        self.log.exception("encountered stale data exception: ", exc_info=e)
+        self._db.rollback()
+        if attempt + 1 == self.MAXIMUM_BOOK_RETRIES:
+            progress.exception = e
+        else:
+            time.sleep(1)
+            self.log.warning(
+                f"retrying book {book} (attempt {attempt} of {self.MAXIMUM_BOOK_RETRIES})"
+            )
+
     def should_stop(self, start, api_description, is_changed):
         pass
 
@@ -1,11 +1,12 @@
 import json
 from datetime import datetime
+from threading import Lock
 from typing import Union
 
 from flask_babel import lazy_gettext as _
 
 from api.authenticator import BasicAuthenticationProvider, PatronData
-from api.sip.client import SIPClient
+from api.sip.client import SIPClient, SIPClientPool
 from api.sip.dialect import Dialect as Sip2Dialect
 from core.model import ExternalIntegration
 from core.util import MoneyUtility
@@ -129,6 +130,11 @@ class SIP2AuthenticationProvider(BasicAuthenticationProvider):
         SIPClient.RECALL_OVERDUE: PatronData.RECALL_OVERDUE,
     }
 
+    # SIPClientPools, keyed by integration ID, shared by every
+    # SIP2AuthenticationProvider created from the same integration.
+    _pools = {}
+    _pools_lock = Lock()
+
     def __init__(
         self, library, integration, analytics=None, client=SIPClient, connect=True
     ):
@@ -200,17 +206,9 @@ class SIP2AuthenticationProvider(BasicAuthenticationProvider):
             self.fields_that_deny_borrowing = []
 
     @property
-    def _client(self):
-        """Initialize a SIPClient object using the default settings.
-
-        :return: A SIPClient
-        """
-        if isinstance(self.client, SIPClient):
-            # A specific SIPClient was provided, hopefully during
-            # a test scenario.
-            return self.client
-
-        return self.client(
+    def _client_settings(self):
+        """The arguments used to initialize a SIPClient."""
+        return dict(
             target_server=self.server,
             target_port=self.port,
             login_user_id=self.login_user_id,
@@ -225,13 +223,60 @@ class SIP2AuthenticationProvider(BasicAuthenticationProvider):
             dialect=self.dialect,
         )
 
+    @property
+    def _client(self):
+        """Initialize a SIPClient object using the default settings.
+
+        :return: A SIPClient
+        """
+        if isinstance(self.client, SIPClient):
+            # A specific SIPClient was provided, hopefully during
+            # a test scenario.
+            return self.client
+
+        return self.client(**self._client_settings)
+
+    @property
+    def _pool(self):
+        """Find or create the SIPClientPool for this provider's
+        integration.
+
+        If the integration has been reconfigured since the pool was
+        created, the old pool is closed and a new one takes its place.
+
+        :return: A SIPClientPool, or None if a specific SIPClient was
+            provided.
+        """
+        if isinstance(self.client, SIPClient):
+            return None
+
+        settings = self._client_settings
+        key = (self.client, tuple(sorted(settings.items())))
+        with self._pools_lock:
+            old_key, pool = self._pools.get(self.external_integration_id, (None, None))
+            if old_key != key:
+                if pool:
+                    pool.close()
+                client_class = self.client
+                pool = SIPClientPool(lambda: client_class(**settings))
+                self._pools[self.external_integration_id] = (key, pool)
+            return pool
+
     def patron_information(self, username, password):
+        def lookup(sip):
+            info = sip.patron_information(username, password)
+            sip.end_session(username, password)
+            return info
+
         try:
+            pool = self._pool
+            if pool:
+                return pool.run(lookup)
+
             sip = self._client
             sip.connect()
             sip.login()
-            info = sip.patron_information(username, password)
-            sip.end_session(username, password)
+            info = lookup(sip)
             sip.disconnect()
             return info
 
@@ -31,6 +31,8 @@ import re
 import socket
 import ssl
 import tempfile
+import time
+from threading import Lock
 
 from api.sip.dialect import GenericILS
 from core.util.datetime_helpers import utc_now
@@ -83,6 +85,16 @@ fixed._add("recall_items_count", 4)
 fixed._add("unavailable_holds_count", 4)
 fixed._add("login_ok", 1)
 fixed._add("end_session", 1)
+fixed._add("online_status", 1)
+fixed._add("checkin_ok", 1)
+fixed._add("checkout_ok", 1)
+fixed._add("acs_renewal_policy", 1)
+fixed._add("status_update_ok", 1)
+fixed._add("offline_ok", 1)
+fixed._add("timeout_period", 3)
+fixed._add("retries_allowed", 3)
+fixed._add("date_time_sync", 18)
+fixed._add("protocol_version", 4)
 
 
 class named:
@@ -174,6 +186,9 @@ named._add("home_address", "BD")
 named._add("email_address", "BE")
 named._add("phone_number", "BF")
 named._add("sequence_number", "AY")
+named._add("library_name", "AM")
+named._add("supported_messages", "BX")
+named._add("terminal_location", "AN")
 
 # The spec doesn't say there can be more than one screen message,
 # but I have seen it happen.
@@ -220,6 +235,11 @@ class SIPClient(Constants):
     # Maximum retries of a SIP message before failing.
     MAXIMUM_RETRIES = 5
 
+    # SSLContexts, keyed by the certificate and key they were built
+    # from, so that each one only has to be built once.
+    _ssl_contexts = {}
+    _ssl_contexts_lock = Lock()
+
     # These are the subfield names associated with the 'patron status'
     # field as specified in the SIP2 spec.
     CHARGE_PRIVILEGES_DENIED = "charge privileges denied"
@@ -356,6 +376,17 @@ class SIPClient(Constants):
             **kwargs,
         )
 
+    def sc_status(self, *args, **kwargs):
+        """Ask the SIP server for its status, e.g. to make sure
+        the connection still works.
+        """
+        return self.make_request(
+            self.sc_status_message,
+            self.acs_status_response_parser,
+            *args,
+            **kwargs,
+        )
+
     def end_session(self, *args, **kwargs):
         """Send end session message."""
         if self.dialect.sendEndSession:
@@ -396,38 +427,55 @@ class SIPClient(Constants):
 
     def make_secure_connection(self):
         """Create an SSL-enabled socket connection."""
+        context = self.ssl_context(self.ssl_cert, self.ssl_key)
+        return context.wrap_socket(self.make_insecure_connection())
 
-        # If a certificate and/or key were provided, write them to
-        # temporary files so OpenSSL can find them.
-        #
-        # Unfortunately there's no way to get OpenSSL to read a
-        # certificate or key from a string. Alternatives suggested
-        # online include M2Crypt, a pure Python SSL implementation.
-        # M2Crypt seems like it will work, but I couldn't find the
-        # documentation I needed, so for the time being... temporary
-        # files.
-        tmp_ssl_cert_path = None
-        tmp_ssl_key_path = None
-        if self.ssl_cert:
-            fd, tmp_ssl_cert_path = tempfile.mkstemp()
-            os.write(fd, self.ssl_cert.encode("utf-8"))
-            os.close(fd)
-        if self.ssl_key:
-            fd, tmp_ssl_key_path = tempfile.mkstemp()
-            os.write(fd, self.ssl_key.encode("utf-8"))
-            os.close(fd)
-        connection = self.make_insecure_connection()
-        connection = ssl.wrap_socket(
-            connection, certfile=tmp_ssl_cert_path, keyfile=tmp_ssl_key_path
-        )
+    @classmethod
+    def ssl_context(cls, ssl_cert, ssl_key):
+        """Find or create an SSLContext that presents the given
+        certificate and key to the SIP server.
+        """
+        key = (ssl_cert, ssl_key)
+        with cls._ssl_contexts_lock:
+            if key not in cls._ssl_contexts:
+                cls._ssl_contexts[key] = cls.make_ssl_context(ssl_cert, ssl_key)
+            return cls._ssl_contexts[key]
+
+    @classmethod
+    def make_ssl_context(cls, ssl_cert, ssl_key):
+        """Create an SSLContext that presents the given certificate
+        and key to the SIP server.
+        """
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+
+        # SIP servers generally use self-signed certificates, so we
+        # don't verify them.
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
 
-        # Now that the connection has been established, the temporary
-        # files are no longer needed. Remove them.
-        for path in tmp_ssl_cert_path, tmp_ssl_key_path:
-            if path and os.path.exists(path):
-                os.remove(path)
+        if not ssl_cert:
+            return context
 
-        return connection
+        # Unfortunately there's no way to get OpenSSL to read a
+        # certificate or key from a string, so they're written to
+        # temporary files just long enough to be loaded into the
+        # context.
+        paths = []
+        try:
+            for value in ssl_cert, ssl_key:
+                if not value:
+                    paths.append(None)
+                    continue
+                fd, path = tempfile.mkstemp()
+                paths.append(path)
+                os.write(fd, value.encode("utf-8"))
+                os.close(fd)
+            context.load_cert_chain(*paths)
+        finally:
+            for path in paths:
+                if path and os.path.exists(path):
+                    os.remove(path)
+        return context
 
     def reset_connection_state(self):
         """Reset connection-specific state.
@@ -497,6 +545,42 @@ class SIPClient(Constants):
         """Parse the response from a login message."""
         return self.parse_response(message, 94, fixed.login_ok)
 
+    def sc_status_message(
+        self, status_code="0", max_print_width="000", protocol_version="2.00"
+    ):
+        """Generate a message asking for the status of the SIP server.
+
+        Format of message to send to ILS:
+        99<status code><max print width><protocol version>
+        status code: 1-char, 0 (OK), 1 (out of paper) or 2 (shutting down)
+        max print width: 3-char
+        protocol version: 4-char, x.xx
+        """
+        return "99" + status_code + max_print_width + protocol_version
+
+    def acs_status_response_parser(self, message):
+        """Parse the response from an SC status message."""
+        return self.parse_response(
+            message,
+            98,
+            fixed.online_status,
+            fixed.checkin_ok,
+            fixed.checkout_ok,
+            fixed.acs_renewal_policy,
+            fixed.status_update_ok,
+            fixed.offline_ok,
+            fixed.timeout_period,
+            fixed.retries_allowed,
+            fixed.date_time_sync,
+            fixed.protocol_version,
+            named.institution_id.required,
+            named.library_name,
+            named.supported_messages.required,
+            named.terminal_location,
+            named.screen_message,
+            named.print_line,
+        )
+
     def end_session_message(
         self,
         patron_identifier,
@@ -915,6 +999,149 @@ class SIPClient(Constants):
         return text
 
 
+class SIPClientPool:
+    """Keep logged-in SIPClients around, so that talking to a SIP
+    server doesn't mean connecting (and maybe doing a TLS handshake)
+    and logging in every single time.
+
+    A connection that has been idle for `idle_timeout` seconds is
+    closed the next time the pool is consulted. A connection that has
+    been idle for `health_check_interval` seconds is sent an SC status
+    message before it's reused.
+    """
+
+    DEFAULT_POOL_SIZE = 5
+    DEFAULT_IDLE_TIMEOUT = 300
+    DEFAULT_HEALTH_CHECK_INTERVAL = 30
+
+    log = client_logger
+
+    def __init__(
+        self,
+        client_factory,
+        pool_size=DEFAULT_POOL_SIZE,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT,
+        health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+        clock=time.monotonic,
+    ):
+        """Constructor.
+
+        :param client_factory: A function that returns a new,
+            unconnected SIPClient.
+        :param pool_size: The maximum number of idle connections to
+            keep open.
+        :param clock: A function returning the current time in seconds.
+            Only intended to be replaced in tests.
+        """
+        self.client_factory = client_factory
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.clock = clock
+        self._lock = Lock()
+
+        # (SIPClient, last used) 2-tuples, most recently used last.
+        self._idle = []
+
+    def run(self, function):
+        """Call `function` with a connected, logged-in SIPClient.
+
+        If a connection from the pool turns out to be broken, it's
+        thrown away and `function` is tried once more with a new
+        connection.
+
+        :return: Whatever `function` returns.
+        """
+        sip, reused = self.checkout()
+        try:
+            result = function(sip)
+        except OSError as e:
+            # This includes RequestResend, if the server kept asking
+            # us to resend a message.
+            self.discard(sip)
+            if not reused:
+                raise
+            self.log.info("Reconnecting after error on pooled connection: %s", e)
+            sip = self.connect()
+            try:
+                result = function(sip)
+            except Exception:
+                self.discard(sip)
+                raise
+        except Exception:
+            self.discard(sip)
+            raise
+        self.checkin(sip)
+        return result
+
+    def checkout(self):
+        """Get a connected, logged-in SIPClient.
+
+        :return: A 2-tuple (SIPClient, reused). `reused` is True if the
+            SIPClient came from the pool rather than being created.
+        """
+        while True:
+            now = self.clock()
+            self.evict_idle(now)
+            with self._lock:
+                if not self._idle:
+                    break
+                sip, last_used = self._idle.pop()
+            if now - last_used < self.health_check_interval:
+                return sip, True
+            try:
+                sip.sc_status()
+                return sip, True
+            except Exception as e:
+                # Whether the connection is broken or the server sent
+                # back something we couldn't understand, we don't want
+                # to use this connection again.
+                self.log.info("Discarding pooled connection: %s", e)
+                self.discard(sip)
+        return self.connect(), False
+
+    def connect(self):
+        """Create a new connected, logged-in SIPClient."""
+        sip = self.client_factory()
+        sip.connect()
+        try:
+            sip.login()
+        except Exception:
+            self.discard(sip)
+            raise
+        return sip
+
+    def checkin(self, sip):
+        """Put a SIPClient back in the pool once it's no longer needed."""
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((sip, self.clock()))
+                return
+        self.discard(sip)
+
+    def discard(self, sip):
+        """Close a SIPClient's connection and forget about it."""
+        try:
+            sip.disconnect()
+        except Exception as e:
+            self.log.warning("Error closing SIP connection: %s", e)
+
+    def evict_idle(self, now):
+        """Close connections that have been idle for too long."""
+        with self._lock:
+            expired = [x for x in self._idle if now - x[1] >= self.idle_timeout]
+            self._idle = [x for x in self._idle if now - x[1] < self.idle_timeout]
+        for sip, last_used in expired:
+            self.discard(sip)
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sip, last_used in idle:
+            self.discard(sip)
+
+
 class MockSIPClient(SIPClient):
     """A SIP client that relies on canned responses rather than a socket
     connection.
@@ -0,0 +1,242 @@
+"""Keep track of per-library objects built from the site configuration,
+so that a change to one library's configuration doesn't mean rebuilding
+everything for every library.
+"""
+import hashlib
+from collections import defaultdict
+from threading import RLock
+
+from sqlalchemy import select
+
+from core.lane import Lane, LaneGenre, lanes_customlists
+from core.model import Collection, ConfigurationSetting, ExternalIntegration, Library
+from core.model.collection import collections_libraries
+from core.model.library import externalintegrations_libraries
+
+_MISSING = object()
+
+
+class LazyLibraryMapping(dict):
+    """A dictionary of per-library objects which creates each object the
+    first time it's asked for.
+
+    Only objects for keys the mapping has been told about, through the
+    constructor or invalidate(), are created. `factory` is called with
+    such a key and should return the object for that key, or raise
+    KeyError if there is no such library. The dictionary can otherwise
+    be used as a normal dictionary, including replacing its values in
+    tests.
+    """
+
+    def __init__(self, factory, keys=()):
+        super().__init__()
+        self.factory = factory
+        self.pending = set(keys)
+        self._lock = RLock()
+
+    def __missing__(self, key):
+        with self._lock:
+            # Another thread may have created this object while we
+            # were waiting for the lock.
+            value = super().get(key, _MISSING)
+            if value is _MISSING:
+                if key not in self.pending:
+                    raise KeyError(key)
+                try:
+                    value = self.factory(key)
+                finally:
+                    self.pending.discard(key)
+                self[key] = value
+            return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return super().__contains__(key) or key in self.pending
+
+    def invalidate(self, key):
+        """Forget the object for `key`, so it will be created again
+        the next time it's needed.
+        """
+        with self._lock:
+            self.pop(key, None)
+            self.pending.add(key)
+
+    def discard(self, key):
+        """Forget about `key` entirely."""
+        with self._lock:
+            self.pop(key, None)
+            self.pending.discard(key)
+
+
+class ConfigurationFingerprint:
+    """Summarize the site configuration as one digest for the parts used
+    by every library and one digest per library.
+
+    Comparing two fingerprints tells us which libraries' objects need
+    to be rebuilt after a change to the configuration.
+    """
+
+    # Integrations with these goals are configured for specific libraries,
+    # and only those libraries need to notice a change. A change to any
+    # other integration affects the whole site.
+    LIBRARY_GOALS = {
+        ExternalIntegration.PATRON_AUTH_GOAL,
+        ExternalIntegration.LICENSE_GOAL,
+    }
+
+    # These Lane columns are kept up to date by scripts; they don't
+    # change the lane configuration.
+    LANE_STATISTICS = {"size", "size_by_entrypoint"}
+
+    def __init__(self, sitewide, libraries, short_names):
+        """Constructor.
+
+        :param sitewide: A digest of everything that's not specific to
+            one library.
+        :param libraries: A dictionary mapping library IDs to digests.
+        :param short_names: A dictionary mapping library IDs to short names.
+        """
+        self.sitewide = sitewide
+        self.libraries = libraries
+        self.short_names = short_names
+
+    @classmethod
+    def from_database(cls, _db):
+        # Unlike a Query, Session.execute() doesn't flush pending
+        # changes first.
+        _db.flush()
+
+        digests = defaultdict(hashlib.sha256)
+        sitewide = digests[None]
+        short_names = {}
+
+        def add(key, row):
+            digests[key].update(repr(tuple(row)).encode("utf8"))
+
+        for row in _db.execute(select([Library.__table__]).order_by(Library.id)):
+            add(row.id, row)
+            short_names[row.id] = row.short_name
+
+        # Gather everything about each integration, then decide whether
+        # it belongs to specific libraries or to the whole site.
+        integrations = {}
+        integration_rows = defaultdict(list)
+        for row in _db.execute(
+            select([ExternalIntegration.__table__]).order_by(ExternalIntegration.id)
+        ):
+            integrations[row.id] = row.goal
+            integration_rows[row.id].append(row)
+
+        # A setting with no value is the same as no setting at all.
+        setting = ConfigurationSetting.__table__
+        for row in _db.execute(
+            select(
+                [
+                    setting.c.library_id,
+                    setting.c.external_integration_id,
+                    setting.c.key,
+                    setting.c.value,
+                ]
+            )
+            .where(setting.c.value.isnot(None))
+            .order_by(setting.c.id)
+        ):
+            if row.library_id is not None:
+                add(row.library_id, row)
+            elif row.external_integration_id is not None:
+                integration_rows[row.external_integration_id].append(row)
+            else:
+                add(None, row)
+
+        integration_libraries = defaultdict(set)
+        for integration_id, library_id in _db.execute(
+            select(
+                [
+                    externalintegrations_libraries.c.externalintegration_id,
+                    externalintegrations_libraries.c.library_id,
+                ]
+            )
+        ):
+            integration_libraries[integration_id].add(library_id)
+
+        collections = {
+            row.id: row
+            for row in _db.execute(
+                select([Collection.__table__]).order_by(Collection.id)
+            )
+        }
+        collection_libraries = defaultdict(set)
+        for collection_id, library_id in _db.execute(
+            select(
+                [
+                    collections_libraries.c.collection_id,
+                    collections_libraries.c.library_id,
+                ]
+            )
+        ):
+            collection_libraries[collection_id].add(library_id)
+
+        for collection in collections.values():
+            library_ids = collection_libraries[collection.id]
+            if not library_ids:
+                add(None, collection)
+                continue
+            for library_id in sorted(library_ids):
+                add(library_id, collection)
+            # A child collection is configured through its parent's
+            # integration.
+            parent = collections.get(collection.parent_id)
+            for c in (collection, parent):
+                if c is not None and c.external_integration_id is not None:
+                    integration_libraries[c.external_integration_id].update(library_ids)
+
+        for integration_id, goal in integrations.items():
+            library_ids = integration_libraries[integration_id]
+            if goal in cls.LIBRARY_GOALS and library_ids:
+                keys = sorted(library_ids)
+            else:
+                keys = [None]
+            for key in keys:
+                for row in integration_rows[integration_id]:
+                    add(key, row)
+
+        lane = Lane.__table__
+        lane_columns = [c for c in lane.c if c.name not in cls.LANE_STATISTICS]
+        for row in _db.execute(select(lane_columns).order_by(lane.c.id)):
+            add(row.library_id, row)
+        for table in (LaneGenre.__table__, lanes_customlists):
+            for row in _db.execute(
+                select([lane.c.library_id, table])
+                .select_from(table.join(lane))
+                .order_by(*table.c)
+            ):
+                add(row.library_id, row)
+
+        return cls(
+            sitewide.hexdigest(),
+            {
+                library_id: digest.hexdigest()
+                for library_id, digest in digests.items()
+                if library_id is not None and library_id in short_names
+            },
+            short_names,
+        )
+
+    def changed_libraries(self, other):
+        """Find the libraries whose configuration differs between this
+        fingerprint and another.
+
+        :return: A set of library IDs, including libraries that only
+            exist in one of the fingerprints.
+        """
+        library_ids = set(self.libraries) | set(other.libraries)
+        return {
+            library_id
+            for library_id in library_ids
+            if self.libraries.get(library_id) != other.libraries.get(library_id)
+        }
@@ -1,6 +1,5 @@
 """Implement logic common to more than one of the Simplified applications."""
 
-import gzip
 import json
 import logging
 import sys
@@ -21,6 +20,7 @@ from .log import LogConfiguration
 from .model import Identifier
 from .opds import AcquisitionFeed, LookupAcquisitionFeed
 from .problem_details import *
+from .util import compression
 from .util.flask_util import OPDSFeedResponse
 from .util.opds_writer import OPDSMessage
 from .util.problem_detail import ProblemDetail
@@ -85,6 +85,64 @@ def load_pagination_from_request(
     return base_class.from_request(get_arg, default_size, **kwargs)
 
 
+# These parts of a request identify the client, so they're left out
+# when a request is replayed.
+REPLAY_CREDENTIALS = {
+    "HTTP_AUTHORIZATION",
+    "HTTP_COOKIE",
+    "HTTP_PROXY_AUTHORIZATION",
+    "REMOTE_USER",
+}
+
+
+def replay_current_request(lane_id=None):
+    """Create a job that will handle the current request again, from
+    scratch.
+
+    The job can be run in a background thread after the current
+    request is over. It gets its own request context, and with it its
+    own database session, so it doesn't depend on any objects loaded
+    while handling the original request.
+
+    The replayed request is anonymous: the client's credentials and
+    cookies aren't kept around after its request is over. This is fine
+    for regenerating cached feeds, which are the same for everyone.
+
+    Which lane a request without a lane identifier (such as /groups)
+    is about can depend on who made it, so the replayed request names
+    the lane that was actually used.
+
+    :param lane_id: The ID of the lane whose feed is being generated,
+        if it's a Lane.
+    :return: A function that takes no arguments.
+    """
+    app = flask.current_app._get_current_object()
+    environ = {
+        k: v
+        for k, v in flask.request.environ.items()
+        if not k.startswith("werkzeug.") and k not in REPLAY_CREDENTIALS
+    }
+    # Only the request line and headers are replayed, not the body.
+    environ["wsgi.input"] = BytesIO()
+    environ["CONTENT_LENGTH"] = "0"
+
+    view_args = flask.request.view_args or {}
+    if (
+        lane_id is not None
+        and "lane_identifier" in view_args
+        and view_args["lane_identifier"] is None
+    ):
+        view_args = dict(view_args, lane_identifier=lane_id)
+        urls = app.url_map.bind(environ.get("SERVER_NAME", ""))
+        environ["PATH_INFO"] = urls.build(flask.request.endpoint, view_args)
+
+    def replay():
+        with app.request_context(environ):
+            app.full_dispatch_request()
+
+    return replay
+
+
 def returns_problem_detail(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -100,9 +158,15 @@ def compressible(f):
     """Decorate a function to make it transparently handle whatever
     compression the client has announced it supports.
 
-    Currently the only form of compression supported is
-    representation-level gzip compression requested through the
-    Accept-Encoding header.
+    Representation-level gzip compression is always supported, as is
+    brotli compression if the `brotli` package is installed. The
+    client requests compression through the Accept-Encoding header.
+
+    If the response comes with a precompressed version of its body in
+    the chosen content-coding (see flask_util.Response), that version
+    is sent as is. A body that's already in memory is compressed all at
+    once; a streamed body is compressed incrementally as it is sent to
+    the client.
 
     This code was modified from
     http://kb.sites.apiit.edu.my/knowledge-base/how-to-gzip-response-in-flask/,
@@ -124,8 +188,8 @@ def compressible(f):
                 # already been encoded.
                 return response
 
-            accept_encoding = flask.request.headers.get("Accept-Encoding", "")
-            if not "gzip" in accept_encoding.lower():
+            encoding = compression.negotiate(flask.request.accept_encodings)
+            if encoding is None:
                 return response
 
             # At this point we know we're going to be changing the
@@ -137,15 +201,27 @@ def compressible(f):
             # fail. This is pure copy-and-paste magic.
             response.direct_passthrough = False
 
-            buffer = BytesIO()
-            gzipped = gzip.GzipFile(mode="wb", fileobj=buffer)
-            gzipped.write(response.data)
-            gzipped.close()
-            response.data = buffer.getvalue()
+            precompressed = getattr(response, "precompressed", None) or {}
+            if encoding in precompressed:
+                # Someone already did the work of compressing this
+                # response. This also sets Content-Length.
+                response.set_data(precompressed[encoding])
+            elif response.is_sequence:
+                # The whole body is already in memory, so compress it
+                # all at once. This also sets Content-Length.
+                response.set_data(compression.compress(response.get_data(), encoding))
+            else:
+                # The body is generated as it's sent, so compress it
+                # the same way.
+                response.response = compression.compress_chunks(
+                    response.iter_encoded(), encoding
+                )
+                # We won't know how long the compressed response is
+                # until it's been sent.
+                response.headers.pop("Content-Length", None)
 
-            response.headers["Content-Encoding"] = "gzip"
+            response.headers["Content-Encoding"] = encoding
             response.vary.add("Accept-Encoding")
-            response.headers["Content-Length"] = len(response.data)
 
             return response
 
@@ -258,6 +334,15 @@ class HeartbeatController:
     HEALTH_CHECK_TYPE = "application/vnd.health+json"
     VERSION_FILENAME = ".version"
 
+    def __init__(self, checks=None):
+        """Constructor.
+
+        :param checks: A function that returns a dictionary to be
+            included in the response as "checks", e.g. to report on the
+            components the application depends on.
+        """
+        self.checks = checks
+
     def heartbeat(self, conf_class=None):
         health_check_object = dict(status="pass")
 
@@ -267,6 +352,11 @@ class HeartbeatController:
             health_check_object["releaseID"] = app_version
             health_check_object["version"] = app_version.split("-")[0]
 
+        if self.checks:
+            checks = self.checks()
+            if checks:
+                health_check_object["checks"] = checks
+
         data = json.dumps(health_check_object)
         return make_response(data, 200, {"Content-Type": self.HEALTH_CHECK_TYPE})
 
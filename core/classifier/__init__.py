@@ -10,12 +10,15 @@
 # SQL to find commonly used classifications not assigned to a genre
 # select count(identifiers.id) as c, subjects.type, substr(subjects.identifier, 0, 20) as i, substr(subjects.name, 0, 20) as n from workidentifiers join classifications on workidentifiers.id=classifications.work_identifier_id join subjects on classifications.subject_id=subjects.id where subjects.genre_id is null and subjects.fiction is null group by subjects.type, i, n order by c desc;
 
+import hashlib
 import json
 import logging
 import os
 import pkgutil
 import re
+import types
 from collections import Counter, defaultdict
+from functools import lru_cache
 from urllib.parse import urlparse
 
 from sqlalchemy.orm.session import Session
@@ -91,6 +94,38 @@ class ClassifierConstants:
     SIMPLIFIED_FICTION_STATUS = "http://librarysimplified.org/terms/fiction/"
 
 
+def rule_fingerprint(value):
+    """A string representation of a classifier rule table that only
+    changes when the rules do.
+
+    Unlike repr(), this doesn't depend on the order of sets and
+    dictionaries, or on where objects happen to be in memory. An object
+    can provide its own representation with a fingerprint() method.
+    """
+    if isinstance(value, (str, int, float, type(None))):
+        return repr(value)
+    if isinstance(value, dict):
+        items = (
+            "%s: %s" % (rule_fingerprint(k), rule_fingerprint(v))
+            for k, v in value.items()
+        )
+        return "{%s}" % ", ".join(sorted(items))
+    if isinstance(value, (set, frozenset)):
+        return "{%s}" % ", ".join(sorted(map(rule_fingerprint, value)))
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ", ".join(map(rule_fingerprint, value))
+    if isinstance(value, re.Pattern):
+        return "re(%r, %d)" % (value.pattern, value.flags)
+    if isinstance(value, (type, types.FunctionType, types.MethodType)):
+        return value.__qualname__
+    if hasattr(value, "fingerprint"):
+        return value.fingerprint()
+    return "%s(%s)" % (
+        type(value).__qualname__,
+        rule_fingerprint(getattr(value, "__dict__", {})),
+    )
+
+
 class Classifier(ClassifierConstants):
     """Turn an external classification into an internal genre, an
     audience, an age level, and a fiction status.
@@ -104,6 +139,26 @@ class Classifier(ClassifierConstants):
 
     classifiers = dict()
 
+    # Changes to a classifier's rule tables (its upper-case class
+    # attributes, and those of its superclasses) are noticed
+    # automatically. Increment this if you change the rules in some
+    # other way, e.g. in a method, so that subjects it already
+    # classified get checked again. A change to the VERSION of a
+    # superclass counts as a change to every classifier based on it.
+    VERSION = 1
+
+    # Files in resource_dir that this classifier loads some of its
+    # rules from. Changes to these files are noticed automatically.
+    RESOURCES = ()
+
+    # Upper-case class attributes that aren't part of the rules.
+    # AUDIENCES_NO_RESEARCH is derived from AUDIENCES, in no particular
+    # order.
+    NOT_RULES = {"VERSION", "CLASSIFY_CACHE_SIZE", "AUDIENCES_NO_RESEARCH"}
+
+    # How many classify() results to remember, across all classifiers.
+    CLASSIFY_CACHE_SIZE = 10000
+
     @classmethod
     def range_tuple(cls, lower, upper):
         """Turn a pair of ages into a tuple that represents an age range.
@@ -126,14 +181,47 @@ class Classifier(ClassifierConstants):
         """Look up a human-readable name for the given identifier."""
         return None
 
+    @classmethod
+    def version(cls):
+        """A fingerprint of the rules this classifier uses.
+
+        This changes whenever the VERSION or the rule tables of this
+        classifier (or any of its superclasses) change, or one of its
+        RESOURCES does.
+        """
+        sha = hashlib.sha1()
+        for klass in reversed(cls.__mro__):
+            if "VERSION" in klass.__dict__:
+                sha.update(("%s=%s;" % (klass.__name__, klass.VERSION)).encode("utf8"))
+            for name, value in sorted(klass.__dict__.items()):
+                if name.isupper() and name not in cls.NOT_RULES:
+                    sha.update(
+                        (
+                            "%s.%s=%s;"
+                            % (klass.__name__, name, rule_fingerprint(value))
+                        ).encode("utf8")
+                    )
+        for resource in sorted(cls.RESOURCES):
+            with open(os.path.join(resource_dir, resource), "rb") as f:
+                sha.update(f.read())
+        return sha.hexdigest()
+
     @classmethod
     def classify(cls, subject):
         """Try to determine genre, audience, target age, and fiction status
         for the given Subject.
         """
-        identifier, name = cls.scrub_identifier_and_name(
-            subject.identifier, subject.name
-        )
+        return cls._classify(subject.identifier, subject.name)
+
+    @classmethod
+    @lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+    def _classify(cls, identifier, name):
+        """Classify a subject with the given identifier and name.
+
+        The result only depends on this classifier's rules, which don't
+        change while the process is running, so it's cached.
+        """
+        identifier, name = cls.scrub_identifier_and_name(identifier, name)
         fiction = cls.is_fiction(identifier, name)
         audience = cls.audience(identifier, name)
 
@@ -148,6 +236,11 @@ class Classifier(ClassifierConstants):
             fiction,
         )
 
+    @classmethod
+    def clear_cache(cls):
+        """Forget every cached classify() result."""
+        cls._classify.cache_clear()
+
     @classmethod
     def scrub_identifier_and_name(cls, identifier, name):
         """Prepare identifier and name from within a call to classify()."""
@@ -794,6 +887,9 @@ class GenreData:
     def __repr__(self):
         return "<GenreData: %s>" % self.name
 
+    def fingerprint(self):
+        return repr(self)
+
     @property
     def self_and_subgenres(self):
         yield self
@@ -109,6 +109,15 @@ class MatchingRule:
                 # It's a special object. Add it to the ruleset as-is.
                 self.ruleset.append(rule)
 
+    def fingerprint(self):
+        """Represent this rule in Classifier.version(), leaving out the
+        subjects it caught.
+        """
+        return "MatchingRule(%s, %s)" % (
+            rule_fingerprint(self.result),
+            rule_fingerprint(self.ruleset),
+        )
+
     def match(self, *subject):
         """If `subject` matches this ruleset, return the appropriate
         result. Otherwise, return None.
@@ -242,6 +251,8 @@ class BISACClassifier(Classifier):
     rules.
     """
 
+    RESOURCES = ("bisac.csv",)
+
     # Map identifiers to human-readable names.
     NAMES = dict(
         [i.strip() for i in l]
@@ -7,23 +7,86 @@ def match_kw(*l):
     The function will match all the strings by default, or can exclude the strings
     that are examples of the classification.
     """
+    # Compile both versions of the regular expression up front; a
+    # single classification run may call match_term millions of times.
+    patterns = {
+        False: _compile_keywords([str(keyword) for keyword in l]),
+        True: _compile_keywords(
+            [keyword for keyword in l if not isinstance(keyword, Eg)]
+        ),
+    }
 
     def match_term(term, exclude_examples=False):
-        if not l:
+        pattern = patterns[bool(exclude_examples)]
+        if pattern is None:
             return None
-        if exclude_examples:
-            keywords = [keyword for keyword in l if not isinstance(keyword, Eg)]
-        else:
-            keywords = [str(keyword) for keyword in l]
+        return pattern.search(term)
+
+    # This is a dictionary so it can be used as a class variable
+    return {"search": match_term, "keywords": l}
+
+
+class KeywordIndex:
+    """Quickly narrow a dictionary of match_kw() results, keyed by
+    genre, down to the genres whose keywords might match a given term.
+
+    Every match must start at a word boundary, so a keyword that
+    starts with a literal word can only match a term that contains a
+    word starting with those same letters. Keywords that start with
+    anything else (e.g. '^historical$') make their genre a candidate
+    for every term.
+    """
+
+    WORD = re.compile(r"\w+")
 
-        if not keywords:
+    def __init__(self, table):
+        self.genres = list(table)
+        self.by_prefix = defaultdict(set)
+        self.unindexed = set()
+        for genre, kw in table.items():
+            prefixes = [self.leading_word(str(keyword)) for keyword in kw["keywords"]]
+            if None in prefixes:
+                self.unindexed.add(genre)
+            for prefix in prefixes:
+                if prefix:
+                    self.by_prefix[prefix].add(genre)
+
+    @classmethod
+    def leading_word(cls, keyword):
+        """The lowercased literal text that any match for `keyword` must
+        start with, or None if it can't be determined.
+        """
+        if "|" in keyword:
             return None
-        any_keyword = "|".join(keywords)
-        with_boundaries = r"\b(%s)\b" % any_keyword
-        return re.compile(with_boundaries, re.I).search(term)
+        prefix = ""
+        for i, c in enumerate(keyword):
+            if not (c.isascii() and (c.isalnum() or c == "_")):
+                break
+            if keyword[i + 1 : i + 2] in ("?", "*", "{"):
+                # This character is optional.
+                break
+            prefix += c
+        return prefix.lower() or None
 
-    # This is a dictionary so it can be used as a class variable
-    return {"search": match_term}
+    def candidates(self, term):
+        """The genres that might match `term`, in their original order."""
+        if not term.isascii():
+            # Case-insensitive regular expressions treat some non-ASCII
+            # characters as equivalent to ASCII letters.
+            return self.genres
+        found = set(self.unindexed)
+        for word in self.WORD.findall(term.lower()):
+            for i in range(1, len(word) + 1):
+                found.update(self.by_prefix.get(word[:i], ()))
+        return [genre for genre in self.genres if genre in found]
+
+
+def _compile_keywords(keywords):
+    if not keywords:
+        return None
+    any_keyword = "|".join(keywords)
+    with_boundaries = r"\b(%s)\b" % any_keyword
+    return re.compile(with_boundaries, re.I)
 
 
 class Eg:
@@ -1150,6 +1213,15 @@ class KeywordBasedClassifier(AgeOrGradeClassifier):
         ),
     }
 
+    # A given subject name can only match a handful of genres. Finding
+    # out which ones is a lot faster than trying every genre's regular
+    # expression in turn.
+    KEYWORD_TABLES = [
+        (LEVEL_3_KEYWORDS, KeywordIndex(LEVEL_3_KEYWORDS)),
+        (LEVEL_2_KEYWORDS, KeywordIndex(LEVEL_2_KEYWORDS)),
+        (CATCHALL_KEYWORDS, KeywordIndex(CATCHALL_KEYWORDS)),
+    ]
+
     @classmethod
     def is_fiction(cls, identifier, name, exclude_examples=False):
         if not name:
@@ -1206,9 +1278,9 @@ class KeywordBasedClassifier(AgeOrGradeClassifier):
         cls, identifier, name, fiction=None, audience=None, exclude_examples=False
     ):
         matches = Counter()
-        match_against = [name]
-        for l in [cls.LEVEL_3_KEYWORDS, cls.LEVEL_2_KEYWORDS, cls.CATCHALL_KEYWORDS]:
-            for genre, keywords in list(l.items()):
+        for l, index in cls.KEYWORD_TABLES:
+            for genre in index.candidates(name):
+                keywords = l[genre]
                 if genre and fiction is not None and genre.is_fiction != fiction:
                     continue
                 if (
@@ -112,6 +112,7 @@ class LCCClassifier(Classifier):
         BP=Religion_Spirituality,
     )
 
+    RESOURCES = ("lcc_one_level.json",)
     NAMES = json.load(open(os.path.join(resource_dir, "lcc_one_level.json")))
 
     @classmethod
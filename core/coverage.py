@@ -1,5 +1,6 @@
 import logging
 import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Optional, Union
 
 from sqlalchemy.orm import Load
@@ -26,7 +27,7 @@ from .model import (
     get_one,
 )
 from .util.datetime_helpers import utc_now
-from .util.worker_pools import DatabaseJob
+from .util.worker_pools import DatabaseJob, RateLimiter
 
 
 class CoverageFailure:
@@ -169,12 +170,26 @@ class BaseCoverageProvider:
     # doing this.
     DEFAULT_BATCH_SIZE: int = 100
 
+    # If your subclass implements fetch_batch() and
+    # process_fetched_batch(), you may set this to the number of
+    # batches to fetch at once. Each call to run_once() will then fetch
+    # this many batches on background threads before processing them,
+    # in order, on the main thread. It's ignored for subclasses that
+    # only implement process_batch().
+    FETCH_WORKERS: int = 0
+
+    # If this is set, the background threads will, between them, start
+    # no more than this many fetch_batch() calls per second.
+    MAX_FETCHES_PER_SECOND: Optional[float] = None
+
     def __init__(
         self,
         _db,
         batch_size=None,
         cutoff_time=None,
         registered_only=False,
+        fetch_workers=None,
+        max_fetches_per_second=None,
     ):
         """Constructor.
 
@@ -188,6 +203,11 @@ class BaseCoverageProvider:
         CoverageProvider will only cover items that already have been
         "preregistered" with a CoverageRecord with a registered or failing
         status. This option is only used on the Metadata Wrangler.
+
+        :param fetch_workers: Optional. Overrides FETCH_WORKERS.
+
+        :param max_fetches_per_second: Optional. Overrides
+        MAX_FETCHES_PER_SECOND.
         """
         self._db = _db
         if not self.__class__.SERVICE_NAME:
@@ -203,6 +223,18 @@ class BaseCoverageProvider:
         self.cutoff_time = cutoff_time
         self.registered_only = registered_only
         self.collection_id = None
+        if fetch_workers is None:
+            fetch_workers = self.FETCH_WORKERS
+        if fetch_workers and not self.can_fetch_batches:
+            self.log.warning(
+                "%s can't fetch batches on background threads; processing one batch at a time.",
+                self.service_name,
+            )
+            fetch_workers = 0
+        self.fetch_workers = fetch_workers
+        self.fetch_rate_limiter = RateLimiter(
+            max_fetches_per_second or self.MAX_FETCHES_PER_SECOND
+        )
 
     @property
     def log(self):
@@ -210,6 +242,18 @@ class BaseCoverageProvider:
             self._log = logging.getLogger(self.service_name)
         return self._log
 
+    @property
+    def can_fetch_batches(self):
+        """Does this provider split process_batch() into fetch_batch()
+        and process_fetched_batch()?
+        """
+        cls = self.__class__
+        return (
+            cls.fetch_batch is not BaseCoverageProvider.fetch_batch
+            and cls.process_fetched_batch
+            is not BaseCoverageProvider.process_fetched_batch
+        )
+
     @property
     def collection(self):
         """Retrieve the Collection object associated with this
@@ -369,8 +413,15 @@ class BaseCoverageProvider:
                 count_as_covered_message,
             )
 
+        # When fetching several batches at once, they're all selected
+        # here, so one call to run_once() covers up to
+        # batch_size * fetch_workers items and advances progress.offset
+        # by the total for all of them. The result is the same as
+        # selecting and processing each batch in turn, unless processing
+        # one batch changes whether items in a later batch need
+        # coverage; such items are processed anyway.
         qu = qu.offset(progress.offset)
-        batch = qu.limit(self.batch_size)
+        batch = qu.limit(self.batch_size * max(self.fetch_workers, 1))
         batch_results = batch.all()
         batch_count = len(batch_results)
 
@@ -379,40 +430,72 @@ class BaseCoverageProvider:
             progress.finish = utc_now()
             return progress
 
-        (
-            successes,
-            transient_failures,
-            persistent_failures,
-        ), results = self.process_batch_and_handle_results(batch_results)
-
-        # Update the running totals so that the service's eventual timestamp
-        # will have a useful .achievements.
-        progress.successes += successes
-        progress.transient_failures += transient_failures
-        progress.persistent_failures += persistent_failures
-
-        if BaseCoverageRecord.SUCCESS not in count_as_covered:
-            # If any successes happened in this batch, increase the
-            # offset to ignore them, or they will just show up again
-            # the next time we run this batch.
-            progress.offset += successes
-
-        if BaseCoverageRecord.TRANSIENT_FAILURE not in count_as_covered:
-            # If any transient failures happened in this batch,
-            # increase the offset to ignore them, or they will
-            # just show up again the next time we run this batch.
-            progress.offset += transient_failures
-
-        if BaseCoverageRecord.PERSISTENT_FAILURE not in count_as_covered:
-            # If any persistent failures happened in this batch,
-            # increase the offset to ignore them, or they will
-            # just show up again the next time we run this batch.
-            progress.offset += persistent_failures
+        if self.fetch_workers:
+            batches = [
+                batch_results[i : i + self.batch_size]
+                for i in range(0, batch_count, self.batch_size)
+            ]
+            processed = self.fetch_and_process_batches(batches)
+        else:
+            processed = [self.process_batch_and_handle_results(batch_results)]
+
+        for (successes, transient_failures, persistent_failures), results in processed:
+            # Update the running totals so that the service's eventual
+            # timestamp will have a useful .achievements.
+            progress.successes += successes
+            progress.transient_failures += transient_failures
+            progress.persistent_failures += persistent_failures
+
+            if BaseCoverageRecord.SUCCESS not in count_as_covered:
+                # If any successes happened in this batch, increase the
+                # offset to ignore them, or they will just show up again
+                # the next time we run this batch.
+                progress.offset += successes
+
+            if BaseCoverageRecord.TRANSIENT_FAILURE not in count_as_covered:
+                # If any transient failures happened in this batch,
+                # increase the offset to ignore them, or they will
+                # just show up again the next time we run this batch.
+                progress.offset += transient_failures
+
+            if BaseCoverageRecord.PERSISTENT_FAILURE not in count_as_covered:
+                # If any persistent failures happened in this batch,
+                # increase the offset to ignore them, or they will
+                # just show up again the next time we run this batch.
+                progress.offset += persistent_failures
 
         return progress
 
-    def process_batch_and_handle_results(self, batch):
-        """:return: A 2-tuple (counts, records).
+    def fetch_and_process_batches(self, batches):
+        """Fetch the data for several batches at once, on background
+        threads, then process the batches one at a time on this thread.
+
+        The database session is left alone until every fetch has
+        finished, so fetch_batch() may look at the items it's given
+        without racing against a commit.
+
+        :yield: The return value of process_batch_and_handle_results()
+            for each batch.
+        """
+
+        def fetch(batch):
+            self.fetch_rate_limiter.wait()
+            return self.fetch_batch(batch)
+
+        with ThreadPoolExecutor(self.fetch_workers) as executor:
+            futures = [executor.submit(fetch, batch) for batch in batches]
+            wait(futures)
+
+        for batch, future in zip(batches, futures):
+            # If a fetch failed, its exception is raised here, just as
+            # it would have been raised by process_batch().
+            yield self.process_batch_and_handle_results(batch, fetched=future.result())
+
+    def process_batch_and_handle_results(self, batch, fetched=None):
+        """:param fetched: Optional. The return value of fetch_batch(),
+            if it was already called for this batch.
+
+        :return: A 2-tuple (counts, records).
 
         `counts` is a 3-tuple (successes, transient failures,
         persistent_failures).
@@ -428,7 +511,10 @@ class BaseCoverageProvider:
         batch = list(batch)
 
         offset_increment = 0
-        results = self.process_batch(batch)
+        if fetched is None:
+            results = self.process_batch(batch)
+        else:
+            results = self.process_fetched_batch(batch, fetched)
         successes = 0
         transient_failures = 0
         persistent_failures = 0
@@ -510,6 +596,27 @@ class BaseCoverageProvider:
             results.append(result)
         return results
 
+    def fetch_batch(self, batch):
+        """Get whatever data from outside the database is needed to
+        give coverage to a batch of items, e.g. by asking a vendor API.
+
+        This is called on a background thread when FETCH_WORKERS is
+        set, so it must not use the database session or change the
+        items it's given.
+
+        :return: Anything but None. This will be passed into
+            process_fetched_batch().
+        """
+        raise NotImplementedError()
+
+    def process_fetched_batch(self, batch, fetched):
+        """Give coverage records to a batch of items, using data
+        previously obtained from fetch_batch().
+
+        :return: A mixed list of coverage records and CoverageFailures.
+        """
+        raise NotImplementedError()
+
     def add_coverage_records_for(self, items):
         """Add CoverageRecords for a group of items from a batch,
         each of which was successful.
@@ -1631,6 +1738,13 @@ class WorkPresentationEditionCoverageProvider(WorkPresentationProvider):
         work.calculate_presentation(self.POLICY)
         return work
 
+    def process_batch(self, batch):
+        """Recalculate the presentation for a batch of Works all at once."""
+        Work.calculate_presentation_for_works(batch, self.POLICY)
+        for work in batch:
+            self.handle_success(work)
+        return batch
+
 
 class WorkClassificationCoverageProvider(WorkPresentationEditionCoverageProvider):
     """Calculates the 'expensive' parts of a work's presentation:
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Query, joinedload
 from core.coverage import BaseCoverageProvider, CoverageFailure
 from core.model.coverage import EquivalencyCoverageRecord
 from core.model.identifier import Equivalency, Identifier, RecursiveEquivalencyCache
+from core.model.work import Work, WorkEquivalentIdentifier
 
 
 class EquivalentIdentifiersCoverageProvider(BaseCoverageProvider):
@@ -33,6 +34,7 @@ class EquivalentIdentifiersCoverageProvider(BaseCoverageProvider):
         self.update_missing_coverage_records()
         ret = super().run()
         self.update_identity_recursive_equivalents()
+        self.update_missing_work_equivalent_identifiers()
         return ret
 
     def items_that_need_coverage(self, identifiers=None, **kwargs) -> Query:
@@ -119,6 +121,12 @@ class EquivalentIdentifiersCoverageProvider(BaseCoverageProvider):
             completed_identifiers.add(parent_id)
 
         self._db.add_all(recursive_equivs)
+        self._db.flush()
+
+        # Works built on top of these chains need their copies updated
+        WorkEquivalentIdentifier.refresh(
+            self._db, parent_identifier_ids=completed_identifiers
+        )
 
         self._already_covered_identifiers.update(completed_identifiers)
 
@@ -200,3 +208,27 @@ class EquivalentIdentifiersCoverageProvider(BaseCoverageProvider):
         self._db.commit()
 
         return missing_identifiers
+
+    def update_missing_work_equivalent_identifiers(self):
+        """Copy the chain of equivalents into WorkEquivalentIdentifier
+        for any work that doesn't have an up to date copy, e.g. because
+        it's new or its presentation edition changed
+        """
+        refreshed = []
+        last_id = 0
+        while True:
+            work_ids = [
+                id
+                for (id,) in WorkEquivalentIdentifier.missing(self._db)
+                .filter(Work.id > last_id)
+                .order_by(Work.id)
+                .limit(self.batch_size)
+            ]
+            if not work_ids:
+                break
+            last_id = work_ids[-1]
+            refreshed.extend(
+                WorkEquivalentIdentifier.refresh(self._db, work_ids=work_ids)
+            )
+            self._db.commit()
+        return refreshed
@@ -27,6 +27,7 @@ from elasticsearch_dsl.query import Query as BaseQuery
 from elasticsearch_dsl.query import Term, Terms
 from flask_babel import lazy_gettext as _
 from spellchecker import SpellChecker
+from sqlalchemy import or_
 
 from .classifier import (
     AgeClassifier,
@@ -38,7 +39,7 @@ from .config import CannotLoadConfiguration
 from .coverage import CoverageFailure, WorkPresentationProvider
 from .facets import FacetConstants
 from .lane import Pagination
-from .metadata_layer import IdentifierData
+from .metadata_layer import IdentifierData, TimestampData
 from .model import (
     Collection,
     ConfigurationSetting,
@@ -48,13 +49,16 @@ from .model import (
     ExternalIntegration,
     Identifier,
     Library,
+    Timestamp,
     Work,
+    WorkChange,
     WorkCoverageRecord,
     numericrange_to_tuple,
 )
+from .monitor import Monitor
 from .problem_details import INVALID_INPUT
 from .selftest import HasSelfTests
-from .util.datetime_helpers import from_timestamp
+from .util.datetime_helpers import from_timestamp, utc_now
 from .util.personal_names import display_name_to_sort_name
 from .util.problem_detail import ProblemDetail
 from .util.stopwords import ENGLISH_STOPWORDS
@@ -91,7 +95,10 @@ class ExternalSearchIndex(HasSelfTests):
     __client = None
 
     CURRENT_ALIAS_SUFFIX = "current"
-    VERSION_RE = re.compile("-v([0-9]+)$")
+    # An index name ends with the mapping version, optionally followed
+    # by a generation number if the index for that version was rebuilt
+    # alongside an existing one.
+    VERSION_RE = re.compile("-v([0-9]+)(-[0-9]+)?$")
 
     SETTINGS = [
         {
@@ -268,6 +275,16 @@ class ExternalSearchIndex(HasSelfTests):
         # The index name to use is the one known to be right for this
         # version.
         self.works_index = self.__client.works_index = self.works_index_name(_db)
+
+        # If a blue/green rebuild moved the alias onto a newer
+        # generation of that index, use that generation instead.
+        alias_name = self.works_alias_name(_db)
+        if self.indices.exists_alias(name=alias_name):
+            for index in self.indices.get_alias(name=alias_name):
+                if index.startswith(self.works_index + "-"):
+                    self.works_index = self.__client.works_index = index
+                    break
+
         if not self.indices.exists(self.works_index):
             # That index doesn't actually exist. Set it up.
             self.setup_index()
@@ -391,14 +408,71 @@ class ExternalSearchIndex(HasSelfTests):
             other_indices.remove(self.works_index)
 
         if other_indices:
-            # The alias exists on one or more other indices.  Remove
-            # the alias altogether, then put it back on the works
-            # index.
-            self.indices.delete_alias(index="_all", name=alias_name)
-            self.indices.put_alias(index=self.works_index, name=alias_name)
+            # The alias exists on one or more other indices. Move it
+            # onto the works index in a single request, so there's
+            # never a moment when searches have nowhere to go.
+            actions = [
+                dict(remove=dict(index=index, alias=alias_name))
+                for index in other_indices
+            ]
+            actions.append(dict(add=dict(index=self.works_index, alias=alias_name)))
+            self.indices.update_aliases(body=dict(actions=actions))
 
         self.works_alias = self.__client.works_alias = alias_name
 
+    def next_works_index_name(self, _db):
+        """Choose a name for an index that will replace the one behind
+        the works alias.
+
+        This is normally the index for the current mapping version. If
+        that index already exists, a generation number is added to the
+        name.
+        """
+        index_name = self.works_index_name(_db)
+        if not self.indices.exists(index=index_name):
+            return index_name
+        return "%s-%s" % (index_name, utc_now().strftime("%Y%m%d%H%M%S"))
+
+    def index_settings(self, index):
+        """Look up the settings of an index."""
+        return self.indices.get_settings(index=index)[index]["settings"]["index"]
+
+    def finish_bulk_load(
+        self, index, number_of_replicas, refresh_interval=None, timeout="30m"
+    ):
+        """Get an index that was filled with replicas and refreshing
+        turned off ready to serve searches.
+
+        :param refresh_interval: None means to use the Elasticsearch
+            default.
+        :return: True if the index's replicas were ready within `timeout`.
+        """
+        self.indices.put_settings(
+            index=index,
+            body=dict(
+                index=dict(
+                    number_of_replicas=number_of_replicas,
+                    refresh_interval=refresh_interval,
+                )
+            ),
+        )
+        self.indices.refresh(index=index)
+        health = self.__client.cluster.health(
+            index=index, wait_for_status="green", timeout=timeout
+        )
+        return not health.get("timed_out")
+
+    def warm_up(self, index, query_strings):
+        """Run some searches against an index before it starts serving
+        real ones, so its caches aren't cold.
+
+        :param query_strings: A list of query strings. None means to
+            run a query that matches everything.
+        """
+        search = Search(using=self.__client, index=index)
+        for query_string in query_strings:
+            Query(query_string).build(search, Pagination.default()).execute()
+
     def base_index_name(self, index_or_alias):
         """Removes version or current suffix from base index name"""
 
@@ -549,6 +623,15 @@ class ExternalSearchIndex(HasSelfTests):
         )
         return qu.count()
 
+    @classmethod
+    def bulk_error_id(cls, error):
+        """Find the ID of the document that caused an error reported by
+        bulk().
+        """
+        return error.get("data", {}).get("_id", None) or error.get("index", {}).get(
+            "_id", None
+        )
+
     def bulk_update(self, works, retry_on_batch_failure=True):
         """Upload a batch of works to the search index at once."""
 
@@ -598,12 +681,7 @@ class ExternalSearchIndex(HasSelfTests):
 
         # We weren't able to create search documents for these works, maybe
         # because they don't have presentation editions yet.
-        def get_error_id(error):
-            return error.get("data", {}).get("_id", None) or error.get("index", {}).get(
-                "_id", None
-            )
-
-        error_ids = [get_error_id(error) for error in errors]
+        error_ids = [self.bulk_error_id(error) for error in errors]
 
         missing_works = [
             work
@@ -623,7 +701,7 @@ class ExternalSearchIndex(HasSelfTests):
 
         for error in errors:
 
-            error_id = get_error_id(error)
+            error_id = self.bulk_error_id(error)
             work = None
             works_with_error = [work for work in works if work.id == error_id]
             if works_with_error:
@@ -3244,3 +3322,106 @@ class SearchIndexCoverageProvider(WorkPresentationProvider):
             records.append(CoverageFailure(work, error))
 
         return records
+
+
+class SearchIndexChangeLogMonitor(Monitor):
+    """Keep the search index up to date by reindexing every Work that
+    shows up in the work change log.
+
+    Entries are deleted from the log as soon as they're handled, so
+    an entry whose transaction commits after entries with higher IDs
+    is still there to be picked up on the next run. Works that are
+    successfully reindexed have their search index WorkCoverageRecords
+    marked as successful, so the SearchIndexCoverageProvider only
+    needs to pick up the stragglers.
+    """
+
+    SERVICE_NAME = "Search index change log monitor"
+
+    # While a blue/green rebuild is running, the counter of the
+    # Timestamp with this service name is the ID of the last
+    # WorkChange it has replayed into the new index. Later entries
+    # are kept around until it's done with them. Meanwhile, this
+    # monitor's own counter is the ID of the last entry it handled,
+    # so it can skip the entries that are being kept around.
+    HOLD_SERVICE_NAME = "Search index blue/green rebuild"
+
+    DEFAULT_BATCH_SIZE = 500
+
+    DEFAULT_COUNTER = 0
+
+    def __init__(self, _db, batch_size=None, search_index_client=None):
+        super().__init__(_db)
+        self.batch_size = batch_size or self.DEFAULT_BATCH_SIZE
+        self.search_index_client = search_index_client or ExternalSearchIndex(_db)
+
+    def hold_position(self):
+        """Find the ID of the last WorkChange a blue/green rebuild has
+        replayed, if one is running.
+        """
+        hold = Timestamp.lookup(
+            self._db, self.HOLD_SERVICE_NAME, Timestamp.SCRIPT_TYPE, None
+        )
+        if hold:
+            return hold.counter
+        return None
+
+    def run_once(self, progress):
+        offset = progress.counter or 0
+        timestamp = self.timestamp()
+        total_reindexed = 0
+        achievements = "Works reindexed: 0."
+        while True:
+            hold = self.hold_position()
+            qu = self._db.query(WorkChange.id, WorkChange.work_id)
+            if hold is not None:
+                # Entries after the hold are still in the log even if
+                # we've handled them, so skip those.
+                qu = qu.filter(or_(WorkChange.id <= hold, WorkChange.id > offset))
+            changes = qu.order_by(WorkChange.id).limit(self.batch_size).all()
+            if not changes:
+                break
+
+            # A work that changed several times only needs to be
+            # reindexed once.
+            work_ids = sorted({work_id for (id, work_id) in changes})
+            total_reindexed += self.process_batch(work_ids)
+            offset = max(offset, changes[-1].id)
+            achievements = "Works reindexed: %d." % total_reindexed
+
+            handled = [id for (id, work_id) in changes if hold is None or id <= hold]
+            if handled:
+                self._db.execute(
+                    WorkChange.__table__.delete().where(WorkChange.id.in_(handled))
+                )
+
+            # If a later batch should raise an exception, we don't
+            # want to lose the progress we've already made.
+            timestamp.update(
+                counter=offset, finish=utc_now(), achievements=achievements
+            )
+            self._db.commit()
+
+        return TimestampData(counter=offset, achievements=achievements)
+
+    def process_batch(self, work_ids):
+        """Reindex a batch of works.
+
+        :return: The number of works successfully reindexed.
+        """
+        works = (
+            self._db.query(Work)
+            .filter(Work.id.in_(work_ids))
+            .filter(Work.presentation_ready == True)
+            .all()
+        )
+        successes, failures = self.search_index_client.bulk_update(works)
+        for (work, error) in failures:
+            # This work's WorkCoverageRecord is still in the
+            # REGISTERED state, so the SearchIndexCoverageProvider
+            # will try again later.
+            self.log.error("Could not reindex %r: %s", work, error)
+        WorkCoverageRecord.bulk_add(
+            successes, WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION
+        )
+        return len(successes)
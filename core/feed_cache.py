@@ -0,0 +1,403 @@
+"""Caches that sit in front of the cachedfeeds table.
+
+Looking up a CachedFeed means a trip to the database and a transfer of
+the entire feed document. A FeedCache keeps recently used feed
+documents closer to hand: first in a size-bounded, in-process LRU
+cache, and then (optionally) in a store shared by every worker on the
+host. Only if neither tier has a usable copy do we go to the database.
+
+Every feed is compressed once, when it goes into the cache, in each of
+the content-codings we support, so that it doesn't have to be
+compressed again every time it's sent to a client.
+
+A FeedRefreshQueue regenerates stale feeds in background threads, so
+that a patron who asks for a stale feed doesn't have to wait for it.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict, namedtuple
+from threading import RLock, local
+from typing import Callable, Dict, List, Optional
+
+from .util import compression
+from .util.datetime_helpers import from_timestamp
+from .util.worker_pools import Pool
+
+# A single cached feed document. `timestamp` is a timezone-aware
+# datetime reflecting when the feed was generated, so a FeedCacheEntry
+# can be passed into CachedFeed._should_refresh just like a CachedFeed.
+# `compressed` is a dictionary mapping content-codings to compressed
+# versions of `content`.
+FeedCacheEntry = namedtuple(
+    "FeedCacheEntry", ["content", "timestamp", "compressed"], defaults=[None]
+)
+
+
+def _entry_size(entry: FeedCacheEntry) -> int:
+    """How much memory a FeedCacheEntry takes up, roughly."""
+    return len(entry.content) + sum(map(len, (entry.compressed or {}).values()))
+
+
+class FeedCacheTier(metaclass=ABCMeta):
+    """A place to store FeedCacheEntry objects, keyed by string."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[FeedCacheEntry]:
+        """Find the entry stored under `key`, if there is one."""
+
+    @abstractmethod
+    def put(self, key: str, entry: FeedCacheEntry) -> None:
+        """Store `entry` under `key`, replacing any previous entry."""
+
+    @abstractmethod
+    def invalidate(self, key: str) -> None:
+        """Remove the entry stored under `key`, if there is one."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+
+
+class LRUFeedCacheTier(FeedCacheTier):
+    """Keep feeds in memory, discarding the least recently used feeds
+    once their total size goes over a limit.
+
+    Every worker process has its own copy of this cache.
+    """
+
+    def __init__(self, max_size: int):
+        """Constructor.
+
+        :param max_size: The maximum number of characters of feed
+            content (compressed or uncompressed) to keep in memory.
+        """
+        self.max_size = max_size
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self.invalidate(key)
+            size = _entry_size(entry)
+            if size > self.max_size:
+                # This feed would push everything else out of the
+                # cache, and still not fit.
+                return
+            self._entries[key] = entry
+            self.size += size
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= _entry_size(evicted)
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= _entry_size(entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileFeedCacheTier(FeedCacheTier):
+    """Keep feeds in files in a directory, so that every worker on a
+    host can share them.
+    """
+
+    log = logging.getLogger("File feed cache")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        filename = hashlib.sha256(key.encode("utf8")).hexdigest() + ".json"
+        return os.path.join(self.directory, filename)
+
+    def get(self, key):
+        try:
+            with open(self.path(key), encoding="utf8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.log.warning("Could not read cached feed %s: %r", key, e)
+            return None
+        if data.get("key") != key:
+            # Vanishingly unlikely, but possible: a hash collision.
+            return None
+        compressed = {
+            encoding: base64.b64decode(value)
+            for encoding, value in data.get("compressed", {}).items()
+        }
+        return FeedCacheEntry(
+            content=data["content"],
+            timestamp=from_timestamp(data["timestamp"]),
+            compressed=compressed,
+        )
+
+    def put(self, key, entry):
+        compressed = {
+            encoding: base64.b64encode(value).decode("ascii")
+            for encoding, value in (entry.compressed or {}).items()
+        }
+        data = dict(
+            key=key,
+            content=entry.content,
+            timestamp=entry.timestamp.timestamp(),
+            compressed=compressed,
+        )
+        # Write to a temporary file and move it into place, so that
+        # other workers never see a partially written feed.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path(key))
+        except OSError as e:
+            self.log.warning("Could not cache feed %s: %r", key, e)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def invalidate(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(self.directory, filename))
+
+
+class FeedCache:
+    """A series of FeedCacheTiers, consulted in order, from fastest
+    to slowest.
+    """
+
+    # Set this environment variable to the maximum number of
+    # characters of feed content each worker should keep in memory.
+    # Set it to zero to disable the in-process cache.
+    SIZE_ENVIRONMENT_VARIABLE = "PALACE_FEED_CACHE_SIZE"
+    DEFAULT_SIZE = 64 * 1024 * 1024
+
+    # Set this environment variable to a directory to share cached
+    # feeds between all the workers on a host.
+    DIRECTORY_ENVIRONMENT_VARIABLE = "PALACE_FEED_CACHE_DIRECTORY"
+
+    def __init__(self, tiers: List[FeedCacheTier]):
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_environment(cls) -> Optional["FeedCache"]:
+        """Build a FeedCache based on environment variables.
+
+        :return: A FeedCache, or None if every tier is disabled.
+        """
+        tiers: List[FeedCacheTier] = []
+        size = int(os.environ.get(cls.SIZE_ENVIRONMENT_VARIABLE, cls.DEFAULT_SIZE))
+        if size > 0:
+            tiers.append(LRUFeedCacheTier(size))
+        directory = os.environ.get(cls.DIRECTORY_ENVIRONMENT_VARIABLE)
+        if directory:
+            tiers.append(FileFeedCacheTier(directory))
+        if not tiers:
+            return None
+        return cls(tiers)
+
+    @classmethod
+    def key(
+        cls,
+        feed_type,
+        library_id,
+        work_id,
+        lane_id,
+        unique_key,
+        facets_key,
+        pagination_key,
+    ) -> str:
+        """Turn the values that distinguish one CachedFeed from another
+        into a single string.
+        """
+        return json.dumps(
+            [
+                feed_type,
+                library_id,
+                work_id,
+                lane_id,
+                unique_key,
+                facets_key,
+                pagination_key,
+            ]
+        )
+
+    def get(self, key: str) -> Optional[FeedCacheEntry]:
+        """Find a feed in the fastest tier that has it.
+
+        When a slower tier has the feed, the faster tiers are given a
+        copy.
+        """
+        for i, tier in enumerate(self.tiers):
+            entry = tier.get(key)
+            if entry is not None:
+                self.hits += 1
+                for faster in self.tiers[:i]:
+                    faster.put(key, entry)
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, entry: FeedCacheEntry) -> FeedCacheEntry:
+        """Put a feed into every tier.
+
+        If the feed hasn't been compressed yet, it's compressed in
+        every supported content-coding before it's stored.
+
+        :return: The FeedCacheEntry that was actually stored.
+        """
+        if entry.compressed is None:
+            entry = entry._replace(
+                compressed=compression.compress_all(entry.content.encode("utf8"))
+            )
+        for tier in self.tiers:
+            tier.put(key, entry)
+        return entry
+
+    def invalidate(self, key: str) -> None:
+        for tier in self.tiers:
+            tier.invalidate(key)
+
+    def clear(self) -> None:
+        for tier in self.tiers:
+            tier.clear()
+
+
+class FeedRefreshQueue:
+    """Regenerate stale feeds in a pool of background threads.
+
+    A feed is only queued once, no matter how many requests for it come
+    in before the refresh job runs.
+    """
+
+    log = logging.getLogger("Feed refresh queue")
+
+    # Set this environment variable to the number of background threads
+    # each worker should use to refresh stale feeds.
+    SIZE_ENVIRONMENT_VARIABLE = "PALACE_FEED_REFRESH_THREADS"
+
+    def __init__(
+        self,
+        size: int,
+        job_factory: Callable[..., Callable],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Constructor.
+
+        :param size: The number of background threads.
+        :param job_factory: A function that returns a job that will
+            regenerate the feed being requested right now. It's called
+            with any keyword arguments passed into `enqueue`. The job
+            will be run in a background thread, so it must not depend
+            on any objects (such as database sessions) that belong to
+            the current thread.
+        :param clock: A function returning the current time in seconds.
+            Only intended to be replaced in tests.
+        """
+        self.job_factory = job_factory
+        self.clock = clock
+        self._lock = RLock()
+        self._pending: Dict[str, float] = {}
+        self._local = local()
+        self.completed = 0
+        self.failed = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.pool = self.create_pool(size)
+
+    def create_pool(self, size):
+        """Create the Pool that will run refresh jobs."""
+        return Pool(size)
+
+    @property
+    def depth(self) -> int:
+        """The number of feeds waiting to be refreshed."""
+        return len(self._pending)
+
+    @property
+    def in_refresh_job(self) -> bool:
+        """Is the current thread in the middle of a refresh job?"""
+        return getattr(self._local, "in_refresh_job", False)
+
+    def enqueue(self, key: str, **kwargs) -> bool:
+        """Queue up a job to refresh the feed being requested right now.
+
+        :param key: The FeedCache key of the feed to be refreshed.
+        :param kwargs: Passed into the job factory.
+        :return: True if a new job was queued; False if a refresh job
+            for this feed was already waiting.
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = self.clock()
+        try:
+            job = self.job_factory(**kwargs)
+        except Exception:
+            with self._lock:
+                del self._pending[key]
+            raise
+        self.pool.put(lambda: self.run(key, job))
+        return True
+
+    def run(self, key: str, job: Callable) -> None:
+        """Run a refresh job and record how long the feed waited."""
+        self._local.in_refresh_job = True
+        try:
+            job()
+        except Exception as e:
+            self.failed += 1
+            self.log.error("Error refreshing feed %s: %r", key, e, exc_info=e)
+        else:
+            self.completed += 1
+        finally:
+            self._local.in_refresh_job = False
+            with self._lock:
+                queued_at = self._pending.pop(key)
+            lag = self.clock() - queued_at
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            self.log.debug("Refreshed feed %s %.2fs after it was queued.", key, lag)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Counters describing the state of the queue."""
+        finished = self.completed + self.failed
+        return dict(
+            depth=self.depth,
+            completed=self.completed,
+            failed=self.failed,
+            average_lag=(self.total_lag / finished) if finished else 0.0,
+            max_lag=self.max_lag,
+        )
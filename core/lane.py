@@ -17,6 +17,7 @@ from sqlalchemy import (
     UniqueConstraint,
     and_,
     event,
+    inspect,
     not_,
     or_,
 )
@@ -32,6 +33,7 @@ from sqlalchemy.orm import (
     relationship,
 )
 from sqlalchemy.orm.session import Session
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.sql import select
 from sqlalchemy.sql.expression import Select
 
@@ -1873,26 +1875,14 @@ class WorkList:
             # be safe.
             has_script_fields = False
 
-        # The simplest way to turn Hits into Works is to create a
-        # DatabaseBackedWorkList that fetches those specific Works
-        # while applying the general availability filters.
-        #
-        # If facets were passed in, then they are used to further
-        # filter the list.
-        #
-        # TODO: There's a lot of room for improvement here, but
-        # performance isn't a big concern -- it's just ugly.
-        wl = SpecificWorkList(work_ids)
-        wl.initialize(self.get_library(_db))
-        qu = wl.works_from_database(_db, facets=facets)
+        # Look up all the Works at once, applying the general
+        # availability filters (and, if facets were passed in, the
+        # facet filters). Works looked up earlier in this request are
+        # not looked up again.
         a = time.time()
-        all_works = qu.all()
-
-        # Create a list of lists with the same membership as the original
-        # `resultsets`, but with Hit objects replaced with Work objects.
-        work_by_id = dict()
-        for w in all_works:
-            work_by_id[w.id] = w
+        hydrator = WorkHydrationCache.for_session(_db)
+        hits, reused = hydrator.hits, hydrator.reused
+        work_by_id = hydrator.hydrate(_db, self.get_library(_db), work_ids, facets)
 
         work_lists = []
         for resultset in resultsets:
@@ -1908,7 +1898,13 @@ class WorkList:
                     works.append(work)
 
         b = time.time()
-        logging.info("Obtained %sxWork in %.2fsec", len(all_works), b - a)
+        logging.info(
+            "Obtained %sxWork in %.2fsec (%d cached for this request, %d already in the session)",
+            len(work_by_id),
+            b - a,
+            hydrator.hits - hits,
+            hydrator.reused - reused,
+        )
         return work_lists
 
     @property
@@ -2513,6 +2509,98 @@ class SpecificWorkList(DatabaseBackedWorkList):
         return qu
 
 
+class WorkHydrationCache:
+    """Turn work IDs from search results into Work objects, remembering
+    the answers until the database session next writes, commits or
+    rolls back.
+
+    In the web application, each request ends with a commit, so Works
+    looked up for one lane of a grouped feed are reused for every
+    other lane of that feed.
+    """
+
+    SESSION_KEY = "_palace_work_hydration_cache"
+
+    def __init__(self):
+        # Maps (library ID, facets) to a dictionary mapping work ID to
+        # a Work, or to None if the work didn't pass the filters.
+        self.works = defaultdict(dict)
+        self.hits = 0
+        self.reused = 0
+
+    @classmethod
+    def for_session(cls, _db):
+        """Find or create the cache for a database session."""
+        if _db.autoflush:
+            # A query would have written any pending changes to the
+            # database, and they might change which Works pass the
+            # filters. Flushing them also resets the cache.
+            _db.flush()
+        if cls.SESSION_KEY not in _db.info:
+            _db.info[cls.SESSION_KEY] = cls()
+        return _db.info[cls.SESSION_KEY]
+
+    @classmethod
+    def reset(cls, _db, *args):
+        """Forget everything about a database session."""
+        _db.info.pop(cls.SESSION_KEY, None)
+
+    @classmethod
+    def _facets_key(cls, facets):
+        if facets is None:
+            return None
+        return (facets.__class__, getattr(facets, "query_string", id(facets)))
+
+    @classmethod
+    def _is_loaded(cls, work):
+        """Is this Work ready to go into a feed without any further
+        trips to the database?
+        """
+        unloaded = inspect(work).unloaded
+        return not any(x in unloaded for x in ("license_pools", "presentation_edition"))
+
+    def hydrate(self, _db, library, work_ids, facets=None):
+        """Find the Works with the given IDs that pass the general
+        availability filters for `library` and the filters imposed by
+        `facets`.
+
+        :return: A dictionary mapping work ID to Work.
+        """
+        works = self.works[(library.id if library else None, self._facets_key(facets))]
+        missing = [x for x in work_ids if x not in works]
+        self.hits += len(work_ids) - len(missing)
+
+        if missing:
+            # Works that are already fully loaded in the session only
+            # need to be checked against the filters. The rest need
+            # to be loaded along with everything needed to put them
+            # in a feed.
+            in_session = {}
+            for work_id in missing:
+                work = _db.identity_map.get(identity_key(Work, work_id))
+                if work is not None and self._is_loaded(work):
+                    in_session[work_id] = work
+            to_load = [x for x in missing if x not in in_session]
+
+            for work_id in missing:
+                works[work_id] = None
+            if in_session:
+                qu = self._query(_db, library, list(in_session), facets)
+                for (work_id,) in qu.with_entities(Work.id):
+                    works[work_id] = in_session[work_id]
+                self.reused += len(in_session)
+            if to_load:
+                for work in self._query(_db, library, to_load, facets):
+                    works[work.id] = work
+
+        return {x: works[x] for x in work_ids if works[x] is not None}
+
+    def _query(self, _db, library, work_ids, facets):
+        wl = SpecificWorkList(work_ids)
+        wl.initialize(library)
+        return wl.works_from_database(_db, facets=facets)
+
+
 class LaneGenre(Base):
     """Relationship object between Lane and Genre."""
 
@@ -3237,3 +3325,12 @@ def receive_modified(target, value, oldvalue, initiator):
     # Remove this information whenever the Lane configuration
     # changes. This will force it to be recalculated.
     Library._has_root_lane_cache.clear()
+
+
+# Anything a WorkHydrationCache knows may be out of date once the
+# session writes to the database or ends its transaction.
+@event.listens_for(Session, "after_flush")
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_soft_rollback")
+def reset_work_hydration_cache(session, *args):
+    WorkHydrationCache.reset(session)
@@ -1232,7 +1232,7 @@ class CirculationData(MetaToModelUtility):
             # We still haven't determined rights, so it's unknown.
             self.default_rights_uri = RightsStatus.UNKNOWN
 
-    def apply(self, _db, collection, replace=None):
+    def apply(self, _db, collection, replace=None, batch=None):
         """Update the title with this CirculationData's information.
 
         :param collection: A Collection representing actual copies of
@@ -1241,6 +1241,9 @@ class CirculationData(MetaToModelUtility):
             this is not present, only delivery information (e.g. format
             information and open-access downloads) will be processed.
 
+        :param batch: A LicensePoolAvailabilityBatch to pass into
+            LicensePool.update_availability.
+
         """
         # Immediately raise an exception if there is information that
         # can only be stored in a LicensePool, but we have no
@@ -1374,6 +1377,7 @@ class CirculationData(MetaToModelUtility):
                     new_patrons_in_hold_queue=self.patrons_in_hold_queue,
                     analytics=analytics,
                     as_of=self.last_checked,
+                    batch=batch,
                 )
 
         # If this is the first time we've seen this pool, or we never
@@ -513,7 +513,7 @@ class SessionBulkOperation:
 from .admin import Admin, AdminRole
 from .cachedfeed import CachedFeed, CachedMARCFile, WillNotGenerateExpensiveFeed
 from .circulationevent import CirculationEvent
-from .classification import Classification, Genre, Subject
+from .classification import Classification, ClassifierVersion, Genre, Subject
 from .collection import (
     Collection,
     CollectionIdentifier,
@@ -539,6 +539,7 @@ from .licensing import (
     DeliveryMechanism,
     License,
     LicensePool,
+    LicensePoolAvailabilityBatch,
     LicensePoolDeliveryMechanism,
     PolicyException,
     RightsStatus,
@@ -554,4 +555,4 @@ from .patron import (
     PatronProfileStorage,
 )
 from .resource import Hyperlink, Representation, Resource, ResourceTransformation
-from .work import Work, WorkGenre
+from .work import Work, WorkChange, WorkEquivalentIdentifier, WorkGenre
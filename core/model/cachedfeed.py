@@ -1,12 +1,18 @@
 # CachedFeed, WillNotGenerateExpensiveFeed
 
 import datetime
+import hashlib
+import itertools
 import logging
+import os
 from collections import namedtuple
+from typing import Optional
 
 from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, Unicode
+from sqlalchemy.sql import func, select
 from sqlalchemy.sql.expression import and_
 
+from ..feed_cache import FeedCache, FeedCacheEntry, FeedRefreshQueue
 from ..util.datetime_helpers import utc_now
 from ..util.flask_util import OPDSFeedResponse
 from . import Base, flush, get_one, get_one_or_create
@@ -64,6 +70,47 @@ class CachedFeed(Base):
 
     log = logging.getLogger("CachedFeed")
 
+    # If this is set to a FeedCache, fetch() will look there for a
+    # fresh copy of a feed before looking in the database.
+    cache: Optional[FeedCache] = None
+
+    # If this is set to a number of seconds, only one worker at a time
+    # will regenerate a stale feed. Until it's done, other workers will
+    # serve the stale copy, so long as it went stale no more than this
+    # many seconds ago.
+    stale_grace_period: Optional[int] = None
+
+    # Set this environment variable to configure `stale_grace_period`.
+    STALE_GRACE_PERIOD_ENVIRONMENT_VARIABLE = "PALACE_FEED_STALE_GRACE_PERIOD"
+
+    # If this is set to a FeedRefreshQueue (and `stale_grace_period`
+    # is set), a stale feed will be served immediately, and regenerated
+    # in the background.
+    refresh_queue: Optional[FeedRefreshQueue] = None
+
+    @classmethod
+    def configure_from_environment(cls, refresh_job_factory=None):
+        """Set up `cache`, `stale_grace_period` and `refresh_queue`
+        based on environment variables.
+
+        :param refresh_job_factory: A function that creates a job to
+            regenerate the feed currently being requested. If this is
+            not provided, stale feeds are never refreshed in the
+            background.
+        """
+        cls.cache = FeedCache.from_environment()
+        grace_period = os.environ.get(cls.STALE_GRACE_PERIOD_ENVIRONMENT_VARIABLE)
+        if grace_period:
+            cls.stale_grace_period = int(grace_period)
+        else:
+            cls.stale_grace_period = None
+
+        threads = int(os.environ.get(FeedRefreshQueue.SIZE_ENVIRONMENT_VARIABLE, 0))
+        if refresh_job_factory and threads > 0:
+            cls.refresh_queue = FeedRefreshQueue(threads, refresh_job_factory)
+        else:
+            cls.refresh_queue = None
+
     @classmethod
     def fetch(
         cls,
@@ -74,6 +121,7 @@ class CachedFeed(Base):
         refresher_method,
         max_age=None,
         raw=False,
+        stream=False,
         **response_kwargs
     ):
         """Retrieve a cached feed from the database if possible.
@@ -102,7 +150,14 @@ class CachedFeed(Base):
         :param raw: If this is False (the default), a Response ready to be
             converted into a Flask Response object will be returned. If this
             is True, the CachedFeed object itself will be returned. In most
-            non-test situations the default is better.
+            non-test situations the default is better. Since a CachedFeed
+            object can only come from the database, `cache` is not
+            consulted when this is True.
+        :param stream: If this is True, `refresher_method` returns an
+            iterable of strings rather than a complete feed. On a cache
+            miss, the pieces are sent to the client as they're
+            generated, and the feed is cached once the last one has
+            gone out. This can't be combined with `raw`.
 
         :return: A Response or CachedFeed containing up-to-date content.
         """
@@ -134,43 +189,99 @@ class CachedFeed(Base):
             facets=keys.facets_key,
             pagination=keys.pagination_key,
         )
+        # If there's a FeedCache, look for the feed there before going
+        # to the database.
+        cache = None if raw else cls.cache
+        cache_key = None
+        if cache is not None:
+            cache_key = cls._cache_key(keys)
+
         feed_data = None
+        feed_obj = None
+        cache_entry = None
+        precompressed = None
         if max_age is cls.IGNORE_CACHE or isinstance(max_age, int) and max_age <= 0:
             # Don't even bother checking for a CachedFeed: we're
             # just going to replace it.
-            feed_obj = None
+            pass
         else:
-            feed_obj = get_one(_db, cls, **kwargs)
-
-        should_refresh = cls._should_refresh(feed_obj, max_age)
-        if should_refresh:
+            if cache is not None:
+                cache_entry = cache.get(cache_key)
+                if cache_entry is not None and cls._should_refresh(
+                    cache_entry, max_age
+                ):
+                    # The cached copy is too old to use, but the
+                    # database might have a newer one.
+                    cache_entry = None
+            if cache_entry is None:
+                feed_obj = get_one(_db, cls, **kwargs)
+
+        should_refresh = cache_entry is None and cls._should_refresh(feed_obj, max_age)
+        serving_stale_feed = False
+        if should_refresh and cls._can_refresh_in_background(feed_obj, max_age):
+            # Serve the stale copy right away, and leave it to a
+            # background thread to regenerate the feed.
+            cls.refresh_queue.enqueue(cls._cache_key(keys), lane_id=keys.lane_id)
+            should_refresh = False
+            serving_stale_feed = True
+        elif should_refresh and not cls._claim_refresh(_db, keys, feed_obj, max_age):
+            # Another worker is already regenerating this feed. Rather
+            # than duplicate its work, serve the stale copy.
+            should_refresh = False
+            serving_stale_feed = True
+
+        if cache_entry is not None:
+            # This is a cache hit, and we never had to touch the
+            # database.
+            feed_data = cache_entry.content
+            precompressed = cache_entry.compressed
+        elif should_refresh and stream:
+            # This is a cache miss, and the new feed will be sent out
+            # as it's generated. Get as far as the first piece now, so
+            # that problems with e.g. the search engine show up
+            # before the response starts.
+            chunks = iter(refresher_method())
+            first = next(chunks, "")
+            feed_data = cls._stream_and_store(
+                _db,
+                itertools.chain([first], chunks),
+                max_age,
+                kwargs,
+                cache,
+                cache_key,
+            )
+            # The feed we found in the database, if any, is stale,
+            # and it's too early to cache the new one.
+            feed_obj = None
+        elif should_refresh:
             # This is a cache miss. Either feed_obj is None or
             # it's no good. We need to generate a new feed.
             feed_data = str(refresher_method())
             generation_time = utc_now()
 
             if max_age is not cls.IGNORE_CACHE:
-                # Having gone through all the trouble of generating
-                # the feed, we want to cache it in the database.
-
-                # Since it can take a while to generate a feed, and we know
-                # that the feed in the database is stale, it's possible that
-                # another thread _also_ noticed that feed was stale, and
-                # generated a similar feed while we were working.
-                #
-                # To avoid a database error, fetch the feed _again_ from the
-                # database rather than assuming we have the up-to-date
-                # object.
-                feed_obj, is_new = get_one_or_create(_db, cls, **kwargs)
-                if feed_obj.timestamp is None or feed_obj.timestamp < generation_time:
-                    # Either there was no contention for this object, or there
-                    # was contention but our feed is more up-to-date than
-                    # the other thread(s). Our feed takes priority.
-                    feed_obj.content = feed_data
-                    feed_obj.timestamp = generation_time
+                feed_obj = cls._store(_db, kwargs, feed_data, generation_time)
         elif feed_obj:
             feed_data = feed_obj.content
 
+        if (
+            cache is not None
+            and cache_entry is None
+            and not serving_stale_feed
+            and feed_obj is not None
+            and feed_obj.content is not None
+        ):
+            # Whatever we ended up with, the next request for this
+            # feed shouldn't need to go to the database.
+            stored = cache.put(
+                cache_key,
+                FeedCacheEntry(content=feed_obj.content, timestamp=feed_obj.timestamp),
+            )
+            if stored.content == feed_data:
+                # The feed was compressed on its way into the cache;
+                # there's no need to compress it again on its way out.
+                precompressed = stored.compressed
+
         if raw and feed_obj:
             return feed_obj
 
@@ -200,8 +311,75 @@ class CachedFeed(Base):
             # to cache these feeds.
             response_kwargs["private"] = True
 
+        if precompressed:
+            response_kwargs.setdefault("precompressed", precompressed)
+
         return OPDSFeedResponse(response=feed_data, **response_kwargs)
 
+    @classmethod
+    def _store(cls, _db, kwargs, feed_data, generation_time):
+        """Store a newly generated feed in the database.
+
+        :return: The CachedFeed.
+        """
+        # Having gone through all the trouble of generating
+        # the feed, we want to cache it in the database.
+
+        # Since it can take a while to generate a feed, and we know
+        # that the feed in the database is stale, it's possible that
+        # another thread _also_ noticed that feed was stale, and
+        # generated a similar feed while we were working.
+        #
+        # To avoid a database error, fetch the feed _again_ from the
+        # database rather than assuming we have the up-to-date
+        # object.
+        feed_obj, is_new = get_one_or_create(_db, cls, **kwargs)
+        if feed_obj.timestamp is None or feed_obj.timestamp < generation_time:
+            # Either there was no contention for this object, or there
+            # was contention but our feed is more up-to-date than
+            # the other thread(s). Our feed takes priority.
+            feed_obj.content = feed_data
+            feed_obj.timestamp = generation_time
+        return feed_obj
+
+    @classmethod
+    def _stream_and_store(cls, _db, chunks, max_age, kwargs, cache, cache_key):
+        """Pass along the pieces of a feed as they're generated, then
+        cache the complete feed.
+
+        If the feed can't be finished, nothing is cached.
+        """
+        generated = []
+        sent = 0
+        try:
+            for chunk in chunks:
+                if max_age is not cls.IGNORE_CACHE:
+                    generated.append(chunk)
+                yield chunk
+                sent += 1
+        except Exception as e:
+            # The response has already started, so it's too late to
+            # send an error document. Let the exception through, so
+            # the server drops the connection rather than ending the
+            # response normally: a truncated feed must not look like
+            # a complete one to the client or to any cache in between.
+            cls.log.error(
+                "Feed %s failed after %d pieces were sent; aborting the response.",
+                cache_key,
+                sent,
+                exc_info=e,
+            )
+            raise
+
+        if max_age is cls.IGNORE_CACHE:
+            return
+        feed_obj = cls._store(_db, kwargs, "".join(generated), utc_now())
+        if cache is not None:
+            cache.put(
+                cache_key,
+                FeedCacheEntry(content=feed_obj.content, timestamp=feed_obj.timestamp),
+            )
+
     @classmethod
     def feed_type(cls, worklist, facets):
         """Determine the 'type' of the feed.
@@ -284,6 +462,104 @@ class CachedFeed(Base):
             should_refresh = True
         return should_refresh
 
+    @classmethod
+    def _cache_key(cls, keys):
+        """Turn a CachedFeedKeys into a key for use with a FeedCache."""
+        return FeedCache.key(
+            keys.feed_type,
+            keys.library.id if keys.library else None,
+            keys.work.id if keys.work else None,
+            keys.lane_id,
+            keys.unique_key,
+            keys.facets_key,
+            keys.pagination_key,
+        )
+
+    @classmethod
+    def invalidate_cache(cls, _db, worklist, facets, pagination):
+        """Remove a feed from `cache`, so that the next request for it
+        will go to the database.
+
+        The arguments are the same as for `fetch`.
+        """
+        if cls.cache is None:
+            return
+        keys = cls._prepare_keys(_db, worklist, facets, pagination)
+        cls.cache.invalidate(cls._cache_key(keys))
+
+    @classmethod
+    def _can_serve_stale(cls, feed_obj, max_age):
+        """Is `feed_obj` a stale feed that's still fresh enough to be
+        served while a new one is generated?
+
+        :param feed_obj: The stale CachedFeed, if there is one.
+        :param max_age: Either a number of seconds, or one of the constants
+            CACHE_FOREVER or IGNORE_CACHE.
+        """
+        if (
+            cls.stale_grace_period is None
+            or feed_obj is None
+            or feed_obj.timestamp is None
+            or max_age in (cls.CACHE_FOREVER, cls.IGNORE_CACHE)
+        ):
+            return False
+        stale_since = feed_obj.timestamp + datetime.timedelta(seconds=max_age)
+        return (
+            stale_since + datetime.timedelta(seconds=cls.stale_grace_period) > utc_now()
+        )
+
+    @classmethod
+    def _can_refresh_in_background(cls, feed_obj, max_age):
+        """Should a stale feed be served now and regenerated later by
+        `refresh_queue`?
+        """
+        return (
+            cls.refresh_queue is not None
+            # A refresh job needs to actually regenerate the feed.
+            and not cls.refresh_queue.in_refresh_job
+            and cls._can_serve_stale(feed_obj, max_age)
+        )
+
+    @classmethod
+    def _claim_refresh(cls, _db, keys, feed_obj, max_age):
+        """Decide whether this worker should regenerate a stale feed,
+        or leave the job to another worker that's already doing it.
+
+        Only one worker can hold the Postgres advisory lock for a given
+        feed at a time. The lock is held until the end of the current
+        transaction, by which point the new feed has been written to
+        the database.
+
+        :param keys: A CachedFeedKeys identifying the feed.
+        :param feed_obj: The stale CachedFeed, if there is one.
+        :param max_age: Either a number of seconds, or one of the constants
+            CACHE_FOREVER or IGNORE_CACHE.
+
+        :return: True if this worker should regenerate the feed; False
+            if it should serve the stale copy in `feed_obj`.
+        """
+        if not cls._can_serve_stale(feed_obj, max_age):
+            # There's nothing we could serve instead of a new feed.
+            return True
+        return cls._try_advisory_lock(_db, cls._lock_id(keys))
+
+    @classmethod
+    def _lock_id(cls, keys):
+        """Turn a CachedFeedKeys into a 64-bit integer suitable for use
+        as a Postgres advisory lock ID.
+        """
+        digest = hashlib.sha256(cls._cache_key(keys).encode("utf8")).digest()
+        return int.from_bytes(digest[:8], "big", signed=True)
+
+    @classmethod
+    def _try_advisory_lock(cls, _db, lock_id):
+        """Try to acquire a transaction-level advisory lock without
+        waiting for it.
+
+        :return: True if the lock was acquired.
+        """
+        return _db.execute(select([func.pg_try_advisory_xact_lock(lock_id)])).scalar()
+
     # This named tuple makes it easy to manage the return value of
     # _prepare_keys.
     CachedFeedKeys = namedtuple(
@@ -362,6 +638,17 @@ class CachedFeed(Base):
         self.content = content
         self.timestamp = utc_now()
         flush(_db)
+        if self.cache is not None:
+            key = FeedCache.key(
+                self.type,
+                self.library_id,
+                self.work_id,
+                self.lane_id,
+                self.unique_key,
+                self.facets,
+                self.pagination,
+            )
+            self.cache.put(key, FeedCacheEntry(self.content, self.timestamp))
 
     def __repr__(self):
         if self.content:
@@ -277,14 +277,75 @@ class Subject(Base):
                 _db.commit()
         _db.commit()
 
-    def assign_to_genre(self):
-        """Assign this subject to a genre."""
-        classifier = Classifier.classifiers.get(self.type, None)
-        if not classifier:
-            return
-        self.checked = True
+    @classmethod
+    def uncheck_outdated(cls, _db, batch_size=1000):
+        """Find checked subjects whose classification rules have changed
+        since they were checked, and mark the ones that would now be
+        classified differently as unchecked.
+
+        Only subject types whose classifier has a new version are
+        considered, and subjects that would come out the same are left
+        alone, so only the works that are actually affected by a rules
+        change end up being reclassified.
+
+        :param batch_size: Consider this many subjects at a time.
+        :return: The number of subjects marked as unchecked.
+        """
         log = logging.getLogger("Subject-genre assignment")
+        unchecked = 0
+        for type, classifier in sorted(Classifier.classifiers.items()):
+            version = classifier.version()
+            record, is_new = get_one_or_create(
+                _db, ClassifierVersion, subject_type=type
+            )
+            if record.version == version:
+                continue
+
+            q = (
+                _db.query(Subject)
+                .filter(Subject.type == type)
+                .filter(Subject.locked == False)
+                .filter(Subject.checked == True)
+                .order_by(Subject.id)
+            )
+            last_id = None
+            while True:
+                qu = q
+                if last_id is not None:
+                    qu = qu.filter(Subject.id > last_id)
+                subjects = qu.limit(batch_size).all()
+                if not subjects:
+                    break
+                for subject in subjects:
+                    if subject.classification_is_outdated(classifier):
+                        subject.checked = False
+                        unchecked += 1
+                last_id = subjects[-1].id
+                _db.commit()
+
+            log.info("Classification rules for %s changed to %s", type, version)
+            record.version = version
+            _db.commit()
+        return unchecked
+
+    def classification_is_outdated(self, classifier):
+        """Would assign_to_genre() change anything about this Subject?"""
+        genre, audience, target_age, fiction = self._classify(classifier)
+        return (
+            genre != self.genre
+            or audience != self.audience
+            or fiction != self.fiction
+            or (
+                numericrange_to_tuple(self.target_age) != target_age
+                and not (not self.target_age and not target_age)
+            )
+        )
+
+    def _classify(self, classifier):
+        """Run this Subject through the given classifier.
 
+        :return: A 4-tuple (genre, audience, target_age, fiction).
+        """
         genredata, audience, target_age, fiction = classifier.classify(self)
         # If the genre is erotica, the audience will always be ADULTS_ONLY,
         # no matter what the classifier says.
@@ -303,6 +364,17 @@ class Subject(Base):
             genre, was_new = Genre.lookup(_db, genredata.name, True)
         else:
             genre = None
+        return genre, audience, target_age, fiction
+
+    def assign_to_genre(self):
+        """Assign this subject to a genre."""
+        classifier = Classifier.classifiers.get(self.type, None)
+        if not classifier:
+            return
+        self.checked = True
+        log = logging.getLogger("Subject-genre assignment")
+
+        genre, audience, target_age, fiction = self._classify(classifier)
 
         # Create a shorthand way of referring to this Subject in log
         # messages.
@@ -335,6 +407,19 @@ class Subject(Base):
         self.target_age = tuple_to_numericrange(target_age)
 
 
+class ClassifierVersion(Base):
+    """The version of the classification rules that was in effect the
+    last time Subjects of a given type were checked.
+
+    See Subject.uncheck_outdated.
+    """
+
+    __tablename__ = "classifierversions"
+    id = Column(Integer, primary_key=True)
+    subject_type = Column(Unicode, unique=True, nullable=False)
+    version = Column(Unicode)
+
+
 class Classification(Base):
     """The assignment of a Identifier to a Subject."""
 
@@ -7,8 +7,21 @@ from typing import TYPE_CHECKING, Optional
 
 from sqlalchemy import Boolean, Column, DateTime
 from sqlalchemy import Enum as AlchemyEnum
-from sqlalchemy import ForeignKey, Index, Integer, String, Unicode, UniqueConstraint
+from sqlalchemy import (
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Unicode,
+    UniqueConstraint,
+    cast,
+    func,
+    literal,
+    select,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.session import Session
 from sqlalchemy.sql.expression import or_
 
@@ -162,6 +175,158 @@ class License(Base, LicenseFunctions):
             logging.warning(f"Checking in expired license # {self.identifier}.")
 
 
+class LicensePoolAvailabilityBatch:
+    """New availability information for a batch of LicensePools.
+
+    When LicensePool.update_availability() is given one of these, the
+    new numbers show up on the LicensePool right away, but the session
+    doesn't consider them changed. When the batch is finished, every
+    LicensePool in it is updated with a single UPDATE statement, and
+    the affected Works are queued for reindexing all at once.
+
+    If the session is rolled back before the batch is finished, the
+    new numbers are lost along with everything else, and the batch
+    should be thrown away.
+    """
+
+    COLUMNS = (
+        "licenses_owned",
+        "licenses_available",
+        "licenses_reserved",
+        "patrons_in_hold_queue",
+    )
+
+    def __init__(self, _db):
+        self._db = _db
+
+        # Maps each LicensePool to the numbers it had when it joined
+        # the batch, the numbers it will have once the batch is
+        # finished, and the time those numbers were checked.
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def accepts(self, pool):
+        """Can an update to `pool` wait until the batch is finished?
+
+        A LicensePool that's not in the database yet, or that doesn't
+        have a Work yet, is about to have more done to it, and that
+        code needs to see the new numbers right away.
+        """
+        return pool.id is not None and pool.work is not None
+
+    def availability(self, pool):
+        """The numbers `pool` will have once the batch is finished."""
+        if pool in self.pending:
+            return self.pending[pool][1]
+        return [getattr(pool, column) for column in self.COLUMNS]
+
+    def add(self, pool, new_values, as_of):
+        """Note new numbers for `pool`.
+
+        :param new_values: A list of values for COLUMNS. None means
+            the corresponding number hasn't changed.
+        :param as_of: The time the numbers were checked. If this is
+            None, LicensePool.last_checked won't be changed.
+        """
+        if pool in self.pending:
+            old_values, values, last_checked = self.pending[pool]
+        else:
+            old_values = values = self.availability(pool)
+            last_checked = None
+        values = [
+            value if new_value is None else new_value
+            for value, new_value in zip(values, new_values)
+        ]
+        self.pending[pool] = (old_values, values, as_of or last_checked)
+
+        # Code that looks at the LicensePool before the batch is
+        # finished should see the new numbers, but flushing the
+        # session shouldn't write them one LicensePool at a time.
+        self._apply(pool)
+
+    def _apply(self, pool):
+        """Make `pool` look like it has its new numbers in the database."""
+        old_values, values, as_of = self.pending[pool]
+        for column, value in zip(self.COLUMNS, values):
+            set_committed_value(pool, column, value)
+        if as_of:
+            set_committed_value(pool, "last_checked", as_of)
+
+    def finish(self):
+        """Write the new numbers to the database, log the changes, and
+        queue the affected Works for reindexing.
+        """
+        from .coverage import CoverageRecord, WorkCoverageRecord
+        from .work import Work, WorkChange
+
+        if not self.pending:
+            return
+
+        # Send the new numbers as one array per column, and turn them
+        # back into rows on the database side.
+        table = LicensePool.__table__
+        columns = ("id",) + self.COLUMNS + ("last_checked",)
+        rows = [
+            [pool.id] + list(values) + [as_of]
+            for pool, (old_values, values, as_of) in self.pending.items()
+        ]
+        new_values = select(
+            [
+                func.unnest(
+                    cast(
+                        literal(list(column_values), ARRAY(table.c[column].type)),
+                        ARRAY(table.c[column].type),
+                    )
+                ).label(column)
+                for column, column_values in zip(columns, zip(*rows))
+            ]
+        ).alias("v")
+        updates = {column: new_values.c[column] for column in self.COLUMNS}
+        updates["last_checked"] = func.coalesce(
+            new_values.c.last_checked, table.c.last_checked
+        )
+        self._db.execute(
+            table.update().where(table.c.id == new_values.c.id).values(updates)
+        )
+
+        # The database has the new numbers now. Make sure the session
+        # agrees, even if it was expired since the numbers were added.
+        checked = []
+        for pool, (old_values, values, as_of) in self.pending.items():
+            self._apply(pool)
+            if as_of:
+                checked.append(pool)
+            if old_values != values:
+                message, args = pool.circulation_changelog(*old_values)
+                logging.info(message, *args)
+
+        if checked:
+            works_table = Work.__table__
+            self._db.execute(
+                works_table.update()
+                .where(works_table.c.id == LicensePool.work_id)
+                .where(LicensePool.id.in_([pool.id for pool in checked]))
+                .values(last_update_time=LicensePool.last_checked)
+            )
+            works = []
+            for pool in checked:
+                set_committed_value(pool.work, "last_update_time", pool.last_checked)
+                if pool.work not in works:
+                    works.append(pool.work)
+
+            # This is what Work.external_index_needs_updating() does,
+            # for all the Works at once.
+            WorkChange.record_all(self._db, works)
+            WorkCoverageRecord.bulk_add(
+                works,
+                WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION,
+                status=CoverageRecord.REGISTERED,
+            )
+        self.pending = {}
+
+
 class LicensePool(Base):
     """A pool of undifferentiated licenses for a work from a given source."""
 
@@ -677,9 +842,15 @@ class LicensePool(Base):
         new_patrons_in_hold_queue,
         analytics=None,
         as_of=None,
+        batch=None,
     ):
         """Update the LicensePool with new availability information.
         Log the implied changes with the analytics provider.
+
+        :param batch: A LicensePoolAvailabilityBatch. If this
+            LicensePool can wait, the new information is written to
+            the database when the batch is finished, along with the
+            information for every other LicensePool in the batch.
         """
         changes_made = False
         if not as_of:
@@ -689,32 +860,42 @@ class LicensePool(Base):
             # LicensePool.last_checked to be updated.
             as_of = None
 
-        old_licenses_owned = self.licenses_owned
-        old_licenses_available = self.licenses_available
-        old_licenses_reserved = self.licenses_reserved
-        old_patrons_in_hold_queue = self.patrons_in_hold_queue
+        if batch is not None and not batch.accepts(self):
+            batch = None
+        if batch is not None:
+            (
+                old_licenses_owned,
+                old_licenses_available,
+                old_licenses_reserved,
+                old_patrons_in_hold_queue,
+            ) = batch.availability(self)
+        else:
+            old_licenses_owned = self.licenses_owned
+            old_licenses_available = self.licenses_available
+            old_licenses_reserved = self.licenses_reserved
+            old_patrons_in_hold_queue = self.patrons_in_hold_queue
 
         for old_value, new_value, more_event, fewer_event in (
             [
-                self.patrons_in_hold_queue,
+                old_patrons_in_hold_queue,
                 new_patrons_in_hold_queue,
                 CirculationEvent.DISTRIBUTOR_HOLD_PLACE,
                 CirculationEvent.DISTRIBUTOR_HOLD_RELEASE,
             ],
             [
-                self.licenses_available,
+                old_licenses_available,
                 new_licenses_available,
                 CirculationEvent.DISTRIBUTOR_CHECKIN,
                 CirculationEvent.DISTRIBUTOR_CHECKOUT,
             ],
             [
-                self.licenses_reserved,
+                old_licenses_reserved,
                 new_licenses_reserved,
                 CirculationEvent.DISTRIBUTOR_AVAILABILITY_NOTIFY,
                 None,
             ],
             [
-                self.licenses_owned,
+                old_licenses_owned,
                 new_licenses_owned,
                 CirculationEvent.DISTRIBUTOR_LICENSE_ADD,
                 CirculationEvent.DISTRIBUTOR_LICENSE_REMOVE,
@@ -726,6 +907,17 @@ class LicensePool(Base):
                 continue
             changes_made = True
 
+        if batch is not None:
+            new_values = [
+                new_licenses_owned,
+                new_licenses_available,
+                new_licenses_reserved,
+                new_patrons_in_hold_queue,
+            ]
+            if any(value is not None for value in new_values):
+                batch.add(self, new_values, as_of)
+            return changes_made
+
         # Update the license pool with the latest information.
         any_data = False
         if new_licenses_owned is not None:
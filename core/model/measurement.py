@@ -746,11 +746,7 @@ class Measurement(Base):
         cls, measurements, popularity_weight=0.3, rating_weight=0.7, default_value=0
     ):
         """Turn a bunch of measurements into an overall measure of quality."""
-        if popularity_weight + rating_weight != 1.0:
-            raise ValueError(
-                "Popularity weight and rating weight must sum to 1! (%.2f + %.2f)"
-                % (popularity_weight, rating_weight)
-            )
+        cls._check_weights(popularity_weight, rating_weight)
         popularities = []
         ratings = []
         qualities = []
@@ -769,6 +765,93 @@ class Measurement(Base):
         popularity = cls._average_normalized_value(popularities)
         rating = cls._average_normalized_value(ratings)
         quality = cls._average_normalized_value(qualities)
+        return cls._combine(
+            popularity, rating, quality, popularity_weight, rating_weight, default_value
+        )
+
+    @classmethod
+    def overall_qualities(
+        cls, rows, popularity_weight=0.3, rating_weight=0.7, default_value=0
+    ):
+        """Calculate overall_quality() for a lot of things at once.
+
+        This works on plain database rows rather than Measurement
+        objects, so there's no need to load thousands of Measurements
+        (and their DataSources) to calculate the quality of thousands
+        of works.
+
+        :param rows: A sequence of (key, quantity_measured, data source
+            name, value, weight, normalized_value) tuples. All the
+            rows with the same key contribute to one result.
+        :return: A dictionary mapping each key to the quality that
+            overall_quality() would calculate from its measurements.
+        """
+        cls._check_weights(popularity_weight, rating_weight)
+
+        # For each key, the weighted total and total weight of its
+        # popularity, rating and quality measurements, in that order.
+        totals = {}
+        normalizers = {}
+        rating = cls.RATING
+        quality = cls.QUALITY
+        for key, quantity, data_source, value, weight, normalized in rows:
+            t = totals.get(key)
+            if t is None:
+                t = totals[key] = [0, 0, 0, 0, 0, 0]
+            if not normalized:
+                if value is None:
+                    continue
+                normalizer_key = (quantity, data_source)
+                if normalizer_key not in normalizers:
+                    normalizers[normalizer_key] = cls._normalizer(quantity, data_source)
+                normalize = normalizers[normalizer_key]
+                if normalize:
+                    normalized = normalize(value)
+                if normalized is None:
+                    continue
+
+            if quantity == rating:
+                i = 2
+            elif quantity == quality:
+                i = 4
+            else:
+                i = 0
+            t[i] += normalized * weight
+            t[i + 1] += weight
+
+        results = {}
+        for key, t in totals.items():
+            results[key] = cls._combine(
+                t[0] / t[1] if t[1] else None,
+                t[2] / t[3] if t[3] else None,
+                t[4] / t[5] if t[5] else None,
+                popularity_weight,
+                rating_weight,
+                default_value,
+            )
+        return results
+
+    @classmethod
+    def _check_weights(cls, popularity_weight, rating_weight):
+        if popularity_weight + rating_weight != 1.0:
+            raise ValueError(
+                "Popularity weight and rating weight must sum to 1! (%.2f + %.2f)"
+                % (popularity_weight, rating_weight)
+            )
+
+    @classmethod
+    def _combine(
+        cls,
+        popularity,
+        rating,
+        quality,
+        popularity_weight,
+        rating_weight,
+        default_value,
+    ):
+        """Combine average normalized popularity, rating and quality
+        into an overall measure of quality.
+        """
         if popularity is None and rating is None and quality is None:
             # We have absolutely no idea about the quality of this work.
             return default_value
@@ -831,29 +914,38 @@ class Measurement(Base):
             pass
         elif self.value is None:
             return None
-        elif self.data_source.name == DataSourceConstants.METADATA_WRANGLER:
+        else:
+            normalize = self._normalizer(self.quantity_measured, self.data_source.name)
+            if normalize:
+                self._normalized_value = normalize(self.value)
+
+        return self._normalized_value
+
+    @classmethod
+    def _normalizer(cls, quantity_measured, data_source_name):
+        """Find the function that turns a value of `quantity_measured`,
+        measured by the named data source, into a number between 0 and 1.
+
+        :return: A function, or None if values can't be normalized. If
+            the function returns None, the value should be ignored.
+        """
+        if data_source_name == DataSourceConstants.METADATA_WRANGLER:
             # Data from the metadata wrangler comes in pre-normalized.
-            self._normalized_value = self.value
-        elif (
-            self.quantity_measured == self.RATING
-            and self.data_source.name in self.RATING_SCALES
-        ):
+            return lambda value: value
+        elif quantity_measured == cls.RATING and data_source_name in cls.RATING_SCALES:
             # Ratings need to be normalized from a scale that depends
             # on the data source (e.g. Amazon's 1-5 stars) to a 0..1 scale.
-            scale_min, scale_max = self.RATING_SCALES[self.data_source.name]
+            scale_min, scale_max = cls.RATING_SCALES[data_source_name]
             width = float(scale_max - scale_min)
-            value = self.value - scale_min
-            self._normalized_value = value / width
-        elif self.quantity_measured in self.PERCENTILE_SCALES:
+            return lambda value: (value - scale_min) / width
+        elif quantity_measured in cls.PERCENTILE_SCALES:
             # Other measured quantities need to be normalized using
             # a percentile scale determined emperically.
-            by_data_source = self.PERCENTILE_SCALES[self.quantity_measured]
-            if not self.data_source.name in by_data_source:
+            by_data_source = cls.PERCENTILE_SCALES[quantity_measured]
+            if not data_source_name in by_data_source:
                 # We don't know how to normalize measurements from
                 # this data source. Ignore this data.
-                return None
-            percentiles = by_data_source[self.data_source.name]
-            position = bisect.bisect_left(percentiles, self.value)
-            self._normalized_value = position * 0.01
-
-        return self._normalized_value
+                return lambda value: None
+            percentiles = by_data_source[data_source_name]
+            return lambda value: bisect.bisect_left(percentiles, value) * 0.01
+        return None
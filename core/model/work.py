@@ -1,12 +1,13 @@
 # WorkGenre, Work
 
 import logging
-from collections import Counter
+from collections import Counter, defaultdict
 from datetime import datetime
 from decimal import Decimal
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Type, TypeVar, cast
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     DateTime,
@@ -17,12 +18,26 @@ from sqlalchemy import (
     Numeric,
     String,
     Unicode,
+    UniqueConstraint,
+    delete,
+    insert,
+    inspect,
 )
 from sqlalchemy.dialects.postgresql import INT4RANGE
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import contains_eager, joinedload, relationship
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql.expression import and_, case, join, literal_column, or_, select
+from sqlalchemy.sql.expression import (
+    and_,
+    case,
+    exists,
+    join,
+    literal_column,
+    or_,
+    select,
+    union,
+    union_all,
+)
 from sqlalchemy.sql.functions import func
 
 from core.model.classification import Classification, Subject
@@ -72,6 +87,290 @@ class WorkGenre(Base):
         return "%s (%d%%)" % (self.genre.name, self.affinity * 100)
 
 
+class WorkChange(Base):
+    """An entry in the work change log: a note that a work's search
+    document needs to be reindexed.
+
+    The SearchIndexChangeLogMonitor reindexes the works in the log and
+    deletes the entries it has handled.
+    """
+
+    __tablename__ = "workchanges"
+    id = Column(BigInteger, primary_key=True)
+    work_id = Column(Integer, ForeignKey("works.id", ondelete="CASCADE"), index=True)
+    created = Column(DateTime(timezone=True), default=utc_now)
+
+    work = relationship("Work")
+
+    @classmethod
+    def record(cls, work):
+        """Note that `work` has changed.
+
+        A work that changes several times before the database session
+        is flushed only gets one entry in the log.
+
+        :return: A WorkChange, or None if the entry couldn't be added
+            to the session.
+        """
+        change = getattr(work, "_pending_change", None)
+        if change is not None and inspect(change).pending:
+            return change
+        _db = Session.object_session(work)
+        if _db is None or work in _db.deleted:
+            # There's nowhere to record the change, or the work is
+            # going away anyway.
+            return None
+        if _db._flushing:
+            # We're being called from a listener in the middle of a
+            # flush, e.g. because a LicensePool was deleted. An object
+            # added to the session now wouldn't be written until the
+            # next flush, if ever, so write the entry directly.
+            if work.id is not None:
+                _db.execute(
+                    cls.__table__.insert().values(work_id=work.id, created=utc_now())
+                )
+            return None
+        change = cls(work=work)
+        _db.add(change)
+        work._pending_change = change
+        return change
+
+    @classmethod
+    def record_all(cls, _db, works):
+        """Note that every Work in `works` has changed, using a single
+        INSERT statement.
+        """
+        if not works:
+            return
+        now = utc_now()
+        _db.execute(
+            cls.__table__.insert().values(
+                [dict(work_id=work.id, created=now) for work in works]
+            )
+        )
+
+    def __repr__(self):
+        return "<WorkChange #%s: work_id=%s>" % (self.id, self.work_id)
+
+
+class WorkEquivalentIdentifier(Base):
+    """An identifier that's equivalent to the primary identifier of a
+    work's presentation edition.
+
+    This is the RecursiveEquivalencyCache chain for each work, copied
+    out ahead of time so that search documents can be built with plain
+    joins. The EquivalentIdentifiersCoverageProvider keeps it up to
+    date. Rows whose `parent_identifier_id` no longer matches the
+    work's primary identifier are out of date and are ignored.
+    """
+
+    __tablename__ = "workequivalentidentifiers"
+    id = Column(Integer, primary_key=True)
+    work_id = Column(
+        Integer, ForeignKey("works.id", ondelete="CASCADE"), index=True, nullable=False
+    )
+
+    # The primary identifier of the work's presentation edition at the
+    # time this row was created.
+    parent_identifier_id = Column(
+        Integer,
+        ForeignKey("identifiers.id", ondelete="CASCADE"),
+        index=True,
+        nullable=False,
+    )
+    identifier_id = Column(
+        Integer, ForeignKey("identifiers.id", ondelete="CASCADE"), nullable=False
+    )
+
+    __table_args__ = (UniqueConstraint(work_id, identifier_id),)
+
+    @classmethod
+    def refresh(cls, _db, work_ids=None, parent_identifier_ids=None):
+        """Recalculate the equivalent identifiers of some works.
+
+        :param work_ids: Refresh these works.
+        :param parent_identifier_ids: Refresh the works whose primary
+            identifier is one of these.
+        :return: A list of the IDs of the works that were refreshed.
+        """
+        qu = _db.query(Work.id).join(
+            Edition, Work.presentation_edition_id == Edition.id
+        )
+        if work_ids is not None:
+            qu = qu.filter(Work.id.in_(work_ids))
+        if parent_identifier_ids is not None:
+            qu = qu.filter(Edition.primary_identifier_id.in_(parent_identifier_ids))
+        ids = [id for (id,) in qu]
+        if not ids:
+            return ids
+
+        _db.execute(delete(cls).where(cls.work_id.in_(ids)))
+        editions = join(Work, Edition, Work.presentation_edition_id == Edition.id)
+
+        # A work's primary identifier is always equivalent to itself.
+        # Recording that, even if the RecursiveEquivalencyCache has
+        # nothing for the identifier yet, means the work isn't picked
+        # up by missing() again until its primary identifier changes.
+        # The chain is refreshed once the cache has one.
+        identities = (
+            select(
+                [
+                    Work.id,
+                    Edition.primary_identifier_id.label("parent_identifier_id"),
+                    Edition.primary_identifier_id.label("identifier_id"),
+                ]
+            )
+            .select_from(editions)
+            .where(Work.id.in_(ids))
+            .where(Edition.primary_identifier_id != None)
+        )
+        chains = (
+            select(
+                [
+                    Work.id,
+                    RecursiveEquivalencyCache.parent_identifier_id,
+                    RecursiveEquivalencyCache.identifier_id,
+                ]
+            )
+            .select_from(
+                editions.join(
+                    RecursiveEquivalencyCache,
+                    RecursiveEquivalencyCache.parent_identifier_id
+                    == Edition.primary_identifier_id,
+                )
+            )
+            .where(Work.id.in_(ids))
+        )
+        _db.execute(
+            insert(cls).from_select(
+                ["work_id", "parent_identifier_id", "identifier_id"],
+                union(chains, identities),
+            )
+        )
+        return ids
+
+    @classmethod
+    def missing(cls, _db):
+        """Find works whose equivalent identifiers are missing or out of
+        date.
+        """
+        current = (
+            _db.query(cls.id)
+            .filter(cls.work_id == Work.id)
+            .filter(cls.parent_identifier_id == Edition.primary_identifier_id)
+        )
+        return (
+            _db.query(Work.id)
+            .join(Edition, Work.presentation_edition_id == Edition.id)
+            .filter(Edition.primary_identifier_id != None)
+            .filter(~current.exists())
+        )
+
+
+class WorkPresentationBatch:
+    """The information Work.calculate_presentation() needs about a
+    batch of Works, looked up with a handful of queries for the whole
+    batch rather than several queries for each Work.
+
+    Quality is calculated for the whole batch up front, straight from
+    the rows of the measurements table.
+
+    See Work.calculate_presentation_for_works.
+    """
+
+    def __init__(self, _db, works, policy):
+        from .licensing import LicensePool
+
+        self._db = _db
+        work_ids = [work.id for work in works]
+
+        # Coverage records are added in bulk once the whole batch is
+        # done. This maps each operation to the Works that need one.
+        self.covered = defaultdict(list)
+
+        self.direct_identifier_ids = defaultdict(list)
+        self.all_identifier_ids = defaultdict(set)
+        self.classifications = defaultdict(list)
+        self.qualities = {}
+        self.workgenres = defaultdict(list)
+        if not (policy.classify or policy.choose_summary or policy.calculate_quality):
+            return
+
+        pools = (
+            _db.query(LicensePool.work_id, LicensePool.identifier_id)
+            .filter(LicensePool.work_id.in_(work_ids))
+            .filter(LicensePool.identifier_id != None)
+        )
+        for work_id, identifier_id in pools:
+            self.direct_identifier_ids[work_id].append(identifier_id)
+
+        equivalents = Identifier.recursively_equivalent_identifier_ids(
+            _db,
+            [id for ids in self.direct_identifier_ids.values() for id in ids],
+            policy=policy,
+        )
+        for work_id, ids in self.direct_identifier_ids.items():
+            for id in ids:
+                self.all_identifier_ids[work_id].update(equivalents[id])
+        all_identifier_ids = set()
+        for ids in self.all_identifier_ids.values():
+            all_identifier_ids.update(ids)
+
+        if policy.classify:
+            for classification in Identifier.classifications_for_identifier_ids(
+                _db, all_identifier_ids
+            ):
+                self.classifications[classification.identifier_id].append(
+                    classification
+                )
+            for workgenre in _db.query(WorkGenre).filter(
+                WorkGenre.work_id.in_(work_ids)
+            ):
+                self.workgenres[workgenre.work_id].append(workgenre)
+
+        if policy.calculate_quality:
+            measurements = defaultdict(list)
+            rows = (
+                Work.quality_measurements(_db, all_identifier_ids)
+                .join(Measurement.data_source)
+                .with_entities(
+                    Measurement.identifier_id,
+                    Measurement.quantity_measured,
+                    DataSource.name,
+                    Measurement.value,
+                    Measurement.weight,
+                    Measurement._normalized_value,
+                )
+            )
+            for row in rows:
+                measurements[row[0]].append(tuple(row[1:]))
+            self.qualities = Measurement.overall_qualities(
+                (
+                    (work_id,) + measurement
+                    for work_id, ids in self.all_identifier_ids.items()
+                    for id in ids
+                    for measurement in measurements[id]
+                ),
+                default_value=None,
+            )
+
+    def classifications_for(self, identifier_ids):
+        return [c for id in identifier_ids for c in self.classifications[id]]
+
+    def add_coverage_record(self, work, operation):
+        """Note that `work` should get a WorkCoverageRecord for
+        `operation` once the batch is finished.
+        """
+        self.covered[operation].append(work)
+
+    def finish(self):
+        """Write out everything that was saved up for the end of the batch."""
+        self._db.flush()
+        for operation, works in self.covered.items():
+            WorkCoverageRecord.bulk_add(works, operation)
+        self.covered.clear()
+
+
 WorkTypevar = TypeVar("WorkTypevar", bound="Work")
 
 
@@ -897,6 +1196,27 @@ class Work(Base):
 
         return None
 
+    @classmethod
+    def calculate_presentation_for_works(cls, works, policy=None, exclude_search=False):
+        """Call calculate_presentation() on a number of Works.
+
+        The identifiers, classifications and measurements they need are
+        looked up for all of the Works at once, nothing is written to
+        the database until they're all done, and their coverage records
+        are then added in bulk.
+        """
+        if not works:
+            return
+        _db = Session.object_session(works[0])
+        policy = policy or PresentationCalculationPolicy()
+        batch = WorkPresentationBatch(_db, works, policy)
+        with _db.no_autoflush:
+            for work in works:
+                work.calculate_presentation(
+                    policy, exclude_search=exclude_search, batch=batch
+                )
+        batch.finish()
+
     def calculate_presentation(
         self,
         policy=None,
@@ -904,6 +1224,7 @@ class Work(Base):
         exclude_search=False,
         default_fiction=None,
         default_audience=None,
+        batch=None,
     ):
         """Make a Work ready to show to patrons.
         Call calculate_presentation_edition() to find the best-quality presentation edition
@@ -914,6 +1235,9 @@ class Work(Base):
         * The intended audience for the work.
         * The best available summary for the work.
         * The overall popularity of the work.
+
+        :param batch: A WorkPresentationBatch containing this Work, if
+            it's being calculated along with a number of other Works.
         """
         if not default_audience:
             default_audience = self._get_default_audience()
@@ -955,10 +1279,12 @@ class Work(Base):
         if policy.classify or policy.choose_summary or policy.calculate_quality:
             # Find all related IDs that might have associated descriptions,
             # classifications, or measurements.
-            _db = Session.object_session(self)
-
-            direct_identifier_ids = self._direct_identifier_ids
-            all_identifier_ids = self.all_identifier_ids(policy=policy)
+            if batch:
+                direct_identifier_ids = batch.direct_identifier_ids[self.id]
+                all_identifier_ids = batch.all_identifier_ids[self.id]
+            else:
+                direct_identifier_ids = self._direct_identifier_ids
+                all_identifier_ids = self.all_identifier_ids(policy=policy)
         else:
             # Don't bother.
             direct_identifier_ids = all_identifier_ids = []
@@ -968,10 +1294,9 @@ class Work(Base):
                 all_identifier_ids,
                 default_fiction=default_fiction,
                 default_audience=default_audience,
+                batch=batch,
             )
-            WorkCoverageRecord.add_for(
-                self, operation=WorkCoverageRecord.CLASSIFY_OPERATION
-            )
+            self._add_coverage_record(WorkCoverageRecord.CLASSIFY_OPERATION, batch)
 
         if policy.choose_summary:
             self._choose_summary(
@@ -996,7 +1321,7 @@ class Work(Base):
                 # if we still haven't found anything of a quality measurement,
                 # then at least make it an integer zero, not none.
                 default_quality = 0
-            self.calculate_quality(all_identifier_ids, default_quality)
+            self.calculate_quality(all_identifier_ids, default_quality, batch=batch)
 
         if self.summary_text:
             if isinstance(self.summary_text, str):
@@ -1222,7 +1547,11 @@ class Work(Base):
         """Mark this work as needing to have its search document reindexed.
         This is a more efficient alternative to reindexing immediately,
         since these WorkCoverageRecords are handled in large batches.
+
+        The work is also added to the work change log, which is
+        consumed within seconds by the SearchIndexChangeLogMonitor.
         """
+        WorkChange.record(self)
         return self._reset_coverage(WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION)
 
     def update_external_index(self, client, add_coverage_record=True):
@@ -1302,35 +1631,60 @@ class Work(Base):
         else:
             self.set_presentation_ready(search_index_client=search_index_client)
 
-    def calculate_quality(self, identifier_ids, default_quality=0):
-        _db = Session.object_session(self)
+    @classmethod
+    def quality_measurements(cls, _db, identifier_ids):
+        """Find the Measurements that go into the quality of a Work
+        with the given Identifiers.
+        """
         # Relevant Measurements are direct measurements of popularity
         # and quality, plus any quantity that might be mapppable to the 0..1
         # range -- ratings, and measurements with an associated percentile
         # score.
         quantities = {Measurement.POPULARITY, Measurement.QUALITY, Measurement.RATING}
         quantities = quantities.union(list(Measurement.PERCENTILE_SCALES.keys()))
-        measurements = (
+        return (
             _db.query(Measurement)
             .filter(Measurement.identifier_id.in_(identifier_ids))
             .filter(Measurement.is_most_recent == True)
             .filter(Measurement.quantity_measured.in_(quantities))
-            .all()
         )
 
-        self.quality = Measurement.overall_quality(
-            measurements, default_value=default_quality
-        )
-        WorkCoverageRecord.add_for(self, operation=WorkCoverageRecord.QUALITY_OPERATION)
+    def calculate_quality(self, identifier_ids, default_quality=0, batch=None):
+        """Calculate this Work's quality from the Measurements of the
+        given Identifiers.
+
+        :param batch: A WorkPresentationBatch which has already
+            calculated this Work's quality from the Measurements of its
+            Identifiers.
+        """
+        if batch:
+            quality = batch.qualities.get(self.id)
+            self.quality = default_quality if quality is None else quality
+        else:
+            _db = Session.object_session(self)
+            measurements = self.quality_measurements(_db, identifier_ids).all()
+            self.quality = Measurement.overall_quality(
+                measurements, default_value=default_quality
+            )
+        self._add_coverage_record(WorkCoverageRecord.QUALITY_OPERATION, batch)
+
+    def _add_coverage_record(self, operation, batch=None):
+        if batch:
+            batch.add_coverage_record(self, operation)
+        else:
+            WorkCoverageRecord.add_for(self, operation=operation)
 
     def assign_genres(
         self,
         identifier_ids,
         default_fiction=False,
         default_audience=Classifier.AUDIENCE_ADULT,
+        batch=None,
     ):
         """Set classification information for this work based on the
         subquery to get equivalent identifiers.
+        :param batch: A WorkPresentationBatch which already knows about
+            this Work's Classifications.
         :return: A boolean explaining whether or not any data actually
         changed.
         """
@@ -1340,10 +1694,13 @@ class Work(Base):
         old_audience = self.audience
         old_target_age = self.target_age
 
-        _db = Session.object_session(self)
-        classifications = Identifier.classifications_for_identifier_ids(
-            _db, identifier_ids
-        )
+        if batch:
+            classifications = batch.classifications_for(identifier_ids)
+        else:
+            _db = Session.object_session(self)
+            classifications = Identifier.classifications_for_identifier_ids(
+                _db, identifier_ids
+            )
         for classification in classifications:
             classifier.add(classification)
 
@@ -1352,7 +1709,9 @@ class Work(Base):
         )
         self.target_age = tuple_to_numericrange(target_age)
 
-        workgenres, workgenres_changed = self.assign_genres_from_weights(genre_weights)
+        workgenres, workgenres_changed = self.assign_genres_from_weights(
+            genre_weights, batch=batch
+        )
 
         classification_changed = (
             workgenres_changed
@@ -1363,7 +1722,7 @@ class Work(Base):
 
         return classification_changed
 
-    def assign_genres_from_weights(self, genre_weights):
+    def assign_genres_from_weights(self, genre_weights, batch=None):
         # Assign WorkGenre objects to the remainder.
         from .classification import Genre
 
@@ -1371,7 +1730,10 @@ class Work(Base):
         _db = Session.object_session(self)
         total_genre_weight = float(sum(genre_weights.values()))
         workgenres = []
-        current_workgenres = _db.query(WorkGenre).filter(WorkGenre.work == self)
+        if batch:
+            current_workgenres = batch.workgenres[self.id]
+        else:
+            current_workgenres = _db.query(WorkGenre).filter(WorkGenre.work == self)
         by_genre = dict()
         for wg in current_workgenres:
             by_genre[wg.genre] = wg
@@ -1383,6 +1745,11 @@ class Work(Base):
                 wg = by_genre[g]
                 is_new = False
                 del by_genre[g]
+            elif batch:
+                # The batch knows about all of this Work's WorkGenres,
+                # so there's no need to look for this one.
+                wg, is_new = WorkGenre(work=self, genre=g), True
+                _db.add(wg)
             else:
                 wg, is_new = get_one_or_create(_db, WorkGenre, work=self, genre=g)
             if is_new or round(wg.affinity, 2) != round(affinity, 2):
@@ -1454,28 +1821,47 @@ class Work(Base):
 
         ## IDENTIFIERS START
         ## Identifiers is a house of cards, it comes crashing down if anything is changed here
-        ## We need a WITH statement selecting the procedural function on works_alias
+        ## We need a WITH statement matching each work to its equivalent identifiers
         ## then proceed to select the Identifiers for each of those outcomes
-        ## but must match works to the equivalent ids for which they were chosen
-        ## The same nonsense will be required for classifications
-        ## TODO: move this equivalence code into another job based on its required frequency
-        ## Add it to another table so it becomes faster to just query the pre-computed table
-
-        equivalent_identifiers = (
-            _db.query(RecursiveEquivalencyCache)
-            .join(
-                Edition,
-                Edition.primary_identifier_id
-                == RecursiveEquivalencyCache.parent_identifier_id,
+        ## The same CTE is used for classifications
+        ## The equivalents come from the precomputed WorkEquivalentIdentifier table,
+        ## except for works whose rows are missing or out of date, which fall back
+        ## to the RecursiveEquivalencyCache
+        work_ids = [w.id for w in works]
+        editions = join(Work, Edition, Work.presentation_edition_id == Edition.id)
+        current = and_(
+            WorkEquivalentIdentifier.work_id == Work.id,
+            WorkEquivalentIdentifier.parent_identifier_id
+            == Edition.primary_identifier_id,
+        )
+        precomputed = (
+            select(
+                [
+                    Work.id.label("work_id"),
+                    WorkEquivalentIdentifier.identifier_id.label("equivalent_id"),
+                ]
             )
-            .join(Work, Work.presentation_edition_id == Edition.id)
-            .filter(Work.id.in_(w.id for w in works))
-            .with_entities(
-                Work.id.label("work_id"),
-                RecursiveEquivalencyCache.identifier_id.label("equivalent_id"),
+            .select_from(editions.join(WorkEquivalentIdentifier, current))
+            .where(Work.id.in_(work_ids))
+        )
+        fallback = (
+            select(
+                [
+                    Work.id.label("work_id"),
+                    RecursiveEquivalencyCache.identifier_id.label("equivalent_id"),
+                ]
+            )
+            .select_from(
+                editions.join(
+                    RecursiveEquivalencyCache,
+                    RecursiveEquivalencyCache.parent_identifier_id
+                    == Edition.primary_identifier_id,
+                )
             )
-            .cte("equivalent_cte")
+            .where(Work.id.in_(work_ids))
+            .where(~exists().where(current))
         )
+        equivalent_identifiers = union_all(precomputed, fallback).cte("equivalent_cte")
 
         identifiers_query = (
             select(
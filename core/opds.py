@@ -1,6 +1,8 @@
+import copy
 import datetime
 import logging
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from threading import RLock
 from typing import List
 from urllib.parse import quote
 
@@ -37,6 +39,70 @@ from .util.flask_util import OPDSEntryResponse, OPDSFeedResponse
 from .util.opds_writer import AtomFeed, OPDSFeed, OPDSMessage
 
 
+class ParsedEntryCache:
+    """Keep parsed versions of the OPDS entries cached in Work objects.
+
+    The same cached entries show up in feed after feed, and copying a
+    parsed tree is cheaper than parsing the string again. Trees are
+    kept until their total size goes over a limit, and then the least
+    recently used ones are discarded.
+
+    The parsed trees are shared between threads, so they're only
+    touched while holding a lock, and callers get their own copies.
+    """
+
+    # The maximum number of characters of cached entries to keep
+    # parsed versions of.
+    DEFAULT_MAX_SIZE = 32 * 1024 * 1024
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+    def parse(self, key, xml):
+        """Parse a cached OPDS entry.
+
+        :param key: Identifies where the entry was cached, e.g. a Work
+            ID and the name of the field. If the entry in that place
+            has changed since it was last parsed, it's parsed again.
+        :param xml: The cached entry, as a string.
+        :return: An lxml Element that belongs to the caller.
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == xml:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(cached[1])
+
+        tree = etree.fromstring(xml)
+        result = copy.deepcopy(tree)
+        with self._lock:
+            self.invalidate(key)
+            if len(xml) <= self.max_size:
+                self._entries[key] = (xml, tree)
+                self.size += len(xml)
+                while self.size > self.max_size:
+                    _, (evicted, _) = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return result
+
+    def invalidate(self, key):
+        with self._lock:
+            cached = self._entries.pop(key, None)
+            if cached is not None:
+                self.size -= len(cached[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class UnfulfillableWork(Exception):
     """Raise this exception when it turns out a Work currently cannot be
     fulfilled through any means, *and* this is a problem sufficient to
@@ -576,6 +642,9 @@ class AcquisitionFeed(OPDSFeed):
 
     FACET_REL = "http://opds-spec.org/facet"
 
+    # Parsed versions of the OPDS entries cached in Work objects.
+    parsed_entries = ParsedEntryCache()
+
     @classmethod
     def groups(
         cls,
@@ -733,10 +802,15 @@ class AcquisitionFeed(OPDSFeed):
         max_age=None,
         search_engine=None,
         search_debug=False,
+        stream=False,
         **response_kwargs,
     ):
         """Create a feed representing one page of works from a given lane.
 
+        :param stream: If this is True and the feed has to be
+            generated, send it to the client a piece at a time as its
+            entries are created, rather than building the whole
+            document first.
         :param response_kwargs: Extra keyword arguments to pass into
             the OPDSFeedResponse constructor.
 
@@ -746,9 +820,10 @@ class AcquisitionFeed(OPDSFeed):
         facets = facets or Facets.default(library)
         pagination = pagination or Pagination.default()
         annotator = cls._make_annotator(annotator)
+        generate = cls._generate_page_chunks if stream else cls._generate_page
 
         def refresh():
-            return cls._generate_page(
+            return generate(
                 _db,
                 title,
                 url,
@@ -767,11 +842,35 @@ class AcquisitionFeed(OPDSFeed):
             pagination=pagination,
             facets=facets,
             refresher_method=refresh,
+            stream=stream,
             **response_kwargs,
         )
 
     @classmethod
-    def _generate_page(
+    def _generate_page(cls, *args):
+        """Internal method called by page() when a cached feed
+        must be regenerated.
+
+        :return: An AcquisitionFeed.
+        """
+        for feed in cls._build_page(*args):
+            pass
+        return feed
+
+    @classmethod
+    def _generate_page_chunks(cls, *args):
+        """Internal method called by page() when a cached feed must be
+        regenerated and sent to the client as it's generated.
+
+        :return: A generator of strings which add up to the feed
+            _generate_page would have created.
+        """
+        for feed in cls._build_page(*args):
+            yield feed.flush()
+        yield feed.finish()
+
+    @classmethod
+    def _build_page(
         cls,
         _db,
         title,
@@ -783,8 +882,11 @@ class AcquisitionFeed(OPDSFeed):
         search_engine,
         search_debug,
     ):
-        """Internal method called by page() when a cached feed
-        must be regenerated.
+        """Build a feed representing one page of works from a given lane.
+
+        This is a generator which yields the same AcquisitionFeed
+        several times: once the works have been loaded, after each
+        entry is added, and when the feed is complete.
         """
         works = lane.works(
             _db,
@@ -805,7 +907,12 @@ class AcquisitionFeed(OPDSFeed):
             # Pagination.page_loaded may or may not have been called
             # yet.
             pagination.page_loaded(works)
-        feed = cls(_db, title, url, works, annotator)
+        feed = cls(_db, title, url, [], annotator)
+        yield feed
+
+        for work in works:
+            feed.add_entry(work)
+            yield feed
 
         entrypoints = facets.selectable_entrypoints(lane)
         if entrypoints:
@@ -847,7 +954,7 @@ class AcquisitionFeed(OPDSFeed):
             feed.add_breadcrumb_links(lane, facets.entrypoint)
 
         annotator.annotate_feed(feed, lane)
-        return feed
+        yield feed
 
     @classmethod
     def from_query(cls, query, _db, feed_name, url, pagination, url_fn, annotator):
@@ -1361,7 +1468,13 @@ class AcquisitionFeed(OPDSFeed):
             xml = getattr(work, field)
 
         if xml:
-            xml = etree.fromstring(xml)
+            # Copying an already-parsed tree is cheaper than parsing
+            # the cached string again, and the annotator is free to
+            # modify the copy.
+            if work.id is not None:
+                xml = self.parsed_entries.parse((work.id, field), xml)
+            else:
+                xml = etree.fromstring(xml)
         else:
             xml = self._make_entry_xml(work, edition)
             data = etree.tounicode(xml)
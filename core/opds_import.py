@@ -1996,6 +1996,7 @@ class OPDSImportMonitor(CollectionMonitor, HasSelfTests, HasExternalIntegration)
             timeout=120,
             max_retry_count=self._max_retry_count,
             allowed_response_codes=["2xx", "3xx"],
+            integration=ExternalIntegration.OPDS_IMPORT,
         )
         response = HTTP.get_with_timeout(url, headers=headers, **kwargs)
         return response.status_code, response.headers, response.content
@@ -57,6 +57,7 @@ from .testing import DatabaseTest, MockRequestsResponse
 from .util.datetime_helpers import strptime_utc, utc_now
 from .util.http import HTTP, BadResponseException
 from .util.string_helpers import base64
+from .util.worker_pools import prefetch
 
 
 class OverdriveConfiguration(ConfigurationGrouping, BaseImporterConfiguration):
@@ -182,6 +183,11 @@ class OverdriveCoreAPI(HasExternalIntegration):
     MAX_CREDENTIAL_AGE = 50 * 60
 
     PAGE_SIZE_LIMIT = 300
+
+    # When going through a list of books that's split across pages,
+    # fetch this many pages ahead of the page that's being processed.
+    PREFETCH_PAGES = 2
+
     EVENT_SOURCE = "Overdrive"
 
     EVENT_DELAY = datetime.timedelta(minutes=120)
@@ -418,14 +424,21 @@ class OverdriveCoreAPI(HasExternalIntegration):
         self._token = credential.credential
 
     def get(
-        self, url: str, extra_headers={}, exception_on_401=False
+        self, url: str, extra_headers={}, exception_on_401=False, token=None, **kwargs
     ) -> Tuple[int, CaseInsensitiveDict, bytes]:
-        """Make an HTTP GET request using the active Bearer Token."""
-        request_headers = dict(Authorization="Bearer %s" % self.token)
+        """Make an HTTP GET request using the active Bearer Token.
+
+        :param token: Use this Bearer Token instead of the active one.
+        :param kwargs: Passed into _do_get.
+        """
+        request_headers = dict(Authorization="Bearer %s" % (token or self.token))
         request_headers.update(extra_headers)
 
         response: Response = self._do_get(
-            url, request_headers, allowed_response_codes=["2xx", "3xx", "401", "404"]
+            url,
+            request_headers,
+            allowed_response_codes=["2xx", "3xx", "401", "404"],
+            **kwargs,
         )
         status_code: int = response.status_code
         headers: CaseInsensitiveDict = response.headers
@@ -477,7 +490,7 @@ class OverdriveCoreAPI(HasExternalIntegration):
         payload: Dict[str, str],
         is_fulfillment=False,
         headers={},
-        **kwargs
+        **kwargs,
     ) -> Response:
         """Make an HTTP POST request for purposes of getting an OAuth token."""
         headers = dict(headers)
@@ -556,11 +569,7 @@ class OverdriveCoreAPI(HasExternalIntegration):
         """Get IDs for every book in the system, with the most recently added
         ones at the front.
         """
-        next_link = self._all_products_link
-        while next_link:
-            page_inventory, next_link = self._get_book_list_page(next_link, "next")
-
-            yield from page_inventory
+        yield from self._book_list(self._all_products_link, "next")
 
     @property
     def _all_products_link(self) -> str:
@@ -571,7 +580,61 @@ class OverdriveCoreAPI(HasExternalIntegration):
         )
         return self.make_link_safe(url)
 
-    def _get_book_list_page(self, link, rel_to_follow="next", extractor_class=None):
+    def _book_list(self, link, rel_to_follow="next"):
+        """Yield availability information for every book in a list
+        that's split across pages, starting with the page at `link`.
+
+        Up to PREFETCH_PAGES pages are fetched in a background thread
+        while the caller works on the current page.
+        """
+        refreshed_at = None
+        while link:
+            # Getting the Bearer Token or the configuration may mean
+            # going to the database, which the background thread must
+            # not do. Look them up here and only hand it plain values.
+            pages = prefetch(
+                self._book_list_pages(
+                    link,
+                    rel_to_follow,
+                    token=self.token,
+                    max_retry_count=self._configuration.max_retry_count,
+                ),
+                self.PREFETCH_PAGES,
+            )
+            try:
+                for page_inventory, link in pages:
+                    yield from page_inventory
+            except BadResponseException as e:
+                if e.status_code != 401 or refreshed_at == link:
+                    raise
+                # The Bearer Token expired. Get a new one and pick up
+                # where the background thread left off.
+                self.check_creds(True)
+                refreshed_at = link
+            finally:
+                pages.close()
+
+    def _book_list_pages(self, link, rel_to_follow, **kwargs):
+        """Fetch every page of a book list in turn, without refreshing
+        the Bearer Token.
+
+        :param kwargs: Passed into get(), e.g. the Bearer Token to use.
+        :yield: A sequence of (availability_info, next_link) 2-tuples.
+        """
+        while link:
+            page_inventory, link = self._get_book_list_page(
+                link, rel_to_follow, exception_on_401=True, **kwargs
+            )
+            yield page_inventory, link
+
+    def _get_book_list_page(
+        self,
+        link,
+        rel_to_follow="next",
+        extractor_class=None,
+        exception_on_401=False,
+        **kwargs,
+    ):
         """Process a page of inventory whose circulation we need to check.
 
         Returns a 2-tuple: (availability_info, next_link).
@@ -582,7 +645,7 @@ class OverdriveCoreAPI(HasExternalIntegration):
         """
         extractor_class = extractor_class or OverdriveRepresentationExtractor
         # We don't cache this because it changes constantly.
-        status_code, headers, content = self.get(link, {})
+        status_code, headers, content = self.get(link, {}, exception_on_401, **kwargs)
         if isinstance(content, (bytes, str)):
             content = json.loads(content)
 
@@ -613,13 +676,12 @@ class OverdriveCoreAPI(HasExternalIntegration):
             collection_token=self.collection_token,
         )
         next_link = self.make_link_safe(next_link)
-        while next_link:
-            page_inventory, next_link = self._get_book_list_page(next_link)
-            # We won't be sending out any events for these books yet,
-            # because we don't know if anything changed, but we will
-            # be putting them on the list of inventory items to
-            # refresh. At that point we will send out events.
-            yield from page_inventory
+
+        # We won't be sending out any events for these books yet,
+        # because we don't know if anything changed, but we will
+        # be putting them on the list of inventory items to
+        # refresh. At that point we will send out events.
+        yield from self._book_list(next_link)
 
     def metadata_lookup(self, identifier):
         """Look up metadata for an Overdrive identifier."""
@@ -672,8 +734,10 @@ class OverdriveCoreAPI(HasExternalIntegration):
     def _do_get(self, url: str, headers, **kwargs) -> Response:
         """This method is overridden in MockOverdriveAPI."""
         url = self.endpoint(url)
-        kwargs["max_retry_count"] = self._configuration.max_retry_count
+        if "max_retry_count" not in kwargs:
+            kwargs["max_retry_count"] = self._configuration.max_retry_count
         kwargs["timeout"] = 120
+        kwargs["integration"] = ExternalIntegration.OVERDRIVE
         return HTTP.get_with_timeout(url, headers=headers, **kwargs)
 
     def _do_post(self, url: str, payload, headers, **kwargs) -> Response:
@@ -681,6 +745,7 @@ class OverdriveCoreAPI(HasExternalIntegration):
         url = self.endpoint(url)
         kwargs["max_retry_count"] = self._configuration.max_retry_count
         kwargs["timeout"] = 120
+        kwargs["integration"] = ExternalIntegration.OVERDRIVE
         return HTTP.post_with_timeout(url, payload, headers=headers, **kwargs)
 
     def website_id(self) -> bytes:
@@ -700,6 +765,11 @@ class OverdriveCoreAPI(HasExternalIntegration):
 
 
 class MockOverdriveCoreAPI(OverdriveCoreAPI):
+
+    # Mock responses are handed out in the order they were queued, so
+    # don't fetch anything in the background.
+    PREFETCH_PAGES = 0
+
     @classmethod
     def mock_collection(
         self,
@@ -21,7 +21,7 @@ from core.model.classification import Classification
 
 from .config import CannotLoadConfiguration, Configuration
 from .coverage import CollectionCoverageProviderJob, CoverageProviderProgress
-from .external_search import ExternalSearchIndex, Filter, SearchIndexCoverageProvider
+from .external_search import ExternalSearchIndex, Filter
 from .lane import Lane
 from .metadata_layer import (
     LinkData,
@@ -62,6 +62,7 @@ from .model.configuration import ExternalIntegrationLink
 from .model.listeners import site_configuration_has_changed
 from .monitor import CollectionMonitor, ReaperMonitor
 from .opds_import import OPDSImporter, OPDSImportMonitor
+from .search_reindex import BlueGreenRebuild, SearchIndexRebuilder
 from .util import fast_query_count
 from .util.datetime_helpers import strptime_utc, to_utc, utc_now
 from .util.personal_names import contributor_name_match_ratio, display_name_to_sort_name
@@ -786,6 +787,16 @@ class RunCoverageProviderScript(IdentifierInputScript):
             "--cutoff-time",
             help="Update existing coverage records if they were originally created after this time.",
         )
+        parser.add_argument(
+            "--fetch-workers",
+            help="Fetch data for this many batches at once, if the coverage provider supports it.",
+            type=int,
+        )
+        parser.add_argument(
+            "--max-fetches-per-second",
+            help="When fetching batches at once, start no more than this many fetches per second.",
+            type=float,
+        )
         return parser
 
     @classmethod
@@ -818,6 +829,10 @@ class RunCoverageProviderScript(IdentifierInputScript):
 
         if callable(provider):
             kwargs = self.extract_additional_command_line_arguments()
+            if parsed_args.fetch_workers is not None:
+                kwargs["fetch_workers"] = parsed_args.fetch_workers
+            if parsed_args.max_fetches_per_second is not None:
+                kwargs["max_fetches_per_second"] = parsed_args.max_fetches_per_second
             kwargs.update(provider_kwargs)
 
             provider = provider(
@@ -1578,12 +1593,15 @@ class WorkProcessingScript(IdentifierInputScript):
             else:
                 works = next(paged_query, [])
 
-            for work in works:
-                self.process_work(work)
+            self.process_works(works)
             offset += self.batch_size
             self._db.commit()
         self._db.commit()
 
+    def process_works(self, works):
+        for work in works:
+            self.process_work(work)
+
     def process_work(self, work):
         raise NotImplementedError()
 
@@ -1638,6 +1656,9 @@ class WorkPresentationScript(TimestampScript, WorkProcessingScript):
     # Do a complete recalculation of the presentation.
     policy = PresentationCalculationPolicy()
 
+    def process_works(self, works):
+        Work.calculate_presentation_for_works(works, policy=self.policy)
+
     def process_work(self, work):
         work.calculate_presentation(policy=self.policy)
 
@@ -1664,8 +1685,10 @@ class ReclassifyWorksForUncheckedSubjectsScript(WorkClassificationScript):
     """Reclassify all Works whose current classifications appear to
     depend on Subjects in the 'unchecked' state.
 
-    This generally means that some migration script reset those
-    Subjects because the rules for processing them changed.
+    This generally means that the rules for processing those Subjects
+    changed: either a migration script reset them, or
+    Subject.uncheck_outdated noticed that the classifier for their type
+    changed and would now classify them differently.
     """
 
     name = "Reclassify works that use unchecked subjects." ""
@@ -1680,6 +1703,15 @@ class ReclassifyWorksForUncheckedSubjectsScript(WorkClassificationScript):
             self._session = _db
         self.query = self._optimized_query()
 
+    def do_run(self):
+        # If the classification rules have changed since the last run,
+        # uncheck the subjects they would now classify differently, so
+        # their works are picked up below.
+        unchecked = Subject.uncheck_outdated(self._db)
+        if unchecked:
+            self.log.info("Classification rules changed for %d subjects.", unchecked)
+        super().do_run()
+
     def _optimized_query(self):
         """Optimizations include
         - Order by each joined table's PK, so that paging is consistent
@@ -3458,26 +3490,114 @@ class RemovesSearchCoverage:
         return count
 
 
-class RebuildSearchIndexScript(RunWorkCoverageProviderScript, RemovesSearchCoverage):
+class RebuildSearchIndexScript(TimestampScript, RemovesSearchCoverage):
     """Completely delete the search index and recreate it."""
 
-    def __init__(self, *args, **kwargs):
-        search = kwargs.get("search_index_client", None)
-        self.search = search or ExternalSearchIndex(self._db)
-        super().__init__(SearchIndexCoverageProvider, *args, **kwargs)
+    @classmethod
+    def arg_parser(cls):
+        parser = argparse.ArgumentParser()
+        cls.add_rebuilder_arguments(parser)
+        parser.add_argument(
+            "--resume",
+            help="Pick up an interrupted rebuild where it left off, instead of starting from scratch.",
+            action="store_true",
+        )
+        return parser
 
-    def do_run(self):
-        # Calling setup_index will destroy the index and recreate it
-        # empty.
-        self.search.setup_index()
+    @classmethod
+    def add_rebuilder_arguments(cls, parser):
+        """Add arguments that control how a SearchIndexRebuilder works."""
+        parser.add_argument(
+            "--processes",
+            help="Number of processes building search documents. Use 0 to build them in this process.",
+            type=int,
+            default=SearchIndexRebuilder.DEFAULT_PROCESSES,
+        )
+        parser.add_argument(
+            "--range-size",
+            help="Number of work IDs in each checkpointed range.",
+            type=int,
+            default=SearchIndexRebuilder.DEFAULT_RANGE_SIZE,
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of works in each batch of search documents.",
+            type=int,
+            default=SearchIndexRebuilder.DEFAULT_BATCH_SIZE,
+        )
+        parser.add_argument(
+            "--max-in-flight",
+            help="Maximum number of batches being uploaded at once.",
+            type=int,
+            default=SearchIndexRebuilder.DEFAULT_MAX_IN_FLIGHT,
+        )
 
-        # Remove all search coverage records so the
-        # SearchIndexCoverageProvider will start from scratch.
-        count = self.remove_search_coverage_records()
-        self.log.info("Deleted %d search coverage records.", count)
+    def __init__(self, _db=None, search_index_client=None, **kwargs):
+        super().__init__(_db, **kwargs)
+        self.search = search_index_client or ExternalSearchIndex(self._db)
+
+    def do_run(self, cmd_args=None):
+        parsed = self.parse_command_line(self._db, cmd_args=cmd_args)
+        if not parsed.resume:
+            # Calling setup_index will destroy the index and recreate it
+            # empty.
+            self.search.setup_index()
+
+            # Remove all search coverage records. The rebuild will add
+            # them back as works are indexed.
+            count = self.remove_search_coverage_records()
+            self.log.info("Deleted %d search coverage records.", count)
 
-        # Now let the SearchIndexCoverageProvider do its thing.
-        return super().do_run()
+        rebuilder = SearchIndexRebuilder(
+            self._db,
+            self.search,
+            processes=parsed.processes,
+            range_size=parsed.range_size,
+            batch_size=parsed.batch_size,
+            max_in_flight=parsed.max_in_flight,
+        )
+        progress = rebuilder.run(resume=parsed.resume)
+        return TimestampData(achievements=progress.achievements)
+
+
+class BlueGreenRebuildSearchIndexScript(RebuildSearchIndexScript):
+    """Build a new search index in the background, then switch searches
+    over to it without any downtime.
+    """
+
+    @classmethod
+    def arg_parser(cls):
+        parser = argparse.ArgumentParser()
+        cls.add_rebuilder_arguments(parser)
+        parser.add_argument(
+            "--index",
+            help="Name of the index to build. Defaults to the next index for the current mapping.",
+        )
+        parser.add_argument(
+            "--warm-up-query",
+            help="Run this search against the new index before switching over to it. May be repeated.",
+            action="append",
+            dest="warm_up_queries",
+        )
+        return parser
+
+    def do_run(self, cmd_args=None):
+        parsed = self.parse_command_line(self._db, cmd_args=cmd_args)
+        rebuild = BlueGreenRebuild(
+            self._db,
+            self.search,
+            new_index=parsed.index,
+            warm_up_queries=parsed.warm_up_queries,
+            processes=parsed.processes,
+            range_size=parsed.range_size,
+            batch_size=parsed.batch_size,
+            max_in_flight=parsed.max_in_flight,
+        )
+        progress = rebuild.run()
+        return TimestampData(
+            achievements="Now serving %s. %s"
+            % (self.search.works_index, progress.achievements)
+        )
 
 
 class SearchIndexCoverageRemover(TimestampScript, RemovesSearchCoverage):
@@ -0,0 +1,624 @@
+"""Rebuild the search index from scratch, quickly.
+
+The work ID space is split into fixed-size ranges. Document builder
+processes turn the works in each range into search documents, one
+batch at a time, while the main process uploads finished batches to
+Elasticsearch. Only a limited number of uploads are allowed in flight
+at once; when Elasticsearch falls behind, the builders block until it
+catches up.
+
+Progress through each range is checkpointed in a Timestamp, so an
+interrupted rebuild can pick up where it left off.
+"""
+import logging
+import multiprocessing
+import queue
+import time
+import traceback
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from sqlalchemy.orm import load_only
+from sqlalchemy.sql.functions import func
+
+from .config import Configuration
+from .external_search import SearchIndexChangeLogMonitor
+from .model import SessionManager, Timestamp, Work, WorkChange, WorkCoverageRecord
+from .util.datetime_helpers import utc_now
+
+# A range of work IDs. Both ends are inclusive.
+WorkIdRange = namedtuple("WorkIdRange", ["start", "end"])
+
+# A batch of search documents for works in `range`, ready to be
+# uploaded. `last_id` is the highest work ID in the batch.
+DocumentBatch = namedtuple("DocumentBatch", ["range", "last_id", "documents"])
+
+# A note that a builder has finished with a range. If something went
+# wrong, `exception` is a stack trace.
+RangeFinished = namedtuple("RangeFinished", ["range", "exception"])
+
+
+def work_id_ranges(_db, range_size):
+    """Split the work ID space into ranges of `range_size` IDs.
+
+    Range boundaries are always multiples of `range_size`, so the same
+    range size always produces the same ranges, even as works are added.
+    """
+    min_id, max_id = _db.query(func.min(Work.id), func.max(Work.id)).one()
+    if max_id is None:
+        return []
+    first = (min_id - 1) // range_size
+    last = (max_id - 1) // range_size
+    return [
+        WorkIdRange(i * range_size + 1, (i + 1) * range_size)
+        for i in range(first, last + 1)
+    ]
+
+
+def build_documents(_db, id_range, after_id, batch_size):
+    """Turn the presentation-ready works in a range into search
+    documents, one batch at a time.
+
+    :param after_id: Only works with IDs higher than this are included.
+    :yield: A DocumentBatch for every `batch_size` works.
+    """
+    while True:
+        works = (
+            _db.query(Work)
+            .filter(Work.id > after_id)
+            .filter(Work.id <= id_range.end)
+            .filter(Work.presentation_ready == True)
+            .order_by(Work.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not works:
+            break
+        after_id = works[-1].id
+        yield DocumentBatch(id_range, after_id, Work.to_search_documents(works))
+
+
+def _document_builder(url, tasks, results, batch_size):
+    """The main loop of a document builder process.
+
+    :param tasks: A queue of (WorkIdRange, after_id) 2-tuples. A
+        None on this queue means there's no more work to do.
+    :param results: A queue that receives a DocumentBatch for every
+        batch of documents, and a RangeFinished for every range.
+    """
+    _db = SessionManager.sessionmaker(url)()
+    try:
+        for id_range, after_id in iter(tasks.get, None):
+            exception = None
+            try:
+                for batch in build_documents(_db, id_range, after_id, batch_size):
+                    results.put(batch)
+                    # Don't let the session fill up with works we're
+                    # done with.
+                    _db.expunge_all()
+            except Exception:
+                exception = traceback.format_exc()
+            _db.rollback()
+            results.put(RangeFinished(id_range, exception))
+    finally:
+        _db.close()
+
+
+class RebuildProgress:
+    """Keep track of how a search index rebuild is going."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.documents = 0
+        self.failures = 0
+        self.failed_ranges = 0
+
+    @property
+    def elapsed(self):
+        return self.clock() - self.started
+
+    @property
+    def docs_per_second(self):
+        elapsed = self.elapsed
+        if not elapsed:
+            return 0.0
+        return self.documents / elapsed
+
+    @property
+    def achievements(self):
+        return (
+            "Documents indexed: %d. Failures: %d. Failed ranges: %d. "
+            "Elapsed: %.1f sec (%.1f docs/sec)."
+            % (
+                self.documents,
+                self.failures,
+                self.failed_ranges,
+                self.elapsed,
+                self.docs_per_second,
+            )
+        )
+
+
+class _RangeState:
+    """Track the batches of a single range that are still being
+    uploaded, so the range's checkpoint never moves past a batch that
+    hasn't made it into the search index.
+    """
+
+    def __init__(self, id_range, timestamp):
+        self.range = id_range
+        self.timestamp = timestamp
+        self.pending = deque()
+        self.built = False
+        self.failed = False
+
+    def add(self, batch):
+        entry = [batch.last_id, False]
+        self.pending.append(entry)
+        return entry
+
+    def advance(self):
+        """Move the checkpoint forward past every uploaded batch.
+
+        :return: True if the checkpoint moved.
+        """
+        if self.failed:
+            return False
+        counter = self.timestamp.counter
+        while self.pending and self.pending[0][1]:
+            counter = self.pending.popleft()[0]
+        if self.built and not self.pending:
+            counter = self.range.end
+        if counter == self.timestamp.counter:
+            return False
+        self.timestamp.counter = counter
+        return True
+
+
+class SearchIndexRebuilder:
+    """Fill a search index with documents for every presentation-ready
+    work, using several processes.
+    """
+
+    # Each range of work IDs is checkpointed in a Timestamp whose
+    # service name starts with this.
+    SERVICE_NAME = "Search index rebuild"
+
+    DEFAULT_RANGE_SIZE = 100000
+    DEFAULT_BATCH_SIZE = 500
+    DEFAULT_PROCESSES = 4
+    DEFAULT_MAX_IN_FLIGHT = 4
+
+    # Log a throughput report this often, in seconds.
+    REPORT_INTERVAL = 60
+
+    # How long to wait for a document builder before checking that
+    # the builders are still alive.
+    BUILDER_TIMEOUT = 10
+
+    def __init__(
+        self,
+        _db,
+        search_index,
+        processes=None,
+        range_size=None,
+        batch_size=None,
+        max_in_flight=None,
+        database_url=None,
+        clock=time.monotonic,
+        index=None,
+        defer_coverage=False,
+    ):
+        """Constructor.
+
+        :param search_index: An ExternalSearchIndex.
+        :param processes: The number of document builder processes. If
+            this is zero, documents are built in this process.
+        :param range_size: The number of work IDs in each checkpointed
+            range.
+        :param batch_size: The number of works in each batch of
+            documents.
+        :param max_in_flight: The maximum number of batches being
+            uploaded at once.
+        :param database_url: The database the document builders should
+            connect to. Defaults to the configured database.
+        :param index: The name of the index to fill. Defaults to the
+            search index's works_index.
+        :param defer_coverage: If this is True, works that are indexed
+            don't get coverage records until record_deferred_coverage()
+            is called, e.g. once the index is serving searches.
+        """
+        self._db = _db
+        self.search_index = search_index
+        self.index = index or search_index.works_index
+        if processes is None:
+            processes = self.DEFAULT_PROCESSES
+        self.processes = processes
+        self.range_size = range_size or self.DEFAULT_RANGE_SIZE
+        self.batch_size = batch_size or self.DEFAULT_BATCH_SIZE
+        self.max_in_flight = max_in_flight or self.DEFAULT_MAX_IN_FLIGHT
+        self.database_url = database_url
+        self.clock = clock
+        self.defer_coverage = defer_coverage
+        self.deferred_coverage = set()
+        self.log = logging.getLogger(self.SERVICE_NAME)
+
+    def service_name(self, id_range):
+        return "%s: works %d-%d" % (self.SERVICE_NAME, id_range.start, id_range.end)
+
+    def checkpoint(self, id_range):
+        """Find or create the Timestamp that tracks progress through a range.
+
+        Its counter is the highest work ID known to be in the index.
+        """
+        service = self.service_name(id_range)
+        timestamp = Timestamp.lookup(self._db, service, Timestamp.SCRIPT_TYPE, None)
+        if timestamp is None:
+            timestamp = Timestamp.stamp(
+                self._db, service, Timestamp.SCRIPT_TYPE, counter=id_range.start - 1
+            )
+        return timestamp
+
+    def clear_checkpoints(self):
+        """Forget about progress made by earlier rebuilds."""
+        self._db.query(Timestamp).filter(
+            Timestamp.service.like(self.SERVICE_NAME + ": %")
+        ).delete(synchronize_session=False)
+
+    def run(self, resume=False):
+        """Rebuild the index.
+
+        :param resume: If this is True, ranges that were (partly)
+            indexed by an earlier rebuild are not indexed again.
+        :return: A RebuildProgress.
+        """
+        if not resume:
+            self.clear_checkpoints()
+        ranges = {}
+        tasks = []
+        for id_range in work_id_ranges(self._db, self.range_size):
+            timestamp = self.checkpoint(id_range)
+            if timestamp.counter >= id_range.end:
+                # This range was completely indexed last time.
+                continue
+            ranges[id_range] = _RangeState(id_range, timestamp)
+            tasks.append((id_range, timestamp.counter))
+        self._db.commit()
+
+        self.progress = RebuildProgress(self.clock)
+        self.last_report = self.progress.started
+        if self.processes:
+            items = self.build_in_processes(tasks)
+        else:
+            items = self.build_in_process(tasks)
+
+        with ThreadPoolExecutor(self.max_in_flight) as executor:
+            in_flight = {}
+            for item in items:
+                state = ranges[item.range]
+                if isinstance(item, RangeFinished):
+                    state.built = True
+                    if item.exception:
+                        self.log.error(
+                            "Could not build documents for %s: %s",
+                            self.service_name(item.range),
+                            item.exception,
+                        )
+                        state.failed = True
+                        self.progress.failed_ranges += 1
+                    self.checkpoint_range(state)
+                    continue
+
+                # Don't start another upload until there's room for it.
+                # Until then, the builders will wait for us.
+                while len(in_flight) >= self.max_in_flight:
+                    self.finish_uploads(in_flight)
+                future = executor.submit(self.upload, item)
+                in_flight[future] = (state, state.add(item))
+
+            while in_flight:
+                self.finish_uploads(in_flight)
+
+        self.log.info(self.progress.achievements)
+        return self.progress
+
+    def build_in_process(self, tasks):
+        """Build documents in this process, one range at a time."""
+        for id_range, after_id in tasks:
+            for batch in build_documents(self._db, id_range, after_id, self.batch_size):
+                yield batch
+            yield RangeFinished(id_range, None)
+
+    def build_in_processes(self, tasks):
+        """Build documents in a pool of processes."""
+        context = multiprocessing.get_context("spawn")
+        task_queue = context.Queue()
+        # Bounding the result queue is what makes the builders wait for
+        # the uploads to catch up.
+        results = context.Queue(maxsize=self.max_in_flight * 2)
+        for task in tasks:
+            task_queue.put(task)
+        for i in range(self.processes):
+            task_queue.put(None)
+
+        url = self.database_url or Configuration.database_url()
+        builders = [
+            context.Process(
+                target=_document_builder,
+                args=(url, task_queue, results, self.batch_size),
+                daemon=True,
+            )
+            for i in range(self.processes)
+        ]
+        for builder in builders:
+            builder.start()
+        try:
+            remaining = len(tasks)
+            while remaining:
+                try:
+                    item = results.get(timeout=self.BUILDER_TIMEOUT)
+                except queue.Empty:
+                    if not any(builder.is_alive() for builder in builders):
+                        raise RuntimeError("All document builders have stopped.")
+                    continue
+                if isinstance(item, RangeFinished):
+                    remaining -= 1
+                yield item
+        finally:
+            for builder in builders:
+                builder.join(timeout=self.BUILDER_TIMEOUT)
+                if builder.is_alive():
+                    builder.terminate()
+
+    def upload(self, batch):
+        """Upload a batch of documents. This runs in a worker thread.
+
+        :return: A 2-tuple (batch, list of IDs of the works that were
+            indexed).
+        """
+        docs = batch.documents
+        for doc in docs:
+            doc["_index"] = self.index
+            doc["_type"] = self.search_index.work_document_type
+        success_count, errors = self.search_index.bulk(
+            docs, raise_on_error=False, raise_on_exception=False
+        )
+        if docs and len(errors) == len(docs):
+            # If the entire upload failed, try it one more time.
+            success_count, errors = self.search_index.bulk(
+                docs, raise_on_error=False, raise_on_exception=False
+            )
+        error_ids = {self.search_index.bulk_error_id(error) for error in errors}
+        for error in errors:
+            self.log.error("Could not index document: %r", error)
+        return batch, [doc["_id"] for doc in docs if doc["_id"] not in error_ids]
+
+    def finish_uploads(self, in_flight):
+        """Wait for at least one upload to finish, then record the
+        results of every upload that has finished.
+
+        :param in_flight: A dictionary mapping each upload's Future to
+            a 2-tuple (_RangeState, entry in _RangeState.pending).
+        """
+        done, not_done = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        for future in done:
+            state, entry = in_flight.pop(future)
+            try:
+                batch, indexed = future.result()
+            except Exception as e:
+                # We have no idea what made it into the index, so this
+                # range's checkpoint can't move any further.
+                self.log.error(
+                    "Error uploading documents for %s: %r",
+                    self.service_name(state.range),
+                    e,
+                    exc_info=e,
+                )
+                if not state.failed:
+                    state.failed = True
+                    self.progress.failed_ranges += 1
+                continue
+
+            self.progress.documents += len(indexed)
+            self.progress.failures += len(batch.documents) - len(indexed)
+            self.record_coverage(indexed)
+            entry[1] = True
+            self.checkpoint_range(state)
+
+        now = self.clock()
+        if now - self.last_report >= self.REPORT_INTERVAL:
+            self.last_report = now
+            self.log.info(self.progress.achievements)
+
+    def record_coverage(self, work_ids):
+        """Note that these works are up to date in the search index.
+
+        If coverage is being deferred, the works are only remembered
+        until record_deferred_coverage() is called.
+        """
+        if self.defer_coverage:
+            self.deferred_coverage.update(work_ids)
+            return
+        self._record_coverage(work_ids)
+
+    def record_deferred_coverage(self):
+        """Record coverage for every work whose coverage was deferred,
+        and stop deferring it.
+        """
+        self.defer_coverage = False
+        work_ids = sorted(self.deferred_coverage)
+        self.deferred_coverage = set()
+        for i in range(0, len(work_ids), self.batch_size):
+            self._record_coverage(work_ids[i : i + self.batch_size])
+            self._db.commit()
+
+    def _record_coverage(self, work_ids):
+        if not work_ids:
+            return
+        works = (
+            self._db.query(Work)
+            .options(load_only(Work.id))
+            .filter(Work.id.in_(work_ids))
+            .all()
+        )
+        WorkCoverageRecord.bulk_add(
+            works, WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION
+        )
+
+    def checkpoint_range(self, state):
+        if state.advance():
+            state.timestamp.finish = utc_now()
+        self._db.commit()
+
+
+class BlueGreenRebuild:
+    """Build a new search index while the current one keeps serving
+    searches, then move the works alias onto it.
+
+    Works that change while the new index is being built are replayed
+    from the work change log, both before and after the alias moves.
+    The old index is left alone, in case it's needed again.
+    """
+
+    SERVICE_NAME = SearchIndexChangeLogMonitor.HOLD_SERVICE_NAME
+
+    # Replicas and periodic refreshes only slow down a bulk load.
+    BULK_LOAD_SETTINGS = dict(number_of_replicas=0, refresh_interval="-1")
+
+    # Replay the change log at most this many times before moving the
+    # alias. A busy site may never stop changing works, but each pass
+    # should be shorter than the last.
+    MAX_REPLAY_PASSES = 3
+
+    def __init__(
+        self,
+        _db,
+        search_index,
+        new_index=None,
+        warm_up_queries=None,
+        batch_size=None,
+        **rebuilder_kwargs
+    ):
+        """Constructor.
+
+        :param search_index: An ExternalSearchIndex whose works alias
+            currently points to the index that's serving searches.
+        :param new_index: The name of the index to build. Defaults to
+            the next index for the current mapping.
+        :param warm_up_queries: Query strings to run against the new
+            index before the alias is moved. None runs a query that
+            matches everything.
+        :param rebuilder_kwargs: Passed into SearchIndexRebuilder.
+        """
+        self._db = _db
+        self.search_index = search_index
+        self.new_index = new_index
+        if warm_up_queries is None:
+            warm_up_queries = [None, search_index.test_search_term]
+        self.warm_up_queries = warm_up_queries
+        self.batch_size = batch_size or SearchIndexRebuilder.DEFAULT_BATCH_SIZE
+        self.rebuilder_kwargs = dict(rebuilder_kwargs, batch_size=self.batch_size)
+        self.log = logging.getLogger(self.SERVICE_NAME)
+
+    def run(self):
+        """Build the new index and switch over to it.
+
+        :return: The RebuildProgress of the bulk load.
+        """
+        old_index = self.search_index.works_index
+        new_index = self.new_index or self.search_index.next_works_index_name(self._db)
+        if new_index == old_index:
+            raise ValueError(
+                "Index %s is serving searches and can't be rebuilt in place."
+                % new_index
+            )
+
+        # Anything that changes from now on needs to be replayed into
+        # the new index, so stop the change log from being cleaned up.
+        position = self._db.query(func.max(WorkChange.id)).scalar() or 0
+        self.hold = Timestamp.stamp(
+            self._db, self.SERVICE_NAME, Timestamp.SCRIPT_TYPE, counter=position
+        )
+        self._db.commit()
+        try:
+            return self._run(old_index, new_index)
+        finally:
+            self.hold.update(counter=Timestamp.CLEAR_VALUE, finish=utc_now())
+            self._db.commit()
+
+    def _run(self, old_index, new_index):
+        settings = self.search_index.index_settings(old_index)
+
+        self.log.info("Building index %s to replace %s", new_index, old_index)
+        self.search_index.setup_index(new_index=new_index, **self.BULK_LOAD_SETTINGS)
+        # The works in the new index aren't really covered until the
+        # new index is serving searches.
+        self.rebuilder = SearchIndexRebuilder(
+            self._db,
+            self.search_index,
+            index=new_index,
+            defer_coverage=True,
+            **self.rebuilder_kwargs
+        )
+        progress = self.rebuilder.run()
+        if progress.failed_ranges:
+            raise Exception(
+                "Not moving the alias to %s: %d ranges could not be indexed."
+                % (new_index, progress.failed_ranges)
+            )
+
+        for i in range(self.MAX_REPLAY_PASSES):
+            if not self.replay():
+                break
+
+        if not self.search_index.finish_bulk_load(
+            new_index,
+            settings.get("number_of_replicas", 1),
+            settings.get("refresh_interval"),
+        ):
+            self.log.warning("Replicas of %s are not ready yet.", new_index)
+        self.search_index.warm_up(new_index, self.warm_up_queries)
+
+        self.search_index.transfer_current_alias(self._db, new_index)
+        self.log.info("Works alias moved from %s to %s", old_index, new_index)
+        self.rebuilder.record_deferred_coverage()
+
+        # Until the alias moved, changes were still going into the old
+        # index. Catch the new index up one last time.
+        self.replay()
+        return progress
+
+    def replay(self):
+        """Reindex every work that changed since the last replay.
+
+        :return: The number of works reindexed.
+        """
+        total = 0
+        position = self.hold.counter
+        while True:
+            changes = (
+                self._db.query(WorkChange.id, WorkChange.work_id)
+                .filter(WorkChange.id > position)
+                .order_by(WorkChange.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            if not changes:
+                break
+            position = changes[-1].id
+            work_ids = sorted({work_id for (id, work_id) in changes})
+            works = (
+                self._db.query(Work)
+                .filter(Work.id.in_(work_ids))
+                .filter(Work.presentation_ready == True)
+                .all()
+            )
+            batch = DocumentBatch(None, position, Work.to_search_documents(works))
+            batch, indexed = self.rebuilder.upload(batch)
+            self.rebuilder.record_coverage(indexed)
+            total += len(indexed)
+            self.hold.counter = position
+            self._db.commit()
+        self.log.info("Replayed %d changed works.", total)
+        return total
@@ -1645,6 +1645,14 @@ def session_fixture():
         del os.environ["TESTING"]
 
 
+@pytest.fixture(autouse=True)
+def classifier_cache():
+    # Classifier.classify() results are cached for the life of the
+    # process; don't let one test's results leak into another's.
+    yield
+    Classifier.clear_cache()
+
+
 def pytest_configure(config):
     # register our custom marks with pytest
     config.addinivalue_line(
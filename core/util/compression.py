@@ -0,0 +1,104 @@
+"""Compress HTTP response bodies with whatever content-coding the client
+prefers.
+
+gzip is always available. brotli is used if the optional `brotli`
+package is installed.
+"""
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from werkzeug.datastructures import Accept
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP = "gzip"
+BROTLI = "br"
+
+# The content-codings we can produce, most preferred first. When a
+# client is equally happy with several of these, it gets the first
+# one on the list.
+ENCODINGS: List[str] = ([BROTLI] if brotli is not None else []) + [GZIP]
+
+# When compressing a response body incrementally, feed it to the
+# compressor this many bytes at a time.
+CHUNK_SIZE = 64 * 1024
+
+
+class _GzipCompressor:
+    """Give a zlib compressor the same interface as a brotli compressor."""
+
+    def __init__(self):
+        # A wbits value of 16 + 15 makes zlib write a gzip header and
+        # trailer. Unlike gzip.GzipFile, zlib leaves the modification
+        # time in the header blank, so compressing the same value
+        # twice gives the same result.
+        self._compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def compressor(encoding: str):
+    """Create an object that compresses data incrementally.
+
+    :param encoding: One of the values in ENCODINGS.
+    :return: An object with a process() method, which takes a chunk of
+        data and returns whatever compressed output is ready, and a
+        finish() method, which returns the rest of the compressed output.
+    """
+    if encoding == GZIP:
+        return _GzipCompressor()
+    if encoding == BROTLI and brotli is not None:
+        return brotli.Compressor()
+    raise ValueError("Unsupported content-coding: %s" % encoding)
+
+
+def negotiate(accept_encodings: Accept) -> Optional[str]:
+    """Choose the content-coding that best matches a client's
+    Accept-Encoding header.
+
+    :param accept_encodings: A parsed Accept-Encoding header, such as
+        flask.request.accept_encodings.
+    :return: One of the values in ENCODINGS, or None if the client
+        doesn't accept any of them.
+    """
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress an entire value at once."""
+    c = compressor(encoding)
+    return c.process(data) + c.finish()
+
+
+def compress_all(data: bytes) -> Dict[str, bytes]:
+    """Compress a value with every supported content-coding.
+
+    :return: A dictionary mapping content-codings to compressed values.
+    """
+    return {encoding: compress(data, encoding) for encoding in ENCODINGS}
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a series of chunks as they come in, without ever holding
+    the entire compressed value in memory.
+    """
+    c = compressor(encoding)
+    for chunk in chunks:
+        compressed = c.process(chunk)
+        if compressed:
+            yield compressed
+    yield c.finish()
+
+
+def split(data: bytes, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Split a value into chunks suitable for compress_chunks."""
+    view = memoryview(data)
+    for start in range(0, len(view), size):
+        yield bytes(view[start : start + size])
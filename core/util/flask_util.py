@@ -1,8 +1,10 @@
 """Utilities for Flask applications."""
 import datetime
 import time
+from collections.abc import Iterator
 from wsgiref.handlers import format_date_time
 
+import flask
 from flask import Response as FlaskResponse
 from lxml import etree
 
@@ -44,6 +46,7 @@ class Response(FlaskResponse):
         direct_passthrough=False,
         max_age=0,
         private=None,
+        precompressed=None,
     ):
         """Constructor.
 
@@ -56,7 +59,18 @@ class Response(FlaskResponse):
         :param private: If this is True, then the response contains
             information from an authenticated client and should not be stored
             in intermediate caches.
+        :param precompressed: A dictionary mapping content-codings
+            (e.g. "gzip") to compressed versions of `response`. If the
+            client asks for one of these content-codings, the
+            @compressible decorator will send the compressed version as
+            is, rather than compressing the response again.
+
+        If `response` is an iterator (such as a generator), the strings
+        it yields are sent to the client as they become available. The
+        iterator keeps the request context, and with it the database
+        session, until it's exhausted.
         """
+        self.precompressed = precompressed or {}
         max_age = max_age or 0
         try:
             max_age = int(max_age)
@@ -75,6 +89,9 @@ class Response(FlaskResponse):
         body = response
         if isinstance(body, etree._Element):
             body = etree.tostring(body)
+        elif isinstance(body, Iterator):
+            if flask.has_request_context():
+                body = flask.stream_with_context(body)
         elif not isinstance(body, (bytes, str)):
             body = str(body)
 
@@ -149,6 +166,7 @@ class OPDSFeedResponse(Response):
         direct_passthrough=False,
         max_age=None,
         private=None,
+        precompressed=None,
     ):
 
         mimetype = mimetype or OPDSFeed.ACQUISITION_FEED_TYPE
@@ -164,6 +182,7 @@ class OPDSFeedResponse(Response):
             direct_passthrough=direct_passthrough,
             max_age=max_age,
             private=private,
+            precompressed=precompressed,
         )
 
 
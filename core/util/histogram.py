@@ -0,0 +1,64 @@
+"""Keep track of how long things take, in this process."""
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+
+class LatencyHistogram:
+    """Count observed durations in a fixed set of buckets.
+
+    Buckets are cumulative: a duration of 0.3 seconds is counted in
+    every bucket whose upper bound is at least 0.3.
+    """
+
+    # Upper bounds of the buckets, in seconds. Anything slower goes
+    # into the "+Inf" bucket.
+    DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+    def __init__(self, buckets: Optional[Iterable[float]] = None):
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """Record one observed duration."""
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[i] += 1
+            self.counts[-1] += 1
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            buckets = OrderedDict(
+                (str(bound), count) for bound, count in zip(self.buckets, self.counts)
+            )
+            buckets["+Inf"] = self.counts[-1]
+            return dict(count=self.count, sum=self.total, buckets=buckets)
+
+
+class LatencyHistograms:
+    """A set of LatencyHistograms, one per name."""
+
+    def __init__(self, buckets: Optional[Iterable[float]] = None):
+        self.buckets = buckets
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> LatencyHistogram:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram(self.buckets)
+            return self.histograms[name]
+
+    def observe(self, name: str, seconds: float):
+        self[name].observe(seconds)
+
+    def as_dict(self) -> Dict[str, Dict]:
+        with self._lock:
+            histograms = dict(self.histograms)
+        return {name: histogram.as_dict() for name, histogram in histograms.items()}
@@ -1,6 +1,13 @@
 import logging
-from typing import Callable, Optional
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from threading import RLock
+from typing import Callable, Dict, Generator, Optional, Set, Tuple
 from urllib.parse import urlparse
+from weakref import WeakSet
 
 import requests
 from flask_babel import lazy_gettext as _
@@ -188,9 +195,253 @@ class RequestTimedOut(RequestNetworkException, requests.exceptions.Timeout):
     internal_message = "Timeout accessing %s: %s"
 
 
+class NoStoredCookiesPolicy(DefaultCookiePolicy):
+    """A cookie policy that never lets a session keep a cookie.
+
+    Cookies set during a redirect chain are still sent along the
+    chain, since `requests` tracks those on the request rather than
+    the session. Cookies the caller passes in are sent as usual.
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class SessionRegistry:
+    """Keep pooled, keep-alive `requests` sessions around so that
+    repeated requests to the same integration don't pay for a new TCP
+    connection and TLS handshake every time.
+
+    Sessions are keyed on (integration, scheme, host, max_retry_count).
+    A session that hasn't been used for `idle_timeout` seconds is
+    closed and dropped the next time the registry is consulted, unless
+    a request is still using it.
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_IDLE_TIMEOUT = 300
+
+    # Set these environment variables to configure the registry used
+    # by HTTP.
+    POOL_SIZE_ENVIRONMENT_VARIABLE = "PALACE_HTTP_POOL_SIZE"
+    IDLE_TIMEOUT_ENVIRONMENT_VARIABLE = "PALACE_HTTP_IDLE_TIMEOUT"
+
+    # Every registry, so they can all be reset in a forked process.
+    _registries: "WeakSet[SessionRegistry]" = WeakSet()
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Constructor.
+
+        :param pool_size: The maximum number of connections to keep
+            open to any one host.
+        :param idle_timeout: Close a session after it's gone this many
+            seconds without being used.
+        :param clock: A function returning the current time in seconds.
+            Only intended to be replaced in tests.
+        """
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._reset()
+        self._registries.add(self)
+
+    def _reset(self) -> None:
+        self._lock = RLock()
+        self._sessions: Dict[Tuple, sessions.Session] = {}
+        self._last_used: Dict[sessions.Session, float] = {}
+
+        # The number of requests currently using each session, and
+        # the sessions that were dropped while requests were using
+        # them. Those are closed once the last request is done.
+        self._checkouts: Dict[sessions.Session, int] = defaultdict(int)
+        self._retired: Set[sessions.Session] = set()
+
+    @classmethod
+    def from_environment(cls) -> "SessionRegistry":
+        """Build a SessionRegistry based on environment variables."""
+        pool_size = os.environ.get(cls.POOL_SIZE_ENVIRONMENT_VARIABLE)
+        idle_timeout = os.environ.get(cls.IDLE_TIMEOUT_ENVIRONMENT_VARIABLE)
+        registry = cls()
+        registry.configure(
+            pool_size=int(pool_size) if pool_size else None,
+            idle_timeout=float(idle_timeout) if idle_timeout else None,
+        )
+        return registry
+
+    @classmethod
+    def after_fork(cls) -> None:
+        """Forget every session in a newly forked process.
+
+        A forked process (such as a uWSGI worker) inherits its parent's
+        sockets. Using or closing them would interfere with the
+        parent's connections, so the sessions are dropped without
+        being closed.
+        """
+        for registry in list(cls._registries):
+            registry._reset()
+
+    def configure(
+        self, pool_size: Optional[int] = None, idle_timeout: Optional[float] = None
+    ) -> None:
+        """Change the pool size or idle timeout.
+
+        Sessions that already exist are dropped, so that the new
+        settings take effect on the next request.
+        """
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if idle_timeout is not None:
+            self.idle_timeout = idle_timeout
+        self.clear()
+
+    @classmethod
+    def key(
+        cls,
+        url: str,
+        integration: Optional[str] = None,
+        max_retry_count: Optional[int] = None,
+    ) -> Tuple:
+        parsed = urlparse(url)
+        return (integration, parsed.scheme, parsed.netloc, max_retry_count)
+
+    def session_for(
+        self,
+        url: str,
+        integration: Optional[str] = None,
+        max_retry_count: Optional[int] = None,
+    ) -> sessions.Session:
+        """Find or create a session suitable for making a request to `url`.
+
+        A session obtained this way may be closed once it's been idle
+        for too long. Use checkout() to keep it open while it's used.
+
+        :param integration: The name of the integration making the
+            request, e.g. "Overdrive". Requests from different integrations
+            never share a session, even if they go to the same host.
+        :param max_retry_count: Retry failed requests this many times.
+        """
+        key = self.key(url, integration, max_retry_count)
+        with self._lock:
+            now = self.clock()
+            self.evict_idle(now)
+            session = self._sessions.get(key)
+            if session is not None:
+                self.hits += 1
+            else:
+                session = self._create_session(max_retry_count)
+                self._sessions[key] = session
+                self.misses += 1
+            self._last_used[session] = now
+            return session
+
+    @contextmanager
+    def checkout(
+        self,
+        url: str,
+        integration: Optional[str] = None,
+        max_retry_count: Optional[int] = None,
+    ) -> Generator[sessions.Session, None, None]:
+        """Find or create a session, as session_for() does, and make
+        sure it isn't closed until the `with` block is finished.
+        """
+        with self._lock:
+            session = self.session_for(url, integration, max_retry_count)
+            self._checkouts[session] += 1
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self._checkouts[session] -= 1
+                if not self._checkouts[session]:
+                    del self._checkouts[session]
+                    if session in self._retired:
+                        self._retired.discard(session)
+                        session.close()
+                    elif session in self._last_used:
+                        self._last_used[session] = self.clock()
+
+    def _create_session(self, max_retry_count: Optional[int]) -> sessions.Session:
+        session = sessions.Session()
+
+        # A pooled session is shared by requests made on behalf of
+        # different patrons and libraries, so it must not carry cookies
+        # from one request to the next.
+        session.cookies.set_policy(NoStoredCookiesPolicy())
+
+        if max_retry_count is not None:
+            max_retries = Retry(total=max_retry_count)
+        else:
+            max_retries = Retry(total=0, read=False)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, max_retries=max_retries
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _drop(self, key: Tuple) -> None:
+        """Forget about a session, and close it if no one's using it."""
+        session = self._sessions.pop(key)
+        del self._last_used[session]
+        if session in self._checkouts:
+            self._retired.add(session)
+        else:
+            session.close()
+
+    def evict_idle(self, now: Optional[float] = None) -> None:
+        """Close every session that has been idle for too long."""
+        with self._lock:
+            if now is None:
+                now = self.clock()
+            for key, session in list(self._sessions.items()):
+                if session in self._checkouts:
+                    continue
+                if now - self._last_used[session] >= self.idle_timeout:
+                    self._drop(key)
+                    self.evictions += 1
+
+    def clear(self) -> None:
+        """Forget about every session, closing each one once no
+        request is using it.
+        """
+        with self._lock:
+            for key in list(self._sessions):
+                self._drop(key)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters describing how well the pool is working."""
+        return dict(
+            sessions=len(self),
+            in_use=len(self._checkouts),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+# A forked process, such as a uWSGI worker, needs its own connections.
+os.register_at_fork(after_in_child=SessionRegistry.after_fork)
+
+
 class HTTP:
     """A helper for the `requests` module."""
 
+    # Requests made through `request_with_timeout` and friends reuse
+    # the sessions kept in this registry.
+    sessions = SessionRegistry.from_environment()
+
     @classmethod
     def get_with_timeout(cls, url: str, *args, **kwargs) -> Response:
         """Make a GET request with timeout handling."""
@@ -232,7 +483,9 @@ class HTTP:
         :param make_request_with: A function that actually makes the
             HTTP request.
         :param args: Positional arguments for the request function.
-        :param kwargs: Keyword arguments for the request function.
+        :param kwargs: Keyword arguments for the request function. The
+            special `integration` keyword argument names the integration
+            making the request; it's used to pick a pooled session.
         """
         process_response_with = kwargs.pop(
             "process_response_with", cls._process_response
@@ -246,6 +499,7 @@ class HTTP:
             kwargs["timeout"] = 20
 
         max_retry_count = kwargs.pop("max_retry_count", None)
+        integration = kwargs.pop("integration", None)
 
         # Unicode data can't be sent over the wire. Convert it
         # to UTF-8.
@@ -276,17 +530,9 @@ class HTTP:
                 args = args + (url,)
 
             if make_request_with == sessions.Session.request:
-                with sessions.Session() as session:
-                    if max_retry_count is not None:
-                        # TODO: Verify the status codes for which it retries.
-                        #  Are there any status codes for which we would NOT want to retry (e.g., 401, 403)?
-                        #  Are there some that we want to ensure get retried (e.g., 502, which we get a lot).
-                        retry_strategy = Retry(total=max_retry_count)
-                        adapter = HTTPAdapter(max_retries=retry_strategy)
-
-                        session.mount("http://", adapter)
-                        session.mount("https://", adapter)
-
+                with cls.sessions.checkout(
+                    url, integration=integration, max_retry_count=max_retry_count
+                ) as session:
                     response = session.request(*args, **kwargs)
             else:
                 response = make_request_with(*args, **kwargs)
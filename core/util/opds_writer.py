@@ -165,6 +165,7 @@ class AtomFeed:
             self.E.updated(self._strftime(utc_now())),
             self.E.link(href=url, rel="self"),
         )
+        self._closing_tag = None
         super().__init__(**kwargs)
 
     def __str__(self):
@@ -172,6 +173,41 @@ class AtomFeed:
             return None
         return etree.tostring(self.feed, encoding="unicode", pretty_print=True)
 
+    def flush(self):
+        """Serialize the tags added to this feed since the last call,
+        then remove them from the feed.
+
+        The first call also returns the feed's opening tag. Together
+        with finish(), this makes it possible to send out a feed a
+        piece at a time without keeping the whole document in memory.
+        The pieces add up to exactly what str(self) would have
+        returned.
+
+        :return: A string.
+        """
+        if not len(self.feed):
+            return ""
+        data = etree.tostring(self.feed, encoding="unicode", pretty_print=True)
+        del self.feed[:]
+        opening, data = data.split("\n", 1)
+        data, closing = data.rsplit("</", 1)
+        if self._closing_tag is None:
+            self._closing_tag = "</" + closing
+            data = opening + "\n" + data
+        return data
+
+    def finish(self):
+        """Serialize whatever flush() has not sent out yet, along with
+        the feed's closing tag.
+
+        :return: A string.
+        """
+        data = self.flush()
+        if self._closing_tag is None:
+            # There was never anything in the feed.
+            return str(self)
+        return data + self._closing_tag
+
 
 class OPDSFeed(AtomFeed):
 
@@ -1,6 +1,7 @@
 import logging
-from queue import Queue
-from threading import Thread
+import time
+from queue import Full, Queue
+from threading import Event, Lock, Thread
 
 # Much of the work in this file is based on
 # https://github.com/shazow/workerpool, with
@@ -179,3 +180,100 @@ class DatabaseJob(Job):
 
     def do_run(self):
         raise NotImplementedError()
+
+
+# Marks the end of the items produced by prefetch()'s background Thread.
+_DONE = object()
+
+
+def prefetch(iterable, size):
+    """Iterate over `iterable` in a background Thread, staying up to
+    `size` items ahead of the caller.
+
+    This lets slow work that produces items (such as fetching pages
+    from a vendor API) overlap with slow work that consumes them
+    (such as writing to the database). Since the items are produced
+    in another Thread, `iterable` must not use the caller's database
+    session.
+
+    If `iterable` raises an exception, the exception is raised again
+    here once the caller has seen every item that came before it.
+
+    :param size: The number of items that may be waiting for the
+        caller at any one time. If this is zero, `iterable` is
+        consumed in the calling Thread, as usual.
+    """
+    if size < 1:
+        yield from iterable
+        return
+
+    items = Queue(maxsize=size)
+    stopped = Event()
+
+    def put(item, exception=None):
+        # Wait for there to be room in the queue, unless the caller
+        # has stopped listening.
+        while not stopped.is_set():
+            try:
+                items.put((item, exception), timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_DONE, e)
+            return
+        put(_DONE)
+
+    Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, exception = items.get()
+            if item is _DONE:
+                if exception:
+                    raise exception
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+class RateLimiter:
+    """Keep any number of Threads from doing something more than a
+    certain number of times per second, between them.
+    """
+
+    def __init__(self, per_second, clock=time.monotonic, sleep=time.sleep):
+        """Constructor.
+
+        :param per_second: The number of times per second that wait()
+            may return. If this is None, wait() always returns
+            immediately.
+        :param clock: A function returning the current time in seconds.
+        :param sleep: A function that sleeps for a number of seconds.
+            `clock` and `sleep` are only intended to be replaced in tests.
+        """
+        self.interval = 1.0 / per_second if per_second else 0
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = Lock()
+        self._next = None
+
+    def wait(self):
+        """Block until it's this Thread's turn."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = self.clock()
+            if self._next is None or self._next < now:
+                self._next = now
+            delay = self._next - now
+            self._next += self.interval
+        if delay > 0:
+            self.sleep(delay)
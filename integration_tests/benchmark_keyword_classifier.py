@@ -0,0 +1,100 @@
+"""Time KeywordBasedClassifier against a corpus of subject names.
+
+Usage: python integration_tests/benchmark_keyword_classifier.py [subjects.txt]
+
+subjects.txt should contain one subject name per line -- for instance,
+the output of `select name from subjects where name is not null`. If
+no file is given, the BISAC, DDC and LCC subject names that ship with
+this package are used.
+
+The results are compared against a re-implementation of the old
+matching code, which built and compiled each genre's regular
+expression every time it was used.
+"""
+import csv
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from core.classifier import resource_dir  # noqa: E402
+from core.classifier.keyword import Eg, KeywordBasedClassifier  # noqa: E402
+
+
+def load_corpus(path=None):
+    if path:
+        with open(path) as f:
+            return [line.strip() for line in f if line.strip()]
+
+    names = []
+    with open(os.path.join(resource_dir, "bisac.csv")) as f:
+        names.extend(name for code, name in csv.reader(f))
+    for filename in ("dewey_1000.json", "lcc_one_level.json"):
+        with open(os.path.join(resource_dir, filename)) as f:
+            names.extend(json.load(f).values())
+    return names
+
+
+def uncompiled_search(kw, term, exclude_examples=False):
+    """The way match_kw used to work."""
+    keywords = kw["keywords"]
+    if not keywords:
+        return None
+    if exclude_examples:
+        keywords = [keyword for keyword in keywords if not isinstance(keyword, Eg)]
+    else:
+        keywords = [str(keyword) for keyword in keywords]
+    if not keywords:
+        return None
+    return re.compile(r"\b(%s)\b" % "|".join(keywords), re.I).search(term)
+
+
+def uncompiled_genre(cls, name, exclude_examples=False):
+    """The way KeywordBasedClassifier.genre used to work."""
+    matches = Counter()
+    for l in [cls.LEVEL_3_KEYWORDS, cls.LEVEL_2_KEYWORDS, cls.CATCHALL_KEYWORDS]:
+        for genre, keywords in list(l.items()):
+            if keywords and uncompiled_search(keywords, name, exclude_examples):
+                matches[genre] += 1
+        most_specific_genre = None
+        most_specific_count = 0
+        for genre, count in matches.most_common():
+            if not most_specific_genre or (
+                most_specific_genre.has_subgenre(genre) and count >= most_specific_count
+            ):
+                most_specific_genre = genre
+                most_specific_count = count
+        if most_specific_genre:
+            break
+    return most_specific_genre
+
+
+def timed(f, names):
+    a = time.time()
+    results = [f(name) for name in names]
+    return results, time.time() - a
+
+
+if __name__ == "__main__":
+    names = load_corpus(sys.argv[1] if len(sys.argv) > 1 else None)
+    print("Classifying %d subject names." % len(names))
+
+    old, old_elapsed = timed(
+        lambda name: uncompiled_genre(KeywordBasedClassifier, name), names
+    )
+    new, new_elapsed = timed(
+        lambda name: KeywordBasedClassifier.genre(None, name), names
+    )
+
+    differences = [(name, a, b) for name, a, b in zip(names, old, new) if a is not b]
+    print("Old: %.2f sec (%.0f names/sec)" % (old_elapsed, len(names) / old_elapsed))
+    print("New: %.2f sec (%.0f names/sec)" % (new_elapsed, len(names) / new_elapsed))
+    print("Speedup: %.1fx" % (old_elapsed / new_elapsed))
+    print("Genres assigned: %d" % len([x for x in new if x]))
+    print("Differences: %d" % len(differences))
+    for name, a, b in differences:
+        print(f"  {name}: {a} != {b}")
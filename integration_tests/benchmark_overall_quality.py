@@ -0,0 +1,86 @@
+"""Time Measurement.overall_qualities against Measurement.overall_quality.
+
+Usage: python integration_tests/benchmark_overall_quality.py [number of works]
+
+A random set of measurements is generated for each work (100,000 works
+by default) using the data sources and quantities that the percentile
+and rating scales know about. Quality is then calculated for every work
+both ways: once by calling overall_quality() on each work's Measurement
+objects, and once by calling overall_qualities() on plain rows, the
+way WorkPresentationBatch does. No database is needed.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from core.model import DataSource, Measurement  # noqa: E402
+
+
+def sources_and_quantities():
+    """Every (quantity, data source) pair the scales know how to normalize,
+    plus one they don't.
+    """
+    pairs = []
+    for quantity, by_data_source in Measurement.PERCENTILE_SCALES.items():
+        for data_source in by_data_source:
+            pairs.append((quantity, data_source))
+    for data_source in Measurement.RATING_SCALES:
+        pairs.append((Measurement.RATING, data_source))
+    pairs.append((Measurement.QUALITY, DataSource.METADATA_WRANGLER))
+    pairs.append(("Some other quantity", DataSource.GUTENBERG))
+    return pairs
+
+
+def generate(works):
+    random.seed(0)
+    pairs = sources_and_quantities()
+    data_sources = {name: DataSource(name=name) for quantity, name in pairs}
+    rows = []
+    measurements = {}
+    for work_id in range(works):
+        measurements[work_id] = []
+        for quantity, data_source in random.sample(pairs, random.randint(1, 6)):
+            if quantity == Measurement.RATING:
+                value = random.uniform(1, 5)
+            elif quantity == Measurement.QUALITY:
+                value = random.random()
+            else:
+                value = random.randint(1, 10000)
+            weight = random.choice([1, 1, 1, 10])
+            rows.append((work_id, quantity, data_source, value, weight, None))
+            measurements[work_id].append(
+                Measurement(
+                    quantity_measured=quantity,
+                    data_source=data_sources[data_source],
+                    value=value,
+                    weight=weight,
+                )
+            )
+    return rows, measurements
+
+
+if __name__ == "__main__":
+    works = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows, measurements = generate(works)
+    print("Calculating quality for %d works (%d measurements)." % (works, len(rows)))
+
+    a = time.time()
+    old = {
+        work_id: Measurement.overall_quality(l) for work_id, l in measurements.items()
+    }
+    old_elapsed = time.time() - a
+
+    a = time.time()
+    new = Measurement.overall_qualities(rows)
+    new_elapsed = time.time() - a
+
+    differences = [
+        work_id for work_id in old if abs(old[work_id] - new.get(work_id, 0)) > 1e-9
+    ]
+    print("Per-object: %.2f sec" % old_elapsed)
+    print("Batched: %.2f sec" % new_elapsed)
+    print("Speedup: %.1fx" % (old_elapsed / new_elapsed))
+    print("Differences: %d" % len(differences))
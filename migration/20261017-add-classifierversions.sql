@@ -0,0 +1,10 @@
+-- The version of each classifier's rules that was in effect the last
+-- time subjects of its type were classified. Subjects are only
+-- reclassified when their classifier's version changes.
+CREATE TABLE IF NOT EXISTS classifierversions (
+    id SERIAL NOT NULL,
+    subject_type VARCHAR NOT NULL,
+    version VARCHAR,
+    PRIMARY KEY (id),
+    UNIQUE (subject_type)
+);
@@ -0,0 +1,11 @@
+-- The work change log: works whose search documents need to be
+-- reindexed. Entries are added as works change and removed by the
+-- search index change log monitor once it has reindexed them.
+CREATE TABLE IF NOT EXISTS workchanges (
+    id BIGSERIAL NOT NULL,
+    work_id INTEGER,
+    created TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (id),
+    FOREIGN KEY(work_id) REFERENCES works (id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_workchanges_work_id ON workchanges (work_id);
@@ -0,0 +1,32 @@
+-- Each work's equivalent identifiers, copied out of the
+-- recursiveequivalentscache so search documents can be built with
+-- plain joins.
+CREATE TABLE IF NOT EXISTS workequivalentidentifiers (
+    id SERIAL NOT NULL,
+    work_id INTEGER NOT NULL,
+    parent_identifier_id INTEGER NOT NULL,
+    identifier_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (work_id, identifier_id),
+    FOREIGN KEY(work_id) REFERENCES works (id) ON DELETE CASCADE,
+    FOREIGN KEY(parent_identifier_id) REFERENCES identifiers (id) ON DELETE CASCADE,
+    FOREIGN KEY(identifier_id) REFERENCES identifiers (id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_workequivalentidentifiers_work_id ON workequivalentidentifiers (work_id);
+CREATE INDEX IF NOT EXISTS ix_workequivalentidentifiers_parent_identifier_id ON workequivalentidentifiers (parent_identifier_id);
+
+-- Backfill the table for existing works, so search documents don't have
+-- to wait for the equivalent identifiers coverage provider to reach
+-- every work. A work's primary identifier is always equivalent to
+-- itself.
+INSERT INTO workequivalentidentifiers (work_id, parent_identifier_id, identifier_id)
+SELECT works.id, recursiveequivalentscache.parent_identifier_id, recursiveequivalentscache.identifier_id
+FROM works
+JOIN editions ON works.presentation_edition_id = editions.id
+JOIN recursiveequivalentscache ON recursiveequivalentscache.parent_identifier_id = editions.primary_identifier_id
+UNION
+SELECT works.id, editions.primary_identifier_id, editions.primary_identifier_id
+FROM works
+JOIN editions ON works.presentation_edition_id = editions.id
+WHERE editions.primary_identifier_id IS NOT NULL
+ON CONFLICT DO NOTHING;
@@ -255,6 +255,52 @@ class TestSIP2AuthenticationProvider(DatabaseTest):
         assert None == patrondata.external_type
         assert PatronData.NO_VALUE == patrondata.block_reason
 
+    def test_connections_are_pooled(self):
+        p = SIP2AuthenticationProvider
+        integration = self._external_integration(self._str)
+        factory = MockSIPClientFactory()
+        auth = p(self._default_library, integration, client=factory)
+        client = auth._client
+
+        # Two patrons are authenticated, one after the other.
+        for i in range(2):
+            client.queue_response(self.sierra_valid_login)
+            client.queue_response(self.end_session_response)
+            patrondata = auth.remote_authenticate("user", "pass")
+            assert "12345" == patrondata.authorization_identifier
+
+        # But only one connection was made to the server.
+        assert ["Creating new socket connection."] == client.status
+        assert 4 == len(client.requests)
+
+        # Another provider created from the same integration, with the
+        # same settings, shares the same pool of connections.
+        pool = auth._pool
+        assert pool is auth._pool
+        assert pool is p(self._default_library, integration, client=factory)._pool
+
+    def test_pool_is_replaced_when_settings_change(self):
+        p = SIP2AuthenticationProvider
+        integration = self._external_integration(self._str)
+        integration.url = "server.local"
+        factory = MockSIPClientFactory()
+        pool = p(self._default_library, integration, client=factory)._pool
+
+        closed = []
+        pool.close = lambda: closed.append(pool)
+
+        # If the integration is reconfigured, the old pool is closed
+        # and a new one takes its place.
+        integration.url = "other-server.local"
+        new_pool = p(self._default_library, integration, client=factory)._pool
+        assert new_pool is not pool
+        assert [pool] == closed
+
+        # A provider that was given a specific SIPClient doesn't use a
+        # pool at all.
+        auth = p(self._default_library, integration, client=MockSIPClient())
+        assert None == auth._pool
+
     def test_ioerror_during_connect_becomes_remoteintegrationexception(self):
         """If the IP of the circulation manager has not been whitelisted,
         we generally can't even connect to the server.
@@ -5,7 +5,7 @@ import ssl
 
 import pytest
 
-from api.sip.client import MockSIPClient, SIPClient
+from api.sip.client import MockSIPClient, RequestResend, SIPClient, SIPClientPool
 from api.sip.dialect import AutoGraphicsVerso, GenericILS
 
 
@@ -34,15 +34,6 @@ class MockSocket:
         return block
 
 
-class MockWrapSocket:
-    def __init__(self):
-        self.called_with = None
-
-    def __call__(self, connection, **kwargs):
-        self.called_with = (connection, kwargs)
-        return connection
-
-
 class TestSIPClient:
     """Test the real SIPClient class without allowing it to make
     network connections.
@@ -72,51 +63,103 @@ class TestSIPClient:
         no_cert = SIPClient(target_server, 999, use_ssl=True)
         with_cert = SIPClient(target_server, 999, ssl_cert="cert", ssl_key="key")
 
+        class MockSSLContext:
+            def __init__(self, cert, key):
+                self.cert = cert
+                self.key = key
+                self.wrapped = []
+
+            def wrap_socket(self, connection):
+                self.wrapped.append(connection)
+                return connection
+
+        contexts = []
+
+        def ssl_context(cert, key):
+            context = MockSSLContext(cert, key)
+            contexts.append(context)
+            return context
+
         # Mock the socket.socket function.
         old_socket = socket.socket
         socket.socket = MockSocket
 
-        # Mock the ssl.wrap_socket function
-        old_wrap_socket = ssl.wrap_socket
-        wrap_socket = MockWrapSocket()
-        ssl.wrap_socket = wrap_socket
-
         try:
-            # When an insecure connection is created, wrap_socket is
-            # not called.
+            # When an insecure connection is created, no SSLContext
+            # is used.
+            insecure.ssl_context = ssl_context
             insecure.connect()
-            assert None == wrap_socket.called_with
+            assert [] == contexts
 
             # When a secure connection is created with no SSL
-            # certificate, wrap_socket() is called on the connection
-            # (in this case, a MockSocket), but no other arguments are
-            # passed in to wrap_socket().
+            # certificate, the connection (in this case, a MockSocket)
+            # is wrapped by an SSLContext with no certificate or key.
+            no_cert.ssl_context = ssl_context
             no_cert.connect()
-            connection, kwargs = wrap_socket.called_with
+            [context] = contexts
+            assert (None, None) == (context.cert, context.key)
+            [connection] = context.wrapped
             assert isinstance(connection, MockSocket)
-            assert dict(keyfile=None, certfile=None) == kwargs
+            assert connection == no_cert.connection
 
             # When a secure connection is created with an SSL
-            # certificate, the certificate and key are written to
-            # temporary files, and the paths to those files are passed
-            # in along with the collection to wrap_socket().
-            wrap_socket.called_with = None
+            # certificate, the SSLContext knows about the certificate
+            # and key.
+            with_cert.ssl_context = ssl_context
             with_cert.connect()
-            connection, kwargs = wrap_socket.called_with
-            assert isinstance(connection, MockSocket)
-            assert {"keyfile", "certfile"} == set(kwargs.keys())
-            for tmpfile in list(kwargs.values()):
-                tmpfile = os.path.abspath(tmpfile)
-                assert os.path.basename(tmpfile).startswith("tmp")
-                # By the time the SSL socket has been wrapped, the
-                # temporary file has already been removed.  Because of
-                # that we can't verify from within a unit test that the
-                # correct contents were written to the file.
-                assert not os.path.exists(tmpfile)
+            context = contexts[-1]
+            assert ("cert", "key") == (context.cert, context.key)
+            assert [with_cert.connection] == context.wrapped
         finally:
-            # Un-mock the old functions.
+            # Un-mock the socket.socket function.
             socket.socket = old_socket
-            ssl.wrap_socket = old_wrap_socket
+
+    def test_make_ssl_context(self, monkeypatch):
+        loaded = []
+
+        def load_cert_chain(context, certfile, keyfile=None):
+            contents = []
+            for path in certfile, keyfile:
+                if path:
+                    assert os.path.basename(path).startswith("tmp")
+                    with open(path) as f:
+                        contents.append(f.read())
+                else:
+                    contents.append(None)
+            loaded.append(((certfile, keyfile), contents))
+
+        monkeypatch.setattr(ssl.SSLContext, "load_cert_chain", load_cert_chain)
+
+        # With no certificate, we get a context that doesn't verify
+        # the server's certificate and doesn't present one of its own.
+        context = SIPClient.make_ssl_context(None, None)
+        assert ssl.CERT_NONE == context.verify_mode
+        assert False == context.check_hostname
+        assert [] == loaded
+
+        # A certificate and key are written to temporary files and
+        # loaded into the context.
+        SIPClient.make_ssl_context("cert", "key")
+        [(paths, contents)] = loaded
+        assert ["cert", "key"] == contents
+
+        # By the time the context has been created, the temporary
+        # files have been removed.
+        for path in paths:
+            assert not os.path.exists(path)
+
+        # The key is optional.
+        loaded.clear()
+        SIPClient.make_ssl_context("cert", None)
+        [(paths, contents)] = loaded
+        assert ["cert", None] == contents
+
+    def test_ssl_context(self):
+        # An SSLContext is only created once for any given certificate
+        # and key.
+        context = SIPClient.ssl_context(None, None)
+        assert isinstance(context, ssl.SSLContext)
+        assert context is SIPClient.ssl_context(None, None)
 
     def test_read_message(self):
         target_server = object()
@@ -312,6 +355,35 @@ class TestLogin:
         assert "12345" == response["patron_identifier"]
 
 
+class TestSCStatus:
+    def test_sc_status_message(self):
+        sip = MockSIPClient()
+        assert "9900002.00" == sip.sc_status_message()
+
+    def test_sc_status(self):
+        sip = MockSIPClient()
+        sip.queue_response(
+            "98YYYNYN01000320230101    1200002.00AOinst|AMMain Library|BXYYYYYYYYYYYYYYYY|ANterminal|AY1AZE67A"
+        )
+        response = sip.sc_status()
+        assert [b"9900002.00|AY0AZFC2D\r"] == sip.requests
+        assert "98" == response["_status"]
+        assert "Y" == response["online_status"]
+        assert "Y" == response["checkin_ok"]
+        assert "Y" == response["checkout_ok"]
+        assert "N" == response["acs_renewal_policy"]
+        assert "Y" == response["status_update_ok"]
+        assert "N" == response["offline_ok"]
+        assert "010" == response["timeout_period"]
+        assert "003" == response["retries_allowed"]
+        assert "20230101    120000" == response["date_time_sync"]
+        assert "2.00" == response["protocol_version"]
+        assert "inst" == response["institution_id"]
+        assert "Main Library" == response["library_name"]
+        assert "YYYYYYYYYYYYYYYY" == response["supported_messages"]
+        assert "terminal" == response["terminal_location"]
+
+
 class TestPatronResponse:
     def setup_method(self):
         self.sip = MockSIPClient()
@@ -503,3 +575,195 @@ class TestClientDialects:
         self.sip.end_session("username", "password")
         assert self.sip.read_count == 0
         assert self.sip.write_count == 0
+
+
+class MockClock:
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class TestSIPClientPool:
+
+    acs_status = "98YYYNYN01000320230101    1200002.00AOinst|BXYYYYYYYYYYYYYYYY"
+
+    def pool(self, **kwargs):
+        self.created = []
+
+        def factory():
+            sip = MockSIPClient(login_user_id="user_id")
+            sip.disconnected = False
+
+            def disconnect():
+                sip.disconnected = True
+
+            sip.disconnect = disconnect
+            # Each new connection has to log in.
+            sip.queue_response("941")
+            self.created.append(sip)
+            return sip
+
+        self.clock = MockClock()
+        return SIPClientPool(factory, clock=self.clock, **kwargs)
+
+    def test_connection_is_reused(self):
+        pool = self.pool()
+
+        # The first time, a new client is created, connected and
+        # logged in.
+        sip, reused = pool.checkout()
+        assert False == reused
+        assert self.created == [sip]
+        assert ["Creating new socket connection."] == sip.status
+        assert [b"9300CNuser_id|CO|AY0AZF8C9\r"] == sip.requests
+
+        # Once it's checked back in, it's reused as-is.
+        pool.checkin(sip)
+        sip2, reused = pool.checkout()
+        assert sip2 is sip
+        assert True == reused
+        assert 1 == len(self.created)
+        assert 1 == len(sip.requests)
+
+        # If a second client is needed while the first one is in use,
+        # a new one is created.
+        sip3, reused = pool.checkout()
+        assert sip3 is not sip
+        assert False == reused
+
+    def test_pool_size(self):
+        pool = self.pool(pool_size=1)
+        sip1, ignore = pool.checkout()
+        sip2, ignore = pool.checkout()
+
+        # There's only room in the pool for one idle client. The
+        # other one is disconnected.
+        pool.checkin(sip1)
+        pool.checkin(sip2)
+        assert False == sip1.disconnected
+        assert True == sip2.disconnected
+
+    def test_health_check(self):
+        pool = self.pool(health_check_interval=30)
+        sip, ignore = pool.checkout()
+        pool.checkin(sip)
+
+        # A client that was used recently isn't checked.
+        self.clock.now += 29
+        assert (sip, True) == pool.checkout()
+        assert 1 == len(sip.requests)
+        pool.checkin(sip)
+
+        # A client that has been idle for a while is sent an SC
+        # status message before it's reused.
+        self.clock.now += 30
+        sip.queue_response(self.acs_status)
+        assert (sip, True) == pool.checkout()
+        assert sip.requests[-1].startswith(b"99")
+        pool.checkin(sip)
+
+        # If the health check fails, the client is thrown away and a
+        # new one takes its place.
+        self.clock.now += 30
+        sip.queue_response("Not a valid response")
+        new_sip, reused = pool.checkout()
+        assert new_sip is not sip
+        assert False == reused
+        assert True == sip.disconnected
+
+    def test_idle_eviction(self):
+        pool = self.pool(idle_timeout=300)
+        sip, ignore = pool.checkout()
+        pool.checkin(sip)
+
+        # A client that has been idle for too long is disconnected
+        # the next time the pool is used.
+        self.clock.now += 300
+        new_sip, reused = pool.checkout()
+        assert True == sip.disconnected
+        assert new_sip is not sip
+        assert False == reused
+
+    def test_run(self):
+        pool = self.pool()
+
+        def function(sip):
+            return sip
+
+        # run() calls the function with a client and puts the client
+        # back in the pool afterwards.
+        sip = pool.run(function)
+        assert sip is pool.run(function)
+        assert 1 == len(self.created)
+
+    def test_run_reconnects_after_error_on_reused_connection(self):
+        pool = self.pool()
+        sip, ignore = pool.checkout()
+        pool.checkin(sip)
+
+        calls = []
+
+        def function(sip):
+            calls.append(sip)
+            if len(calls) == 1:
+                raise RequestResend()
+            return "result"
+
+        # The pooled connection failed, so it was thrown away and the
+        # function was called again with a new connection.
+        assert "result" == pool.run(function)
+        assert [sip, self.created[1]] == calls
+        assert True == sip.disconnected
+
+        # The new connection went into the pool.
+        assert (self.created[1], True) == pool.checkout()
+
+    def test_run_does_not_retry_new_connection(self):
+        pool = self.pool()
+        calls = []
+
+        def function(sip):
+            calls.append(sip)
+            raise OSError("Doom!")
+
+        # A brand new connection failed, so there's no point in
+        # trying again.
+        with pytest.raises(OSError) as excinfo:
+            pool.run(function)
+        assert "Doom!" in str(excinfo.value)
+        [sip] = calls
+        assert True == sip.disconnected
+
+        # If the retry fails too, the exception is raised.
+        sip, ignore = pool.checkout()
+        pool.checkin(sip)
+        calls.clear()
+        with pytest.raises(OSError):
+            pool.run(function)
+        assert 2 == len(calls)
+        assert all(x.disconnected for x in calls)
+
+    def test_run_discards_client_after_other_exception(self):
+        pool = self.pool()
+
+        def function(sip):
+            raise ValueError("Oops")
+
+        with pytest.raises(ValueError):
+            pool.run(function)
+        [sip] = self.created
+        assert True == sip.disconnected
+        assert [] == pool._idle
+
+    def test_close(self):
+        pool = self.pool()
+        sip1, ignore = pool.checkout()
+        sip2, ignore = pool.checkout()
+        pool.checkin(sip1)
+        pool.checkin(sip2)
+        pool.close()
+        assert True == sip1.disconnected
+        assert True == sip2.disconnected
+        assert [] == pool._idle
@@ -23,6 +23,7 @@ from api.authenticator import (
     Authenticator,
     BasicAuthenticationProvider,
     CirculationPatronProfileStorage,
+    CredentialVerificationCache,
     LibraryAuthenticator,
     OAuthAuthenticationProvider,
     OAuthController,
@@ -2675,6 +2676,219 @@ class TestBasicAuthenticationProviderAuthenticate(AuthenticatorTest):
     # appear no different to us than a patron who has never used the
     # circulation manager before.
 
+    def _counting_provider(self, patrondata, cache_seconds=60, failure_seconds=None):
+        """Create a MockBasic whose credential checks are remembered, and
+        which keeps track of how often it asks the source of truth.
+        """
+        integration = self._external_integration(
+            self._str, ExternalIntegration.PATRON_AUTH_GOAL
+        )
+        integration.setting(
+            BasicAuthenticationProvider.CREDENTIAL_CACHE_SECONDS
+        ).value = cache_seconds
+        integration.setting(
+            BasicAuthenticationProvider.CREDENTIAL_FAILURE_CACHE_SECONDS
+        ).value = failure_seconds
+        provider = MockBasic(self._default_library, integration, patrondata=patrondata)
+        provider.remote_authenticate_calls = []
+        original = provider.remote_authenticate
+
+        def remote_authenticate(username, password):
+            provider.remote_authenticate_calls.append((username, password))
+            return original(username, password)
+
+        provider.remote_authenticate = remote_authenticate
+        return provider
+
+    def test_credential_cache_is_off_by_default(self):
+        provider = self.mock_basic(patrondata=None)
+        assert None == provider.credential_cache
+
+    def test_credential_cache(self):
+        patron = self._patron()
+        patrondata = PatronData(permanent_id=patron.external_identifier)
+        provider = self._counting_provider(patrondata)
+        assert 60 == provider.credential_cache.ttl
+        assert 0 == provider.credential_cache.negative_ttl
+
+        # The first time we see these credentials, they are checked
+        # with the source of truth.
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert [("user", "pass")] == provider.remote_authenticate_calls
+
+        # The second time, they aren't.
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert 1 == len(provider.remote_authenticate_calls)
+        assert 1 == provider.credential_cache.hits
+
+        # Different credentials for the same patron are checked.
+        other = dict(username="user", password="other pass")
+        assert patron == provider.authenticate(self._db, other)
+        assert 2 == len(provider.remote_authenticate_calls)
+
+        # Since failures aren't being remembered, wrong credentials are
+        # checked every time.
+        provider.patrondata = None
+        wrong = dict(username="user", password="wrong")
+        assert None == provider.authenticate(self._db, wrong)
+        assert None == provider.authenticate(self._db, wrong)
+        assert 4 == len(provider.remote_authenticate_calls)
+
+    def test_credential_cache_remembers_failures_if_configured(self):
+        provider = self._counting_provider(None, failure_seconds=5)
+        assert 5 == provider.credential_cache.negative_ttl
+        assert None == provider.authenticate(self._db, self.credentials)
+        assert None == provider.authenticate(self._db, self.credentials)
+        assert 1 == len(provider.remote_authenticate_calls)
+        assert 1 == provider.credential_cache.negative_hits
+
+    def test_credential_cache_does_not_remember_problem_details(self):
+        provider = self._counting_provider(INVALID_CREDENTIALS, failure_seconds=5)
+        for i in range(2):
+            assert INVALID_CREDENTIALS == provider.authenticate(
+                self._db, self.credentials
+            )
+        assert 2 == len(provider.remote_authenticate_calls)
+
+    def test_credential_cache_ignored_when_block_status_changes(self):
+        patron = self._patron()
+        patrondata = PatronData(
+            permanent_id=patron.external_identifier,
+            block_reason=PatronData.NO_VALUE,
+        )
+        provider = self._counting_provider(patrondata)
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert 1 == len(provider.remote_authenticate_calls)
+
+        # Something else blocked the patron after their credentials
+        # were checked. The remembered verdict can't be trusted
+        # anymore, so the source of truth is asked again.
+        patron.block_reason = PatronData.EXCESSIVE_FINES
+        provider.patrondata = PatronData(
+            permanent_id=patron.external_identifier,
+            block_reason=PatronData.EXCESSIVE_FINES,
+        )
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert 2 == len(provider.remote_authenticate_calls)
+        assert 1 == provider.credential_cache.invalidations
+
+        # The new verdict is remembered.
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert 2 == len(provider.remote_authenticate_calls)
+
+    def test_credential_cache_invalidated_by_patron_lookup(self):
+        patron, complete_patrondata = self._inactive_patron()
+        minimal_patrondata = PatronData(
+            permanent_id=patron.external_identifier,
+            authorization_identifier="old auth id",
+            complete=False,
+        )
+        provider = self._counting_provider(minimal_patrondata)
+        provider.remote_patron_lookup_patrondata = complete_patrondata
+        assert patron == provider.authenticate(self._db, self.credentials)
+
+        # The detailed lookup told us the patron's authorization
+        # identifier changed, so the verdict we just got is not kept.
+        assert 1 == provider.credential_cache.invalidations
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert 2 == len(provider.remote_authenticate_calls)
+
+    def test_credential_cache_invalidated_by_metadata_update(self):
+        patron = self._patron()
+        patron.authorization_identifier = "user"
+        patrondata = PatronData(
+            permanent_id=patron.external_identifier, authorization_identifier="user"
+        )
+        provider = self._counting_provider(patrondata)
+        assert patron == provider.authenticate(self._db, self.credentials)
+
+        # A metadata update tells us something that disagrees with the
+        # verdict we remembered, so the verdict is forgotten.
+        provider.remote_patron_lookup_patrondata = PatronData(
+            permanent_id="someone else", authorization_identifier="user"
+        )
+        provider.update_patron_metadata(patron)
+        assert 1 == provider.credential_cache.invalidations
+        assert patron == provider.authenticate(self._db, self.credentials)
+        assert 2 == len(provider.remote_authenticate_calls)
+
+
+class TestCredentialVerificationCache:
+    class MockClock:
+        def __init__(self):
+            self.now = 1000
+
+        def __call__(self):
+            return self.now
+
+    def test_get_put(self):
+        clock = self.MockClock()
+        cache = CredentialVerificationCache(10, 2, clock=clock)
+        patrondata = PatronData(permanent_id="1")
+
+        assert (False, None) == cache.get("user", "pass")
+        cache.put("user", "pass", patrondata)
+        cache.put("other", "wrong", None)
+        assert (True, patrondata) == cache.get("user", "pass")
+        assert (True, None) == cache.get("other", "wrong")
+        assert (False, None) == cache.get("user", "wrong")
+        assert 1 == cache.hits
+        assert 1 == cache.negative_hits
+        assert 2 == cache.misses
+        assert 0.5 == cache.hit_rate
+
+        # The password isn't stored anywhere.
+        assert "pass" not in repr(cache._entries)
+
+        # Failures are forgotten sooner than successes.
+        clock.now += 2
+        assert (False, None) == cache.get("other", "wrong")
+        assert (True, patrondata) == cache.get("user", "pass")
+        clock.now += 8
+        assert (False, None) == cache.get("user", "pass")
+
+    def test_failures_not_remembered_without_negative_ttl(self):
+        cache = CredentialVerificationCache(10)
+        cache.put("user", "pass", None)
+        assert (False, None) == cache.get("user", "pass")
+
+    def test_max_entries(self):
+        clock = self.MockClock()
+        cache = CredentialVerificationCache(10, max_entries=2, clock=clock)
+        for i in range(3):
+            cache.put("user%d" % i, "pass", PatronData(permanent_id=str(i)))
+        assert 2 == len(cache._entries)
+        assert (False, None) == cache.get("user0", "pass")
+        assert True == cache.get("user2", "pass")[0]
+
+    def test_invalidate(self):
+        cache = CredentialVerificationCache(10)
+        patrondata = PatronData(permanent_id="1", block_reason=PatronData.NO_VALUE)
+        cache.put("user", "pass", patrondata)
+        cache.put("user", "old pass", patrondata)
+        cache.put("other", "pass", patrondata)
+
+        # Information that agrees with what we remember changes nothing.
+        cache.invalidate("user", PatronData(permanent_id="1"))
+        assert 0 == cache.invalidations
+
+        # Information that disagrees invalidates everything we remember
+        # about that username.
+        cache.invalidate(
+            "user",
+            PatronData(
+                permanent_id="1", block_reason=PatronData.NO_BORROWING_PRIVILEGES
+            ),
+        )
+        assert 2 == cache.invalidations
+        assert (False, None) == cache.get("user", "pass")
+        assert (False, None) == cache.get("user", "old pass")
+        assert True == cache.get("other", "pass")[0]
+
+        cache.invalidate("other")
+        assert (False, None) == cache.get("other", "pass")
+
 
 class TestOAuthAuthenticationProvider(AuthenticatorTest):
     def test_from_config(self):
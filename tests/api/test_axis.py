@@ -266,6 +266,36 @@ class TestAxis360API(Axis360Test):
         response = self.api.request("http://url/")
         assert b"The data" == response.content
 
+    def test_bearer_token(self):
+        api = MockAxis360API(self._db, self.collection, with_token=False)
+        api.queue_response(200, content=json.dumps(dict(access_token="foo")))
+        assert "foo" == api.bearer_token()
+
+        # The token is reused until it expires.
+        assert "foo" == api.bearer_token()
+        assert 1 == len(api.requests)
+
+        # If another thread already replaced an expired token, the
+        # replacement is used rather than fetching yet another token.
+        api.token = "bar"
+        assert "bar" == api.bearer_token(expired="foo")
+        assert 1 == len(api.requests)
+
+        api.queue_response(200, content=json.dumps(dict(access_token="baz")))
+        assert "baz" == api.bearer_token(expired="bar")
+        assert 2 == len(api.requests)
+
+    def test_with_session(self):
+        # A copy of the API made for another thread shares the
+        # original's bearer token.
+        api = MockAxis360API(self._db, self.collection, with_token=False)
+        copy = api.with_session(self._db)
+        api.queue_response(200, content=json.dumps(dict(access_token="foo")))
+        assert "foo" == copy.bearer_token()
+        assert "foo" == api.token
+        assert "foo" == api.bearer_token()
+        assert 1 == len(api.requests)
+
     def test_refresh_bearer_token_error(self):
         # Raise an exception if we don't get a 200 status code when
         # refreshing the bearer token.
@@ -1,6 +1,7 @@
 import json
 import os
 import random
+import threading
 from datetime import datetime, timedelta
 from io import BytesIO, StringIO
 from unittest import mock
@@ -28,6 +29,7 @@ from api.bibliotheca import (
 from api.circulation import CirculationAPI, FulfillmentInfo, HoldInfo, LoanInfo
 from api.circulation_exceptions import *
 from api.web_publication_manifest import FindawayManifest
+from core.coverage import CoverageFailure
 from core.metadata_layer import ReplacementPolicy, TimestampData
 from core.mock_analytics_provider import MockAnalyticsProvider
 from core.model import (
@@ -1535,6 +1537,46 @@ class TestBibliothecaEventMonitor(BibliothecaAPITest):
         assert 17 == len(api.requests)
         assert "Events handled: 0." == after_timestamp.achievements
 
+    def test_catch_up_from_prefetches_slices(self):
+        # While the events in one slice of time are being handled,
+        # the next slices are fetched in the background.
+        api = MockBibliothecaAPI(self._db, self.collection)
+        api.PREFETCH_EVENT_SLICES = 2
+        fetched = []
+
+        def get_events_between(start, end):
+            fetched.append((start, threading.current_thread()))
+            if len(fetched) == 5:
+                raise ValueError("Ouch!")
+            return [(start,)]
+
+        api.get_events_between = get_events_between
+
+        class Mock(BibliothecaEventMonitor):
+            def handle_event(self, start):
+                self.handled.append(start)
+
+        monitor = Mock(self._db, self.collection, api_class=api)
+        monitor.handled = []
+        start = datetime_utc(2020, 1, 1)
+        progress = TimestampData()
+        monitor.catch_up_from(start, start + timedelta(minutes=15), progress)
+
+        slices = [start + timedelta(minutes=i) for i in (0, 5, 10)]
+        assert slices == [slice_start for slice_start, thread in fetched]
+        assert threading.current_thread() not in [thread for x, thread in fetched]
+        assert slices == monitor.handled
+        assert "Events handled: 3." == progress.achievements
+
+        # If fetching a slice fails, the slices before it are handled
+        # first, and then the error is raised.
+        monitor.handled = []
+        with pytest.raises(ValueError):
+            monitor.catch_up_from(
+                start + timedelta(minutes=15), start + timedelta(minutes=30), progress
+            )
+        assert [start + timedelta(minutes=15)] == monitor.handled
+
     def test_handle_event(self):
         api = MockBibliothecaAPI(self._db, self.collection)
         api.queue_response(200, content=self.sample_data("item_metadata_single.xml"))
@@ -1808,6 +1850,36 @@ class TestBibliographicCoverageProvider(TestBibliothecaAPI):
         assert "The Incense Game" == pool.work.title
         assert True == pool.work.presentation_ready
 
+    def test_fetch_and_process_batch(self):
+        # Test the two halves of a batch lookup, which can be split
+        # between a background thread and the main thread.
+        found = self._identifier(identifier_type=Identifier.BIBLIOTHECA_ID)
+        found.identifier = "ddf4gr9"
+        missing = self._identifier(identifier_type=Identifier.BIBLIOTHECA_ID)
+
+        provider = BibliothecaBibliographicCoverageProvider(
+            self.collection, api_class=MockBibliothecaAPI
+        )
+        provider.api.queue_response(
+            200, content=self.sample_data("item_metadata_single.xml")
+        )
+        provider.api.queue_response(
+            200, content=self.sample_data("empty_item_bibliographic.xml")
+        )
+
+        # Each title is looked up on its own.
+        fetched = provider.fetch_batch([found, missing])
+        assert 2 == len(fetched)
+        assert [] == provider.api.responses
+
+        [success, failure] = provider.process_fetched_batch([found, missing], fetched)
+        assert found == success
+        assert True == found.licensed_through[0].work.presentation_ready
+
+        assert isinstance(failure, CoverageFailure)
+        assert missing == failure.obj
+        assert "Bibliotheca bibliographic lookup failed." == failure.exception
+
     def test_internal_formats(self):
 
         m = ItemListParser.internal_formats
@@ -1,4 +1,5 @@
 """Test the CirculationAPI."""
+import threading
 from datetime import timedelta
 from unittest.mock import MagicMock
 
@@ -39,6 +40,7 @@ from core.model import (
 )
 from core.testing import DatabaseTest
 from core.util.datetime_helpers import utc_now
+from core.util.histogram import LatencyHistograms
 
 from . import sample_data
 
@@ -1464,6 +1466,126 @@ class TestCirculationAPI(DatabaseTest):
         assert 0 == len(holds)
         assert False == complete
 
+    def test_patron_activity_timeout(self):
+        loan = LoanInfo(self.collection, None, None, None, None, None)
+        hold = HoldInfo(self.collection, None, None, None, None, None, None)
+        released = threading.Event()
+        seen = []
+
+        class Threaded(BaseCirculationAPI):
+            # These APIs can be used in worker threads.
+            def with_session(self, _db):
+                return self._copy_with_session(_db)
+
+        class Fast(Threaded):
+            _db = None
+
+            def patron_activity(self, patron, pin):
+                seen.append((self._db, patron, patron.id, pin))
+                return [loan]
+
+        class Slow(Threaded):
+            def patron_activity(self, patron, pin):
+                released.wait(5)
+                return [hold]
+
+        class Broken(Threaded):
+            def patron_activity(self, patron, pin):
+                raise Exception("Nope")
+
+        class Mock(CirculationAPI):
+            PATRON_ACTIVITY_THREADS_PER_API = 1
+            PATRON_ACTIVITY_TIMEOUT = 0.1
+            _patron_activity_limits = {}
+            patron_activity_latency = LatencyHistograms()
+
+        circulation = Mock(self._db, self._default_library)
+        fast = Fast()
+        circulation.api_for_collection = {1: fast, 2: Slow()}
+
+        # The slow API didn't respond in time, so the patron's activity
+        # is incomplete -- but we still got the activity from the fast
+        # API.
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert [loan] == loans
+        assert [] == holds
+        assert False == complete
+
+        # The fast API was given its own database session, and the
+        # patron was looked up in that session.
+        [(_db, patron, patron_id, pin)] = seen
+        assert _db is not None
+        assert _db is not self._db
+        assert patron is not self.patron
+        assert self.patron.id == patron_id
+        assert "1234" == pin
+        assert None == fast._db
+
+        # While the slow API is still working on the first request, it
+        # isn't sent another one.
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert [loan] == loans
+        assert [] == holds
+        assert False == complete
+
+        # Once the slow API is working again, the activity is complete.
+        released.set()
+        limit = circulation.patron_activity_limit(2)
+        assert True == limit.acquire(timeout=5)
+        limit.release()
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert [loan] == loans
+        assert [hold] == holds
+        assert True == complete
+
+        # An API that raises an exception also makes the activity
+        # incomplete.
+        circulation.api_for_collection = {1: Fast(), 2: Broken()}
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert [loan] == loans
+        assert False == complete
+
+        # An API that can't be given another database session is
+        # used in this thread, with this thread's session.
+        class Local(BaseCirculationAPI):
+            _db = self._db
+
+            def patron_activity(self, patron, pin):
+                seen.append((self._db, patron, threading.current_thread()))
+                return [hold]
+
+        class LocalBroken(Local):
+            def patron_activity(self, patron, pin):
+                raise Exception("Nope")
+
+        seen.clear()
+        circulation.api_for_collection = {1: Fast(), 2: Local()}
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert [loan] == loans
+        assert [hold] == holds
+        assert True == complete
+        assert (self._db, self.patron, threading.current_thread()) in seen
+
+        circulation.api_for_collection = {2: LocalBroken()}
+        loans, holds, complete = circulation.patron_activity(self.patron, "1234")
+        assert [] == holds
+        assert False == complete
+
+        # Every time an API finished, how long it took was recorded.
+        latency = circulation.patron_activity_latency.as_dict()
+        assert 5 == latency["Fast"]["count"]
+        assert 2 == latency["Slow"]["count"]
+        assert 1 == latency["Broken"]["count"]
+        assert 1 == latency["Local"]["count"]
+        assert 1 == latency["LocalBroken"]["count"]
+
+        # All of this happened on a thread pool shared by every
+        # CirculationAPI.
+        other = CirculationAPI(self._db, self._default_library)
+        assert circulation.patron_activity_executor() is (
+            other.patron_activity_executor()
+        )
+
     def test_can_fulfill_without_loan(self):
         """Can a title can be fulfilled without an active loan?  It depends on
         the BaseCirculationAPI implementation for that title's colelction.
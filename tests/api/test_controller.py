@@ -3,6 +3,7 @@ import email
 import json
 import random
 import sys
+import time
 import urllib.parse
 from contextlib import contextmanager
 from decimal import Decimal
@@ -27,11 +28,15 @@ from api.authenticator import (
     LibraryAuthenticator,
     OAuthController,
 )
-from api.circulation import FulfillmentInfo, HoldInfo, LoanInfo
+from api.circulation import CirculationAPI, FulfillmentInfo, HoldInfo, LoanInfo
 from api.circulation_exceptions import *
 from api.circulation_exceptions import RemoteInitiatedServerError
 from api.config import Configuration, temp_config
-from api.controller import CirculationManager, CirculationManagerController
+from api.controller import (
+    AuthenticationDocumentEntry,
+    CirculationManager,
+    CirculationManagerController,
+)
 from api.custom_index import CustomIndexView
 from api.lanes import (
     ContributorFacets,
@@ -127,6 +132,7 @@ from core.user_profile import ProfileController, ProfileStorage
 from core.util.authentication_for_opds import AuthenticationForOPDSDocument
 from core.util.datetime_helpers import datetime_utc, utc_now
 from core.util.flask_util import Response
+from core.util.histogram import LatencyHistograms
 from core.util.http import RemoteIntegrationException
 from core.util.opds_writer import OPDSFeed
 from core.util.problem_detail import ProblemDetail
@@ -389,9 +395,9 @@ class TestCirculationManager(CirculationControllerTest):
         assert 1 == len(manager.top_level_lanes)
         assert 1 == len(manager.circulation_apis)
 
-        # The authentication document cache has a default value for
-        # max_age.
-        assert 0 == manager.authentication_for_opds_documents.max_age
+        # Authentication documents are not cached by default.
+        assert 0 == manager.authentication_document_max_age
+        assert None == manager.authentication_documents
 
         # WSGI debug is off by default.
         assert False == manager.wsgi_debug
@@ -475,9 +481,9 @@ class TestCirculationManager(CirculationControllerTest):
         # removed.
         assert {"http://sitewide", "http://registration"} == manager.patron_web_domains
 
-        # The authentication document cache has been rebuilt with a
-        # new max_age.
-        assert 60 == manager.authentication_for_opds_documents.max_age
+        # Authentication documents have a new max_age.
+        assert 60 == manager.authentication_document_max_age
+        assert 60 == manager.authentication_documents.max_age
 
         # The WSGI debug setting has been changed.
         assert True == manager.wsgi_debug
@@ -508,6 +514,141 @@ class TestCirculationManager(CirculationControllerTest):
         # Restore the CustomIndexView.for_library implementation
         CustomIndexView.for_library = old_for_library
 
+    def test_reload_settings(self):
+        manager = self.manager
+        library = self._default_library
+        other_library = self._library()
+        self.library_setup(other_library)
+        manager.load_settings()
+
+        # Loading the configuration for the first time may have created
+        # some configuration, such as key pairs for the libraries.
+        manager.reload_settings()
+
+        full = manager.settings_load_latency["full"]
+        libraries = manager.settings_load_latency["libraries"]
+        full_loads = full.count
+        library_loads = libraries.count
+        external_search = manager.external_search
+
+        lanes = manager.top_level_lanes[library.id]
+        other_lanes = manager.top_level_lanes[other_library.id]
+        other_api = manager.circulation_apis[other_library.id]
+        authenticator = manager.auth.library_authenticators[library.short_name]
+        other_authenticator = manager.auth.library_authenticators[
+            other_library.short_name
+        ]
+
+        # Nothing has changed, so nothing is reloaded.
+        fingerprints = manager.settings_load_latency["fingerprint"].count
+        manager.reload_settings()
+        assert other_lanes is manager.top_level_lanes[other_library.id]
+        assert full_loads == full.count
+        assert library_loads + 1 == libraries.count
+
+        # But the configuration had to be fingerprinted to find that out.
+        assert fingerprints + 1 == manager.settings_load_latency["fingerprint"].count
+
+        # A change to one library's configuration only affects the
+        # objects for that library.
+        ConfigurationSetting.for_library("a setting", other_library).value = "value"
+        manager.reload_settings()
+        assert full_loads == full.count
+        assert library_loads + 2 == libraries.count
+        assert external_search is manager.external_search
+        assert lanes is manager.top_level_lanes[library.id]
+        assert authenticator is manager.auth.library_authenticators[library.short_name]
+
+        # The other library's objects are created again the next time
+        # they're needed.
+        assert other_library.id not in dict(manager.top_level_lanes)
+        assert other_lanes is not manager.top_level_lanes[other_library.id]
+        assert other_api is not manager.circulation_apis[other_library.id]
+        new_authenticator = manager.auth.library_authenticators[
+            other_library.short_name
+        ]
+        assert isinstance(new_authenticator, LibraryAuthenticator)
+        assert other_authenticator is not new_authenticator
+
+        # A change that affects the whole site reloads everything.
+        ConfigurationSetting.sitewide(self._db, "a setting").value = "value"
+        manager.reload_settings()
+        assert full_loads + 1 == full.count
+        assert lanes is not manager.top_level_lanes[library.id]
+
+    def test_libraries_set_up_on_first_use(self):
+        library = self._default_library
+        other_library = self._library()
+        self.library_setup(other_library)
+        manager = CirculationManager(self._db, testing=True)
+
+        # Nothing has been set up for the libraries yet, but the
+        # CirculationManager knows about them.
+        for mapping, key in (
+            (manager.auth.library_authenticators, other_library.short_name),
+            (manager.top_level_lanes, other_library.id),
+            (manager.circulation_apis, other_library.id),
+            (manager.custom_index_views, other_library.id),
+        ):
+            assert {} == mapping
+            assert key in mapping
+        assert 0 == manager.settings_load_latency["lanes"].count
+
+        # Since nothing has been set up, there was no need to
+        # fingerprint the configuration.
+        assert None == manager.configuration_fingerprint
+        assert 0 == manager.settings_load_latency["fingerprint"].count
+
+        # A library's objects are set up the first time they're needed.
+        lanes = manager.top_level_lanes[other_library.id]
+        assert other_library.id == lanes.library_id
+        assert [other_library.id] == list(manager.top_level_lanes)
+        assert 1 == manager.settings_load_latency["lanes"].count
+        assert isinstance(
+            manager.auth.library_authenticators[library.short_name],
+            LibraryAuthenticator,
+        )
+        assert 1 == manager.settings_load_latency["authenticator"].count
+
+        # Libraries can be set up at startup instead.
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.PRELOAD_LIBRARIES
+        ).value = f" {other_library.short_name} | nosuchlibrary"
+        manager = CirculationManager(self._db, testing=True)
+        assert [other_library.id] == list(manager.top_level_lanes)
+        assert [other_library.id] == list(manager.circulation_apis)
+        assert [other_library.id] == list(manager.custom_index_views)
+        assert [other_library.short_name] == list(manager.auth.library_authenticators)
+
+        # The configuration the preloaded library was set up with was
+        # fingerprinted, so a later reload can tell whether it changed.
+        assert None != manager.configuration_fingerprint
+        assert 1 == manager.settings_load_latency["fingerprint"].count
+
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.PRELOAD_LIBRARIES
+        ).value = "*"
+        manager = CirculationManager(self._db, testing=True)
+        assert {library.id, other_library.id} == set(manager.top_level_lanes)
+
+    def test_reload_settings_if_changed(self):
+        manager = self.manager
+        calls = []
+        manager.reload_settings = lambda: calls.append("reload")
+
+        # The site configuration hasn't changed since it was loaded.
+        last_update = Configuration.site_configuration_last_update(self._db)
+        manager.site_configuration_last_update = last_update
+        manager.reload_settings_if_changed()
+        assert [] == calls
+
+        manager.site_configuration_last_update = last_update - datetime.timedelta(
+            seconds=1
+        )
+        manager.reload_settings_if_changed()
+        assert ["reload"] == calls
+        assert last_update == manager.site_configuration_last_update
+
     def test_exception_during_external_search_initialization_is_stored(self):
         class BadSearch(CirculationManager):
             @property
@@ -816,6 +957,30 @@ class TestCirculationManager(CirculationControllerTest):
         assert ("view", args, kwargs) == manager.url_for_calls.pop()
         assert [] == manager.url_for_calls
 
+    def test_heartbeat_checks(self):
+        # The heartbeat reports on how long vendor APIs have been taking
+        # to report on patron activity.
+        original = CirculationAPI.patron_activity_latency
+        try:
+            CirculationAPI.patron_activity_latency = LatencyHistograms(buckets=[1])
+            self.manager.settings_load_latency = LatencyHistograms(buckets=[1])
+            assert None == self.manager.heartbeat_checks()
+
+            CirculationAPI.patron_activity_latency.observe("OverdriveAPI", 0.5)
+            [check] = self.manager.heartbeat_checks()["patronActivity:responseTime"]
+            assert "OverdriveAPI" == check["componentId"]
+            assert "s" == check["observedUnit"]
+            assert 1 == check["observedValue"]["count"]
+
+            # It also reports on how long it's taken to load the site
+            # configuration.
+            self.manager.settings_load_latency.observe("full", 2)
+            [check] = self.manager.heartbeat_checks()["settings:loadTime"]
+            assert "full" == check["componentId"]
+            assert {"1": 0, "+Inf": 1} == check["observedValue"]["buckets"]
+        finally:
+            CirculationAPI.patron_activity_latency = original
+
 
 class TestBaseController(CirculationControllerTest):
     def test_unscoped_session(self):
@@ -1533,18 +1698,32 @@ class TestIndexController(CirculationControllerTest):
             doc = json.loads(data)
             assert library_name == doc["title"]
 
-        # Currently, the authentication document cache is disabled by default.
-        self.manager.authentication_for_opds_documents[library_name] = "Cached value"
-        with self.request_context_with_library(
-            "/", headers=dict(Authorization=self.invalid_auth)
-        ):
-            response = self.manager.index_controller.authentication_document()
-            assert "Cached value" != response.get_data(as_text=True)
+        # By default, documents aren't cached.
+        assert None == self.manager.authentication_documents
+
+        # Once a cache time is set, the document is cached, and until
+        # something it depends on changes, the cached copy is served.
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.AUTHENTICATION_DOCUMENT_CACHE_TIME
+        ).value = 600
+        self.manager.load_settings()
+        cache = self.manager.authentication_documents
+        assert 600 == cache.max_age
+
+        def current_document():
+            with self.request_context_with_library("/"):
+                response = self.manager.index_controller.authentication_document()
+                return response.get_data(as_text=True)
+
+        assert data == current_document()
+        with self.request_context_with_library("/"):
+            key = self.manager.authentication_document_key(self.library)
+        entry = cache[key]
+        assert data == entry.content
+        assert key == entry.key
 
-        # Enable the A4OPDS document cache and verify that it's working.
-        self.manager.authentication_for_opds_documents.max_age = 3600
         cached_value = json.dumps(dict(key="Cached document"))
-        self.manager.authentication_for_opds_documents[library_name] = cached_value
+        cache[key] = AuthenticationDocumentEntry(cached_value, key)
         with self.request_context_with_library(
             "/?debug", headers=dict(Authorization=self.invalid_auth)
         ):
@@ -1569,6 +1748,10 @@ class TestIndexController(CirculationControllerTest):
             debug = doc["_debug"]
             assert all(x in debug for x in ("url", "cache", "environ"))
 
+            # Since the document no longer matches the cached one, it
+            # has no ETag.
+            assert "ETag" not in response.headers
+
         # WSGI debugging is not provided unless requested.
         with self.request_context_with_library(
             "/", headers=dict(Authorization=self.invalid_auth)
@@ -1576,6 +1759,50 @@ class TestIndexController(CirculationControllerTest):
             response = self.manager.index_controller.authentication_document()
             assert "_debug" not in response.get_data(as_text=True)
 
+        # The document's ETag is based on its content, and was
+        # calculated when the document was cached. A client that
+        # already has the current document gets a 304 response.
+        etag = response.headers["ETag"]
+        assert '"%s"' % cache[key].etag == etag
+        with self.request_context_with_library("/", headers={"If-None-Match": etag}):
+            response = self.manager.index_controller.authentication_document()
+            assert 304 == response.status_code
+            assert etag == response.headers["ETag"]
+            assert b"" == response.data
+
+        with self.request_context_with_library(
+            "/", headers={"If-None-Match": '"an old version"'}
+        ):
+            response = self.manager.index_controller.authentication_document()
+            assert 200 == response.status_code
+            assert cached_value == response.get_data(as_text=True)
+
+        # A document is rebuilt once it's too old.
+        cache.__setitem__(
+            key,
+            AuthenticationDocumentEntry(cached_value, key),
+            set_time=time.time() - cache.max_age - 1,
+        )
+        assert library_name == json.loads(current_document())["title"]
+
+        # A document is also rebuilt when its library's configuration
+        # changes.
+        cache[key] = AuthenticationDocumentEntry(cached_value, key)
+        assert cached_value == current_document()
+        ConfigurationSetting.for_library(
+            Configuration.LIBRARY_DESCRIPTION, self.library
+        ).value = "A new description"
+        self.manager.reload_settings()
+        assert library_name == json.loads(current_document())["title"]
+
+        # Setting the cache time back to zero turns off the cache.
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.AUTHENTICATION_DOCUMENT_CACHE_TIME
+        ).value = 0
+        self.manager.load_settings()
+        assert None == self.manager.authentication_documents
+        assert library_name == json.loads(current_document())["title"]
+
     def test_public_key_integration_document(self):
         base_url = ConfigurationSetting.sitewide(
             self._db, Configuration.BASE_URL_KEY
@@ -4907,6 +5134,9 @@ class TestCrawlableFeed(CirculationControllerTest):
         assert sort_key == pagination.last_item_on_previous_page
         assert 23 == pagination.size
 
+        # Crawlable feeds are sent out as they're generated.
+        assert True == out_kwargs.pop("stream")
+
         # We're done looking at the arguments.
         assert {} == out_kwargs
 
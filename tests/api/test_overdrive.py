@@ -7,6 +7,7 @@ from typing import Dict
 from unittest.mock import MagicMock
 
 import pytest
+from sqlalchemy import select
 from sqlalchemy.orm.exc import StaleDataError
 
 from api.authenticator import BasicAuthenticationProvider
@@ -36,6 +37,8 @@ from core.model import (
     MediaTypes,
     Representation,
     RightsStatus,
+    Session,
+    SessionManager,
 )
 from core.overdrive import OverdriveConfiguration
 from core.testing import DatabaseTest, DummyHTTPClient, MockRequestsResponse
@@ -85,6 +88,23 @@ class TestOverdriveAPI(OverdriveAPITest):
             self._db
         )
 
+    def test_with_session(self):
+        _db = SessionManager.sessionmaker(session=self._db)()
+        api = self.api.with_session(_db)
+        assert _db == api._db
+        assert self._db == self.api._db
+
+        # The copy reads its configuration through the new session.
+        integration = api.external_integration(_db)
+        assert self.collection.external_integration.id == integration.id
+        assert _db == Session.object_session(integration)
+        assert _db == Session.object_session(api._external_integration)
+        assert (
+            self.api._configuration.overdrive_client_key
+            == api._configuration.overdrive_client_key
+        )
+        _db.close()
+
     def test_lock_in_format(self):
         # Verify which formats do or don't need to be locked in before
         # fulfillment.
@@ -2171,7 +2191,7 @@ class TestOverdriveCirculationMonitor(OverdriveAPITest):
                 self.licensepools = []
                 self.update_licensepool_calls = []
 
-            def update_licensepool(self, book_id):
+            def update_licensepool(self, book_id, batch=None):
                 pool, is_new, is_changed = self.licensepools.pop(0)
                 self.update_licensepool_calls.append((book_id, pool))
                 return pool, is_new, is_changed
@@ -2284,7 +2304,7 @@ class TestOverdriveCirculationMonitor(OverdriveAPITest):
             def recently_changed_ids(self, start, cutoff):
                 return [1, 2, 3]
 
-            def update_licensepool(self, book_id):
+            def update_licensepool(self, book_id, batch=None):
                 current_count = self.tries.get(str(book_id)) or 0
                 current_count = current_count + 1
                 self.tries[str(book_id)] = current_count
@@ -2345,7 +2365,7 @@ class TestOverdriveCirculationMonitor(OverdriveAPITest):
             def recently_changed_ids(self, start, cutoff):
                 return [1, 2, 3]
 
-            def update_licensepool(self, book_id):
+            def update_licensepool(self, book_id, batch=None):
                 current_count = self.tries.get(str(book_id)) or 0
                 current_count = current_count + 1
                 self.tries[str(book_id)] = current_count
@@ -2387,6 +2407,95 @@ class TestOverdriveCirculationMonitor(OverdriveAPITest):
         assert api.tries["3"] == 3
         assert progress.is_failure
 
+    def test_catch_up_from_in_batches(self):
+        """Availability information is written to the database in
+        batches of BATCH_SIZE books.
+        """
+        pools = {}
+        for book_id in (1, 2, 3):
+            work = self._work(with_license_pool=True)
+            [pools[book_id]] = work.license_pools
+            pools[book_id].licenses_owned = 0
+        self._db.flush()
+
+        _db = self._db
+        table = LicensePool.__table__
+
+        class MockAPI:
+            def __init__(self, *ignore, **kwignore):
+                self.seen = []
+
+            def recently_changed_ids(self, start, cutoff):
+                return [1, 2, 3]
+
+            def update_licensepool(self, book_id, batch=None):
+                # Keep track of what the database said about each
+                # LicensePool when this book was processed.
+                owned = {
+                    id: licenses_owned
+                    for id, licenses_owned in _db.execute(
+                        select([table.c.id, table.c.licenses_owned])
+                    )
+                }
+                self.seen.append([owned[pools[x].id] for x in (1, 2, 3)])
+                pool = pools[book_id]
+                pool.update_availability(10, 10, 0, 0, batch=batch)
+                return pool, False, True
+
+        class MockMonitor(OverdriveCirculationMonitor):
+            BATCH_SIZE = 2
+
+        monitor = MockMonitor(self._db, self.collection, api_class=MockAPI)
+        progress = TimestampData()
+        monitor.catch_up_from(object(), object(), progress)
+
+        # The first two books were written to the database together,
+        # before the third book was processed.
+        assert [[0, 0, 0], [0, 0, 0], [10, 10, 0]] == monitor.api.seen
+
+        # The third book was written out at the end.
+        self._db.expire_all()
+        assert [10, 10, 10] == [pools[x].licenses_owned for x in (1, 2, 3)]
+        assert "Books processed: 3." == progress.achievements
+
+    def test_catch_up_from_with_failure_in_batch(self):
+        """If a book runs into stale data, the books it was batched with
+        are processed again, one at a time.
+        """
+
+        class MockAPI:
+            def __init__(self, *ignore, **kwignore):
+                self.calls = []
+
+            def recently_changed_ids(self, start, cutoff):
+                return [1, 2, 3, 4]
+
+            def update_licensepool(self, book_id, batch=None):
+                self.calls.append((book_id, batch is not None))
+                if (book_id, True) == self.calls[-1] and book_id == 4:
+                    raise StaleDataError("Ouch!")
+                return object(), False, True
+
+        class MockMonitor(OverdriveCirculationMonitor):
+            BATCH_SIZE = 2
+
+        monitor = MockMonitor(self._db, self.collection, api_class=MockAPI)
+        progress = TimestampData()
+        monitor.catch_up_from(object(), object(), progress)
+
+        # Books 1 and 2 were committed as a batch. Book 4 failed, so
+        # book 3 (which hadn't been committed yet) and book 4 were
+        # processed again, on their own.
+        assert [
+            (1, True),
+            (2, True),
+            (3, True),
+            (4, True),
+            (3, False),
+            (4, False),
+        ] == monitor.api.calls
+        assert not progress.is_failure
+
 
 class TestNewTitlesOverdriveCollectionMonitor(OverdriveAPITest):
     def test_recently_changed_ids(self):
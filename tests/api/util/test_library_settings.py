@@ -0,0 +1,139 @@
+import pytest
+
+from api.util.library_settings import ConfigurationFingerprint, LazyLibraryMapping
+from core.lane import Lane
+from core.model import ConfigurationSetting, ExternalIntegration
+from core.testing import DatabaseTest
+
+
+class TestLazyLibraryMapping:
+    def test_objects_created_on_first_use(self):
+        created = []
+
+        def factory(key):
+            if key == "deleted":
+                raise KeyError(key)
+            created.append(key)
+            return key.upper()
+
+        mapping = LazyLibraryMapping(factory, ["a", "b", "deleted"])
+        assert 0 == len(mapping)
+        assert "a" in mapping
+        assert [] == created
+
+        assert "A" == mapping["a"]
+        assert "A" == mapping.get("a")
+        assert ["a"] == created
+        assert {"a": "A"} == mapping
+
+        # A key the mapping wasn't told about has no object.
+        assert "c" not in mapping
+        assert "default" == mapping.get("c", "default")
+        with pytest.raises(KeyError):
+            mapping["c"]
+
+        # If the factory can't create an object, the key is forgotten.
+        with pytest.raises(KeyError):
+            mapping["deleted"]
+        assert "deleted" not in mapping
+
+        # An invalidated object is created again the next time it's
+        # needed.
+        mapping.invalidate("a")
+        assert "a" in mapping
+        assert {} == mapping
+        assert "A" == mapping["a"]
+        assert ["a", "a"] == created
+
+        # So is an object for a new key.
+        mapping.invalidate("c")
+        assert "C" == mapping["c"]
+
+        # A discarded key is forgotten entirely.
+        mapping.discard("a")
+        mapping.discard("b")
+        assert "a" not in mapping
+        assert "b" not in mapping
+
+        # Values can be set directly.
+        mapping["b"] = "mock"
+        assert "mock" == mapping["b"]
+        assert ["a", "a", "c"] == created
+
+    def test_none_is_a_value(self):
+        mapping = LazyLibraryMapping(lambda key: None, ["a"])
+        assert None == mapping.get("a", "default")
+        assert "a" in mapping
+
+
+class TestConfigurationFingerprint(DatabaseTest):
+    def test_changed_libraries(self):
+        library = self._default_library
+        other_library = self._library()
+
+        def fingerprint():
+            return ConfigurationFingerprint.from_database(self._db)
+
+        def changes(before):
+            after = fingerprint()
+            return after.sitewide != before.sitewide, after.changed_libraries(before)
+
+        before = fingerprint()
+        assert library.short_name == before.short_names[library.id]
+        assert (False, set()) == changes(before)
+
+        # A change to a library's settings only affects that library.
+        before = fingerprint()
+        ConfigurationSetting.for_library("a setting", library).value = "value"
+        assert (False, {library.id}) == changes(before)
+
+        # So does a change to a library's patron authentication integration.
+        integration = self._external_integration(
+            "api.simple_authentication", ExternalIntegration.PATRON_AUTH_GOAL
+        )
+        integration.libraries.append(other_library)
+        before = fingerprint()
+        integration.setting("key").value = "value"
+        assert (False, {other_library.id}) == changes(before)
+
+        # And a change to the integration behind one of its collections.
+        collection = self._default_collection
+        before = fingerprint()
+        collection.external_integration.setting("key").value = "value"
+        assert (False, {library.id}) == changes(before)
+
+        # And a change to one of its lanes.
+        lane = self._lane(library=other_library)
+        before = fingerprint()
+        lane.display_name = "New name"
+        assert (False, {other_library.id}) == changes(before)
+
+        # Updating the size of a lane doesn't change its configuration.
+        before = fingerprint()
+        lane.size = 100
+        assert (False, set()) == changes(before)
+
+        # A sitewide setting affects every library.
+        before = fingerprint()
+        ConfigurationSetting.sitewide(self._db, "a setting").value = "value"
+        assert (True, set()) == changes(before)
+
+        # So does an integration that's not configured for a library.
+        before = fingerprint()
+        self._external_integration(
+            "search", ExternalIntegration.SEARCH_GOAL
+        ).url = "http://search/"
+        assert (True, set()) == changes(before)
+
+        # A new library shows up as a changed library, and so does a
+        # library that was deleted.
+        before = fingerprint()
+        new_library = self._library()
+        assert (False, {new_library.id}) == changes(before)
+
+        before = fingerprint()
+        for lane in self._db.query(Lane).filter(Lane.library == new_library):
+            self._db.delete(lane)
+        self._db.delete(new_library)
+        self._db.flush()
+        assert (False, {new_library.id}) == changes(before)
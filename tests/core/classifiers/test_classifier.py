@@ -1,5 +1,6 @@
 """Test logic surrounding classification schemes."""
 
+import re
 from collections import Counter
 
 from psycopg2.extras import NumericRange
@@ -13,13 +14,16 @@ from core.classifier import (
     WorkClassifier,
     fiction_genres,
     nonfiction_genres,
+    rule_fingerprint,
 )
 from core.classifier.age import (
     AgeClassifier,
     GradeLevelClassifier,
     InterestLevelClassifier,
 )
+from core.classifier.bisac import BISACClassifier as BISAC
 from core.classifier.ddc import DeweyDecimalClassifier as DDC
+from core.classifier.keyword import Eg
 from core.classifier.keyword import FASTClassifier as FAST
 from core.classifier.keyword import LCSHClassifier as LCSH
 from core.classifier.lcc import LCCClassifier as LCC
@@ -161,6 +165,98 @@ class TestClassifier:
         assert None == m(None)
         assert Lowercased("Foo") == m("Foo")
 
+    def test_classify_is_cached(self):
+        class Counting(Classifier):
+            calls = 0
+
+            @classmethod
+            def is_fiction(cls, identifier, name):
+                cls.calls += 1
+                return True
+
+        class MockSubject:
+            def __init__(self, identifier, name):
+                self.identifier = identifier
+                self.name = name
+
+        first = Counting.classify(MockSubject("id", "A Name"))
+        assert 1 == Counting.calls
+
+        # Classifying a subject with the same identifier and name
+        # doesn't run through the rules again.
+        assert first == Counting.classify(MockSubject("id", "A Name"))
+        assert 1 == Counting.calls
+
+        Counting.classify(MockSubject("id", "Another Name"))
+        assert 2 == Counting.calls
+
+        # Once the cache is cleared, the rules are run again.
+        Classifier.clear_cache()
+        Counting.classify(MockSubject("id", "A Name"))
+        assert 3 == Counting.calls
+
+    def test_version(self):
+        # Each classifier's version reflects the data files its rules
+        # are loaded from.
+        assert DDC.version() != LCC.version()
+        assert DDC.version() != Classifier.version()
+        assert LCSH.version() == FAST.version()
+        assert DDC.version() == DDC.version()
+
+        class MoreResources(DDC):
+            RESOURCES = DDC.RESOURCES + ("lcc_one_level.json",)
+
+        assert MoreResources.version() != DDC.version()
+
+        # It also reflects its own VERSION and the VERSION of the
+        # classifiers it's based on.
+        class NewRules(DDC):
+            VERSION = 2
+
+        class BasedOnNewRules(NewRules):
+            pass
+
+        assert NewRules.version() != DDC.version()
+        assert NewRules.version() == BasedOnNewRules.version()
+
+        class NewerRules(NewRules):
+            VERSION = 1
+
+        assert NewerRules.version() != NewRules.version()
+
+        # It also reflects the classifier's rule tables, so a change to
+        # one of them is noticed without anyone changing VERSION.
+        class NewTable(DDC):
+            FICTION = DDC.FICTION | {"PZ"}
+
+        assert NewTable.version() != DDC.version()
+
+        class OtherKeywords(LCSH):
+            KEYWORD_TABLES = LCSH.KEYWORD_TABLES[:-1]
+
+        assert OtherKeywords.version() != LCSH.version()
+
+        # Classifying subjects doesn't change the rules.
+        version = BISAC.version()
+        Classifier.clear_cache()
+        BISAC._classify("FIC022000", "Fiction / Mystery & Detective")
+        assert version == BISAC.version()
+
+    def test_rule_fingerprint(self):
+        # The fingerprint doesn't depend on the order of sets and
+        # dictionaries.
+        assert rule_fingerprint({"b": {2, 1}, "a": [1, 2]}) == rule_fingerprint(
+            {"a": [1, 2], "b": {1, 2}}
+        )
+        assert rule_fingerprint([1, 2]) != rule_fingerprint([2, 1])
+
+        # Objects are represented by their attributes, not by where
+        # they are in memory.
+        assert rule_fingerprint(Eg("term")) == rule_fingerprint(Eg("term"))
+        assert rule_fingerprint(Eg("term")) != rule_fingerprint(Eg("other"))
+        pattern = re.compile("a+", re.I)
+        assert "re('a+', %d)" % pattern.flags == rule_fingerprint(pattern)
+
 
 class TestClassifierLookup:
     def test_lookup(self):
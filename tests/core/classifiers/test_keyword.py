@@ -1,7 +1,9 @@
 from core import classifier
 from core.classifier import *
 from core.classifier.keyword import KeywordBasedClassifier as Keyword
+from core.classifier.keyword import KeywordIndex
 from core.classifier.keyword import LCSHClassifier as LCSH
+from core.classifier.keyword import match_kw
 
 
 class TestLCSH:
@@ -153,3 +155,36 @@ class TestKeyword:
         assert None == Keyword.genre(None, "Fiction/Urban")
 
         assert classifier.Folklore == Keyword.genre(None, "fables")
+
+
+class TestKeywordIndex:
+    def test_leading_word(self):
+        m = KeywordIndex.leading_word
+        assert "science" == m("Science Fiction")
+        assert "children" == m("children's stories")
+        assert "history" == m("history.*africa")
+        assert "colo" == m("colou?r")
+        assert None == m("^historical$")
+        assert None == m("cats|dogs")
+
+    def test_candidates(self):
+        table = dict(
+            a=match_kw("space opera", "aliens"),
+            b=match_kw("opera"),
+            c=match_kw("^opera$"),
+        )
+        index = KeywordIndex(table)
+
+        # A genre is a candidate if one of its keywords starts with the
+        # beginning of a word in the term.
+        assert ["a", "b", "c"] == index.candidates("Space Opera")
+        assert ["a", "c"] == index.candidates("Alien space")
+        assert ["c"] == index.candidates("Horror")
+
+        # It's up to the genre's regular expression to decide whether
+        # the rest of the keyword matches.
+        assert ["b", "c"] == index.candidates("Soap operatics")
+        assert None == table["b"]["search"]("Soap operatics")
+
+        # Non-ASCII terms aren't narrowed down at all.
+        assert ["a", "b", "c"] == index.candidates("Ópera")
@@ -1,8 +1,15 @@
 import datetime
+import gzip
 
 import pytest
 
 from core.classifier import Classifier
+from core.feed_cache import (
+    FeedCache,
+    FeedCacheEntry,
+    FeedRefreshQueue,
+    LRUFeedCacheTier,
+)
 from core.lane import Facets, Pagination, WorkList
 from core.model.cachedfeed import CachedFeed
 from core.testing import DatabaseTest
@@ -401,6 +408,316 @@ class TestCachedFeed(DatabaseTest):
         assert isinstance(r, OPDSFeedResponse)
         assert True == r.private
 
+    def test_fetch_with_feed_cache(self, monkeypatch):
+        # If CachedFeed.cache is set, fetch() looks for a fresh copy of
+        # the feed there before going to the database.
+        facets = Facets.default(self._default_library)
+        pagination = Pagination.default()
+        wl = WorkList()
+        wl.initialize(self._default_library)
+        refresher = MockFeedGenerator()
+        args = (self._db, wl, facets, pagination, refresher)
+
+        monkeypatch.setattr(CachedFeed, "cache", FeedCache([LRUFeedCacheTier(1000)]))
+
+        # A newly generated feed is stored in the database and in the
+        # cache.
+        r = CachedFeed.fetch(*args, max_age=1000)
+        assert "This is feed #1" == str(r)
+        assert 1 == len(CachedFeed.cache.tiers[0])
+        assert (0, 1) == (CachedFeed.cache.hits, CachedFeed.cache.misses)
+
+        # Change the feed in the database behind the cache's back.
+        cf = self._db.query(CachedFeed).one()
+        cf.content = "Changed in the database"
+
+        # The next request is served from the cache.
+        r = CachedFeed.fetch(*args, max_age=1000)
+        assert "This is feed #1" == str(r)
+        assert (1, 1) == (CachedFeed.cache.hits, CachedFeed.cache.misses)
+
+        # It comes with a precompressed version of the feed, so it
+        # doesn't need to be compressed again.
+        assert b"This is feed #1" == gzip.decompress(r.precompressed["gzip"])
+
+        # Invalidating the cache with the same arguments sends the next
+        # request to the database, and its copy goes back into the cache.
+        CachedFeed.invalidate_cache(self._db, wl, facets, pagination)
+        r = CachedFeed.fetch(*args, max_age=1000)
+        assert "Changed in the database" == str(r)
+        r = CachedFeed.fetch(*args, max_age=1000)
+        assert "Changed in the database" == str(r)
+        assert (2, 2) == (CachedFeed.cache.hits, CachedFeed.cache.misses)
+
+        # A cached copy older than max_age is not used.
+        key = CachedFeed._cache_key(
+            CachedFeed._prepare_keys(self._db, wl, facets, pagination)
+        )
+        old = utc_now() - datetime.timedelta(seconds=100)
+        CachedFeed.cache.put(key, FeedCacheEntry("Old feed", old))
+        cf.timestamp = old
+        r = CachedFeed.fetch(*args, max_age=10)
+        assert "This is feed #2" == str(r)
+        assert "This is feed #2" == CachedFeed.cache.get(key).content
+
+        # The cache is never consulted when the caller wants the
+        # CachedFeed itself.
+        CachedFeed.cache.put(key, FeedCacheEntry("Only in the cache", utc_now()))
+        feed = CachedFeed.fetch(*args, max_age=1000, raw=True)
+        assert "This is feed #2" == feed.content
+
+    def test_fetch_stream(self, monkeypatch):
+        # If stream=True, a newly generated feed is sent out as it's
+        # generated, and cached once it's complete.
+        facets = Facets.default(self._default_library)
+        pagination = Pagination.default()
+        wl = WorkList()
+        wl.initialize(self._default_library)
+        monkeypatch.setattr(CachedFeed, "cache", FeedCache([LRUFeedCacheTier(1000)]))
+
+        generated = []
+
+        def refresher():
+            for chunk in ("one ", "two ", "three"):
+                generated.append(chunk)
+                yield chunk
+
+        args = (self._db, wl, facets, pagination, refresher)
+        r = CachedFeed.fetch(*args, max_age=1000, stream=True)
+        assert isinstance(r, OPDSFeedResponse)
+
+        # The first piece was generated before the response was
+        # returned, but nothing has been cached yet.
+        assert ["one "] == generated
+        assert [] == self._db.query(CachedFeed).all()
+
+        assert "one two three" == str(r)
+        [cached] = self._db.query(CachedFeed).all()
+        assert "one two three" == cached.content
+        assert (
+            "one two three"
+            == CachedFeed.cache.get(
+                CachedFeed._cache_key(
+                    CachedFeed._prepare_keys(self._db, wl, facets, pagination)
+                )
+            ).content
+        )
+
+        # The next request is served from the cache, without calling
+        # the refresher.
+        generated = []
+        r = CachedFeed.fetch(*args, max_age=1000, stream=True)
+        assert "one two three" == str(r)
+        assert [] == generated
+
+        # A feed that's not supposed to be cached is streamed, but not
+        # stored.
+        cached.content = "Changed in the database"
+        r = CachedFeed.fetch(*args, max_age=CachedFeed.IGNORE_CACHE, stream=True)
+        assert "one two three" == str(r)
+        assert "Changed in the database" == cached.content
+
+    def test_fetch_stream_failure(self, monkeypatch):
+        # If a streamed feed can't be finished, the error isn't
+        # swallowed, and the partial feed isn't cached.
+        facets = Facets.default(self._default_library)
+        pagination = Pagination.default()
+        wl = WorkList()
+        wl.initialize(self._default_library)
+        cache = FeedCache([LRUFeedCacheTier(1000)])
+        monkeypatch.setattr(CachedFeed, "cache", cache)
+
+        def refresher():
+            yield "one "
+            yield "two "
+            raise Exception("The search engine went away")
+
+        r = CachedFeed.fetch(
+            self._db, wl, facets, pagination, refresher, max_age=1000, stream=True
+        )
+        chunks = iter(r.response)
+        assert "one " == next(chunks)
+        assert "two " == next(chunks)
+        with pytest.raises(Exception) as excinfo:
+            next(chunks)
+        assert "The search engine went away" in str(excinfo.value)
+
+        assert [] == self._db.query(CachedFeed).all()
+        key = CachedFeed._cache_key(
+            CachedFeed._prepare_keys(self._db, wl, facets, pagination)
+        )
+        assert None == cache.get(key)
+
+    def test_fetch_single_flight(self, monkeypatch):
+        # If stale_grace_period is set, a worker that finds a stale feed
+        # only regenerates it if no other worker is already doing so.
+        facets = Facets.default(self._default_library)
+        pagination = Pagination.default()
+        wl = WorkList()
+        wl.initialize(self._default_library)
+        refresher = MockFeedGenerator()
+        args = (self._db, wl, facets, pagination, refresher)
+
+        class Lock:
+            locked = False
+            lock_id = None
+
+            @classmethod
+            def try_lock(cls, _db, lock_id):
+                cls.lock_id = lock_id
+                return not cls.locked
+
+        monkeypatch.setattr(CachedFeed, "stale_grace_period", 60)
+        monkeypatch.setattr(CachedFeed, "_try_advisory_lock", Lock.try_lock)
+
+        CachedFeed.fetch(*args, max_age=10)
+        cf = self._db.query(CachedFeed).one()
+
+        # The feed went stale 20 seconds ago, and another worker is
+        # regenerating it, so we get the stale copy.
+        cf.timestamp = utc_now() - datetime.timedelta(seconds=30)
+        Lock.locked = True
+        r = CachedFeed.fetch(*args, max_age=10)
+        assert "This is feed #1" == str(r)
+        assert 1 == len(refresher.calls)
+
+        # The lock ID is based on the same keys as the feed itself.
+        keys = CachedFeed._prepare_keys(self._db, wl, facets, pagination)
+        assert CachedFeed._lock_id(keys) == Lock.lock_id
+
+        # Once the lock is free, we get to regenerate the feed.
+        Lock.locked = False
+        r = CachedFeed.fetch(*args, max_age=10)
+        assert "This is feed #2" == str(r)
+
+        # If the stale copy is older than the grace period, it's not
+        # served, no matter what other workers are doing.
+        cf.timestamp = utc_now() - datetime.timedelta(seconds=100)
+        Lock.locked = True
+        r = CachedFeed.fetch(*args, max_age=10)
+        assert "This is feed #3" == str(r)
+
+    def test_fetch_stale_while_revalidate(self, monkeypatch):
+        # If there's a refresh queue, a stale feed is served
+        # immediately and regenerated in the background.
+        facets = Facets.default(self._default_library)
+        pagination = Pagination.default()
+        wl = WorkList()
+        wl.initialize(self._default_library)
+        refresher = MockFeedGenerator()
+        args = (self._db, wl, facets, pagination, refresher)
+
+        class MockQueue:
+            in_refresh_job = False
+
+            def __init__(self):
+                self.queued = []
+
+            def enqueue(self, key, **kwargs):
+                self.queued.append(key)
+                self.kwargs = kwargs
+
+        queue = MockQueue()
+        monkeypatch.setattr(CachedFeed, "stale_grace_period", 60)
+        monkeypatch.setattr(CachedFeed, "refresh_queue", queue)
+
+        # A feed that doesn't exist yet has to be generated right away.
+        r = CachedFeed.fetch(*args, max_age=10)
+        assert "This is feed #1" == str(r)
+        assert [] == queue.queued
+
+        # A stale feed is served, and queued up to be refreshed.
+        cf = self._db.query(CachedFeed).one()
+        cf.timestamp = utc_now() - datetime.timedelta(seconds=30)
+        r = CachedFeed.fetch(*args, max_age=10)
+        assert "This is feed #1" == str(r)
+        keys = CachedFeed._prepare_keys(self._db, wl, facets, pagination)
+        assert [CachedFeed._cache_key(keys)] == queue.queued
+
+        # The refresh job is told which lane the feed is for.
+        assert dict(lane_id=None) == queue.kwargs
+
+        # When the refresh job makes the same request, the feed is
+        # regenerated.
+        queue.in_refresh_job = True
+        r = CachedFeed.fetch(*args, max_age=10)
+        assert "This is feed #2" == str(r)
+        assert 1 == len(queue.queued)
+
+        # A feed that's been stale for too long isn't served at all.
+        queue.in_refresh_job = False
+        cf.timestamp = utc_now() - datetime.timedelta(seconds=100)
+        r = CachedFeed.fetch(*args, max_age=10)
+        assert "This is feed #3" == str(r)
+        assert 1 == len(queue.queued)
+
+    def test__claim_refresh(self):
+        now = utc_now()
+
+        class MockFeed:
+            timestamp = now - datetime.timedelta(seconds=15)
+
+        class Mock(CachedFeed):
+            stale_grace_period = None
+
+            @classmethod
+            def _try_advisory_lock(cls, _db, lock_id):
+                return "lock result"
+
+        keys = CachedFeed._prepare_keys(
+            self._db, self._lane(), None, Pagination.default()
+        )
+        m = Mock._claim_refresh
+
+        # Without a grace period, every worker regenerates stale feeds.
+        assert True == m(self._db, keys, MockFeed, 10)
+
+        # With a grace period, the advisory lock decides -- unless there's
+        # no usable stale copy.
+        Mock.stale_grace_period = 60
+        assert "lock result" == m(self._db, keys, MockFeed, 10)
+        assert True == m(self._db, keys, None, 10)
+        assert True == m(self._db, keys, MockFeed, CachedFeed.CACHE_FOREVER)
+        assert True == m(self._db, keys, MockFeed, CachedFeed.IGNORE_CACHE)
+        Mock.stale_grace_period = 4
+        assert True == m(self._db, keys, MockFeed, 10)
+
+    def test__try_advisory_lock(self):
+        # Within a single transaction, the lock can be taken repeatedly.
+        m = CachedFeed._try_advisory_lock
+        assert True == m(self._db, 12345)
+        assert True == m(self._db, 12345)
+
+    def test_configure_from_environment(self, monkeypatch):
+        class Mock(CachedFeed):
+            pass
+
+        monkeypatch.delenv(FeedCache.SIZE_ENVIRONMENT_VARIABLE, raising=False)
+        monkeypatch.setenv(CachedFeed.STALE_GRACE_PERIOD_ENVIRONMENT_VARIABLE, "30")
+        Mock.configure_from_environment()
+        assert isinstance(Mock.cache, FeedCache)
+        assert 30 == Mock.stale_grace_period
+
+        # There's no refresh queue unless the caller knows how to
+        # create refresh jobs and background threads are enabled.
+        assert None == Mock.refresh_queue
+        monkeypatch.setenv(FeedRefreshQueue.SIZE_ENVIRONMENT_VARIABLE, "2")
+        Mock.configure_from_environment()
+        assert None == Mock.refresh_queue
+
+        job_factory = object()
+        monkeypatch.setattr(FeedRefreshQueue, "create_pool", lambda self, size: size)
+        Mock.configure_from_environment(refresh_job_factory=job_factory)
+        assert isinstance(Mock.refresh_queue, FeedRefreshQueue)
+        assert job_factory == Mock.refresh_queue.job_factory
+        assert 2 == Mock.refresh_queue.pool
+
+        monkeypatch.delenv(FeedRefreshQueue.SIZE_ENVIRONMENT_VARIABLE)
+        monkeypatch.delenv(CachedFeed.STALE_GRACE_PERIOD_ENVIRONMENT_VARIABLE)
+        Mock.configure_from_environment(refresh_job_factory=job_factory)
+        assert None == Mock.stale_grace_period
+        assert None == Mock.refresh_queue
+
     # Tests of helper methods.
 
     def test_feed_type(self):
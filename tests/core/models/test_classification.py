@@ -4,7 +4,7 @@ from sqlalchemy.exc import IntegrityError
 
 from core.classifier import Classifier
 from core.model import create
-from core.model.classification import Genre, Subject
+from core.model.classification import ClassifierVersion, Genre, Subject
 from core.testing import DatabaseTest
 
 
@@ -76,6 +76,62 @@ class TestSubject(DatabaseTest):
         assert None == subject.genre
         assert None == subject.fiction
 
+    def test_uncheck_outdated(self):
+        def subject(type, identifier):
+            subject, ignore = Subject.lookup(self._db, type, identifier, None)
+            subject.assign_to_genre()
+            return subject
+
+        sf = subject(Subject.TAG, "Science fiction")
+        children = subject(Subject.TAG, "Children's books")
+        locked = subject(Subject.TAG, "Fantasy")
+        locked.locked = True
+        ddc = subject(Subject.DDC, "300")
+        unchecked, ignore = Subject.lookup(self._db, Subject.TAG, "Horror", None)
+
+        # As far as these subjects know, they were classified under
+        # rules that would now say something different about them.
+        history, ignore = Genre.lookup(self._db, "History")
+        for s in sf, locked, ddc:
+            s.genre = history
+
+        tag = Classifier.lookup(Subject.TAG)
+        assert True == sf.classification_is_outdated(tag)
+        assert False == children.classification_is_outdated(tag)
+
+        # The first time through, every type of subject is checked,
+        # but only the ones that would be classified differently are
+        # marked as unchecked.
+        assert 2 == Subject.uncheck_outdated(self._db)
+        assert False == sf.checked
+        assert False == ddc.checked
+        assert True == children.checked
+        assert True == locked.checked
+        assert False == unchecked.checked
+
+        # The current version of each classifier's rules is recorded.
+        tag_version = (
+            self._db.query(ClassifierVersion)
+            .filter(ClassifierVersion.subject_type == Subject.TAG)
+            .one()
+        )
+        assert tag_version.version == Classifier.lookup(Subject.TAG).version()
+
+        # So the next time through, nothing is considered.
+        sf.assign_to_genre()
+        ddc.assign_to_genre()
+        for s in sf, ddc:
+            s.genre = history
+        assert 0 == Subject.uncheck_outdated(self._db)
+        assert True == sf.checked
+
+        # If one classifier's rules change, only subjects of that
+        # type are considered.
+        tag_version.version = "an older version"
+        assert 1 == Subject.uncheck_outdated(self._db)
+        assert False == sf.checked
+        assert True == ddc.checked
+
 
 class TestGenre(DatabaseTest):
     def test_name_is_unique(self):
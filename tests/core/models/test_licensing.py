@@ -5,10 +5,12 @@ from unittest.mock import MagicMock, PropertyMock
 
 import pytest
 from parameterized import parameterized
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.functions import func
 
 from core.mock_analytics_provider import MockAnalyticsProvider
-from core.model import create
+from core.model import WorkChange, WorkCoverageRecord, create
 from core.model.circulationevent import CirculationEvent
 from core.model.collection import CollectionMissing
 from core.model.constants import MediaTypes
@@ -21,6 +23,7 @@ from core.model.licensing import (
     DeliveryMechanism,
     Hold,
     LicensePool,
+    LicensePoolAvailabilityBatch,
     LicensePoolDeliveryMechanism,
     LicenseStatus,
     Loan,
@@ -28,7 +31,8 @@ from core.model.licensing import (
 )
 from core.model.resource import Hyperlink, Representation
 from core.testing import DatabaseTest
-from core.util.datetime_helpers import utc_now
+from core.util.datetime_helpers import datetime_utc, utc_now
+from tests.core.utils import DBStatementCounter
 
 
 class TestDeliveryMechanism(DatabaseTest):
@@ -652,6 +656,121 @@ class TestLicensePool(DatabaseTest):
         assert 30 == pool.licenses_reserved
         assert 40 == pool.patrons_in_hold_queue
 
+    def test_update_availability_with_batch(self):
+        work1 = self._work(with_license_pool=True)
+        work2 = self._work(with_license_pool=True)
+        [pool1] = work1.license_pools
+        [pool2] = work2.license_pools
+        pool2.licenses_owned = 1
+        pool2.licenses_available = 1
+        pool2.last_checked = None
+        new_pool = self._licensepool(None)
+        for work in (work1, work2):
+            work.last_update_time = None
+            WorkCoverageRecord.add_for(
+                work, WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION
+            )
+        self._db.flush()
+        last_change = self._db.query(func.max(WorkChange.id)).scalar()
+
+        batch = LicensePoolAvailabilityBatch(self._db)
+        as_of = datetime_utc(2022, 1, 1)
+        assert True == pool1.update_availability(30, 20, 2, 0, batch=batch)
+
+        # A second update to the same LicensePool is compared against
+        # the numbers from the first one.
+        assert False == pool1.update_availability(30, None, None, None, batch=batch)
+        assert True == pool1.update_availability(None, 19, None, None, batch=batch)
+        assert False == pool2.update_availability(None, None, None, None, batch=batch)
+        assert True == pool2.update_availability(
+            0, 0, 0, 0, as_of=CirculationEvent.NO_DATE, batch=batch
+        )
+
+        # A LicensePool without a Work is updated right away.
+        new_pool.update_availability(5, 5, 0, 0, as_of=as_of, batch=batch)
+        assert 5 == new_pool.licenses_owned
+        assert 2 == len(batch)
+
+        # The LicensePools have their new numbers already, but the
+        # session doesn't think they need to be written.
+        assert (30, 19) == (pool1.licenses_owned, pool1.licenses_available)
+        assert (0, 0) == (pool2.licenses_owned, pool2.licenses_available)
+        assert pool1 not in self._db.dirty
+        assert pool2 not in self._db.dirty
+
+        # Load everything the changelog will need, so that all we
+        # count below is the work of the batch itself.
+        for pool in (pool1, pool2):
+            pool.presentation_edition, pool.identifier
+        self._db.flush()
+
+        # Until the batch is finished, the database hasn't changed.
+        def owned(pool):
+            table = LicensePool.__table__
+            return self._db.execute(
+                select([table.c.licenses_owned]).where(table.c.id == pool.id)
+            ).scalar()
+
+        assert 1 == owned(pool1)
+        assert 1 == owned(pool2)
+        assert None == work1.last_update_time
+
+        # Even if the LicensePools are reloaded from the database in
+        # the meantime, the batch still knows the new numbers.
+        self._db.expire(pool1)
+        assert 1 == pool1.licenses_owned
+        pool1.presentation_edition, pool1.identifier, pool1.work
+
+        with DBStatementCounter(self.connection) as counter:
+            batch.finish()
+        # The LicensePools are updated with one statement, the Work
+        # with another, and then the Work is queued for reindexing.
+        assert 5 == counter.count
+        assert 0 == len(batch)
+
+        # The session knows about the new numbers, and so does the
+        # database.
+        for expire in (False, True):
+            if expire:
+                self._db.expire_all()
+            assert (30, 19, 2, 0) == (
+                pool1.licenses_owned,
+                pool1.licenses_available,
+                pool1.licenses_reserved,
+                pool1.patrons_in_hold_queue,
+            )
+            assert (0, 0, 0, 0) == (
+                pool2.licenses_owned,
+                pool2.licenses_available,
+                pool2.licenses_reserved,
+                pool2.patrons_in_hold_queue,
+            )
+            assert work1.last_update_time == pool1.last_checked
+            assert (utc_now() - pool1.last_checked) < datetime.timedelta(seconds=5)
+
+            # pool2's update was not supposed to change last_checked.
+            assert None == pool2.last_checked
+            assert None == work2.last_update_time
+
+        # work1 was queued for reindexing, and work2 was not.
+        def status(work):
+            [record] = [
+                x
+                for x in work.coverage_records
+                if x.operation == WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION
+            ]
+            return record.status
+
+        assert WorkCoverageRecord.REGISTERED == status(work1)
+        assert WorkCoverageRecord.SUCCESS == status(work2)
+        changes = self._db.query(WorkChange).filter(WorkChange.id > last_change)
+        assert [work1] == [change.work for change in changes]
+
+        # Finishing an empty batch does nothing.
+        with DBStatementCounter(self.connection) as counter:
+            batch.finish()
+        assert 0 == counter.count
+
     def test_open_access_links(self):
         edition, pool = self._edition(with_open_access_download=True)
         source = DataSource.lookup(self._db, DataSource.GUTENBERG)
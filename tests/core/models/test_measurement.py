@@ -1,3 +1,5 @@
+import pytest
+
 from core.model import DataSource, Measurement, get_one_or_create
 from core.testing import DatabaseTest
 from core.util.datetime_helpers import datetime_utc
@@ -298,6 +300,49 @@ class TestMeasurement(DatabaseTest):
         irrelevant = self._measurement("Some other quantity", 42, self.source, 1)
         assert 0 == Measurement.overall_quality([irrelevant])
 
+    def test_overall_qualities(self):
+        oclc = DataSource.lookup(self._db, DataSource.OCLC)
+        wrangler = DataSource.lookup(self._db, DataSource.METADATA_WRANGLER)
+        measurement_sets = dict(
+            popularity=[self._popularity(59)],
+            weighted=[self._rating(10, weight=10), self._rating(1, weight=1)],
+            everything=[
+                self._popularity(4),
+                self._rating(4),
+                self._quality(0.5),
+                self._measurement(Measurement.HOLDINGS, 400, oclc, 10),
+                self._measurement(Measurement.POPULARITY, 0.2, wrangler, 1),
+            ],
+            irrelevant=[self._measurement("Some other quantity", 42, self.source, 1)],
+        )
+        rows = [
+            (
+                key,
+                m.quantity_measured,
+                m.data_source.name,
+                m.value,
+                m.weight,
+                m._normalized_value,
+            )
+            for key, measurements in measurement_sets.items()
+            for m in measurements
+        ]
+
+        # overall_qualities() gets the same answers as
+        # overall_quality(), without needing Measurement objects.
+        qualities = Measurement.overall_qualities(rows, 0.4, 0.6, default_value=None)
+        for key, measurements in measurement_sets.items():
+            assert Measurement.overall_quality(
+                measurements, 0.4, 0.6, default_value=None
+            ) == pytest.approx(qualities[key])
+        assert None == qualities["irrelevant"]
+
+        # Things with no measurements at all aren't mentioned.
+        assert {} == Measurement.overall_qualities([])
+
+        with pytest.raises(ValueError):
+            Measurement.overall_qualities(rows, 0.5, 0.6)
+
     def test_calculate_quality(self):
         w = self._work(with_open_access_download=True)
 
@@ -8,18 +8,24 @@ from psycopg2.extras import NumericRange
 from core.classifier import Classifier, Fantasy, Romance, Science_Fiction
 from core.equivalents_coverage import EquivalentIdentifiersCoverageProvider
 from core.external_search import MockExternalSearchIndex
-from core.model import get_one_or_create, tuple_to_numericrange
+from core.model import (
+    PresentationCalculationPolicy,
+    get_one_or_create,
+    tuple_to_numericrange,
+)
 from core.model.classification import Genre, Subject
 from core.model.contributor import Contributor
 from core.model.coverage import WorkCoverageRecord
 from core.model.datasource import DataSource
 from core.model.edition import Edition
-from core.model.identifier import Identifier
+from core.model.identifier import Identifier, RecursiveEquivalencyCache
 from core.model.licensing import LicensePool
+from core.model.measurement import Measurement
 from core.model.resource import Hyperlink, Representation, Resource
-from core.model.work import Work, WorkGenre
+from core.model.work import Work, WorkChange, WorkEquivalentIdentifier, WorkGenre
 from core.testing import DatabaseTest
 from core.util.datetime_helpers import datetime_utc, from_timestamp, utc_now
+from tests.core.utils import DBStatementCounter
 
 
 class TestWork(DatabaseTest):
@@ -555,6 +561,71 @@ class TestWork(DatabaseTest):
         after = sorted((x.genre.name, x.affinity) for x in work.work_genres)
         assert [("Romance", 0.25), ("Science Fiction", 0.75)] == after
 
+    def test_calculate_presentation_for_works(self):
+        source = DataSource.lookup(self._db, DataSource.OVERDRIVE)
+
+        def work(subjects, rating):
+            work = self._work(with_license_pool=True)
+            identifier = work.license_pools[0].identifier
+            equivalent = self._identifier()
+            identifier.equivalent_to(source, equivalent, 1)
+            for subject in subjects:
+                equivalent.classify(source, Subject.OVERDRIVE, subject, weight=100)
+            identifier.add_measurement(source, Measurement.RATING, rating)
+            # This Work used to be classified as Fantasy.
+            work.assign_genres_from_weights({Fantasy: 1})
+            return work
+
+        works = [
+            work(["Romance", "Science Fiction"], 5),
+            work(["Juvenile Nonfiction"], 2),
+            self._work(with_license_pool=True),
+        ]
+
+        def presentation(work):
+            return (
+                work.quality,
+                work.fiction,
+                work.audience,
+                work.target_age,
+                sorted((wg.genre.name, wg.affinity) for wg in work.work_genres),
+                sorted(
+                    (r.operation, r.status)
+                    for r in self._db.query(WorkCoverageRecord).filter(
+                        WorkCoverageRecord.work == work
+                    )
+                ),
+            )
+
+        policy = PresentationCalculationPolicy.recalculate_everything()
+        for w in works:
+            w.calculate_presentation(policy)
+        self._db.flush()
+        self._db.expire_all()
+        one_at_a_time = [presentation(w) for w in works]
+        assert [("Romance", 0.5), ("Science Fiction", 0.5)] == one_at_a_time[0][4]
+        assert [] == one_at_a_time[2][4]
+
+        # Calculating presentation for all the Works at once gives
+        # the same results, with far fewer database statements.
+        for w in works:
+            w.assign_genres_from_weights({Fantasy: 1})
+            w.quality = None
+        self._db.flush()
+        with DBStatementCounter(self.connection) as batch_counter:
+            Work.calculate_presentation_for_works(works, policy)
+        self._db.expire_all()
+        assert one_at_a_time == [presentation(w) for w in works]
+
+        with DBStatementCounter(self.connection) as counter:
+            for w in works:
+                w.calculate_presentation(policy)
+            self._db.flush()
+        assert batch_counter.get_count() < counter.get_count()
+
+    def test_calculate_presentation_for_works_no_works(self):
+        Work.calculate_presentation_for_works([])
+
     def test_classifications_with_genre(self):
         work = self._work(with_open_access_download=True)
         identifier = work.presentation_edition.primary_identifier
@@ -1306,6 +1377,93 @@ class TestWork(DatabaseTest):
             x["collection_id"] for x in search_doc["licensepools"]
         }
 
+    def test_to_search_document_equivalent_identifiers(self):
+        work = self._work(with_license_pool=True)
+        edition = work.presentation_edition
+        primary = edition.primary_identifier
+
+        def identifiers():
+            doc = work.to_search_document()
+            return sorted(x["identifier"] for x in doc["identifiers"])
+
+        # Nothing has been precomputed for this work, so its equivalent
+        # identifiers come from the RecursiveEquivalencyCache.
+        assert [primary.identifier] == identifiers()
+
+        # Once they have been precomputed, they're used instead.
+        other = self._identifier()
+        self._db.add(
+            WorkEquivalentIdentifier(
+                work_id=work.id, parent_identifier_id=primary.id, identifier_id=other.id
+            )
+        )
+        self._db.flush()
+        assert [other.identifier] == identifiers()
+
+        # If the work's primary identifier changes, the precomputed
+        # identifiers are out of date and are ignored.
+        new_primary = self._identifier()
+        edition.primary_identifier = new_primary
+        self._db.flush()
+        assert [new_primary.identifier] == identifiers()
+
+    def test_work_equivalent_identifier_refresh(self):
+        work = self._work(with_license_pool=True)
+        primary = work.presentation_edition.primary_identifier
+        equivalent = self._identifier()
+        data_source = DataSource.lookup(self._db, DataSource.OCLC)
+        equivalent.equivalent_to(data_source, primary, 1)
+        EquivalentIdentifiersCoverageProvider(self._db).run()
+        no_edition = self._work()
+        no_edition.presentation_edition = None
+
+        def rows():
+            return sorted(
+                (row.parent_identifier_id, row.identifier_id)
+                for row in self._db.query(WorkEquivalentIdentifier).filter(
+                    WorkEquivalentIdentifier.work_id == work.id
+                )
+            )
+
+        # The provider copied the work's chain of equivalents.
+        expect = sorted([(primary.id, primary.id), (primary.id, equivalent.id)])
+        assert expect == rows()
+        assert [] == WorkEquivalentIdentifier.missing(self._db).all()
+
+        # When the primary identifier changes, the copy is out of date
+        # until it's refreshed.
+        new_primary = self._identifier()
+        work.presentation_edition.primary_identifier = new_primary
+        self._db.flush()
+        assert [(work.id,)] == WorkEquivalentIdentifier.missing(self._db).all()
+
+        assert [work.id] == WorkEquivalentIdentifier.refresh(
+            self._db, parent_identifier_ids=[new_primary.id]
+        )
+        assert [(new_primary.id, new_primary.id)] == rows()
+        assert [] == WorkEquivalentIdentifier.missing(self._db).all()
+
+        # A work whose primary identifier has nothing in the
+        # RecursiveEquivalencyCache still gets a row for the identifier
+        # itself, so it's not found to be missing over and over again.
+        self._db.query(RecursiveEquivalencyCache).filter(
+            RecursiveEquivalencyCache.parent_identifier_id == new_primary.id
+        ).delete()
+        self._db.query(WorkEquivalentIdentifier).filter(
+            WorkEquivalentIdentifier.work_id == work.id
+        ).delete()
+        assert [(work.id,)] == WorkEquivalentIdentifier.missing(self._db).all()
+        assert [work.id] == WorkEquivalentIdentifier.refresh(
+            self._db, work_ids=[work.id]
+        )
+        assert [(new_primary.id, new_primary.id)] == rows()
+        assert [] == WorkEquivalentIdentifier.missing(self._db).all()
+
+        # Works with no presentation edition have nothing to refresh.
+        assert [] == WorkEquivalentIdentifier.refresh(
+            self._db, work_ids=[no_edition.id]
+        )
+
     def test_to_search_doc_no_edition(self):
         """There was a bug where to_search_documents would crash if
         a presentation_edition was missing"""
@@ -1587,6 +1745,56 @@ class TestWork(DatabaseTest):
         # WorkCoverageRecord is processed.
         assert [] == list(index.docs.values())
 
+    def test_external_index_needs_updating_records_change(self):
+        # external_index_needs_updating adds the work to the work
+        # change log as well as resetting its coverage.
+        work = self._work()
+        self._db.query(WorkChange).delete()
+        work.external_index_needs_updating()
+        self._db.flush()
+        [change] = self._db.query(WorkChange).all()
+        assert work == change.work
+        assert change.created is not None
+
+    def test_work_change_record(self):
+        work = self._work()
+        self._db.query(WorkChange).delete()
+
+        # A work that changes several times before the session is
+        # flushed only gets one entry in the log.
+        change = WorkChange.record(work)
+        assert change == WorkChange.record(work)
+        self._db.flush()
+        assert [change] == self._db.query(WorkChange).all()
+
+        # Once the entry has been written, another change makes a new
+        # entry.
+        change2 = WorkChange.record(work)
+        assert change2 != change
+        self._db.flush()
+        assert change2.id > change.id
+
+        # Deleting a work deletes its entries in the log.
+        self._db.delete(work)
+        self._db.flush()
+        self._db.expire_all()
+        assert [] == self._db.query(WorkChange).all()
+
+    def test_work_change_record_outside_session(self):
+        # A work that's not in a session can't be recorded.
+        assert None == WorkChange.record(Work())
+
+    def test_work_change_record_during_flush(self):
+        # When a LicensePool is deleted, its work is recorded from a
+        # listener that runs in the middle of the flush.
+        work = self._work(with_license_pool=True)
+        [pool] = work.license_pools
+        self._db.flush()
+        self._db.query(WorkChange).delete()
+        self._db.delete(pool)
+        self._db.flush()
+        assert [work.id] == [c.work_id for c in self._db.query(WorkChange)]
+
     def test_for_unchecked_subjects(self):
 
         w1 = self._work(with_license_pool=True)
@@ -16,6 +16,7 @@ from core.app_server import (
     compressible,
     load_facets_from_request,
     load_pagination_from_request,
+    replay_current_request,
 )
 from core.config import Configuration
 from core.entrypoint import AudiobooksEntryPoint, EbooksEntryPoint, EntryPoint
@@ -25,6 +26,7 @@ from core.model import ConfigurationSetting, Identifier
 from core.opds import MockAnnotator
 from core.problem_details import INVALID_INPUT, INVALID_URN
 from core.testing import DatabaseTest
+from core.util.flask_util import OPDSFeedResponse
 from core.util.opds_writer import OPDSFeed, OPDSMessage
 
 
@@ -63,6 +65,21 @@ class TestHeartbeatController:
         assert "pass" == data["status"]
         assert "ba.na.na" == data["version"]
         assert "ba.na.na-10-ssssssssss" == data["releaseID"]
+        assert "checks" not in data
+
+        # The controller can be given a function that reports on the
+        # application's components.
+        controller = HeartbeatController(checks=lambda: dict(a=[dict(b="c")]))
+        with app.test_request_context("/"):
+            response = controller.heartbeat()
+        data = json.loads(response.data.decode("utf8"))
+        assert dict(a=[dict(b="c")]) == data["checks"]
+
+        # If it has nothing to report, there are no checks.
+        controller = HeartbeatController(checks=lambda: None)
+        with app.test_request_context("/"):
+            response = controller.heartbeat()
+        assert "checks" not in json.loads(response.data.decode("utf8"))
 
 
 class TestURNLookupHandler(DatabaseTest):
@@ -475,8 +492,9 @@ class TestCompressibleAnnotator:
         # If the client asks for gzip through Accept-Encoding, the
         # representation is compressed.
         response = ask_for_compression("gzip")
-        assert compressed == response.data
+        assert value == gzip.decompress(response.data)
         assert "gzip" == response.headers["Content-Encoding"]
+        assert "Accept-Encoding" in response.vary
 
         # If the client doesn't ask for compression, the value is
         # passed through unchanged.
@@ -495,3 +513,136 @@ class TestCompressibleAnnotator:
         response = ask_for_compression("gzip", "Accept-Transfer-Encoding")
         assert value == response.data
         assert "Content-Encoding" not in response.headers
+
+    def test_compressible_precompressed(self):
+        # If a response comes with a precompressed version of its
+        # body, @compressible sends that instead of compressing the
+        # body again.
+        @compressible
+        def function():
+            return OPDSFeedResponse("feed", precompressed={"gzip": b"already gzipped"})
+
+        def ask_for_compression(compression):
+            with self.app.test_request_context(
+                headers={"Accept-Encoding": compression}
+            ):
+                response = function()
+                self.app.process_response(response)
+                return response
+
+        response = ask_for_compression("gzip")
+        assert b"already gzipped" == response.data
+        assert "gzip" == response.headers["Content-Encoding"]
+        assert str(len(b"already gzipped")) == response.headers["Content-Length"]
+
+        # If the client doesn't ask for the precompressed variant, it's
+        # not used.
+        response = ask_for_compression("identity")
+        assert b"feed" == response.data
+
+    def test_compressible_in_memory(self):
+        # A response whose body is already in memory is compressed all
+        # at once, so it keeps its Content-Length.
+        value = b"Compress me! " * 10000
+
+        @compressible
+        def function():
+            return flask.Response(value)
+
+        with self.app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+            response = function()
+            self.app.process_response(response)
+        assert response.is_sequence
+        assert value == gzip.decompress(response.get_data())
+        assert str(len(response.get_data())) == response.headers["Content-Length"]
+
+    def test_compressible_streaming(self):
+        # A streamed response is compressed as it streams, one chunk at
+        # a time, so its length isn't known ahead of time.
+        generated = []
+
+        def chunks():
+            for chunk in (b"chunk 1 ", b"chunk 2"):
+                generated.append(chunk)
+                yield chunk
+
+        @compressible
+        def function():
+            return flask.Response(chunks())
+
+        with self.app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+            response = function()
+            self.app.process_response(response)
+
+        # Nothing has been generated yet.
+        assert [] == generated
+        assert "Content-Length" not in response.headers
+        assert not response.is_sequence
+        assert b"chunk 1 chunk 2" == gzip.decompress(b"".join(response.response))
+        assert 2 == len(generated)
+
+
+class TestReplayCurrentRequest:
+    def test_replay_current_request(self):
+        app = Flask(__name__)
+        calls = []
+
+        @app.route("/feed/<lane>")
+        def feed(lane):
+            calls.append(
+                (
+                    lane,
+                    flask.request.args.get("order"),
+                    flask.request.headers.get("Accept-Language"),
+                    flask.request.headers.get("Authorization"),
+                    flask.request.headers.get("Cookie"),
+                )
+            )
+            return "feed"
+
+        with app.test_request_context(
+            "/feed/5?order=title",
+            headers={
+                "Accept-Language": "es",
+                "Authorization": "Basic xyz",
+                "Cookie": "session=abc",
+            },
+        ):
+            job = replay_current_request()
+
+        # Creating the job didn't handle the request.
+        assert [] == calls
+
+        # Once the original request is over, the job handles the same
+        # request in a context of its own -- but without the client's
+        # credentials.
+        job()
+        assert [("5", "title", "es", None, None)] == calls
+        assert flask.has_request_context() is False
+
+        # The job can be run more than once.
+        job()
+        assert 2 == len(calls)
+
+    def test_replay_current_request_names_lane(self):
+        # A request that doesn't name a lane is replayed as a request
+        # for the lane that was actually used, since which lane that
+        # is might depend on who made the original request.
+        app = Flask(__name__)
+        calls = []
+
+        @app.route("/<library>/groups", defaults=dict(lane_identifier=None))
+        @app.route("/<library>/groups/<lane_identifier>")
+        def groups(library, lane_identifier):
+            calls.append((library, lane_identifier, flask.request.args.get("order")))
+            return "feed"
+
+        with app.test_request_context("/lib/groups?order=title"):
+            replay_current_request(lane_id=5)()
+            replay_current_request()()
+        assert [("lib", "5", "title"), ("lib", None, "title")] == calls
+
+        # A request that named a lane is replayed as-is.
+        with app.test_request_context("/lib/groups/7"):
+            replay_current_request(lane_id=5)()
+        assert ("lib", "7", None) == calls[-1]
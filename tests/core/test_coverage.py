@@ -1,4 +1,5 @@
 import datetime
+import threading
 
 import pytest
 
@@ -503,6 +504,90 @@ class TestBaseCoverageProvider(CoverageProviderTest):
             == progress.achievements
         )
 
+    def test_run_once_with_fetch_workers(self):
+        class Mock(AlwaysSuccessfulCoverageProvider):
+            fetch_threads = []
+            processed = []
+
+            def fetch_batch(self, batch):
+                self.fetch_threads.append(threading.current_thread())
+                return [x.identifier for x in batch]
+
+            def process_fetched_batch(self, batch, fetched):
+                # Each batch is processed on the main thread, with
+                # the data that was fetched for that batch.
+                assert threading.current_thread() == threading.main_thread()
+                assert [x.identifier for x in batch] == fetched
+                self.processed.append(batch)
+
+                # The first item in each batch is a transient failure.
+                first, rest = batch[0], batch[1:]
+                return [self.failure(first, "oops")] + rest
+
+        identifiers = [self._identifier() for i in range(5)]
+        provider = Mock(self._db, batch_size=2, fetch_workers=2)
+        progress = provider.run_once(CoverageProviderProgress())
+
+        # Two batches of two identifiers each were fetched on
+        # background threads.
+        assert 2 == len(provider.fetch_threads)
+        assert threading.main_thread() not in provider.fetch_threads
+        assert [2, 2] == [len(batch) for batch in provider.processed]
+        [first, second] = provider.processed
+        assert 4 == len(set(first + second))
+
+        # The results from both batches were tallied, and the offset
+        # skips over the transient failures.
+        assert 2 == progress.successes
+        assert 2 == progress.transient_failures
+        assert 2 == progress.offset
+
+        # The next call picks up the last identifier.
+        provider.run_once(progress)
+        [last] = set(identifiers) - set(first + second)
+        assert [last] == provider.processed[-1]
+        assert 3 == progress.transient_failures
+
+    def test_fetch_workers_ignored_without_fetch_batch(self):
+        # This provider only implements process_batch(), so it can't
+        # fetch batches on background threads.
+        provider = AlwaysSuccessfulCoverageProvider(
+            self._db, batch_size=2, fetch_workers=2
+        )
+        assert False == provider.can_fetch_batches
+        assert 0 == provider.fetch_workers
+
+        # It processes one batch at a time, as usual.
+        identifiers = [self._identifier() for i in range(3)]
+        progress = provider.run_once(CoverageProviderProgress())
+        assert 2 == progress.successes
+
+    def test_run_once_with_fetch_workers_fetch_fails(self):
+        class Mock(AlwaysSuccessfulCoverageProvider):
+            def fetch_batch(self, batch):
+                if len(batch) == 1:
+                    raise Exception("Vendor API is down")
+                return batch
+
+            def process_fetched_batch(self, batch, fetched):
+                return batch
+
+        # These will be split into a batch of two, which can be
+        # fetched, and a batch of one, which can't.
+        identifiers = [self._identifier() for i in range(3)]
+        provider = Mock(self._db, batch_size=2, fetch_workers=2)
+        progress = CoverageProviderProgress()
+        with pytest.raises(Exception) as excinfo:
+            provider.run_once(progress)
+        assert "Vendor API is down" in str(excinfo.value)
+
+        # The batch that was fetched successfully was processed and
+        # counted before the exception was raised.
+        assert 2 == progress.successes
+        assert [1, 1, 0] == sorted(
+            (len(x.coverage_records) for x in identifiers), reverse=True
+        )
+
     def test_process_batch_and_handle_results(self):
         """Test that process_batch_and_handle_results passes the identifiers
         its given into the appropriate BaseCoverageProvider, and deals
@@ -2194,6 +2279,27 @@ class TestWorkClassificationCoverageProvider(DatabaseTest):
             ]
         )
 
+    def test_process_batch(self):
+        works = [self._work(with_license_pool=True) for i in range(2)]
+        for work in works:
+            work.quality = None
+        provider = WorkClassificationCoverageProvider(self._db)
+        assert works == provider.process_batch(works)
+
+        # The whole batch has had its presentation calculated.
+        for work in works:
+            assert 0 == work.quality
+            operations = {
+                r.operation
+                for r in self._db.query(WorkCoverageRecord).filter(
+                    WorkCoverageRecord.work == work
+                )
+            }
+            assert {
+                WorkCoverageRecord.CLASSIFY_OPERATION,
+                WorkCoverageRecord.QUALITY_OPERATION,
+            }.issubset(operations)
+
 
 class TestOPDSEntryWorkCoverageProvider(DatabaseTest):
     def test_run(self):
@@ -5,6 +5,7 @@ from sqlalchemy import or_
 from core.equivalents_coverage import EquivalentIdentifiersCoverageProvider
 from core.model.coverage import EquivalencyCoverageRecord
 from core.model.identifier import Equivalency, RecursiveEquivalencyCache
+from core.model.work import WorkEquivalentIdentifier
 from core.query.coverage import EquivalencyCoverageQueries
 from core.testing import DatabaseTest
 
@@ -271,3 +272,33 @@ class TestEquivalentCoverage(DatabaseTest):
 
         all_recursives = self._db.query(RecursiveEquivalencyCache).all()
         assert len(all_recursives) == 4
+
+    def test_work_equivalent_identifiers(self):
+        # A work whose primary identifier is part of a chain.
+        work = self._work(with_license_pool=True)
+        edition = work.presentation_edition
+        edition.primary_identifier = self.idens[0]
+        self._db.commit()
+
+        def equivalents():
+            return {
+                row.identifier_id
+                for row in self._db.query(WorkEquivalentIdentifier).filter(
+                    WorkEquivalentIdentifier.work_id == work.id
+                )
+            }
+
+        # Processing the chain also copies it for the work.
+        self.provider.update_missing_coverage_records()
+        batch = self.provider.items_that_need_coverage().all()
+        self.provider.process_batch(batch)
+        assert {self.idens[0].id, self.idens[1].id, self.idens[2].id} == equivalents()
+
+        # Works that haven't been copied at all are taken care of when
+        # the provider finishes.
+        other_work = self._work(with_license_pool=True)
+        self._db.commit()
+        assert [
+            other_work.id
+        ] == self.provider.update_missing_work_equivalent_identifiers()
+        assert [] == self.provider.update_missing_work_equivalent_identifiers()
@@ -31,6 +31,7 @@ from core.external_search import (
     Query,
     QueryParser,
     SearchBase,
+    SearchIndexChangeLogMonitor,
     SearchIndexCoverageProvider,
     SortKeyPagination,
     WorkSearchResult,
@@ -45,6 +46,8 @@ from core.model import (
     DataSource,
     Edition,
     Genre,
+    Timestamp,
+    WorkChange,
     WorkCoverageRecord,
     get_one_or_create,
 )
@@ -4580,3 +4583,145 @@ class TestSearchIndexCoverageProvider(DatabaseTest):
         assert work == record.obj
         assert True == record.transient
         assert "There was an error!" == record.exception
+
+
+class TestSearchIndexChangeLogMonitor(DatabaseTest):
+    def test_run(self):
+        index = MockExternalSearchIndex()
+        monitor = SearchIndexChangeLogMonitor(
+            self._db, batch_size=2, search_index_client=index
+        )
+        work1 = self._work(with_license_pool=True)
+        work2 = self._work(with_license_pool=True)
+        not_ready = self._work()
+
+        # Start from a clean log, then record changes to each work,
+        # including two changes to work1.
+        self._db.query(WorkChange).delete()
+        for work in (work1, not_ready, work1, work2):
+            work.external_index_needs_updating()
+            self._db.flush()
+        changes = self._db.query(WorkChange).order_by(WorkChange.id).all()
+        assert 4 == len(changes)
+        last_id = changes[-1].id
+
+        monitor.run()
+
+        # Both presentation-ready works were reindexed.
+        assert {work1.id, work2.id} == {doc["_id"] for doc in index.docs.values()}
+
+        # Their search index coverage is up to date; the work that
+        # isn't presentation-ready is left for later.
+        def status(work):
+            return WorkCoverageRecord.lookup(
+                work, WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION
+            ).status
+
+        assert WorkCoverageRecord.SUCCESS == status(work1)
+        assert WorkCoverageRecord.SUCCESS == status(work2)
+        assert WorkCoverageRecord.REGISTERED == status(not_ready)
+
+        # The monitor checkpointed at the last entry it handled, and
+        # the entries it handled were removed from the log.
+        timestamp = (
+            self._db.query(Timestamp)
+            .filter(Timestamp.service == monitor.service_name)
+            .one()
+        )
+        assert last_id == timestamp.counter
+        assert "Works reindexed: 3." == timestamp.achievements
+        assert [] == self._db.query(WorkChange).all()
+
+        # Running the monitor again picks up where it left off.
+        index.docs.clear()
+        WorkChange.record(work2)
+        self._db.flush()
+        monitor.run()
+        assert [work2.id] == [doc["_id"] for doc in index.docs.values()]
+        assert timestamp.counter > last_id
+
+    def test_failures_are_left_for_coverage_provider(self):
+        class DoomedExternalSearchIndex(MockExternalSearchIndex):
+            def bulk(self, docs, **kwargs):
+                return 0, [
+                    dict(data=dict(_id=doc["_id"]), error="There was an error!")
+                    for doc in docs
+                ]
+
+        work = self._work(with_license_pool=True)
+        work.external_index_needs_updating()
+        monitor = SearchIndexChangeLogMonitor(
+            self._db, search_index_client=DoomedExternalSearchIndex()
+        )
+        assert 0 == monitor.process_batch([work.id])
+        record = WorkCoverageRecord.lookup(
+            work, WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION
+        )
+        assert WorkCoverageRecord.REGISTERED == record.status
+
+    def test_late_entries_are_not_lost(self):
+        # An entry whose transaction commits after the monitor has
+        # handled entries with higher IDs is picked up on the next run.
+        index = MockExternalSearchIndex()
+        monitor = SearchIndexChangeLogMonitor(self._db, search_index_client=index)
+        work1 = self._work(with_license_pool=True)
+        work2 = self._work(with_license_pool=True)
+        self._db.query(WorkChange).delete()
+        WorkChange.record(work1)
+        self._db.flush()
+        monitor.run()
+        [counter] = [
+            t.counter
+            for t in self._db.query(Timestamp).filter(
+                Timestamp.service == monitor.service_name
+            )
+        ]
+
+        late = WorkChange(id=counter - 1, work=work2)
+        self._db.add(late)
+        self._db.flush()
+        index.docs.clear()
+        monitor.run()
+        assert [work2.id] == [doc["_id"] for doc in index.docs.values()]
+        assert [] == self._db.query(WorkChange).all()
+
+    def test_hold(self):
+        # While a blue/green rebuild is replaying the change log, the
+        # entries it hasn't replayed yet aren't deleted.
+        index = MockExternalSearchIndex()
+        work = self._work(with_license_pool=True)
+        self._db.query(WorkChange).delete()
+        changes = []
+        for i in range(3):
+            changes.append(WorkChange(work=work))
+            self._db.add(changes[-1])
+        self._db.flush()
+        ids = [change.id for change in changes]
+        hold = Timestamp.stamp(
+            self._db,
+            SearchIndexChangeLogMonitor.HOLD_SERVICE_NAME,
+            Timestamp.SCRIPT_TYPE,
+            counter=ids[0],
+        )
+
+        monitor = SearchIndexChangeLogMonitor(
+            self._db, batch_size=2, search_index_client=index
+        )
+        assert ids[0] == monitor.hold_position()
+        monitor.run()
+        assert [work.id] == [doc["_id"] for doc in index.docs.values()]
+        assert ids[1:] == [id for (id,) in self._db.query(WorkChange.id)]
+
+        # The entries that were kept aren't handled again while the
+        # hold is in place.
+        index.docs.clear()
+        monitor.run()
+        assert {} == index.docs
+
+        # Once the hold is released, they're handled one more time and
+        # deleted.
+        hold.counter = None
+        assert None == monitor.hold_position()
+        monitor.run()
+        assert [work.id] == [doc["_id"] for doc in index.docs.values()]
+        assert [] == self._db.query(WorkChange).all()
@@ -0,0 +1,242 @@
+import datetime
+import gzip
+
+import pytest
+
+from core.feed_cache import (
+    FeedCache,
+    FeedCacheEntry,
+    FeedRefreshQueue,
+    FileFeedCacheTier,
+    LRUFeedCacheTier,
+)
+from core.util.datetime_helpers import datetime_utc
+
+
+class TestLRUFeedCacheTier:
+    def test_eviction(self):
+        now = datetime_utc(2021, 1, 1)
+        tier = LRUFeedCacheTier(max_size=10)
+        tier.put("a", FeedCacheEntry("aaaa", now))
+        tier.put("b", FeedCacheEntry("bbbb", now))
+        assert 8 == tier.size
+
+        # Using "a" makes "b" the least recently used entry, so it's the
+        # one that goes when the cache fills up.
+        assert "aaaa" == tier.get("a").content
+        tier.put("c", FeedCacheEntry("cccc", now))
+        assert None == tier.get("b")
+        assert "aaaa" == tier.get("a").content
+        assert 8 == tier.size
+
+        # Replacing an entry doesn't count its old content twice.
+        tier.put("a", FeedCacheEntry("aaaaaa", now))
+        assert 10 == tier.size
+        assert 2 == len(tier)
+
+        # An entry bigger than the whole cache isn't stored at all.
+        tier.put("d", FeedCacheEntry("d" * 11, now))
+        assert None == tier.get("d")
+        assert 2 == len(tier)
+
+        tier.invalidate("a")
+        assert None == tier.get("a")
+        assert 4 == tier.size
+
+        tier.clear()
+        assert 0 == len(tier)
+        assert 0 == tier.size
+
+        # Compressed versions of a feed count towards its size.
+        tier.put("e", FeedCacheEntry("eeee", now, dict(gzip=b"ee")))
+        assert 6 == tier.size
+
+
+class TestFileFeedCacheTier:
+    def test_put_get(self, tmp_path):
+        now = datetime_utc(2021, 1, 1, 12, 30)
+        tier = FileFeedCacheTier(str(tmp_path))
+        assert None == tier.get("key")
+
+        tier.put("key", FeedCacheEntry("<feed>☃</feed>", now))
+
+        # A different tier using the same directory sees the feed.
+        entry = FileFeedCacheTier(str(tmp_path)).get("key")
+        assert "<feed>☃</feed>" == entry.content
+        assert now == entry.timestamp
+        assert entry.timestamp.utcoffset() == datetime.timedelta(0)
+
+        tier.invalidate("key")
+        assert None == tier.get("key")
+
+        # Invalidating a feed that isn't there is fine.
+        tier.invalidate("key")
+
+        # Compressed versions of the feed are stored alongside it.
+        tier.put("key", FeedCacheEntry("feed", now, dict(gzip=b"\x1f\x8b\x00")))
+        assert dict(gzip=b"\x1f\x8b\x00") == tier.get("key").compressed
+
+        tier.clear()
+        assert [] == list(tmp_path.iterdir())
+
+
+class TestFeedCache:
+    def test_tiers(self, tmp_path):
+        now = datetime_utc(2021, 1, 1)
+        memory = LRUFeedCacheTier(100)
+        files = FileFeedCacheTier(str(tmp_path))
+        cache = FeedCache([memory, files])
+
+        assert None == cache.get("key")
+        assert 1 == cache.misses
+
+        # put() puts an entry in every tier.
+        cache.put("key", FeedCacheEntry("feed", now))
+        assert "feed" == memory.get("key").content
+        assert "feed" == files.get("key").content
+
+        # Along the way, the feed was compressed.
+        stored = cache.put("key", FeedCacheEntry("feed", now))
+        assert b"feed" == gzip.decompress(stored.compressed["gzip"])
+        assert stored.compressed == memory.get("key").compressed
+        assert stored.compressed == files.get("key").compressed
+
+        # An entry that's already been compressed isn't compressed
+        # again.
+        already = FeedCacheEntry("feed", now, dict(gzip=b"gzipped"))
+        assert already == cache.put("key", already)
+
+        # When only a slower tier has the entry, it's copied into the
+        # faster tiers.
+        memory.clear()
+        assert "feed" == cache.get("key").content
+        assert "feed" == memory.get("key").content
+        assert 1 == cache.hits
+
+        cache.invalidate("key")
+        assert None == memory.get("key")
+        assert None == files.get("key")
+
+    def test_key(self):
+        key = FeedCache.key("groups", 1, None, 2, None, "facets", "pagination")
+        assert key != FeedCache.key("groups", 1, None, 2, None, "facets", "")
+        assert key == FeedCache.key("groups", 1, None, 2, None, "facets", "pagination")
+
+    def test_from_environment(self, monkeypatch, tmp_path):
+        monkeypatch.delenv(FeedCache.SIZE_ENVIRONMENT_VARIABLE, raising=False)
+        monkeypatch.delenv(FeedCache.DIRECTORY_ENVIRONMENT_VARIABLE, raising=False)
+
+        # By default there's an in-memory cache, but no shared cache.
+        [tier] = FeedCache.from_environment().tiers
+        assert isinstance(tier, LRUFeedCacheTier)
+        assert FeedCache.DEFAULT_SIZE == tier.max_size
+
+        monkeypatch.setenv(FeedCache.SIZE_ENVIRONMENT_VARIABLE, "100")
+        monkeypatch.setenv(FeedCache.DIRECTORY_ENVIRONMENT_VARIABLE, str(tmp_path))
+        memory, files = FeedCache.from_environment().tiers
+        assert 100 == memory.max_size
+        assert str(tmp_path) == files.directory
+
+        # If every tier is disabled, there's no cache at all.
+        monkeypatch.setenv(FeedCache.SIZE_ENVIRONMENT_VARIABLE, "0")
+        monkeypatch.delenv(FeedCache.DIRECTORY_ENVIRONMENT_VARIABLE)
+        assert None == FeedCache.from_environment()
+
+
+class MockPool:
+    """Run jobs only when told to."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def put(self, job):
+        self.jobs.append(job)
+
+    def run_all(self):
+        jobs, self.jobs = self.jobs, []
+        for job in jobs:
+            job()
+
+
+class MockFeedRefreshQueue(FeedRefreshQueue):
+    def create_pool(self, size):
+        self.pool_size = size
+        return MockPool()
+
+
+class TestFeedRefreshQueue:
+    def test_enqueue(self):
+        now = [100.0]
+        calls = []
+        created = []
+
+        def job_factory():
+            created.append(object())
+            name = "job %d" % len(created)
+
+            def job():
+                # While the job runs, the queue knows it's running.
+                calls.append((name, queue.in_refresh_job))
+
+            return job
+
+        queue = MockFeedRefreshQueue(3, job_factory, clock=lambda: now[0])
+        assert 3 == queue.pool_size
+        assert False == queue.in_refresh_job
+
+        # A feed that's already waiting to be refreshed isn't queued
+        # a second time.
+        assert True == queue.enqueue("feed 1")
+        now[0] = 101.0
+        assert False == queue.enqueue("feed 1")
+        assert True == queue.enqueue("feed 2")
+        assert 2 == queue.depth
+        assert 2 == len(queue.pool.jobs)
+
+        now[0] = 104.0
+        queue.pool.run_all()
+        assert [("job 1", True), ("job 2", True)] == calls
+        assert False == queue.in_refresh_job
+        assert (
+            dict(depth=0, completed=2, failed=0, average_lag=3.5, max_lag=4.0)
+            == queue.stats
+        )
+
+        # Once a feed has been refreshed, it can be queued again.
+        assert True == queue.enqueue("feed 1")
+
+    def test_enqueue_passes_arguments_to_job_factory(self):
+        factory_calls = []
+
+        def job_factory(**kwargs):
+            factory_calls.append(kwargs)
+            return lambda: None
+
+        queue = MockFeedRefreshQueue(1, job_factory)
+        queue.enqueue("feed", lane_id=5)
+        assert [dict(lane_id=5)] == factory_calls
+
+    def test_failed_job(self):
+        def job_factory():
+            def job():
+                raise Exception("oops")
+
+            return job
+
+        queue = MockFeedRefreshQueue(1, job_factory)
+        queue.enqueue("feed")
+        queue.pool.run_all()
+        assert 0 == queue.depth
+        assert 1 == queue.failed
+        assert 0 == queue.completed
+        assert False == queue.in_refresh_job
+
+    def test_job_factory_error(self):
+        # If a job can't be created, the feed isn't left in the queue.
+        def job_factory():
+            raise Exception("no job for you")
+
+        queue = MockFeedRefreshQueue(1, job_factory)
+        with pytest.raises(Exception):
+            queue.enqueue("feed")
+        assert 0 == queue.depth
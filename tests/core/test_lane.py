@@ -7,7 +7,7 @@ from unittest.mock import MagicMock, call
 
 import pytest
 from elasticsearch.exceptions import ElasticsearchException
-from sqlalchemy import and_, text
+from sqlalchemy import and_, inspect, text
 
 from core.classifier import Classifier
 from core.config import Configuration
@@ -35,6 +35,7 @@ from core.lane import (
     Pagination,
     SearchFacets,
     TopLevelWorkList,
+    WorkHydrationCache,
     WorkList,
 )
 from core.model import (
@@ -55,6 +56,7 @@ from core.problem_details import INVALID_INPUT
 from core.testing import DatabaseTest, EndToEndSearchTest, LogCaptureHandler
 from core.util.datetime_helpers import utc_now
 from core.util.opds_writer import OPDSFeed
+from tests.core.utils import DBStatementCounter
 
 
 class TestFacetsWithEntryPoint(DatabaseTest):
@@ -3356,6 +3358,74 @@ class TestDatabaseBackedWorkList(DatabaseTest):
         assert [pool] == w.license_pools
 
 
+class TestWorkHydrationCache(DatabaseTest):
+    def test_hydrate(self):
+        library = self._default_library
+        w1 = self._work(with_license_pool=True)
+        w2 = self._work(with_license_pool=True)
+        undeliverable = self._work(with_license_pool=True)
+        for lpdm in undeliverable.license_pools[0].delivery_mechanisms:
+            self._db.delete(lpdm)
+        ids = [w1.id, w2.id, undeliverable.id]
+        for work in (w1, w2, undeliverable):
+            work.license_pools
+            work.presentation_edition
+
+        # Make sure the site-wide settings consulted by the filters
+        # exist, so creating them doesn't reset the cache.
+        ConfigurationSetting.excluded_audio_data_sources(self._db)
+
+        # These Works are already loaded in the session, so they only
+        # need to be checked against the filters.
+        cache = WorkHydrationCache.for_session(self._db)
+        assert {w1.id: w1, w2.id: w2} == cache.hydrate(self._db, library, ids)
+        assert (0, 3) == (cache.hits, cache.reused)
+
+        # The second time, the database isn't consulted at all -- not
+        # even for the Work that didn't pass the filters.
+        assert cache == WorkHydrationCache.for_session(self._db)
+        with DBStatementCounter(self.connection) as counter:
+            assert {w1.id: w1} == cache.hydrate(self._db, library, [w1.id])
+            assert {} == cache.hydrate(self._db, library, [undeliverable.id])
+        assert 0 == counter.get_count()
+        assert (2, 3) == (cache.hits, cache.reused)
+
+        # A different set of facets means a different set of filters.
+        facets = Facets.default(library, availability=Facets.AVAILABLE_NOW)
+        w1.license_pools[0].licenses_available = 0
+        self._db.flush()
+        cache = WorkHydrationCache.for_session(self._db)
+        assert {w2.id: w2} == cache.hydrate(self._db, library, ids, facets)
+        assert {w1.id: w1, w2.id: w2} == cache.hydrate(self._db, library, ids)
+
+        # Works that aren't fully loaded are loaded along with
+        # everything necessary to put them in a feed.
+        self._db.commit()
+        cache = WorkHydrationCache.for_session(self._db)
+        assert {w1.id: w1, w2.id: w2} == cache.hydrate(self._db, library, ids)
+        assert (0, 0) == (cache.hits, cache.reused)
+        assert "license_pools" not in inspect(w1).unloaded
+
+    def test_cache_is_reset(self):
+        # The cache goes away when the session writes to the database
+        # or ends its transaction.
+        work = self._work(with_license_pool=True)
+        for change in (
+            lambda: setattr(work, "quality", 0.5),
+            self._db.commit,
+            self._db.rollback,
+        ):
+            cache = WorkHydrationCache.for_session(self._db)
+            change()
+            assert cache != WorkHydrationCache.for_session(self._db)
+
+        # Pending changes are written out before the cache is used,
+        # just as they would be before a query.
+        cache = WorkHydrationCache.for_session(self._db)
+        work.quality = 0.6
+        assert cache != WorkHydrationCache.for_session(self._db)
+
+
 class TestHierarchyWorkList(DatabaseTest):
     """Test HierarchyWorkList in terms of its two subclasses, Lane and TopLevelWorkList."""
 
@@ -1,5 +1,6 @@
 import datetime
 import logging
+import re
 import xml.etree.ElementTree as ET
 from io import StringIO
 
@@ -51,6 +52,7 @@ from core.opds import (
     MockUnfulfillableAnnotator,
     NavigationFacets,
     NavigationFeed,
+    ParsedEntryCache,
     VerboseAnnotator,
 )
 from core.opds_import import OPDSXMLParser
@@ -61,6 +63,38 @@ from core.util.opds_writer import AtomFeed, OPDSFeed, OPDSMessage
 from tests.core.utils import DBStatementCounter
 
 
+class TestParsedEntryCache:
+    def test_parse(self):
+        cache = ParsedEntryCache(max_size=30)
+        a = "<entry><id>a</id></entry>"
+
+        # Every call gets its own copy of the parsed entry.
+        first = cache.parse("a", a)
+        first.append(etree.Element("extra"))
+        second = cache.parse("a", a)
+        assert a == etree.tounicode(second)
+        assert first is not second
+        assert 1 == len(cache)
+        assert len(a) == cache.size
+
+        # A different entry under the same key replaces the old one.
+        b = "<entry><id>b</id></entry>"
+        assert b == etree.tounicode(cache.parse("a", b))
+        assert 1 == len(cache)
+
+        # Once the entries are too big, the least recently used ones
+        # are discarded, and an entry too big to fit isn't kept at all.
+        cache.parse("b", b)
+        assert ["b"] == list(cache._entries)
+        cache.parse("big", "<entry><id>%s</id></entry>" % ("x" * 30))
+        assert ["b"] == list(cache._entries)
+        assert len(b) == cache.size
+
+        cache.clear()
+        assert 0 == len(cache)
+        assert 0 == cache.size
+
+
 class TestBaseAnnotator(DatabaseTest):
     def test_authors(self):
         # Create an Edition with an author and a narrator.
@@ -1479,6 +1513,63 @@ class TestAcquisitionFeed(DatabaseTest):
 
         assert "<title>feed title</title>" in str(response)
 
+    def test_page_stream(self):
+        # If stream=True, AcquisitionFeed.page() sends out the feed as
+        # it's generated.
+        wl = WorkList()
+        wl.initialize(self._default_library)
+        response = AcquisitionFeed.page(
+            self._db, "feed title", "url", wl, MockAnnotator, stream=True
+        )
+        assert isinstance(response, OPDSFeedResponse)
+        assert False == response.is_sequence
+        assert "<title>feed title</title>" in str(response)
+
+        # Once the whole feed was sent, it was cached.
+        [cached] = self._db.query(CachedFeed).all()
+        assert str(response) == cached.content
+
+    def test_generate_page_chunks(self):
+        # _generate_page_chunks creates the same feed as
+        # _generate_page, one entry at a time.
+        work1 = self._work(with_open_access_download=True)
+        work2 = self._work(with_open_access_download=True)
+
+        class MockLane(WorkList):
+            def works(self, _db, **kwargs):
+                return [work1, work2]
+
+        lane = MockLane()
+        lane.initialize(self._default_library)
+        args = (
+            self._db,
+            "feed title",
+            "http://url/",
+            lane,
+            MockAnnotator(),
+            Facets.default(self._default_library),
+            Pagination.default(),
+            None,
+            False,
+        )
+
+        def without_timestamp(feed):
+            return re.sub("<updated>[^<]*</updated>", "", feed)
+
+        chunks = list(AcquisitionFeed._generate_page_chunks(*args))
+
+        # The feed's opening tags, one entry, another entry, the
+        # feed-level links, and the closing tag.
+        assert 5 == len(chunks)
+        assert "<title>feed title</title>" in chunks[0]
+        assert work1.title in chunks[1]
+        assert work2.title in chunks[2]
+        assert "<simplified:breadcrumbs>" in chunks[3]
+        assert "</feed>\n" == chunks[4]
+
+        feed = AcquisitionFeed._generate_page(*args)
+        assert without_timestamp(str(feed)) == without_timestamp("".join(chunks))
+
     def test_as_response(self):
         # Verify the ability to convert an AcquisitionFeed object to an
         # OPDSFeedResponse containing the feed.
@@ -1910,6 +2001,35 @@ class TestAcquisitionFeed(DatabaseTest):
         )
         assert entry_string == etree.tounicode(full_entry)
 
+    def test_cached_entry_is_not_modified_by_annotation(self):
+        # A cached entry is only parsed once, but every feed that uses
+        # it gets its own copy to annotate.
+        work = self._work(with_open_access_download=True)
+        work.simple_opds_entry = "<entry><title>Cached</title></entry>"
+
+        def entry_string():
+            feed = AcquisitionFeed(
+                self._db, self._str, self._url, [], annotator=Annotator
+            )
+            return etree.tounicode(feed.create_entry(work))
+
+        first = entry_string()
+        assert first == entry_string()
+
+        # The annotations went into the copies, not into the parsed
+        # version of the cached entry.
+        [(xml, parsed)] = [
+            value
+            for key, value in AcquisitionFeed.parsed_entries._entries.items()
+            if key == (work.id, "simple_opds_entry")
+        ]
+        assert "<entry><title>Cached</title></entry>" == etree.tounicode(parsed)
+        assert first.startswith("<entry><title>Cached</title><id ")
+
+        # If the cached entry changes, it's parsed again.
+        work.simple_opds_entry = "<entry><title>Changed</title></entry>"
+        assert entry_string().startswith("<entry><title>Changed</title><id ")
+
     def test_exception_during_entry_creation_is_not_reraised(self):
         # This feed will raise an exception whenever it's asked
         # to create an entry.
@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+import threading
 
 import pytest
 
@@ -449,6 +450,90 @@ class TestOverdriveCoreAPI(OverdriveTestWithAPI):
             # this page) and a link to the next page.
             assert result == (["an availability queue"], "http://next-page/")
 
+    def test__book_list(self):
+        # Test the method that goes through every page of a book list,
+        # fetching pages in the background.
+        self.api.PREFETCH_PAGES = 2
+
+        def page(book_id, next_link=None):
+            content = dict(products=[dict(id=book_id)])
+            if next_link:
+                content["links"] = dict(next=dict(href=next_link))
+            return json.dumps(content)
+
+        assert "bearer token" == self.api.token
+        self.api.queue_response(200, content=page("1", "http://page-2/"))
+
+        # The Bearer Token expires before the second page is fetched.
+        # The background thread can't refresh it, so that happens
+        # when the caller gets that far.
+        self.api.queue_response(401)
+        self.api.access_token_response = self.api.mock_access_token_response(
+            "new bearer token"
+        )
+        self.api.queue_response(200, content=page("2", "http://page-3/"))
+        self.api.queue_response(200, content=page("3"))
+
+        books = list(self.api._book_list("http://page-1/"))
+        assert ["1", "2", "3"] == [book["id"] for book in books]
+        assert "new bearer token" == self.api.token
+        assert [
+            "http://page-1/",
+            "http://page-2/",
+            "http://page-2/",
+            "http://page-3/",
+        ] == [url for url, headers, body in self.api.requests]
+
+        # If the new token doesn't work either, the error is raised.
+        self.api.queue_response(401)
+        self.api.queue_response(401)
+        with pytest.raises(BadResponseException) as excinfo:
+            list(self.api._book_list("http://page-1/"))
+        assert "Something's wrong with the Overdrive OAuth Bearer Token!" in str(
+            excinfo.value
+        )
+
+        # So is any other error.
+        self.api.queue_response(500)
+        with pytest.raises(BadResponseException):
+            list(self.api._book_list("http://page-1/"))
+
+    def test__book_list_configuration_read_in_calling_thread(self):
+        # The background thread that fetches pages doesn't look at the
+        # configuration, which would mean using the database session.
+        self.api.PREFETCH_PAGES = 2
+        configuration = self.api._configuration
+        threads = []
+
+        class Configuration:
+            def __getattr__(self, name):
+                threads.append(threading.current_thread())
+                return getattr(configuration, name)
+
+        self.api._configuration = Configuration()
+        self.api.token
+        requests = []
+        original_do_get = self.api._do_get
+
+        def _do_get(url, headers, **kwargs):
+            requests.append((threading.current_thread(), kwargs["max_retry_count"]))
+            return original_do_get(url, headers, **kwargs)
+
+        self.api._do_get = _do_get
+        content = dict(products=[dict(id="1")], links=dict(next=dict(href="http://2/")))
+        self.api.queue_response(200, content=json.dumps(content))
+        self.api.queue_response(200, content=json.dumps(dict(products=[])))
+        assert ["1"] == [book["id"] for book in self.api._book_list("http://1/")]
+
+        # Both pages were fetched in the background, with the number
+        # of retries looked up ahead of time.
+        max_retry_count = configuration.max_retry_count
+        assert 2 == len(requests)
+        for thread, retries in requests:
+            assert threading.current_thread() != thread
+            assert max_retry_count == retries
+        assert {threading.current_thread()} == set(threads)
+
 
 class TestOverdriveRepresentationExtractor(OverdriveTestWithAPI):
     def test_availability_info(self):
@@ -41,6 +41,7 @@ from core.opds_import import OPDSImportMonitor
 from core.s3 import MinIOUploader, MinIOUploaderConfiguration, S3Uploader
 from core.scripts import (
     AddClassificationScript,
+    BlueGreenRebuildSearchIndexScript,
     CheckContributorNamesInDB,
     CollectionArgumentsScript,
     CollectionInputScript,
@@ -2625,6 +2626,38 @@ class TestReclassifyWorksForUncheckedSubjectsScript(DatabaseTest):
         self._db.refresh(subject)
         assert subject.checked == True
 
+    def test_subject_classification_outdated(self):
+        # This subject was checked, but the current rules would
+        # classify it differently.
+        subject = self._subject(Subject.TAG, "Science fiction")
+        subject.assign_to_genre()
+        subject.fiction = False
+        work = self._work(with_license_pool=True)
+        self._classification(
+            work.presentation_edition.primary_identifier,
+            subject,
+            work.license_pools[0].data_source,
+        )
+
+        # This one was checked and would be classified the same way.
+        unchanged = self._subject(Subject.TAG, "Fantasy")
+        unchanged.assign_to_genre()
+        self._db.commit()
+
+        class Mock(ReclassifyWorksForUncheckedSubjectsScript):
+            def process_works(self, works):
+                self.processed = getattr(self, "processed", []) + works
+                super().process_works(works)
+
+        script = Mock(self._db)
+        script.run()
+
+        # The outdated subject was reclassified, along with its work.
+        assert True == subject.checked
+        assert True == subject.fiction
+        assert [work] == script.processed
+        assert True == unchanged.checked
+
 
 class TestListCollectionMetadataIdentifiersScript(DatabaseTest):
     def test_do_run(self):
@@ -2989,15 +3022,11 @@ class TestMirrorResourcesScript(DatabaseTest):
 
 class TestRebuildSearchIndexScript(DatabaseTest):
     def test_do_run(self):
-        class MockSearchIndex:
+        class MockSearchIndex(MockExternalSearchIndex):
             def setup_index(self):
                 # This is where the search index is deleted and recreated.
                 self.setup_index_called = True
 
-            def bulk_update(self, works):
-                self.bulk_update_called_with = list(works)
-                return works, []
-
         index = MockSearchIndex()
         work = self._work(with_license_pool=True)
         work2 = self._work(with_license_pool=True)
@@ -3016,26 +3045,85 @@ class TestRebuildSearchIndexScript(DatabaseTest):
 
         # Run the script.
         script = RebuildSearchIndexScript(self._db, search_index_client=index)
-        [progress] = script.do_run()
+        progress = script.do_run(cmd_args=["--processes=0"])
 
-        # The mock methods were called with the values we expect.
+        # The index was recreated and both works were added to it.
         assert True == index.setup_index_called
-        assert {work, work2} == set(index.bulk_update_called_with)
+        assert {work.id, work2.id} == {doc["_id"] for doc in index.docs.values()}
 
-        # The script returned a list containing a single
-        # CoverageProviderProgress object containing accurate
-        # information about what happened (from the CoverageProvider's
-        # point of view).
-        assert (
-            "Items processed: 2. Successes: 2, transient failures: 0, persistent failures: 0"
-            == progress.achievements
+        # The script returned a TimestampData describing what happened.
+        assert isinstance(progress, TimestampData)
+        assert progress.achievements.startswith(
+            "Documents indexed: 2. Failures: 0. Failed ranges: 0."
         )
 
         # The old WorkCoverageRecords for the works were deleted. Then
-        # the CoverageProvider did its job and new ones were added.
+        # new ones were added as the works were indexed.
         new_coverage = [x.id for x in coverage_qu]
         assert 2 == len(new_coverage)
         assert set(new_coverage) != set(original_coverage)
+        assert {wcr.SUCCESS} == {x.status for x in coverage_qu}
+
+    def test_do_run_resume(self):
+        class MockSearchIndex(MockExternalSearchIndex):
+            setup_index_called = False
+
+            def setup_index(self):
+                self.setup_index_called = True
+
+        index = MockSearchIndex()
+        work = self._work(with_license_pool=True)
+        wcr = WorkCoverageRecord
+        record, ignore = wcr.add_for(work, wcr.UPDATE_SEARCH_INDEX_OPERATION)
+
+        # When resuming an interrupted rebuild, the index and the
+        # coverage records are left alone.
+        script = RebuildSearchIndexScript(self._db, search_index_client=index)
+        script.do_run(cmd_args=["--processes=0", "--resume"])
+        assert False == index.setup_index_called
+        assert record in self._db.query(wcr).all()
+
+
+class TestBlueGreenRebuildSearchIndexScript(DatabaseTest):
+    def test_do_run(self):
+        class MockSearchIndex(MockExternalSearchIndex):
+            def next_works_index_name(self, _db):
+                return "works-2"
+
+            def index_settings(self, index):
+                return dict(number_of_replicas="1")
+
+            def setup_index(self, new_index=None, **index_settings):
+                self.setup_index_called_with = new_index
+
+            def finish_bulk_load(self, *args):
+                return True
+
+            def warm_up(self, index, query_strings):
+                self.warm_up_called_with = query_strings
+
+            def transfer_current_alias(self, _db, new_index):
+                self.works_index = new_index
+
+        index = MockSearchIndex()
+        work = self._work(with_license_pool=True)
+        script = BlueGreenRebuildSearchIndexScript(self._db, search_index_client=index)
+        progress = script.do_run(
+            cmd_args=["--processes=0", "--warm-up-query=a", "--warm-up-query=b"]
+        )
+
+        # A new index was built and the alias moved onto it.
+        assert "works-2" == index.setup_index_called_with
+        assert ["a", "b"] == index.warm_up_called_with
+        assert [("works-2", index.work_document_type, work.id)] == list(index.docs)
+        assert progress.achievements.startswith(
+            "Now serving works-2. Documents indexed: 1."
+        )
+
+        # If the name of the new index is given, it's used.
+        script.do_run(cmd_args=["--processes=0", "--index=works-3"])
+        assert "works-3" == index.setup_index_called_with
+        assert "works-3" == index.works_index
 
 
 class TestSearchIndexCoverageRemover(DatabaseTest):
@@ -0,0 +1,387 @@
+import pytest
+
+from core.external_search import MockExternalSearchIndex
+from core.model import Timestamp, WorkCoverageRecord
+from core.search_reindex import (
+    BlueGreenRebuild,
+    DocumentBatch,
+    RangeFinished,
+    SearchIndexRebuilder,
+    WorkIdRange,
+    _RangeState,
+    build_documents,
+    work_id_ranges,
+)
+from core.testing import DatabaseTest
+
+
+class MockClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestWorkIdRanges(DatabaseTest):
+    def test_work_id_ranges(self):
+        # With no works, there are no ranges.
+        assert [] == work_id_ranges(self._db, 10)
+
+        works = [self._work() for i in range(3)]
+        ids = [w.id for w in works]
+        ranges = work_id_ranges(self._db, 2)
+
+        # Every work is in exactly one range.
+        for id in ids:
+            assert 1 == len([r for r in ranges if r.start <= id <= r.end])
+
+        # The range boundaries are multiples of the range size.
+        for r in ranges:
+            assert 1 == r.start % 2
+            assert 0 == r.end % 2
+            assert 1 == r.end - r.start
+
+
+class TestBuildDocuments(DatabaseTest):
+    def test_build_documents(self):
+        w1 = self._work(with_license_pool=True)
+        not_ready = self._work()
+        w2 = self._work(with_license_pool=True)
+        w3 = self._work(with_license_pool=True)
+        id_range = WorkIdRange(w1.id, w3.id)
+
+        # Only presentation-ready works are included. Works at or below
+        # `after_id` are skipped.
+        batches = list(build_documents(self._db, id_range, w1.id, 1))
+        assert [w2.id, w3.id] == [b.last_id for b in batches]
+        assert [[w2.id], [w3.id]] == [
+            [doc["_id"] for doc in b.documents] for b in batches
+        ]
+        assert {id_range} == {b.range for b in batches}
+
+        # Works outside the range are skipped.
+        [batch] = build_documents(self._db, WorkIdRange(w1.id, w2.id), 0, 10)
+        assert [w1.id, w2.id] == sorted(doc["_id"] for doc in batch.documents)
+
+
+class TestRangeState(DatabaseTest):
+    def test_advance(self):
+        id_range = WorkIdRange(1, 100)
+        timestamp = Timestamp.stamp(
+            self._db, "a service", Timestamp.SCRIPT_TYPE, counter=0
+        )
+        state = _RangeState(id_range, timestamp)
+        b1 = state.add(DocumentBatch(id_range, 10, []))
+        b2 = state.add(DocumentBatch(id_range, 20, []))
+
+        # The checkpoint can't move past a batch that hasn't been
+        # uploaded, even if a later batch has.
+        b2[1] = True
+        assert False == state.advance()
+        assert 0 == timestamp.counter
+
+        b1[1] = True
+        assert True == state.advance()
+        assert 20 == timestamp.counter
+
+        # Once every document in the range has been built and
+        # uploaded, the checkpoint moves to the end of the range.
+        state.built = True
+        assert True == state.advance()
+        assert 100 == timestamp.counter
+
+        # A failed range's checkpoint never moves.
+        state.failed = True
+        state.add(DocumentBatch(id_range, 200, []))[1] = True
+        assert False == state.advance()
+
+
+class TestSearchIndexRebuilder(DatabaseTest):
+    def rebuilder(self, index, **kwargs):
+        kwargs.setdefault("processes", 0)
+        return SearchIndexRebuilder(self._db, index, clock=MockClock(), **kwargs)
+
+    def test_run(self):
+        index = MockExternalSearchIndex()
+        works = [self._work(with_license_pool=True) for i in range(5)]
+        rebuilder = self.rebuilder(index, range_size=2, batch_size=1, max_in_flight=2)
+
+        progress = rebuilder.run()
+
+        # Every work was indexed.
+        assert {w.id for w in works} == {doc["_id"] for doc in index.docs.values()}
+        assert 5 == progress.documents
+        assert 0 == progress.failures
+        assert (
+            "Documents indexed: 5. Failures: 0. Failed ranges: 0. "
+            "Elapsed: 0.0 sec (0.0 docs/sec)." == progress.achievements
+        )
+
+        # Every work has up-to-date search index coverage.
+        for work in works:
+            record = WorkCoverageRecord.lookup(
+                work, WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION
+            )
+            assert WorkCoverageRecord.SUCCESS == record.status
+
+        # Every range was checkpointed as complete.
+        for id_range in work_id_ranges(self._db, 2):
+            assert id_range.end == rebuilder.checkpoint(id_range).counter
+
+    def test_resume(self):
+        index = MockExternalSearchIndex()
+        w1 = self._work(with_license_pool=True)
+        w2 = self._work(with_license_pool=True)
+        rebuilder = self.rebuilder(index, range_size=1000000)
+        [id_range] = work_id_ranges(self._db, 1000000)
+
+        # An earlier rebuild got as far as w1.
+        rebuilder.checkpoint(id_range).counter = w1.id
+
+        # When resuming, only w2 is indexed.
+        rebuilder.run(resume=True)
+        assert [w2.id] == [doc["_id"] for doc in index.docs.values()]
+
+        # Resuming a completed rebuild does nothing.
+        index.docs.clear()
+        rebuilder.run(resume=True)
+        assert {} == index.docs
+
+        # Not resuming starts from scratch.
+        rebuilder.run()
+        assert {w1.id, w2.id} == {doc["_id"] for doc in index.docs.values()}
+
+    def test_backpressure(self):
+        # No more than max_in_flight uploads happen at once.
+        class SlowIndex(MockExternalSearchIndex):
+            in_flight = 0
+            max_seen = 0
+
+            def bulk(self, docs, **kwargs):
+                SlowIndex.in_flight += 1
+                SlowIndex.max_seen = max(SlowIndex.max_seen, SlowIndex.in_flight)
+                try:
+                    return super().bulk(docs, **kwargs)
+                finally:
+                    SlowIndex.in_flight -= 1
+
+        index = SlowIndex()
+        for i in range(6):
+            self._work(with_license_pool=True)
+        self.rebuilder(index, batch_size=1, max_in_flight=2).run()
+        assert 6 == len(index.docs)
+        assert SlowIndex.max_seen <= 2
+
+    def test_upload_failures(self):
+        w1 = self._work(with_license_pool=True)
+        w2 = self._work(with_license_pool=True)
+
+        class PartlyDoomedIndex(MockExternalSearchIndex):
+            """Documents for w1 always fail."""
+
+            def bulk(self, docs, **kwargs):
+                errors = [
+                    dict(data=dict(_id=doc["_id"]), error="Doomed")
+                    for doc in docs
+                    if doc["_id"] == w1.id
+                ]
+                ok = [doc for doc in docs if doc["_id"] != w1.id]
+                super().bulk(ok, **kwargs)
+                return len(ok), errors
+
+        index = PartlyDoomedIndex()
+        progress = self.rebuilder(index).run()
+        assert [w2.id] == [doc["_id"] for doc in index.docs.values()]
+        assert 1 == progress.documents
+        assert 1 == progress.failures
+
+        # The failed work is still registered as needing an update, so
+        # the SearchIndexCoverageProvider will try it again.
+        operation = WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION
+        assert WorkCoverageRecord.REGISTERED == (
+            WorkCoverageRecord.lookup(w1, operation).status
+        )
+        assert WorkCoverageRecord.SUCCESS == (
+            WorkCoverageRecord.lookup(w2, operation).status
+        )
+
+    def test_failed_range(self):
+        # If something goes wrong building or uploading a range, its
+        # checkpoint is left where it was, so resuming will retry it.
+        work = self._work(with_license_pool=True)
+        [id_range] = work_id_ranges(self._db, 1000000)
+
+        class BrokenIndex(MockExternalSearchIndex):
+            def bulk(self, docs, **kwargs):
+                raise Exception("Elasticsearch is down")
+
+        rebuilder = self.rebuilder(BrokenIndex(), range_size=1000000)
+        progress = rebuilder.run()
+        assert 1 == progress.failed_ranges
+        assert id_range.start - 1 == rebuilder.checkpoint(id_range).counter
+
+        class BrokenRebuilder(SearchIndexRebuilder):
+            def build_in_process(self, tasks):
+                for id_range, after_id in tasks:
+                    yield RangeFinished(id_range, "Traceback")
+
+        rebuilder = BrokenRebuilder(
+            self._db, MockExternalSearchIndex(), processes=0, range_size=1000000
+        )
+        progress = rebuilder.run()
+        assert 1 == progress.failed_ranges
+        assert id_range.start - 1 == rebuilder.checkpoint(id_range).counter
+
+
+class MockBlueGreenIndex(MockExternalSearchIndex):
+    """Keep track of what happens to the indexes."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+        self.hooks = {}
+
+    def _call(self, name, *args):
+        self.calls.append((name,) + args)
+        if name in self.hooks:
+            self.hooks[name]()
+
+    def next_works_index_name(self, _db):
+        return "works-2"
+
+    def index_settings(self, index):
+        return dict(number_of_replicas="2", refresh_interval="5s")
+
+    def setup_index(self, new_index=None, **index_settings):
+        self._call("setup_index", new_index, index_settings)
+
+    def finish_bulk_load(self, index, number_of_replicas, refresh_interval=None):
+        self._call("finish_bulk_load", index, number_of_replicas, refresh_interval)
+        return True
+
+    def warm_up(self, index, query_strings):
+        self._call("warm_up", index, query_strings)
+
+    def transfer_current_alias(self, _db, new_index):
+        self._call("transfer_current_alias", new_index)
+        self.works_index = new_index
+
+    def indexed(self, index):
+        return sorted(id for (i, type, id) in self.docs if i == index)
+
+
+class TestBlueGreenRebuild(DatabaseTest):
+    def hold(self):
+        return Timestamp.lookup(
+            self._db, BlueGreenRebuild.SERVICE_NAME, Timestamp.SCRIPT_TYPE, None
+        )
+
+    def test_run(self):
+        index = MockBlueGreenIndex()
+        w1 = self._work(with_license_pool=True)
+        w2 = self._work(with_license_pool=True)
+        w3 = self._work(with_license_pool=True)
+        rebuild = BlueGreenRebuild(self._db, index, processes=0)
+
+        # Keep track of the works in each bulk upload.
+        index.bulk_calls = []
+        original_bulk = index.bulk
+
+        def bulk(docs, **kwargs):
+            index.bulk_calls.append([doc["_id"] for doc in docs])
+            return original_bulk(docs, **kwargs)
+
+        index.bulk = bulk
+
+        def change(work):
+            def hook():
+                # The hold is in place while the rebuild is running.
+                assert self.hold().counter is not None
+                work.external_index_needs_updating()
+                self._db.flush()
+
+            return hook
+
+        def covered():
+            return sorted(
+                record.work_id
+                for record in self._db.query(WorkCoverageRecord).filter(
+                    WorkCoverageRecord.operation
+                    == WorkCoverageRecord.UPDATE_SEARCH_INDEX_OPERATION,
+                    WorkCoverageRecord.status == WorkCoverageRecord.SUCCESS,
+                )
+            )
+
+        def transfer_current_alias():
+            # Nothing is covered until the new index is serving
+            # searches.
+            assert [] == covered()
+            change(w2)()
+
+        # One work changes while the new index is being built, and
+        # another one changes just after the alias moves.
+        index.hooks["setup_index"] = change(w1)
+        index.hooks["transfer_current_alias"] = transfer_current_alias
+
+        progress = rebuild.run()
+        assert 3 == progress.documents
+        assert sorted([w1.id, w2.id, w3.id]) == covered()
+
+        # The new index was filled with replicas and refreshing turned
+        # off, then given the old index's settings back, warmed up,
+        # and put behind the alias.
+        assert [
+            (
+                "setup_index",
+                "works-2",
+                dict(number_of_replicas=0, refresh_interval="-1"),
+            ),
+            ("finish_bulk_load", "works-2", "2", "5s"),
+            ("warm_up", "works-2", [None, index.test_search_term]),
+            ("transfer_current_alias", "works-2"),
+        ] == index.calls
+        assert "works-2" == index.works_index
+
+        # Everything went into the new index, and nothing into the
+        # old one.
+        assert sorted([w1.id, w2.id, w3.id]) == index.indexed("works-2")
+        assert [] == index.indexed("works")
+
+        # The bulk load was followed by a replay of w1, and the alias
+        # move was followed by a replay of w2. Changes from before the
+        # rebuild started weren't replayed.
+        # Documents within a bulk upload can come in any order.
+        assert [[w1.id, w2.id, w3.id], [w1.id], [w2.id]] == [
+            sorted(ids) for ids in index.bulk_calls
+        ]
+
+        # The hold on the change log was released.
+        assert None == self.hold().counter
+
+    def test_failed_rebuild(self):
+        class BrokenIndex(MockBlueGreenIndex):
+            def bulk(self, docs, **kwargs):
+                raise Exception("Elasticsearch is down")
+
+        index = BrokenIndex()
+        self._work(with_license_pool=True)
+        rebuild = BlueGreenRebuild(self._db, index, processes=0)
+        with pytest.raises(Exception) as excinfo:
+            rebuild.run()
+        assert "Not moving the alias to works-2: 1 ranges could not be indexed." in str(
+            excinfo.value
+        )
+
+        # The alias wasn't moved, and the hold was released.
+        assert "transfer_current_alias" not in [call[0] for call in index.calls]
+        assert "works" == index.works_index
+        assert None == self.hold().counter
+
+    def test_refuses_to_rebuild_serving_index(self):
+        rebuild = BlueGreenRebuild(self._db, MockBlueGreenIndex(), new_index="works")
+        with pytest.raises(ValueError) as excinfo:
+            rebuild.run()
+        assert "Index works is serving searches and can't be rebuilt in place." in str(
+            excinfo.value
+        )
@@ -0,0 +1,62 @@
+"""Test functionality of util/compression.py."""
+import gzip
+
+import pytest
+from werkzeug.http import parse_accept_header
+
+from core.util import compression
+
+
+class TestCompression:
+    def test_negotiate(self):
+        def m(header):
+            return compression.negotiate(parse_accept_header(header))
+
+        assert "gzip" == m("gzip")
+        assert "gzip" == m("GZIP, deflate")
+        assert None == m("")
+        assert None == m("compress, identity")
+        assert None == m("gzip;q=0")
+
+        # The client's preference wins.
+        assert "gzip" == m("gzip;q=0.5, br;q=0.4")
+
+        # When the client has no preference, ours wins.
+        assert compression.ENCODINGS[0] == m("*")
+        assert compression.ENCODINGS[0] == m("gzip, deflate, br")
+
+    def test_gzip(self):
+        value = b"Compress me! " * 100
+        compressed = compression.compress(value, "gzip")
+        assert value == gzip.decompress(compressed)
+
+        # Compressing the same value twice gives the same result.
+        assert compressed == compression.compress(value, "gzip")
+
+        # Compressing in chunks gives the same result as compressing
+        # all at once.
+        chunks = compression.split(value, size=7)
+        assert compressed == b"".join(compression.compress_chunks(chunks, "gzip"))
+
+    def test_brotli(self):
+        brotli = pytest.importorskip("brotli")
+        assert "br" == compression.ENCODINGS[0]
+        value = b"Compress me! " * 100
+        assert value == brotli.decompress(compression.compress(value, "br"))
+        chunks = compression.split(value, size=7)
+        compressed = b"".join(compression.compress_chunks(chunks, "br"))
+        assert value == brotli.decompress(compressed)
+
+    def test_compress_all(self):
+        compressed = compression.compress_all(b"value")
+        assert set(compression.ENCODINGS) == set(compressed)
+        assert b"value" == gzip.decompress(compressed["gzip"])
+
+    def test_unsupported_encoding(self):
+        with pytest.raises(ValueError) as excinfo:
+            compression.compressor("compress")
+        assert "Unsupported content-coding: compress" in str(excinfo.value)
+
+    def test_split(self):
+        assert [b"abc", b"def", b"g"] == list(compression.split(b"abcdefg", 3))
+        assert [] == list(compression.split(b"", 3))
@@ -4,6 +4,7 @@ import datetime
 import time
 from wsgiref.handlers import format_date_time
 
+from flask import Flask
 from flask import Response as FlaskResponse
 
 from core.util.datetime_helpers import utc_now
@@ -34,6 +35,24 @@ class TestResponse:
         assert "Cache-Control" in headers
         assert "Expires" in headers
 
+    def test_iterator_body(self):
+        # An iterator is sent to the client as it yields strings,
+        # rather than being converted to a string up front.
+        def body():
+            yield "first "
+            yield "second"
+
+        response = Response(body())
+        assert False == response.is_sequence
+        assert "first second" == str(response)
+
+        # In a request context, the iterator keeps the context around
+        # until it's done.
+        app = Flask(__name__)
+        with app.test_request_context("/"):
+            response = Response(body())
+        assert "first second" == str(response)
+
     def test_headers(self):
         # First, test cases where the response should be private and
         # not cached. These are the kinds of settings used for error
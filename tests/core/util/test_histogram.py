@@ -0,0 +1,36 @@
+"""Test functionality of util/histogram.py."""
+from core.util.histogram import LatencyHistogram, LatencyHistograms
+
+
+class TestLatencyHistogram:
+    def test_observe(self):
+        histogram = LatencyHistogram(buckets=[1, 0.5])
+        assert (0.5, 1) == histogram.buckets
+        for seconds in (0.2, 0.5, 0.7, 3):
+            histogram.observe(seconds)
+
+        data = histogram.as_dict()
+        assert 4 == data["count"]
+        assert 4.4 == round(data["sum"], 2)
+
+        # Buckets are cumulative.
+        assert [("0.5", 2), ("1", 3), ("+Inf", 4)] == list(data["buckets"].items())
+
+
+class TestLatencyHistograms:
+    def test_observe(self):
+        histograms = LatencyHistograms(buckets=[1])
+        assert {} == histograms.as_dict()
+
+        histograms.observe("fast", 0.1)
+        histograms.observe("slow", 2)
+        histograms.observe("slow", 3)
+
+        # Each name gets its own histogram, created the first time
+        # it's needed.
+        assert histograms["fast"] is histograms["fast"]
+        data = histograms.as_dict()
+        assert {"fast", "slow"} == set(data)
+        assert 1 == data["fast"]["buckets"]["1"]
+        assert 2 == data["slow"]["count"]
+        assert 0 == data["slow"]["buckets"]["1"]
@@ -2,6 +2,7 @@ import json
 
 import pytest
 import requests
+import requests_mock
 
 from core.problem_details import INVALID_INPUT
 from core.testing import MockRequestsResponse
@@ -12,8 +13,19 @@ from core.util.http import (
     RemoteIntegrationException,
     RequestNetworkException,
     RequestTimedOut,
+    SessionRegistry,
 )
 from core.util.problem_detail import ProblemDetail
+from tests.core.util.test_mock_web_server import MockAPIServer, MockAPIServerResponse
+
+
+@pytest.fixture
+def mock_web_server():
+    """A test fixture that yields a usable mock web server for the lifetime of the test."""
+    _server = MockAPIServer("127.0.0.1", 10256)
+    _server.start()
+    yield _server
+    _server.stop()
 
 
 class TestHTTP:
@@ -197,6 +209,26 @@ class TestHTTP:
             assert isinstance(v, bytes)
         assert isinstance(data, bytes)
 
+    def test_request_with_timeout_reuses_pooled_session(self):
+        """request_with_timeout uses HTTP.sessions rather than creating
+        a new session for every request.
+        """
+
+        class Mock(HTTP):
+            sessions = SessionRegistry()
+
+        with requests_mock.Mocker() as m:
+            m.get("http://url/", text="ok")
+            Mock.request_with_timeout("GET", "http://url/", integration="Overdrive")
+            Mock.request_with_timeout("GET", "http://url/", integration="Overdrive")
+
+        # The first request created a session; the second reused it.
+        # Neither request is still using it.
+        assert 1 == len(Mock.sessions)
+        assert 0 == Mock.sessions.stats["in_use"]
+        assert 1 == Mock.sessions.misses
+        assert 1 == Mock.sessions.hits
+
     def test_debuggable_request(self):
         class Mock(HTTP):
             @classmethod
@@ -373,3 +405,149 @@ class TestRequestNetworkException:
         # The status code corresponding to an upstream timeout is 502.
         document, status_code, headers = standard_detail.response
         assert 502 == status_code
+
+
+class TestSessionRegistry:
+    def test_session_for(self):
+        registry = SessionRegistry(pool_size=4)
+
+        session = registry.session_for("https://host/path", integration="Overdrive")
+        assert (0, 1) == (registry.hits, registry.misses)
+
+        # The same integration and host get the same session, whatever
+        # the path.
+        assert session == registry.session_for(
+            "https://host/other", integration="Overdrive"
+        )
+        assert (1, 1) == (registry.hits, registry.misses)
+
+        # A different host, integration or retry count gets a different
+        # session.
+        assert session != registry.session_for("https://other/", "Overdrive")
+        assert session != registry.session_for("https://host/", "Axis 360")
+        assert session != registry.session_for(
+            "https://host/", "Overdrive", max_retry_count=3
+        )
+        assert 4 == len(registry)
+
+        # The adapters are configured with the pool size and retry count.
+        retrying = registry.session_for("https://host/", "Overdrive", 3)
+        adapter = retrying.get_adapter("https://host/")
+        assert 4 == adapter._pool_maxsize
+        assert 3 == adapter.max_retries.total
+
+        assert (
+            dict(sessions=4, in_use=0, hits=2, misses=4, evictions=0) == registry.stats
+        )
+
+    def test_session_does_not_keep_cookies(self):
+        registry = SessionRegistry()
+        session = registry.session_for("http://url/")
+        with requests_mock.Mocker() as m:
+            m.get("http://url/", cookies={"patron": "secret"})
+            session.get("http://url/")
+        assert 0 == len(session.cookies)
+
+    def test_cookies_follow_redirects(self, mock_web_server: MockAPIServer):
+        redirect = MockAPIServerResponse()
+        redirect.status_code = 302
+        redirect.headers["Location"] = mock_web_server.url("/next")
+        redirect.headers["Set-Cookie"] = "token=value; Path=/"
+        redirect.headers["Content-Length"] = "0"
+        mock_web_server.enqueue_response("GET", "/start", redirect)
+        mock_web_server.enqueue_response("GET", "/next", MockAPIServerResponse())
+
+        registry = SessionRegistry()
+        url = mock_web_server.url("/start")
+        with registry.checkout(url) as session:
+            session.get(url)
+
+        # The cookie was sent along the redirect chain, but the session
+        # didn't keep it for the next request.
+        start, next = mock_web_server.requests()
+        assert "/next" == next.path
+        assert "token=value" == next.headers["Cookie"]
+        assert 0 == len(session.cookies)
+
+    def test_checkout(self):
+        now = [0.0]
+        registry = SessionRegistry(idle_timeout=10, clock=lambda: now[0])
+        with registry.checkout("http://url/") as session:
+            assert 1 == registry.stats["in_use"]
+
+            # A session that's in use isn't evicted, however long
+            # the request takes.
+            now[0] = 20
+            registry.evict_idle()
+            assert session == registry.session_for("http://url/")
+            assert 0 == registry.evictions
+
+            # A session that's dropped while it's in use is closed
+            # once the request is finished.
+            adapter = session.get_adapter("http://url/")
+            adapter.poolmanager.connection_from_url("http://url/")
+            registry.clear()
+            assert 0 == len(registry)
+            assert 1 == len(adapter.poolmanager.pools)
+        assert 0 == len(adapter.poolmanager.pools)
+        assert 0 == registry.stats["in_use"]
+
+        # The idle timeout starts when a request is finished.
+        with registry.checkout("http://url/") as session:
+            now[0] = 40
+        now[0] = 45
+        registry.evict_idle()
+        assert 1 == len(registry)
+        now[0] = 50
+        registry.evict_idle()
+        assert 0 == len(registry)
+
+    def test_evict_idle(self):
+        now = [0.0]
+        registry = SessionRegistry(idle_timeout=10, clock=lambda: now[0])
+        old = registry.session_for("http://old/")
+        now[0] = 5
+        registry.session_for("http://new/")
+
+        # After 10 seconds, the first session is evicted the next time
+        # the registry is used; the second is still fresh.
+        now[0] = 10
+        assert old != registry.session_for("http://old/")
+        assert 1 == registry.evictions
+        assert 2 == len(registry)
+
+    def test_configure(self):
+        registry = SessionRegistry()
+        registry.session_for("http://url/")
+        registry.configure(pool_size=2, idle_timeout=5)
+        assert 2 == registry.pool_size
+        assert 5 == registry.idle_timeout
+
+        # Existing sessions were dropped so the new settings take effect.
+        assert 0 == len(registry)
+
+    def test_from_environment(self, monkeypatch):
+        registry = SessionRegistry.from_environment()
+        assert SessionRegistry.DEFAULT_POOL_SIZE == registry.pool_size
+        assert SessionRegistry.DEFAULT_IDLE_TIMEOUT == registry.idle_timeout
+
+        monkeypatch.setenv(SessionRegistry.POOL_SIZE_ENVIRONMENT_VARIABLE, "3")
+        monkeypatch.setenv(SessionRegistry.IDLE_TIMEOUT_ENVIRONMENT_VARIABLE, "30")
+        registry = SessionRegistry.from_environment()
+        assert 3 == registry.pool_size
+        assert 30 == registry.idle_timeout
+
+    def test_after_fork(self):
+        registry = SessionRegistry()
+        session = registry.session_for("http://url/")
+        adapter = session.get_adapter("http://url/")
+        adapter.poolmanager.connection_from_url("http://url/")
+        lock = registry._lock
+
+        # In a forked process, every registry forgets its sessions
+        # without closing the connections it shares with its parent.
+        SessionRegistry.after_fork()
+        assert 0 == len(registry)
+        assert 1 == len(adapter.poolmanager.pools)
+        assert lock != registry._lock
+        assert session != registry.session_for("http://url/")
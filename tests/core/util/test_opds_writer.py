@@ -1,3 +1,4 @@
+import copy
 import datetime
 
 import pytz
@@ -41,6 +42,43 @@ class TestOPDSMessage:
 
 
 class TestAtomFeed:
+    def test_flush_and_finish(self):
+        # A feed can be serialized a piece at a time, as tags are added
+        # to it.
+        def entry(title):
+            return AtomFeed.E.entry(
+                AtomFeed.E.title(title),
+                AtomFeed.makeelement("{%s}distribution" % AtomFeed.BIBFRAME_NS),
+            )
+
+        feed = AtomFeed("title", "http://url/")
+        expect = copy.deepcopy(feed.feed)
+        for title in ("one", "two"):
+            expect.append(entry(title))
+        expect.append(AtomFeed.E.link(rel="next", href="http://next/"))
+
+        chunks = [feed.flush()]
+        for title in ("one", "two"):
+            feed.feed.append(entry(title))
+            chunks.append(feed.flush())
+        feed.feed.append(AtomFeed.E.link(rel="next", href="http://next/"))
+        chunks.append(feed.finish())
+
+        # The first chunk starts the feed, and the tags are gone once
+        # they've been serialized.
+        assert chunks[0].startswith("<feed ")
+        assert "<title>one</title>" in chunks[1]
+        assert "<title>two</title>" in chunks[2]
+        assert 0 == len(feed.feed)
+
+        # The pieces add up to the complete feed.
+        assert etree.tostring(expect, encoding="unicode", pretty_print=True) == "".join(
+            chunks
+        )
+
+        # Flushing an empty feed does nothing.
+        assert "" == feed.flush()
+
     def test_add_link_to_entry(self):
         kwargs = dict(title=1, href="url", extra="extra info")
         entry = AtomFeed.E.entry()
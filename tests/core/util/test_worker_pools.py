@@ -1,8 +1,19 @@
 import threading
+import time
+
+import pytest
 
 from core.model import Identifier, SessionManager
 from core.testing import DatabaseTest
-from core.util.worker_pools import DatabaseJob, DatabasePool, Pool, Queue, Worker
+from core.util.worker_pools import (
+    DatabaseJob,
+    DatabasePool,
+    Pool,
+    Queue,
+    RateLimiter,
+    Worker,
+    prefetch,
+)
 
 
 class TestPool:
@@ -157,3 +168,114 @@ class TestDatabaseJob(DatabaseTest):
         [identifier] = self._db.query(Identifier).all()
         assert "Keep It" == identifier.type
         assert "100" == identifier.identifier
+
+
+class TestPrefetch:
+    def test_items_arrive_in_order(self):
+        assert list(range(10)) == list(prefetch(iter(range(10)), 3))
+
+    def test_stays_ahead_of_the_caller(self):
+        produced = []
+
+        def items():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        prefetched = prefetch(items(), 3)
+        assert 0 == next(prefetched)
+        time.sleep(0.2)
+
+        # While we were busy with the first item, three more were put
+        # in the queue and a fifth is waiting for room -- but that's
+        # as far ahead as it gets.
+        assert 5 == len(produced)
+
+        assert list(range(1, 100)) == list(prefetched)
+
+    def test_exception_is_raised_in_order(self):
+        def items():
+            yield 1
+            yield 2
+            raise ValueError("Ouch!")
+
+        seen = []
+        with pytest.raises(ValueError) as excinfo:
+            for item in prefetch(items(), 5):
+                seen.append(item)
+        assert "Ouch!" in str(excinfo.value)
+        assert [1, 2] == seen
+
+    def test_caller_stops_early(self):
+        produced = []
+
+        def items():
+            i = 0
+            while True:
+                produced.append(i)
+                yield i
+                i += 1
+
+        prefetched = prefetch(items(), 2)
+        assert [0, 1] == [next(prefetched), next(prefetched)]
+        prefetched.close()
+
+        # Once the caller stops listening, the background thread stops
+        # producing items.
+        time.sleep(0.3)
+        count = len(produced)
+        time.sleep(0.3)
+        assert count == len(produced)
+
+    def test_size_zero(self):
+        # With no room for prefetched items, everything happens in
+        # the calling thread.
+        threads = []
+
+        def items():
+            for i in range(3):
+                threads.append(threading.current_thread())
+                yield i
+
+        assert [0, 1, 2] == list(prefetch(items(), 0))
+        assert [threading.current_thread()] * 3 == threads
+
+
+class TestRateLimiter:
+    def test_wait(self):
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+
+        limiter = RateLimiter(4, clock=lambda: now[0], sleep=sleep)
+
+        # The first call goes through immediately; each call after that
+        # waits its turn, a quarter of a second after the one before.
+        for i in range(3):
+            limiter.wait()
+        assert [0.25, 0.5] == sleeps
+
+        # Once enough time has passed, there's no need to wait.
+        now[0] += 10
+        limiter.wait()
+        assert [0.25, 0.5] == sleeps
+
+    def test_no_limit(self):
+        def sleep(seconds):
+            raise Exception("Shouldn't sleep!")
+
+        limiter = RateLimiter(None, sleep=sleep)
+        for i in range(10):
+            limiter.wait()
+
+    def test_limit_is_shared_between_threads(self):
+        sleeps = []
+        limiter = RateLimiter(10, clock=lambda: 0, sleep=sleeps.append)
+        threads = [threading.Thread(target=limiter.wait) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [0.1, 0.2, 0.3, 0.4] == [round(x, 2) for x in sorted(sleeps)]